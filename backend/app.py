@@ -183,6 +183,370 @@ def auto_migrate_super_admin():
         print(f"❌ Super Admin migration failed: {e}")
         return False
 
+def auto_migrate_event_recurrence():
+    """Add event.recurrence_id and turn legacy recurring instances into occurrence rows"""
+    
+    # Only run in production
+    if os.getenv('ENVIRONMENT') != 'production':
+        return True
+    
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        print("DATABASE_URL not found - skipping event recurrence migration")
+        return False
+    
+    try:
+        from sqlalchemy import create_engine, text
+        engine = create_engine(database_url)
+        
+        with engine.connect() as conn:
+            result = conn.execute(text("""
+                SELECT column_name 
+                FROM information_schema.columns 
+                WHERE table_name = 'event' 
+                AND column_name = 'recurrence_id'
+            """))
+            
+            if result.fetchall():
+                print("✅ recurrence_id column already exists - no migration needed")
+                return True
+            
+            print("🚀 Starting event recurrence migration...")
+            conn.execute(text('ALTER TABLE "event" ADD COLUMN recurrence_id TIMESTAMP NULL'))
+            
+            # Instances created by the old expand-on-create code become the
+            # materialized occurrences of their series
+            conn.execute(text("""
+                UPDATE "event" SET recurrence_id = date
+                WHERE parent_event_id IS NOT NULL AND date IS NOT NULL
+            """))
+            
+            # Open-ended legacy series stopped at their last created instance
+            conn.execute(text("""
+                UPDATE "event" AS series SET recurring_end_date = (
+                    SELECT MAX(child.date) FROM "event" AS child WHERE child.parent_event_id = series.id
+                )
+                WHERE series.is_recurring = TRUE
+                AND series.recurring_end_date IS NULL
+                AND series.recurring_count IS NULL
+                AND EXISTS (SELECT 1 FROM "event" AS child WHERE child.parent_event_id = series.id)
+            """))
+            
+            conn.execute(text("""
+                ALTER TABLE "event" ADD CONSTRAINT uq_event_occurrence UNIQUE (parent_event_id, recurrence_id)
+            """))
+            
+            conn.commit()
+            print("🎉 Event recurrence migration completed!")
+            return True
+            
+    except Exception as e:
+        print(f"❌ Event recurrence migration failed: {e}")
+        return False
+
+def auto_migrate_rsvp_previous_status():
+    """Add rsvp.previous_status, which the RSVP upsert returns for admin change tracking"""
+    
+    # Only run in production
+    if os.getenv('ENVIRONMENT') != 'production':
+        return True
+    
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        print("DATABASE_URL not found - skipping RSVP migration")
+        return False
+    
+    try:
+        from sqlalchemy import create_engine, text
+        engine = create_engine(database_url)
+        
+        with engine.connect() as conn:
+            conn.execute(text('ALTER TABLE rsvp ADD COLUMN IF NOT EXISTS previous_status VARCHAR(10) NULL'))
+            conn.commit()
+            print("✅ rsvp.previous_status column checked")
+            return True
+            
+    except Exception as e:
+        print(f"❌ RSVP migration failed: {e}")
+        return False
+
+def auto_migrate_substitute_escalation():
+    """Add the call list escalation columns to substitute_requests"""
+    
+    # Only run in production
+    if os.getenv('ENVIRONMENT') != 'production':
+        return True
+    
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        print("DATABASE_URL not found - skipping substitute escalation migration")
+        return False
+    
+    try:
+        from sqlalchemy import create_engine, text
+        engine = create_engine(database_url)
+        
+        with engine.connect() as conn:
+            conn.execute(text('ALTER TABLE substitute_requests ADD COLUMN IF NOT EXISTS call_list_id INTEGER NULL REFERENCES call_lists(id)'))
+            conn.execute(text('ALTER TABLE substitute_requests ADD COLUMN IF NOT EXISTS next_contact_at TIMESTAMP NULL'))
+            conn.execute(text('ALTER TABLE substitute_requests ADD COLUMN IF NOT EXISTS escalation_wave INTEGER DEFAULT 0'))
+            conn.commit()
+            print("✅ substitute_requests escalation columns checked")
+            return True
+            
+    except Exception as e:
+        print(f"❌ Substitute escalation migration failed: {e}")
+        return False
+
+def auto_migrate_survey_results():
+    """Add the aggregated respondent count to event_survey and the anonymous respondent key to survey_response"""
+    
+    # Only run in production
+    if os.getenv('ENVIRONMENT') != 'production':
+        return True
+    
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        print("DATABASE_URL not found - skipping survey results migration")
+        return False
+    
+    try:
+        from sqlalchemy import create_engine, text
+        engine = create_engine(database_url)
+        
+        with engine.connect() as conn:
+            # Left NULL on existing surveys so their results are aggregated on first read
+            conn.execute(text('ALTER TABLE event_survey ADD COLUMN IF NOT EXISTS respondent_count INTEGER NULL'))
+            # Its unique index is built by auto_migrate_indexes
+            conn.execute(text('ALTER TABLE survey_response ADD COLUMN IF NOT EXISTS respondent_key VARCHAR(64) NULL'))
+            conn.commit()
+            print("✅ event_survey respondent_count and survey_response respondent_key columns checked")
+            return True
+            
+    except Exception as e:
+        print(f"❌ Survey results migration failed: {e}")
+        return False
+
+def auto_migrate_quick_polls():
+    """Add the voter key that enforces one vote per member to poll_responses"""
+    
+    # Only run in production
+    if os.getenv('ENVIRONMENT') != 'production':
+        return True
+    
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        print("DATABASE_URL not found - skipping quick poll migration")
+        return False
+    
+    try:
+        from sqlalchemy import create_engine, text
+        engine = create_engine(database_url)
+        
+        with engine.connect() as conn:
+            conn.execute(text('ALTER TABLE poll_responses ADD COLUMN IF NOT EXISTS voter_key VARCHAR(64) NULL'))
+            conn.commit()
+            print("✅ poll_responses voter_key column checked")
+            return True
+            
+    except Exception as e:
+        print(f"❌ Quick poll migration failed: {e}")
+        return False
+
+def auto_migrate_reminder_ledger():
+    """Record reminders sent before the reminder ledger existed, so they aren't sent again"""
+    
+    # Only run in production
+    if os.getenv('ENVIRONMENT') != 'production':
+        return True
+    
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        print("DATABASE_URL not found - skipping reminder ledger migration")
+        return False
+    
+    try:
+        from sqlalchemy import create_engine, text
+        engine = create_engine(database_url)
+        
+        with engine.connect() as conn:
+            # Only upcoming events matter to the scheduler's anti-join, which
+            # keeps this to a few index lookups once the backfill has run
+            result = conn.execute(text("""
+                INSERT INTO event_reminder_ledger (event_id, organization_id, claimed_at, reminder_sent_at, recipient_count)
+                SELECT e.id, e.organization_id, MIN(l.sent_at), MAX(l.sent_at), COUNT(*)
+                FROM email_log AS l JOIN "event" AS e ON e.id = l.event_id
+                WHERE l.email_type = 'event_reminder' AND e.date >= NOW()
+                GROUP BY e.id, e.organization_id
+                ON CONFLICT (event_id) DO NOTHING
+            """))
+            conn.commit()
+            print(f"✅ Reminder ledger checked ({result.rowcount} earlier reminders recorded)")
+            return True
+            
+    except Exception as e:
+        print(f"❌ Reminder ledger migration failed: {e}")
+        return False
+
+def auto_migrate_member_import():
+    """Add the progress timestamp stale imports are detected by to member_import_jobs"""
+    
+    # Only run in production
+    if os.getenv('ENVIRONMENT') != 'production':
+        return True
+    
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        print("DATABASE_URL not found - skipping member import migration")
+        return False
+    
+    try:
+        from sqlalchemy import create_engine, text
+        engine = create_engine(database_url)
+        
+        with engine.connect() as conn:
+            # NULL on existing jobs, which fall back to started_at
+            conn.execute(text('ALTER TABLE member_import_jobs ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NULL'))
+            conn.commit()
+            print("✅ member_import_jobs updated_at column checked")
+            return True
+            
+    except Exception as e:
+        print(f"❌ Member import migration failed: {e}")
+        return False
+
+def auto_migrate_event_foreign_keys():
+    """Make rows that only describe an event go away with it, so events can be deleted"""
+    
+    # Only run in production
+    if os.getenv('ENVIRONMENT') != 'production':
+        return True
+    
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        print("DATABASE_URL not found - skipping event foreign key migration")
+        return False
+    
+    # (table, constraint) pairs whose event_id should cascade on delete
+    constraints = [
+        ('notification_jobs', 'notification_jobs_event_id_fkey'),
+        ('event_reminder_ledger', 'event_reminder_ledger_event_id_fkey'),
+    ]
+    
+    try:
+        from sqlalchemy import create_engine, text
+        engine = create_engine(database_url)
+        
+        with engine.connect() as conn:
+            for table, constraint in constraints:
+                result = conn.execute(text(
+                    "SELECT confdeltype FROM pg_constraint WHERE conname = :name"
+                ), {'name': constraint}).fetchone()
+                if result and result[0] == 'c':
+                    continue
+                conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {constraint}'))
+                conn.execute(text(
+                    f'ALTER TABLE {table} ADD CONSTRAINT {constraint} '
+                    f'FOREIGN KEY (event_id) REFERENCES "event" (id) ON DELETE CASCADE'
+                ))
+                print(f"✅ {table}.event_id now cascades on event delete")
+            conn.commit()
+            return True
+            
+    except Exception as e:
+        print(f"❌ Event foreign key migration failed: {e}")
+        return False
+
+def auto_migrate_indexes():
+    """Create indexes declared on the models after their tables already existed"""
+    
+    # Only run in production
+    if os.getenv('ENVIRONMENT') != 'production':
+        return True
+    
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        print("DATABASE_URL not found - skipping index migration")
+        return False
+    
+    # (index name, CREATE statement). Built CONCURRENTLY so writes carry on meanwhile
+    indexes = [
+        ('ix_event_org_template_date', 'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_event_org_template_date ON "event" (organization_id, is_template, date)'),
+        ('ix_event_org_date', 'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_event_org_date ON "event" (organization_id, date)'),
+        ('uq_rsvp_event_user', 'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_rsvp_event_user ON rsvp (event_id, user_id)'),
+        ('ix_rsvp_user_id', 'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_rsvp_user_id ON rsvp (user_id)'),
+        ('ix_user_organizations_org_active', 'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_organizations_org_active ON user_organizations (organization_id, is_active)'),
+        ('ix_email_log_event_type', 'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_email_log_event_type ON email_log (event_id, email_type)'),
+        ('ix_email_log_org_sent_at', 'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_email_log_org_sent_at ON email_log (organization_id, sent_at)'),
+        ('ix_message_recipients_user_read', 'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_message_recipients_user_read ON message_recipients (user_id, read_at)'),
+        ('ix_audit_log_org_timestamp', 'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_audit_log_org_timestamp ON audit_log (organization_id, timestamp)'),
+        ('ix_message_threads_org_last_message', 'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_message_threads_org_last_message ON message_threads (organization_id, last_message_at)'),
+        ('ix_messages_thread_sent_at', 'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_thread_sent_at ON messages (thread_id, sent_at)'),
+        ('ix_substitute_requests_status_next_contact', 'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_substitute_requests_status_next_contact ON substitute_requests (status, next_contact_at)'),
+        ('uq_poll_responses_poll_voter', 'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_poll_responses_poll_voter ON poll_responses (poll_id, voter_key)'),
+        ('uq_survey_response_question_respondent', 'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_survey_response_question_respondent ON survey_response (question_id, respondent_key)'),
+    ]
+    statements = [
+        # Dirty-day markers are append-only, so concurrent RSVPs never wait on one row
+        'ALTER TABLE analytics_dirty_days DROP CONSTRAINT IF EXISTS analytics_dirty_days_organization_id_day_key',
+        # Duplicated the (user_id, field_id) constraint, which is now the response upsert's conflict target
+        'DROP INDEX CONCURRENTLY IF EXISTS uq_event_field_response_event_user_field',
+    ]
+    
+    try:
+        from sqlalchemy import create_engine, text
+        engine = create_engine(database_url)
+        
+        # Autocommit: every statement is its own transaction, so one failure
+        # doesn't undo the others (and CONCURRENTLY can't run inside one)
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            # Every web worker runs this on boot; the first one does the work
+            if not conn.execute(text('SELECT pg_try_advisory_lock(4817001)')).scalar():
+                print("Index migration running in another worker - skipping")
+                return True
+            
+            try:
+                valid = dict(conn.execute(text("""
+                    SELECT c.relname, i.indisvalid FROM pg_index AS i JOIN pg_class AS c ON c.oid = i.indexrelid
+                    WHERE c.relname = ANY(:names)
+                """), {'names': [name for name, _ in indexes]}).fetchall())
+                
+                failed = []
+                for name, statement in indexes:
+                    if valid.get(name):
+                        continue
+                    try:
+                        if name in valid:
+                            # Left invalid by an interrupted concurrent build
+                            conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
+                        if name == 'uq_rsvp_event_user':
+                            # Keep the newest RSVP of any duplicates before making (event_id, user_id) unique
+                            conn.execute(text("""
+                                DELETE FROM rsvp AS older USING rsvp AS newer
+                                WHERE older.event_id = newer.event_id AND older.user_id = newer.user_id AND older.id < newer.id
+                            """))
+                        conn.execute(text(statement))
+                        print(f"✅ Created index {name}")
+                    except Exception as e:
+                        failed.append(name)
+                        print(f"❌ Creating index {name} failed: {e}")
+                
+                for statement in statements:
+                    try:
+                        conn.execute(text(statement))
+                    except Exception as e:
+                        failed.append(statement)
+                        print(f"❌ Index migration statement failed: {e}")
+            finally:
+                conn.execute(text('SELECT pg_advisory_unlock(4817001)'))
+            
+            print(f"✅ Checked {len(indexes) + len(statements)} index migrations ({len(failed)} failed)")
+            return not failed
+            
+    except Exception as e:
+        print(f"❌ Index migration failed: {e}")
+        return False
+
 # Disable Flask's default static file serving to use our custom route
 app = Flask(__name__, static_folder=None)
 app.config.from_object(Config)
@@ -211,6 +575,7 @@ from routes.messages import messages_bp
 from routes.substitutes import substitutes_bp
 from routes.bulk_ops import bulk_ops_bp
 from routes.quick_polls import quick_polls_bp
+from routes.live_updates import live_updates_bp
 from routes.analytics import analytics_bp
 from routes.super_admin import super_admin_bp
 # Phase 2 Super Admin Analytics - Advanced system insights
@@ -236,6 +601,7 @@ app.register_blueprint(messages_bp, url_prefix='/api/messages')
 app.register_blueprint(substitutes_bp, url_prefix='/api/substitutes')
 app.register_blueprint(bulk_ops_bp, url_prefix='/api/bulk-ops')
 app.register_blueprint(quick_polls_bp, url_prefix='/api/quick-polls')
+app.register_blueprint(live_updates_bp, url_prefix='/api/stream')
 app.register_blueprint(analytics_bp, url_prefix='/api/analytics')
 app.register_blueprint(super_admin_bp, url_prefix='/api/super-admin')
 app.register_blueprint(super_analytics_bp, url_prefix='/api/super-admin/analytics')
@@ -426,6 +792,18 @@ print(f"Index.html exists: {os.path.exists('static/index.html')}")
 auto_migrate_password_reset()
 auto_migrate_organization()
 auto_migrate_super_admin()
+auto_migrate_event_recurrence()
+auto_migrate_rsvp_previous_status()
+auto_migrate_substitute_escalation()
+auto_migrate_survey_results()
+auto_migrate_quick_polls()
+auto_migrate_reminder_ledger()
+auto_migrate_member_import()
+auto_migrate_event_foreign_keys()
+auto_migrate_indexes()
+
+# Imports that were running when the previous process stopped won't finish
+task_service.fail_stale_member_imports()
 
 if __name__ == '__main__':
     # Railway sets the PORT environment variable
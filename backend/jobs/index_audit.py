@@ -0,0 +1,204 @@
+"""
+Index audit
+
+Runs EXPLAIN on each hot query BandSync issues and flags the ones the
+database would answer with a sequential (full table) scan. By default it
+seeds a throwaway SQLite database from the models; point it at a copy of
+production to check the real planner:
+
+    python jobs/index_audit.py                              # seeded in-memory SQLite
+    python jobs/index_audit.py --database-url postgresql://...
+    python jobs/index_audit.py --database-url ... --seed    # create tables and seed first
+
+Exits non-zero if any query would sequentially scan, so it can gate CI.
+"""
+
+import os
+import sys
+import json
+import argparse
+import logging
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import select, desc
+from config import Config
+from models import (
+    db, User, Organization, UserOrganization, Event, RSVP, EmailLog,
+    AuditLog, Message, MessageThread, MessageRecipient
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SEED_ORGANIZATIONS = 3
+SEED_MEMBERS = 40
+SEED_EVENTS = 60
+
+_now = datetime(2025, 1, 1)
+
+# (name, statement) for each hot query, with representative parameters
+HOT_QUERIES = [
+    ('event listing', lambda: select(Event).where(
+        Event.organization_id == 1, Event.is_template == False, Event.date >= _now
+    ).order_by(Event.date, Event.id)),
+    ('organization events by date', lambda: select(Event.id).where(
+        Event.organization_id == 1, Event.date >= _now, Event.date < _now + timedelta(days=30)
+    )),
+    ('recurring occurrence lookup', lambda: select(Event).where(
+        Event.parent_event_id == 1, Event.recurrence_id == _now
+    )),
+    ('member RSVP for event', lambda: select(RSVP).where(RSVP.event_id == 1, RSVP.user_id == 1)),
+    ('event RSVPs', lambda: select(RSVP).where(RSVP.event_id == 1)),
+    ('member RSVPs', lambda: select(RSVP.event_id, RSVP.status).where(RSVP.user_id == 1)),
+    ('active organization members', lambda: select(UserOrganization.user_id).where(
+        UserOrganization.organization_id == 1, UserOrganization.is_active == True
+    )),
+    ('member organizations', lambda: select(UserOrganization).where(UserOrganization.user_id == 1)),
+    ('event email log', lambda: select(EmailLog.id).where(
+        EmailLog.event_id == 1, EmailLog.email_type == 'event_reminder'
+    )),
+    ('organization email log', lambda: select(EmailLog).where(
+        EmailLog.organization_id == 1
+    ).order_by(desc(EmailLog.sent_at))),
+    ('organization audit trail', lambda: select(AuditLog).where(
+        AuditLog.organization_id == 1, AuditLog.timestamp >= _now
+    ).order_by(desc(AuditLog.timestamp))),
+    ('audit log page', lambda: select(AuditLog).where(
+        AuditLog.timestamp < _now
+    ).order_by(desc(AuditLog.timestamp), desc(AuditLog.id)).limit(50)),
+    ('unread messages', lambda: select(MessageRecipient.message_id).where(
+        MessageRecipient.user_id == 1, MessageRecipient.read_at.is_(None)
+    )),
+    ('message inbox', lambda: select(MessageThread.id).where(
+        MessageThread.organization_id == 1
+    ).order_by(desc(MessageThread.last_message_at), desc(MessageThread.id)).limit(50)),
+    ('thread messages', lambda: select(Message.id).where(
+        Message.thread_id == 1
+    ).order_by(desc(Message.sent_at))),
+]
+
+
+def create_audit_app(database_url=None):
+    """Minimal Flask app for database access (no blueprints or scheduler)"""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url or 'sqlite:///:memory:'
+    db.init_app(app)
+    return app
+
+
+def seed():
+    """A few organizations' worth of rows in every table the hot queries touch"""
+    for o in range(SEED_ORGANIZATIONS):
+        org = Organization(name=f'Audit Band {o}')
+        db.session.add(org)
+        db.session.flush()
+        members = [User(username=f'audit_{o}_{m}', email=f'audit_{o}_{m}@example.com', password_hash='x',
+                        organization_id=org.id) for m in range(SEED_MEMBERS)]
+        db.session.add_all(members)
+        db.session.flush()
+        db.session.add_all([UserOrganization(user_id=u.id, organization_id=org.id, is_active=m % 5 != 0)
+                            for m, u in enumerate(members)])
+        events = [Event(title=f'Event {e}', date=_now + timedelta(days=e - SEED_EVENTS // 2),
+                        organization_id=org.id, is_template=e % 10 == 0) for e in range(SEED_EVENTS)]
+        db.session.add_all(events)
+        db.session.flush()
+        db.session.add_all([RSVP(event_id=e.id, user_id=u.id, status='Yes') for e in events[::3] for u in members])
+        db.session.add_all([EmailLog(user_id=u.id, event_id=e.id, organization_id=org.id, email_type='event_reminder',
+                                     sent_at=e.date) for e in events[::6] for u in members])
+        db.session.add_all([AuditLog(user_id=u.id, organization_id=org.id, action_type='login', resource_type='user',
+                                     timestamp=_now - timedelta(hours=i)) for i, u in enumerate(members)])
+        thread = MessageThread(subject='Audit', organization_id=org.id, created_by=members[0].id)
+        db.session.add(thread)
+        db.session.flush()
+        for i in range(10):
+            message = Message(thread_id=thread.id, sender_id=members[0].id, content=f'Message {i}')
+            db.session.add(message)
+            db.session.flush()
+            db.session.add_all([MessageRecipient(message_id=message.id, user_id=u.id,
+                                                 read_at=_now if m % 2 else None)
+                                for m, u in enumerate(members)])
+    db.session.commit()
+
+
+def explain(connection, statement):
+    """
+    Plan a statement.
+
+    Returns:
+        tuple: (plan lines, lines that are sequential scans)
+    """
+    compiled = statement.compile(dialect=connection.dialect, compile_kwargs={'render_postcompile': True})
+    sql = str(compiled)
+
+    if connection.dialect.name == 'sqlite':
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+        plan = [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}', params)]
+        return plan, [line for line in plan if line.startswith('SCAN') and 'INDEX' not in line]
+
+    if connection.dialect.name == 'postgresql':
+        # Seeded tables are tiny, so discourage sequential scans: the planner
+        # still falls back to one when no index can serve the query
+        connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        result = connection.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {sql}', compiled.params).scalar()
+        nodes = [(json.loads(result) if isinstance(result, str) else result)[0]['Plan']]
+        plan, scans = [], []
+        while nodes:
+            node = nodes.pop()
+            line = f"{node['Node Type']} on {node.get('Relation Name', '-')}"
+            plan.append(line)
+            if node['Node Type'] == 'Seq Scan':
+                scans.append(line)
+            nodes.extend(node.get('Plans', []))
+        return plan, scans
+
+    raise NotImplementedError(f"EXPLAIN is not supported on {connection.dialect.name}")
+
+
+def run_index_audit(database_url=None, seed_database=None):
+    """
+    EXPLAIN every hot query and log the plans.
+
+    Returns:
+        list: Names of the queries that would sequentially scan
+    """
+    app = create_audit_app(database_url)
+    flagged = []
+
+    with app.app_context():
+        if seed_database or (seed_database is None and not database_url):
+            db.create_all()
+            seed()
+            with db.engine.connect() as connection:
+                if connection.dialect.name in ('sqlite', 'postgresql'):
+                    connection.exec_driver_sql('ANALYZE')
+                    connection.commit()
+
+        with db.engine.connect() as connection:
+            for name, build in HOT_QUERIES:
+                with connection.begin():
+                    plan, scans = explain(connection, build())
+                if scans:
+                    flagged.append(name)
+                    logger.warning(f"SEQ SCAN  {name}: {'; '.join(scans)}")
+                else:
+                    logger.info(f"ok        {name}: {'; '.join(plan)}")
+
+    logger.info(f"{len(HOT_QUERIES) - len(flagged)}/{len(HOT_QUERIES)} hot queries use an index")
+    return flagged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Flag hot BandSync queries that would sequentially scan')
+    parser.add_argument('--database-url', help='Database to audit (default: a seeded in-memory SQLite database)')
+    parser.add_argument('--seed', action='store_true', default=None,
+                        help='Create tables and seed the database first (always done for the default database)')
+    args = parser.parse_args()
+
+    sys.exit(1 if run_index_audit(args.database_url, args.seed) else 0)
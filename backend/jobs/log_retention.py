@@ -0,0 +1,86 @@
+"""
+Log retention
+
+Archives and drops the months of audit_log, security_event and email_log
+that are older than the active global 'data_retention' SecurityPolicy
+allows, then makes sure the upcoming monthly partitions exist. Run it daily
+from cron on one machine (it writes archives to local disk):
+
+    python jobs/log_retention.py                          # apply the policy
+    python jobs/log_retention.py --dry-run                # list what would go
+    python jobs/log_retention.py --archive-dir /backups/logs
+    python jobs/log_retention.py --partition              # PostgreSQL: convert the tables first
+
+--partition converts any log table that isn't partitioned yet into a
+monthly range-partitioned one. It copies the table under an exclusive lock,
+so run it once in a quiet period.
+"""
+
+import os
+import sys
+import argparse
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from config import Config
+from models import db
+from services.log_partitions import LOG_TABLES, partition_table, retention_policy, apply_retention
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def create_retention_app(database_url=None):
+    """Minimal Flask app for database access (no blueprints or scheduler)"""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if database_url:
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    db.init_app(app)
+    return app
+
+
+def run_log_retention(database_url=None, archive_dir=None, dry_run=False, partition=False, now=None):
+    """
+    Apply the data retention policy to the log tables.
+
+    Returns:
+        list: The expired months (see apply_retention)
+    """
+    app = create_retention_app(database_url)
+
+    with app.app_context():
+        policy = retention_policy()
+        logger.info(f"Retention policy: {policy}")
+
+        with db.engine.connect() as connection:
+            if partition:
+                for table in LOG_TABLES:
+                    with connection.begin():
+                        if partition_table(connection, table, now):
+                            logger.info(f"Converted {table} to monthly partitions")
+
+            expired = apply_retention(connection, policy, archive_dir=archive_dir, now=now, dry_run=dry_run)
+
+    for entry in expired:
+        logger.info(f"{'Would remove' if dry_run else 'Removed'} {entry['table']} {entry['month']}"
+                    + (f" -> {entry['archive']}" if entry['archive'] else ''))
+    logger.info(f"{len(expired)} expired log months {'found' if dry_run else 'removed'}")
+    return expired
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Archive and drop log table months past the retention policy')
+    parser.add_argument('--database-url', help='Database to clean up (default: DATABASE_URL)')
+    parser.add_argument('--archive-dir', help='Where to write .ndjson.gz archives (default: LOG_ARCHIVE_DIR or ./log_archive)')
+    parser.add_argument('--dry-run', action='store_true', help='List the expired months without touching them')
+    parser.add_argument('--partition', action='store_true',
+                        help='Convert unpartitioned log tables to monthly partitions first (PostgreSQL only)')
+    args = parser.parse_args()
+
+    run_log_retention(args.database_url, args.archive_dir, args.dry_run, args.partition)
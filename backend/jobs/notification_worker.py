@@ -0,0 +1,68 @@
+"""
+Notification worker
+
+Drains the notification_jobs queue (new event, cancellation and RSVP change
+notifications) outside the web workers. Run it as its own process:
+
+    python jobs/notification_worker.py          # poll forever
+    python jobs/notification_worker.py --once   # drain the queue and exit (cron)
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from config import Config
+from models import db
+from services.notification_queue import NotificationQueue
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def create_worker_app():
+    """Minimal Flask app for database access (no blueprints or scheduler)"""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    return app
+
+def run_notification_worker(once=False, batch_size=100, poll_interval=5):
+    """Process notification jobs until the queue is empty (once) or forever"""
+    app = create_worker_app()
+    logger.info("Notification worker started")
+    
+    with app.app_context():
+        db.create_all()
+        while True:
+            try:
+                processed = NotificationQueue.process_batch(batch_size)
+            except Exception as e:
+                logger.error(f"Error processing notification jobs: {str(e)}")
+                db.session.rollback()
+                processed = 0
+            
+            if processed:
+                continue
+            if once:
+                break
+            time.sleep(poll_interval)
+    
+    logger.info("Notification worker stopped")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Deliver queued BandSync notifications')
+    parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+    parser.add_argument('--batch-size', type=int, default=int(os.environ.get('NOTIFICATION_BATCH_SIZE', 100)))
+    parser.add_argument('--poll-interval', type=float, default=float(os.environ.get('NOTIFICATION_POLL_INTERVAL', 5)))
+    args = parser.parse_args()
+    
+    run_notification_worker(once=args.once, batch_size=args.batch_size, poll_interval=args.poll_interval)
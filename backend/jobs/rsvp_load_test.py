@@ -0,0 +1,152 @@
+"""
+RSVP load test
+
+Fires a burst of concurrent RSVP submissions at one event - half from members
+answering for the first time, half from members changing an earlier answer -
+and reports the latency percentiles. Seeds its own organization, event and
+members into the target database.
+
+    python jobs/rsvp_load_test.py                      # in-process app on a throwaway SQLite file
+    python jobs/rsvp_load_test.py --submissions 2000 --concurrency 200
+    python jobs/rsvp_load_test.py --database-url postgresql://... --base-url http://localhost:5000
+
+With --base-url the requests go over HTTP to a running server, which must use
+the same database and JWT_SECRET_KEY as this script. Never point it at
+production: it writes test rows.
+
+Exits non-zero if any submission failed or the RSVPs/notification jobs
+written don't match what was submitted.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import logging
+import tempfile
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    return ordered[max(0, -(-len(ordered) * pct // 100) - 1)]
+
+
+def seed(db, submissions):
+    """An organization with one event and `submissions` members, every other one already RSVP'd 'No'"""
+    from models import User, Organization, UserOrganization, Event, RSVP
+
+    run = uuid.uuid4().hex[:8]
+    org = Organization(name=f'Load Test Band {run}')
+    db.session.add(org)
+    db.session.flush()
+    event = Event(title='Load Test Gig', date=datetime.utcnow() + timedelta(days=7), organization_id=org.id)
+    members = [User(username=f'load_{run}_{i}', email=f'load_{run}_{i}@example.com', password_hash='x',
+                    organization_id=org.id) for i in range(submissions)]
+    db.session.add(event)
+    db.session.add_all(members)
+    db.session.flush()
+    db.session.add_all([UserOrganization(user_id=m.id, organization_id=org.id) for m in members])
+    db.session.add_all([RSVP(event_id=event.id, user_id=m.id, status='No') for m in members[::2]])
+    db.session.commit()
+    return org.id, event.id, [m.id for m in members]
+
+
+def run_rsvp_load_test(submissions=500, concurrency=None, database_url=None, base_url=None):
+    """
+    Seed, submit every member's RSVP concurrently and check what was written.
+
+    Returns:
+        dict: Submission counts and latency percentiles in milliseconds
+    """
+    if not database_url:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'rsvp_load_test.db')}"
+    # The app reads its configuration at import
+    os.environ['DATABASE_URL'] = database_url
+
+    from flask_jwt_extended import create_access_token
+    from app import app, db
+    from models import RSVP, NotificationJob
+
+    with app.app_context():
+        db.create_all()
+        org_id, event_id, member_ids = seed(db, submissions)
+        tokens = [create_access_token(identity=str(member_id), additional_claims={'organization_id': org_id})
+                  for member_id in member_ids]
+
+    client = None if base_url else app.test_client()
+    body = json.dumps({'status': 'Yes'}).encode()
+
+    def submit(token):
+        headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+        started = time.perf_counter()
+        if client:
+            status = client.post(f'/api/events/{event_id}/rsvp', data=body, headers=headers).status_code
+        else:
+            request = urllib.request.Request(f'{base_url.rstrip("/")}/api/events/{event_id}/rsvp',
+                                             data=body, headers=headers, method='POST')
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+        return status, (time.perf_counter() - started) * 1000
+
+    logger.info(f"Submitting {submissions} RSVPs to event {event_id} "
+                f"({concurrency or submissions} at a time, {'HTTP' if base_url else 'in-process'})")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency or submissions) as pool:
+        results = list(pool.map(submit, tokens))
+    elapsed = time.perf_counter() - started
+
+    latencies = [ms for _, ms in results]
+    failed = [status for status, _ in results if status != 200]
+
+    with app.app_context():
+        statuses = [status for (status,) in db.session.query(RSVP.status).filter_by(event_id=event_id)]
+        jobs = NotificationJob.query.filter_by(job_type='rsvp_change', event_id=event_id).count()
+
+    stats = {
+        'submissions': submissions,
+        'failed': len(failed),
+        'seconds': round(elapsed, 2),
+        'p50_ms': round(percentile(latencies, 50), 1),
+        'p95_ms': round(percentile(latencies, 95), 1),
+        'p99_ms': round(percentile(latencies, 99), 1),
+        'max_ms': round(max(latencies), 1),
+        'rsvps': len(statuses),
+        'rsvps_yes': statuses.count('Yes'),
+        'notification_jobs': jobs,
+    }
+    logger.info(' '.join(f'{key}={value}' for key, value in stats.items()))
+    if failed:
+        logger.warning(f"Failed submissions by status code: {sorted(set(failed))}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure RSVP latency under a burst of concurrent submissions')
+    parser.add_argument('--submissions', type=int, default=500, help='Members submitting an RSVP (default: 500)')
+    parser.add_argument('--concurrency', type=int, help='Requests in flight at once (default: all of them)')
+    parser.add_argument('--database-url', help='Database to seed and check (default: a throwaway SQLite file)')
+    parser.add_argument('--base-url', help='Send requests to a running server instead of an in-process app')
+    args = parser.parse_args()
+
+    stats = run_rsvp_load_test(args.submissions, args.concurrency, args.database_url, args.base_url)
+    ok = (not stats['failed'] and stats['rsvps'] == stats['rsvps_yes'] == args.submissions
+          and stats['notification_jobs'] == args.submissions)
+    sys.exit(0 if ok else 1)
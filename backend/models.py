@@ -22,8 +22,12 @@ class UserOrganization(db.Model):
     organization = db.relationship('Organization', backref='user_organizations')
     section = db.relationship('Section', backref='user_organizations')
     
-    # Unique constraint: one record per user-organization pair
-    __table_args__ = (db.UniqueConstraint('user_id', 'organization_id'),)
+    __table_args__ = (
+        # Unique constraint: one record per user-organization pair
+        db.UniqueConstraint('user_id', 'organization_id'),
+        # Active member lookups for an organization
+        db.Index('ix_user_organizations_org_active', 'organization_id', 'is_active'),
+    )
 
 
 # Multi-tenant: Organization model
@@ -198,6 +202,15 @@ class User(db.Model):
 
 
 class Event(db.Model):
+    # One materialized row per occurrence of a series (see services/recurrence.py)
+    __table_args__ = (
+        db.UniqueConstraint('parent_event_id', 'recurrence_id', name='uq_event_occurrence'),
+        # Event listings: an organization's (non-template) events in date order
+        db.Index('ix_event_org_template_date', 'organization_id', 'is_template', 'date'),
+        # Date-range scans of an organization's events (analytics, summaries)
+        db.Index('ix_event_org_date', 'organization_id', 'date'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(120), nullable=False)
     type = db.Column(db.String(50), nullable=False, default='Rehearsal')  # Keep for backward compatibility
@@ -243,6 +256,7 @@ class Event(db.Model):
     recurring_end_date = db.Column(db.DateTime, nullable=True)  # When to stop recurring
     recurring_count = db.Column(db.Integer, nullable=True)  # Max number of occurrences
     parent_event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=True)  # Reference to parent if this is a recurring instance
+    recurrence_id = db.Column(db.DateTime, nullable=True)  # Original start of the occurrence an instance stands in for
     
     # Event template support
     is_template = db.Column(db.Boolean, default=False)
@@ -270,11 +284,26 @@ class Event(db.Model):
     creator = db.relationship('User', foreign_keys=[created_by], backref='created_events', lazy=True)
     canceller = db.relationship('User', foreign_keys=[cancelled_by], backref='cancelled_events', lazy=True)
 
+class EventOccurrenceExclusion(db.Model):
+    """A deleted occurrence of a recurring series, which expansion skips (an iCal EXDATE)"""
+    __tablename__ = 'event_occurrence_exclusions'
+    
+    series_id = db.Column(db.Integer, db.ForeignKey('event.id', ondelete='CASCADE'), primary_key=True)
+    recurrence_id = db.Column(db.DateTime, primary_key=True)  # Start of the deleted occurrence
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class RSVP(db.Model):
+    __table_args__ = (
+        # One RSVP per member per event; also serves lookups by event
+        db.UniqueConstraint('event_id', 'user_id', name='uq_rsvp_event_user'),
+        db.Index('ix_rsvp_user_id', 'user_id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
     status = db.Column(db.String(10), nullable=False)  # Yes, No, Maybe
+    previous_status = db.Column(db.String(10), nullable=True)  # Status before the latest change
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
@@ -294,6 +323,98 @@ class EmailLog(db.Model):
     user = db.relationship('User', backref='email_logs')
     event = db.relationship('Event', backref='email_logs')
     organization = db.relationship('Organization', backref='email_logs')
+    
+    __table_args__ = (
+        # "Has this event's reminder/notification gone out" checks
+        db.Index('ix_email_log_event_type', 'event_id', 'email_type'),
+        # Organization email history, newest first
+        db.Index('ix_email_log_org_sent_at', 'organization_id', 'sent_at'),
+    )
+
+
+class EventReminderLedger(db.Model):
+    """One row per event whose reminder has been claimed/sent by the scheduler"""
+    __tablename__ = 'event_reminder_ledger'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id', ondelete='CASCADE'), nullable=False, unique=True)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False)
+    claimed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    reminder_sent_at = db.Column(db.DateTime, nullable=True, index=True)  # Null while the run that claimed it is sending
+    recipient_count = db.Column(db.Integer, default=0)
+
+
+# Analytics rollups - maintained by services/analytics_rollups.py, never written by hand
+class AnalyticsEventRollup(db.Model):
+    """RSVP totals for one event"""
+    __tablename__ = 'analytics_event_rollups'
+
+    event_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    organization_id = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Date, nullable=False)  # Event date
+    event_type = db.Column(db.String(50))
+    responses = db.Column(db.Integer, default=0)
+    yes_count = db.Column(db.Integer, default=0)
+    no_count = db.Column(db.Integer, default=0)
+    maybe_count = db.Column(db.Integer, default=0)
+
+    __table_args__ = (db.Index('ix_analytics_event_rollups_org_day', 'organization_id', 'day'),)
+
+
+class AnalyticsMemberRollup(db.Model):
+    """RSVP totals for one member across an organization's events on one day"""
+    __tablename__ = 'analytics_member_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    organization_id = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Date, nullable=False)  # Event date
+    user_id = db.Column(db.Integer, nullable=False)
+    responses = db.Column(db.Integer, default=0)
+    yes_count = db.Column(db.Integer, default=0)
+    no_count = db.Column(db.Integer, default=0)
+    maybe_count = db.Column(db.Integer, default=0)
+    last_rsvp_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (db.UniqueConstraint('organization_id', 'day', 'user_id'),)
+
+
+class AnalyticsActivityRollup(db.Model):
+    """Per organization, per day activity counts (RSVPs made, messages, emails, substitutes)"""
+    __tablename__ = 'analytics_activity_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    organization_id = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Date, nullable=False)  # Day the activity happened
+    rsvps = db.Column(db.Integer, default=0)
+    messages = db.Column(db.Integer, default=0)
+    emails = db.Column(db.Integer, default=0)
+    emails_sent = db.Column(db.Integer, default=0)
+    emails_failed = db.Column(db.Integer, default=0)
+    substitute_requests = db.Column(db.Integer, default=0)
+    substitutes_filled = db.Column(db.Integer, default=0)
+    substitute_response_hours = db.Column(db.Float, default=0)  # Sum over filled requests
+
+    __table_args__ = (db.UniqueConstraint('organization_id', 'day'),)
+
+
+class AnalyticsDirtyDay(db.Model):
+    """An (organization, event day) whose event/member rollups must be recomputed.
+    Append-only: a day may have several markers, which the compactor folds together."""
+    __tablename__ = 'analytics_dirty_days'
+
+    id = db.Column(db.Integer, primary_key=True)
+    organization_id = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    marked_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class AnalyticsRollupState(db.Model):
+    """Watermarks for rollups filled by the periodic compactor"""
+    __tablename__ = 'analytics_rollup_state'
+
+    name = db.Column(db.String(50), primary_key=True)
+    rolled_through = db.Column(db.Date, nullable=True)  # Last complete day rolled up
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
 class AdminAttendanceReport(db.Model):
@@ -364,7 +485,7 @@ class EventFieldResponse(db.Model):
     event = db.relationship('Event', backref='field_responses')
     user = db.relationship('User', backref='field_responses')
     
-    # Unique constraint: one response per user per field
+    # Unique constraint: one response per user per field (and the submission upsert's conflict target)
     __table_args__ = (db.UniqueConstraint('user_id', 'field_id'),)
 
 
@@ -398,6 +519,8 @@ class EventSurvey(db.Model):
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     deadline = db.Column(db.DateTime, nullable=True)  # Survey deadline
+    # Kept by services/survey_results.py; None until the survey's results have been aggregated
+    respondent_count = db.Column(db.Integer, nullable=True, default=0)
     
     # Relationships
     event = db.relationship('Event', backref='surveys')
@@ -417,6 +540,8 @@ class SurveyQuestion(db.Model):
     
     # Relationships
     responses = db.relationship('SurveyResponse', backref='question', cascade='all, delete-orphan')
+    stats = db.relationship('SurveyQuestionStats', uselist=False, cascade='all, delete-orphan')
+    answer_counts = db.relationship('SurveyAnswerCount', cascade='all, delete-orphan')
 
 
 class SurveyResponse(db.Model):
@@ -425,6 +550,9 @@ class SurveyResponse(db.Model):
     survey_id = db.Column(db.Integer, db.ForeignKey('event_survey.id'), nullable=False)
     question_id = db.Column(db.Integer, db.ForeignKey('survey_question.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Nullable for anonymous surveys
+    # Anonymous surveys only: HMAC of the member's ID, so their answers can be
+    # replaced without recording who gave them
+    respondent_key = db.Column(db.String(64), nullable=True)
     response_value = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -432,8 +560,80 @@ class SurveyResponse(db.Model):
     survey = db.relationship('EventSurvey', backref='responses')
     user = db.relationship('User', backref='survey_responses')
     
-    # Unique constraint: one response per user per question (if not anonymous)
-    __table_args__ = (db.UniqueConstraint('user_id', 'question_id'),)
+    # One response per member per question, by user (named) or respondent key (anonymous)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'question_id'),
+        db.UniqueConstraint('question_id', 'respondent_key', name='uq_survey_response_question_respondent'),
+    )
+
+
+class SurveyQuestionStats(db.Model):
+    """Running response totals per survey question (see services/survey_results.py)"""
+    __tablename__ = 'survey_question_stats'
+    
+    question_id = db.Column(db.Integer, db.ForeignKey('survey_question.id'), primary_key=True)
+    survey_id = db.Column(db.Integer, db.ForeignKey('event_survey.id'), nullable=False, index=True)
+    response_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)  # Responses that parsed as a number
+    rating_sum = db.Column(db.Float, nullable=False, default=0)
+
+
+class SurveyAnswerCount(db.Model):
+    """How often each option was chosen, or each rating (1-5) given, per survey question"""
+    __tablename__ = 'survey_answer_counts'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    survey_id = db.Column(db.Integer, db.ForeignKey('event_survey.id'), nullable=False, index=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('survey_question.id'), nullable=False)
+    value = db.Column(db.Text, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (db.UniqueConstraint('question_id', 'value'),)
+
+
+class NotificationJob(db.Model):
+    """Outbound notification waiting to be delivered by the notification worker"""
+    __tablename__ = 'notification_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)  # 'new_event', 'event_cancellation', 'rsvp_change', 'substitute_offer'
+    idempotency_key = db.Column(db.String(255), nullable=False, unique=True)  # '<job_type>:<event_id>:<user_id>'
+    organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False)
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id', ondelete='CASCADE'), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    payload = db.Column(db.JSON, nullable=True)
+    status = db.Column(db.String(20), default='pending')  # 'pending', 'processing', 'sent', 'failed'
+    attempts = db.Column(db.Integer, default=0)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    
+    # Worker polls pending jobs in run_after order
+    __table_args__ = (db.Index('ix_notification_jobs_status_run_after', 'status', 'run_after'),)
+
+
+class MemberImportJob(db.Model):
+    """Progress of a background CSV member import"""
+    __tablename__ = 'member_import_jobs'
+
+    id = db.Column(db.String(36), primary_key=True)  # UUID handed to the client for polling
+    organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    status = db.Column(db.String(20), default='queued')  # 'queued', 'running', 'completed', 'failed'
+    total_rows = db.Column(db.Integer, default=0)
+    processed_rows = db.Column(db.Integer, default=0)
+    created_count = db.Column(db.Integer, default=0)  # New accounts
+    added_count = db.Column(db.Integer, default=0)  # Existing accounts added to the organization
+    skipped_count = db.Column(db.Integer, default=0)  # Already members
+    error_count = db.Column(db.Integer, default=0)
+    errors = db.Column(db.JSON, nullable=True)  # [{'row_number': n, 'email': ..., 'error': ...}], capped
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    # Bumped as each chunk commits; a running job that stops updating died with its worker
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
 
 
 # =============================================================================
@@ -485,6 +685,10 @@ class EmailForwardingRule(db.Model):
 class MessageThread(db.Model):
     """Internal message threads within organizations"""
     __tablename__ = 'message_threads'
+    __table_args__ = (
+        # The inbox: an organization's threads by latest activity
+        db.Index('ix_message_threads_org_last_message', 'organization_id', 'last_message_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False)
@@ -504,6 +708,10 @@ class MessageThread(db.Model):
 class Message(db.Model):
     """Individual messages within threads"""
     __tablename__ = 'messages'
+    __table_args__ = (
+        # A thread's messages newest first (its latest one for the inbox)
+        db.Index('ix_messages_thread_sent_at', 'thread_id', 'sent_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     thread_id = db.Column(db.Integer, db.ForeignKey('message_threads.id'), nullable=False)
@@ -533,8 +741,12 @@ class MessageRecipient(db.Model):
     # Relationships
     user = db.relationship('User', backref='message_receipts')
     
-    # Unique constraint: one receipt per message per user
-    __table_args__ = (db.UniqueConstraint('message_id', 'user_id'),)
+    __table_args__ = (
+        # Unique constraint: one receipt per message per user
+        db.UniqueConstraint('message_id', 'user_id'),
+        # A member's unread messages (read_at IS NULL)
+        db.Index('ix_message_recipients_user_read', 'user_id', 'read_at'),
+    )
 
 
 class SubstituteRequest(db.Model):
@@ -553,12 +765,20 @@ class SubstituteRequest(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     expires_at = db.Column(db.DateTime, nullable=True)
     
+    # Call list escalation (see services/substitute_escalation.py)
+    call_list_id = db.Column(db.Integer, db.ForeignKey('call_lists.id'), nullable=True)
+    next_contact_at = db.Column(db.DateTime, nullable=True)  # When escalation next acts; None once it's done
+    escalation_wave = db.Column(db.Integer, default=0)  # Waves of the call list contacted so far
+    
     # Relationships
     event = db.relationship('Event', backref='substitute_requests')
     requester = db.relationship('User', foreign_keys=[requested_by], backref='substitute_requests')
     substitute = db.relationship('User', foreign_keys=[filled_by], backref='filled_substitute_requests')
     section = db.relationship('Section', backref='substitute_requests')
     responses = db.relationship('SubstituteResponse', backref='request', cascade='all, delete-orphan')
+    
+    # Escalation pops due requests in next_contact_at order
+    __table_args__ = (db.Index('ix_substitute_requests_status_next_contact', 'status', 'next_contact_at'),)
 
 
 class CallList(db.Model):
@@ -607,7 +827,7 @@ class SubstituteResponse(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     request_id = db.Column(db.Integer, db.ForeignKey('substitute_requests.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    response = db.Column(db.String(20), nullable=False)  # 'available', 'unavailable', 'maybe'
+    response = db.Column(db.String(20), nullable=False)  # 'pending' (contacted, no answer yet), 'available', 'unavailable', 'maybe'
     response_message = db.Column(db.Text, nullable=True)
     responded_at = db.Column(db.DateTime, default=datetime.utcnow)
     contacted_at = db.Column(db.DateTime, nullable=True)
@@ -664,6 +884,7 @@ class QuickPoll(db.Model):
     creator = db.relationship('User', backref='created_polls')
     section = db.relationship('Section', backref='quick_polls')
     responses = db.relationship('PollResponse', backref='poll', cascade='all, delete-orphan')
+    option_counts = db.relationship('PollOptionCount', cascade='all, delete-orphan')
 
 
 class PollResponse(db.Model):
@@ -677,12 +898,27 @@ class PollResponse(db.Model):
     response_text = db.Column(db.Text, nullable=True)  # For text responses
     responded_at = db.Column(db.DateTime, default=datetime.utcnow)
     ip_address = db.Column(db.String(45), nullable=True)  # For anonymous tracking
+    # Who voted: the user ID, or for anonymous polls a keyed hash of it (see services/quick_polls.py)
+    voter_key = db.Column(db.String(64), nullable=True)
     
     # Relationships
     user = db.relationship('User', backref='poll_responses')
     
-    # Unique constraint: one response per user per poll (if not anonymous)
-    __table_args__ = (db.UniqueConstraint('poll_id', 'user_id'),)
+    __table_args__ = (
+        # Unique constraint: one response per user per poll (if not anonymous)
+        db.UniqueConstraint('poll_id', 'user_id'),
+        # One vote per voter per poll, anonymous or not; the vote insert's conflict target
+        db.UniqueConstraint('poll_id', 'voter_key', name='uq_poll_responses_poll_voter'),
+    )
+
+
+class PollOptionCount(db.Model):
+    """Running vote count per quick poll option, kept by services/quick_polls.py"""
+    __tablename__ = 'poll_option_counts'
+    
+    poll_id = db.Column(db.Integer, db.ForeignKey('quick_polls.id'), primary_key=True)
+    option_index = db.Column(db.Integer, primary_key=True)  # Position in QuickPoll.options
+    votes = db.Column(db.Integer, nullable=False, default=0)
 
 
 # =============================================================================
@@ -709,6 +945,9 @@ class AuditLog(db.Model):
     user = db.relationship('User', backref='audit_logs')
     organization = db.relationship('Organization', backref='audit_logs')
     
+    # Organization audit trail, newest first
+    __table_args__ = (db.Index('ix_audit_log_org_timestamp', 'organization_id', 'timestamp'),)
+    
     def to_dict(self):
         return {
             'id': self.id,
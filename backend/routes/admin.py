@@ -12,6 +12,7 @@ import os
 from werkzeug.utils import secure_filename
 from services.calendar_service import calendar_service
 from utils.admin_utils import is_super_admin, can_access_organization
+from utils.auth_context import is_admin
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -23,7 +24,7 @@ def get_users():
     org_id = claims.get('organization_id')
     
     # Check if user has admin access or is Super Admin
-    if not is_super_admin(user_id) and claims.get('role') != 'Admin':
+    if not is_super_admin(user_id) and not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     # If Super Admin, allow access to any organization
@@ -76,7 +77,7 @@ def get_users():
 @jwt_required()
 def update_user(user_id):
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     org_id = claims.get('organization_id')
     
@@ -151,7 +152,7 @@ def update_user(user_id):
 @jwt_required()
 def delete_user(user_id):
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     org_id = claims.get('organization_id')
@@ -355,7 +356,7 @@ def delete_user(user_id):
 @jwt_required()
 def organization():
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     org_id = claims.get('organization_id')
     org = Organization.query.get_or_404(org_id)
@@ -420,7 +421,7 @@ def organization():
 def upload_logo():
     """Upload organization logo to Cloudinary"""
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     if 'file' not in request.files:
@@ -486,7 +487,7 @@ def upload_logo():
 def create_user():
     """Create a new user in the organization"""
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     data = request.get_json()
@@ -575,7 +576,7 @@ def create_user():
 def send_user_invitation(user_id):
     """Send invitation email to an existing user"""
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     org_id = claims.get('organization_id')
@@ -616,7 +617,7 @@ def send_user_invitation(user_id):
 def add_existing_user_to_organization():
     """Add an existing user to the current organization"""
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     data = request.get_json()
@@ -710,7 +711,7 @@ def add_existing_user_to_organization():
 @jwt_required()
 def get_user(user_id):
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     org_id = claims.get('organization_id')
     
@@ -758,7 +759,7 @@ def get_sections():
 def create_section():
     """Create a new section (Admin only)"""
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     org_id = claims.get('organization_id')
@@ -798,7 +799,7 @@ def create_section():
 def update_section(section_id):
     """Update a section (Admin only)"""
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     org_id = claims.get('organization_id')
@@ -837,7 +838,7 @@ def update_section(section_id):
 def delete_section(section_id):
     """Delete a section (Admin only)"""
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     org_id = claims.get('organization_id')
@@ -857,7 +858,7 @@ def delete_section(section_id):
 def assign_user_section(user_id):
     """Assign a user to a section (Admin only)"""
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     org_id = claims.get('organization_id')
@@ -903,7 +904,7 @@ def assign_user_section(user_id):
 def get_email_logs():
     """Get email logs for current organization"""
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     org_id = claims.get('organization_id')
@@ -952,7 +953,7 @@ def get_email_logs():
 def get_email_stats():
     """Get email statistics for current organization"""
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     org_id = claims.get('organization_id')
@@ -979,8 +980,7 @@ def get_email_stats():
 @jwt_required()
 def get_scheduled_jobs():
     """Get status of scheduled email jobs"""
-    claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     try:
@@ -995,7 +995,7 @@ def get_scheduled_jobs():
 def send_test_notification():
     """Send a test notification to admin"""
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     user_id = get_jwt_identity()
@@ -1038,7 +1038,7 @@ def send_test_notification():
 def get_calendar_stats():
     """Get calendar usage statistics for current organization"""
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     org_id = claims.get('organization_id')
@@ -1077,7 +1077,7 @@ def get_calendar_stats():
 def test_calendar_feed():
     """Test calendar feed generation"""
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     org_id = claims.get('organization_id')
@@ -1185,7 +1185,7 @@ def get_all_users():
 def upload_user_avatar(user_id):
     """Upload user avatar to Cloudinary"""
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     if 'file' not in request.files:
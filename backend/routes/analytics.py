@@ -5,7 +5,7 @@ Provides admin analytics and insights endpoints
 
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import User
+from utils.auth_context import current_user, is_admin
 from services.analytics_service import AnalyticsService
 from datetime import datetime, timedelta
 
@@ -13,9 +13,7 @@ analytics_bp = Blueprint('analytics', __name__)
 
 def admin_required():
     """Decorator to require admin access"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    if not user or user.role != 'Admin':
+    if not is_admin():
         return jsonify({'error': 'Admin access required'}), 403
     return None
 
@@ -27,8 +25,7 @@ def get_analytics_overview():
     if auth_check:
         return auth_check
     
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = current_user()
     
     days = request.args.get('days', 30, type=int)
     days = min(max(days, 1), 365)  # Limit between 1 and 365 days
@@ -47,8 +44,7 @@ def get_member_analytics():
     if auth_check:
         return auth_check
     
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = current_user()
     
     days = request.args.get('days', 30, type=int)
     days = min(max(days, 1), 365)  # Limit between 1 and 365 days
@@ -67,8 +63,7 @@ def get_event_analytics():
     if auth_check:
         return auth_check
     
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = current_user()
     
     days = request.args.get('days', 90, type=int)
     days = min(max(days, 1), 365)  # Limit between 1 and 365 days
@@ -87,8 +82,7 @@ def get_communication_analytics():
     if auth_check:
         return auth_check
     
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = current_user()
     
     days = request.args.get('days', 30, type=int)
     days = min(max(days, 1), 365)  # Limit between 1 and 365 days
@@ -107,8 +101,7 @@ def get_organization_health():
     if auth_check:
         return auth_check
     
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = current_user()
     
     try:
         health_data = AnalyticsService.get_organization_health_score(user.organization_id)
@@ -125,7 +118,7 @@ def get_analytics_dashboard():
         return auth_check
     
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = current_user()
     
     # Debug logging
     print(f"DEBUG: User ID: {current_user_id}, Org ID: {user.organization_id if user else 'None'}")
@@ -172,8 +165,7 @@ def export_analytics():
     if auth_check:
         return auth_check
     
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = current_user()
     
     export_type = request.args.get('type', 'overview')
     days = request.args.get('days', 30, type=int)
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, send_file, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User, Event, EventAttachment
+from flask_jwt_extended import jwt_required
+from models import db, Event, EventAttachment
+from utils.auth_context import current_user, is_admin
 from werkzeug.utils import secure_filename
 import os
 import uuid
@@ -69,8 +70,7 @@ def get_event_attachments(event_id):
 def upload_attachment(event_id):
     """Upload a file attachment to an event"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
+        user = current_user()
         event = Event.query.get_or_404(event_id)
         
         # Check if file is present
@@ -143,15 +143,14 @@ def upload_attachment(event_id):
 def delete_attachment(event_id, attachment_id):
     """Delete an attachment"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
+        user = current_user()
         
         attachment = EventAttachment.query.get_or_404(attachment_id)
         if attachment.event_id != event_id:
             return jsonify({'error': 'Attachment does not belong to this event'}), 400
         
         # Check permissions (admin or uploader can delete)
-        if user.role != 'Admin' and attachment.uploaded_by != user.id:
+        if not is_admin() and attachment.uploaded_by != user.id:
             return jsonify({'error': 'Permission denied'}), 403
         
         # Delete physical file
@@ -172,15 +171,14 @@ def delete_attachment(event_id, attachment_id):
 def download_attachment(event_id, attachment_id):
     """Download an attachment"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
+        user = current_user()
         
         attachment = EventAttachment.query.get_or_404(attachment_id)
         if attachment.event_id != event_id:
             return jsonify({'error': 'Attachment does not belong to this event'}), 400
         
         # Check if file is public or user has access
-        if not attachment.is_public and user.role != 'Admin' and attachment.uploaded_by != user.id:
+        if not attachment.is_public and not is_admin() and attachment.uploaded_by != user.id:
             return jsonify({'error': 'Permission denied'}), 403
         
         # Serve file
@@ -201,15 +199,14 @@ def download_attachment(event_id, attachment_id):
 def update_attachment(event_id, attachment_id):
     """Update attachment metadata"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
+        user = current_user()
         
         attachment = EventAttachment.query.get_or_404(attachment_id)
         if attachment.event_id != event_id:
             return jsonify({'error': 'Attachment does not belong to this event'}), 400
         
         # Check permissions (admin or uploader can update)
-        if user.role != 'Admin' and attachment.uploaded_by != user.id:
+        if not is_admin() and attachment.uploaded_by != user.id:
             return jsonify({'error': 'Permission denied'}), 403
         
         data = request.get_json()
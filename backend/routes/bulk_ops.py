@@ -1,34 +1,21 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required
 from models import (db, User, Organization, Event, RSVP, Section, 
-                   UserOrganization, EventCategory)
+                   UserOrganization, EventCategory, MemberImportJob)
+from utils.auth_context import get_current_user_and_org, is_admin
 from datetime import datetime, timedelta
+from sqlalchemy import func, case
+from utils.streaming import stream_rows, STREAM_FORMATS, STREAM_BATCH_SIZE
+from services.member_import import MemberImportService, MemberImportError, read_member_csv, iter_chunks
+from services.recurrence import RecurrenceService
 import csv
 import io
 import json
-from werkzeug.security import generate_password_hash
 import re
 import uuid
 
 bulk_ops_bp = Blueprint('bulk_ops', __name__)
 
-def get_current_user_and_org():
-    """Helper function to get current user and organization from JWT"""
-    current_user_id = get_jwt_identity()
-    claims = get_jwt()
-    organization_id = claims.get('organization_id')
-    
-    user = User.query.get(current_user_id)
-    organization = Organization.query.get(organization_id) if organization_id else None
-    
-    return user, organization
-
-def is_admin(user, organization_id):
-    """Check if user is admin in the specified organization"""
-    if not user or not organization_id:
-        return False
-    return user.get_role_in_organization(organization_id) == 'Admin'
-
 def validate_email(email):
     """Validate email format"""
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -66,38 +53,68 @@ def export_organization_data():
     if not is_admin(user, organization.id):
         return jsonify({'error': 'Admin access required'}), 403
     
-    # Get members
-    members = []
-    for uo in organization.user_organizations:
-        members.append({
-            'id': uo.user.id,
-            'name': uo.user.name,
-            'email': uo.user.email,
-            'role': uo.role,
-            'section': uo.section.name if uo.section else None
-        })
+    format_type = request.args.get('format', 'json')
+    if format_type == 'csv':
+        return jsonify({'error': 'Use /export/members or /export/events for CSV'}), 400
     
-    # Get events
-    events = []
-    for event in organization.events:
-        events.append({
-            'id': event.id,
-            'title': event.title,
-            'date': event.date.isoformat() if event.date else None,
-            'location': event.location_address,
-            'description': event.description
-        })
+    def records():
+        yield {'type': 'organization', 'id': organization.id, 'name': organization.name}
+        for member in _organization_export_members(organization.id):
+            yield {'type': 'member', **member}
+        for event in _organization_export_events(organization.id):
+            yield {'type': 'event', **event}
+    
+    if format_type == 'ndjson':
+        return stream_rows(records(), 'ndjson', None, f'{organization.name}_export_{datetime.now().strftime("%Y%m%d")}')
     
     return jsonify({
         'organization': {
             'id': organization.id,
             'name': organization.name
         },
-        'members': members,
-        'events': events,
+        'members': list(_organization_export_members(organization.id)),
+        'events': list(_organization_export_events(organization.id)),
         'exported_at': datetime.utcnow().isoformat()
     })
 
+def _organization_export_members(organization_id):
+    """Members for /export, read in batches with user and section joined in"""
+    query = db.session.query(
+        User.id, User.name, User.email, UserOrganization.role, Section.name.label('section')
+    ).join(
+        User, User.id == UserOrganization.user_id
+    ).outerjoin(
+        Section, Section.id == UserOrganization.section_id
+    ).filter(
+        UserOrganization.organization_id == organization_id
+    ).order_by(UserOrganization.id).yield_per(STREAM_BATCH_SIZE)
+    
+    for row in query:
+        yield {
+            'id': row.id,
+            'name': row.name,
+            'email': row.email,
+            'role': row.role,
+            'section': row.section
+        }
+
+def _organization_export_events(organization_id):
+    """Events for /export, read in batches"""
+    query = db.session.query(
+        Event.id, Event.title, Event.date, Event.location_address, Event.description
+    ).filter(
+        Event.organization_id == organization_id
+    ).order_by(Event.id).yield_per(STREAM_BATCH_SIZE)
+    
+    for row in query:
+        yield {
+            'id': row.id,
+            'title': row.title,
+            'date': row.date.isoformat() if row.date else None,
+            'location': row.location_address,
+            'description': row.description
+        }
+
 @bulk_ops_bp.route('/import/members/preview', methods=['POST'])
 @jwt_required()
 def preview_member_import():
@@ -120,93 +137,51 @@ def preview_member_import():
         return jsonify({'error': 'Only CSV files are supported'}), 400
     
     try:
-        # Read CSV content
-        stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-        csv_reader = csv.DictReader(stream)
-        
-        # Expected columns
-        required_columns = ['email', 'first_name', 'last_name']
-        optional_columns = ['phone', 'section', 'role', 'instrument']
-        
-        # Validate headers
-        headers = csv_reader.fieldnames
-        missing_columns = [col for col in required_columns if col not in headers]
+        headers, rows = read_member_csv(file)
         
-        if missing_columns:
-            return jsonify({
-                'error': f'Missing required columns: {", ".join(missing_columns)}',
-                'required_columns': required_columns,
-                'optional_columns': optional_columns
-            }), 400
-        
-        # Process rows
+        # Validate in chunks so conflict checks are one query per chunk
         valid_rows = []
         invalid_rows = []
-        existing_emails = set()
-        
-        # Get existing users in organization
-        existing_users = {member.email for member in organization.members}
-        
-        row_num = 0
-        for row in csv_reader:
-            row_num += 1
-            errors = []
-            
-            # Validate required fields
-            if not row.get('email'):
-                errors.append('Email is required')
-            elif not validate_email(row['email']):
-                errors.append('Invalid email format')
-            elif row['email'] in existing_users:
-                errors.append('User already exists in organization')
-            elif row['email'] in existing_emails:
-                errors.append('Duplicate email in import file')
-            else:
-                existing_emails.add(row['email'])
-            
-            if not row.get('first_name'):
-                errors.append('First name is required')
-            
-            if not row.get('last_name'):
-                errors.append('Last name is required')
-            
-            # Validate optional fields
-            if row.get('role') and row['role'] not in ['Admin', 'Member']:
-                errors.append('Role must be Admin or Member')
-            
-            row_data = {
-                'row_number': row_num,
-                'email': row.get('email', ''),
-                'first_name': row.get('first_name', ''),
-                'last_name': row.get('last_name', ''),
-                'phone': row.get('phone', ''),
-                'section': row.get('section', ''),
-                'role': row.get('role', 'Member'),
-                'instrument': row.get('instrument', ''),
-                'errors': errors
-            }
-            
-            if errors:
-                invalid_rows.append(row_data)
-            else:
-                valid_rows.append(row_data)
+        valid_count = 0
+        total_rows = 0
+        seen_emails = set()
+        normalized = (MemberImportService.normalize_row(row_num, row) for row_num, row in rows)
+        for chunk in iter_chunks(normalized, MemberImportService.CHUNK_SIZE):
+            MemberImportService.validate_chunk(chunk, organization.id, seen_emails)
+            for row_data in chunk:
+                total_rows += 1
+                if row_data.pop('is_member'):
+                    row_data['errors'].append('User already exists in organization')
+                row_data.pop('existing_user_id')
+                if row_data['errors']:
+                    invalid_rows.append(row_data)
+                else:
+                    valid_count += 1
+                    if len(valid_rows) < 10:  # Show first 10 for preview
+                        valid_rows.append(row_data)
         
         return jsonify({
-            'total_rows': row_num,
-            'valid_rows': len(valid_rows),
+            'total_rows': total_rows,
+            'valid_rows': valid_count,
             'invalid_rows': len(invalid_rows),
-            'valid_data': valid_rows[:10],  # Show first 10 for preview
+            'valid_data': valid_rows,
             'invalid_data': invalid_rows,
             'headers': headers
         })
         
+    except MemberImportError as e:
+        return jsonify({'error': str(e), **e.details}), 400
     except Exception as e:
         return jsonify({'error': f'Error processing CSV: {str(e)}'}), 400
 
 @bulk_ops_bp.route('/import/members', methods=['POST'])
 @jwt_required()
 def import_members():
-    """Import members from CSV"""
+    """
+    Import members from CSV (multipart 'file') or a JSON 'members' list.
+    
+    Runs in the background; poll /import/jobs/<job_id> for progress.
+    """
     user, organization = get_current_user_and_org()
     if not organization:
         return jsonify({'error': 'Organization not found'}), 404
@@ -214,68 +189,57 @@ def import_members():
     if not is_admin(user, organization.id):
         return jsonify({'error': 'Admin access required'}), 403
     
-    data = request.get_json()
-    
-    if not data.get('members'):
+    try:
+        if 'file' in request.files:
+            _, rows = read_member_csv(request.files['file'])
+            members = [MemberImportService.normalize_row(row_num, row) for row_num, row in rows]
+        else:
+            data = request.get_json(silent=True) or {}
+            members = [MemberImportService.normalize_row(row_num, row)
+                       for row_num, row in enumerate(data.get('members') or [], start=1)]
+    except MemberImportError as e:
+        return jsonify({'error': str(e), **e.details}), 400
+    
+    if not members:
         return jsonify({'error': 'Member data is required'}), 400
     
-    created_users = []
-    errors = []
+    job = MemberImportService.start_import(current_app._get_current_object(), organization.id, user.id, members)
+    return jsonify({
+        'message': f'Importing {len(members)} members',
+        'job_id': job.id,
+        'status_url': f'/api/bulk-ops/import/jobs/{job.id}'
+    }), 202
+
+@bulk_ops_bp.route('/import/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_import_job(job_id):
+    """Progress of a member import"""
+    user, organization = get_current_user_and_org()
+    if not organization:
+        return jsonify({'error': 'Organization not found'}), 404
     
-    try:
-        for member_data in data['members']:
-            try:
-                # Check if user already exists globally
-                existing_user = User.query.filter_by(email=member_data['email']).first()
-                
-                if existing_user:
-                    # Add to organization if not already a member
-                    if existing_user not in organization.members:
-                        membership = UserOrganization(
-                            user_id=existing_user.id,
-                            organization_id=organization.id,
-                            role=member_data.get('role', 'Member')
-                        )
-                        db.session.add(membership)
-                        created_users.append(existing_user.email)
-                else:
-                    # Create new user
-                    new_user = User(
-                        email=member_data['email'],
-                        first_name=member_data['first_name'],
-                        last_name=member_data['last_name'],
-                        phone=member_data.get('phone', ''),
-                        password_hash=generate_password_hash('TempPassword123!'),  # Temporary password
-                        is_active=True,
-                        created_at=datetime.utcnow()
-                    )
-                    
-                    db.session.add(new_user)
-                    db.session.flush()  # Get the user ID
-                    
-                    # Add to organization
-                    membership = UserOrganization(
-                        user_id=new_user.id,
-                        organization_id=organization.id,
-                        role=member_data.get('role', 'Member')
-                    )
-                    db.session.add(membership)
-                    created_users.append(new_user.email)
-                
-            except Exception as e:
-                errors.append(f"Error creating user {member_data['email']}: {str(e)}")
-        
-        db.session.commit()
-        
-        return jsonify({
-            'message': f'Successfully imported {len(created_users)} members',
-            'created_users': created_users,
-            'errors': errors
-        })
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': f'Import failed: {str(e)}'}), 500
+    if not is_admin(user, organization.id):
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    job = MemberImportJob.query.filter_by(id=job_id, organization_id=organization.id).first()
+    if not job:
+        return jsonify({'error': 'Import job not found'}), 404
+    
+    return jsonify({
+        'job_id': job.id,
+        'status': job.status,
+        'total_rows': job.total_rows,
+        'processed_rows': job.processed_rows,
+        'progress': round(job.processed_rows / job.total_rows * 100, 1) if job.total_rows else 100.0,
+        'created_count': job.created_count,
+        'added_count': job.added_count,
+        'skipped_count': job.skipped_count,
+        'error_count': job.error_count,
+        'errors': job.errors or [],
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    })
 
 @bulk_ops_bp.route('/events/create', methods=['POST'])
 @jwt_required()
@@ -373,71 +337,44 @@ def create_recurring_events():
         if not data.get(field):
             return jsonify({'error': f'{field} is required'}), 400
     
+    recurrence_type = data['recurrence_type']  # 'daily', 'weekly', 'monthly'
+    if recurrence_type not in ['daily', 'weekly', 'monthly']:
+        return jsonify({'error': 'Invalid recurrence type'}), 400
+    
     try:
-        base_start = datetime.fromisoformat(data['start_datetime'])
-        base_end = None
+        start_datetime = datetime.fromisoformat(data['start_datetime'])
+        end_datetime = None
         if data.get('end_datetime'):
-            base_end = datetime.fromisoformat(data['end_datetime'])
-        
-        recurrence_type = data['recurrence_type']  # 'daily', 'weekly', 'monthly'
-        recurrence_count = data['recurrence_count']
+            end_datetime = datetime.fromisoformat(data['end_datetime'])
         
-        created_events = []
-        
-        for i in range(recurrence_count):
-            # Calculate datetime for this occurrence
-            if recurrence_type == 'daily':
-                start_datetime = base_start + timedelta(days=i)
-                end_datetime = base_end + timedelta(days=i) if base_end else None
-            elif recurrence_type == 'weekly':
-                start_datetime = base_start + timedelta(weeks=i)
-                end_datetime = base_end + timedelta(weeks=i) if base_end else None
-            elif recurrence_type == 'monthly':
-                # Simple monthly recurrence (same day of month)
-                months_ahead = i
-                year = base_start.year + (base_start.month + months_ahead - 1) // 12
-                month = (base_start.month + months_ahead - 1) % 12 + 1
-                start_datetime = base_start.replace(year=year, month=month)
-                if base_end:
-                    end_datetime = base_end.replace(year=year, month=month)
-                else:
-                    end_datetime = None
-            else:
-                return jsonify({'error': 'Invalid recurrence type'}), 400
-            
-            # Create event
-            event_name = f"{data['name']}"
-            if recurrence_count > 1:
-                event_name += f" ({i + 1})"
-            
-            event = Event(
-                name=event_name,
-                description=data.get('description', ''),
-                start_datetime=start_datetime,
-                end_datetime=end_datetime,
-                location=data.get('location', ''),
-                organization_id=organization.id,
-                created_by=user.id,
-                created_at=datetime.utcnow(),
-                rsvp_required=data.get('rsvp_required', True),
-                rsvp_deadline=start_datetime - timedelta(days=1),  # Default deadline
-                is_recurring=True
-            )
-            
-            db.session.add(event)
-            db.session.flush()
-            
-            created_events.append({
-                'id': event.id,
-                'name': event.name,
-                'start_datetime': event.start_datetime.isoformat()
-            })
+        # The series is stored once; its occurrences are expanded when read
+        # and only get rows of their own once edited or RSVP'd
+        event = Event(
+            title=data['name'],
+            description=data.get('description', ''),
+            date=start_datetime,
+            end_date=end_datetime,
+            location_address=data.get('location', ''),
+            organization_id=organization.id,
+            created_by=user.id,
+            created_at=datetime.utcnow(),
+            is_recurring=True,
+            recurring_pattern=recurrence_type,
+            recurring_interval=1,
+            recurring_count=data['recurrence_count']
+        )
         
+        db.session.add(event)
         db.session.commit()
         
+        occurrences = [start_datetime] + [
+            occurrence.date for occurrence in RecurrenceService.expand(event, start_datetime, datetime.max)
+        ]
+        
         return jsonify({
-            'message': f'Successfully created {len(created_events)} recurring events',
-            'created_events': created_events
+            'message': f'Successfully created a recurring event with {len(occurrences)} occurrences',
+            'series_id': event.id,
+            'occurrences': [when.isoformat() for when in occurrences]
         })
         
     except Exception as e:
@@ -455,33 +392,54 @@ def export_members():
     if not is_admin(user, organization.id):
         return jsonify({'error': 'Admin access required'}), 403
     
-    # Get all members
-    members = organization.members
+    format_type = request.args.get('format', 'json')  # json, csv, ndjson
+    filename = f'{organization.name}_members_{datetime.now().strftime("%Y%m%d")}'
     
-    # Create CSV data
-    csv_data = []
-    for member in members:
-        membership = UserOrganization.query.filter_by(
-            user_id=member.id,
-            organization_id=organization.id
-        ).first()
-        
-        csv_data.append({
-            'email': member.email,
-            'first_name': member.first_name,
-            'last_name': member.last_name,
-            'phone': member.phone or '',
-            'role': membership.role if membership else 'Member',
-            'joined_date': membership.joined_at.isoformat() if membership and membership.joined_at else '',
-            'last_login': member.last_login.isoformat() if member.last_login else '',
-            'is_active': member.is_active
-        })
+    if format_type in STREAM_FORMATS:
+        return stream_rows(_member_export_rows(organization.id), format_type, MEMBER_EXPORT_FIELDS, filename)
     
     return jsonify({
-        'filename': f'{organization.name}_members_{datetime.now().strftime("%Y%m%d")}.csv',
-        'data': csv_data
+        'filename': f'{filename}.csv',
+        'data': list(_member_export_rows(organization.id))
     })
 
+MEMBER_EXPORT_FIELDS = ['email', 'first_name', 'last_name', 'phone', 'section', 'role', 'joined_date', 'is_active']
+
+def _member_export_rows(organization_id):
+    """
+    One row per membership, from a single batched query with the user and
+    section joined in. Columns match the import template so exports round-trip.
+    """
+    query = db.session.query(
+        User.email,
+        User.name,
+        User.username,
+        User.phone,
+        Section.name.label('section'),
+        UserOrganization.role,
+        UserOrganization.joined_at,
+        UserOrganization.is_active
+    ).join(
+        User, User.id == UserOrganization.user_id
+    ).outerjoin(
+        Section, Section.id == func.coalesce(UserOrganization.section_id, User.section_id)
+    ).filter(
+        UserOrganization.organization_id == organization_id
+    ).order_by(UserOrganization.id).yield_per(STREAM_BATCH_SIZE)
+    
+    for row in query:
+        first_name, _, last_name = (row.name or row.username).partition(' ')
+        yield {
+            'email': row.email,
+            'first_name': first_name,
+            'last_name': last_name,
+            'phone': row.phone or '',
+            'section': row.section or '',
+            'role': row.role or 'Member',
+            'joined_date': row.joined_at.isoformat() if row.joined_at else '',
+            'is_active': row.is_active
+        }
+
 @bulk_ops_bp.route('/export/events', methods=['GET'])
 @jwt_required()
 def export_events():
@@ -497,39 +455,70 @@ def export_events():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     
-    query = Event.query.filter_by(organization_id=organization.id)
+    try:
+        start_date = datetime.fromisoformat(start_date) if start_date else None
+    except ValueError:
+        return jsonify({'error': 'Invalid start_date format'}), 400
+    try:
+        end_date = datetime.fromisoformat(end_date) if end_date else None
+    except ValueError:
+        return jsonify({'error': 'Invalid end_date format'}), 400
     
+    format_type = request.args.get('format', 'json')  # json, csv, ndjson
+    filename = f'{organization.name}_events_{datetime.now().strftime("%Y%m%d")}'
+    rows = _event_export_rows(organization.id, start_date, end_date)
+    
+    if format_type in STREAM_FORMATS:
+        return stream_rows(rows, format_type, EVENT_EXPORT_FIELDS, filename)
+    
+    return jsonify({
+        'filename': f'{filename}.csv',
+        'data': list(rows)
+    })
+
+EVENT_EXPORT_FIELDS = ['title', 'type', 'description', 'date', 'end_date', 'location',
+                       'is_cancelled', 'rsvp_count', 'yes_count', 'created_at']
+
+def _event_export_rows(organization_id, start_date=None, end_date=None):
+    """One row per event with RSVP counts joined in, read in batches"""
+    rsvp_counts = db.session.query(
+        RSVP.event_id,
+        func.count(RSVP.id).label('rsvp_count'),
+        func.count(case((func.lower(RSVP.status) == 'yes', 1))).label('yes_count')
+    ).join(
+        Event, Event.id == RSVP.event_id
+    ).filter(
+        Event.organization_id == organization_id
+    ).group_by(RSVP.event_id).subquery()
+    
+    query = db.session.query(
+        Event,
+        func.coalesce(rsvp_counts.c.rsvp_count, 0),
+        func.coalesce(rsvp_counts.c.yes_count, 0)
+    ).outerjoin(
+        rsvp_counts, rsvp_counts.c.event_id == Event.id
+    ).filter(
+        Event.organization_id == organization_id,
+        Event.is_template == False
+    )
     if start_date:
-        query = query.filter(Event.start_datetime >= datetime.fromisoformat(start_date))
+        query = query.filter(Event.date >= start_date)
     if end_date:
-        query = query.filter(Event.start_datetime <= datetime.fromisoformat(end_date))
-    
-    events = query.order_by(Event.start_datetime).all()
+        query = query.filter(Event.date <= end_date)
     
-    # Create CSV data
-    csv_data = []
-    for event in events:
-        rsvp_count = RSVP.query.filter_by(event_id=event.id).count()
-        yes_count = RSVP.query.filter_by(event_id=event.id, response='yes').count()
-        
-        csv_data.append({
-            'name': event.name,
+    for event, rsvp_count, yes_count in query.order_by(Event.date, Event.id).yield_per(STREAM_BATCH_SIZE):
+        yield {
+            'title': event.title,
+            'type': event.type,
             'description': event.description or '',
-            'start_datetime': event.start_datetime.isoformat(),
-            'end_datetime': event.end_datetime.isoformat() if event.end_datetime else '',
-            'location': event.location or '',
-            'rsvp_required': event.rsvp_required,
-            'rsvp_deadline': event.rsvp_deadline.isoformat() if event.rsvp_deadline else '',
-            'max_attendees': event.max_attendees or '',
+            'date': event.date.isoformat() if event.date else '',
+            'end_date': event.end_date.isoformat() if event.end_date else '',
+            'location': event.location_address or '',
+            'is_cancelled': event.is_cancelled,
             'rsvp_count': rsvp_count,
             'yes_count': yes_count,
-            'created_at': event.created_at.isoformat()
-        })
-    
-    return jsonify({
-        'filename': f'{organization.name}_events_{datetime.now().strftime("%Y%m%d")}.csv',
-        'data': csv_data
-    })
+            'created_at': event.created_at.isoformat() if event.created_at else ''
+        }
 
 @bulk_ops_bp.route('/delete/events', methods=['POST'])
 @jwt_required()
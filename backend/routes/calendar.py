@@ -6,6 +6,7 @@ Provides iCal feeds and calendar integration endpoints.
 from flask import Blueprint, Response, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from services.calendar_service import calendar_service
+from utils.auth_context import is_admin
 from models import User, Organization, Section, UserOrganization
 import logging
 
@@ -13,6 +14,23 @@ logger = logging.getLogger(__name__)
 
 calendar_bp = Blueprint('calendar', __name__)
 
+def _feed_response(feed, cache_control):
+    """
+    Build an iCal response carrying strong ETag/Last-Modified validators.
+    Answers 304 Not Modified when the client's conditional headers still match.
+    """
+    response = Response(
+        feed.data,
+        mimetype='text/calendar',
+        headers={
+            'Content-Disposition': f'attachment; filename="{feed.filename}"',
+            'Cache-Control': cache_control
+        }
+    )
+    response.set_etag(feed.etag)
+    response.last_modified = feed.last_modified
+    return response.make_conditional(request)
+
 @calendar_bp.route('/org/<int:org_id>/events.ics')
 def organization_calendar(org_id):
     """
@@ -27,26 +45,14 @@ def organization_calendar(org_id):
     try:
         include_templates = request.args.get('include_templates', 'false').lower() == 'true'
         
-        # Generate calendar
-        ical_data = calendar_service.generate_organization_calendar(
+        # Generate (or reuse) calendar
+        feed = calendar_service.get_organization_feed(
             org_id, 
             include_templates=include_templates
         )
         
-        # Get organization name for filename
-        org = Organization.query.get(org_id)
-        filename = f"{org.name.replace(' ', '_')}_calendar.ics" if org else "calendar.ics"
-        
-        return Response(
-            ical_data,
-            mimetype='text/calendar',
-            headers={
-                'Content-Disposition': f'attachment; filename="{filename}"',
-                'Cache-Control': 'no-cache, no-store, must-revalidate',
-                'Pragma': 'no-cache',
-                'Expires': '0'
-            }
-        )
+        # Clients may store the feed but must revalidate it on every poll
+        return _feed_response(feed, 'no-cache, must-revalidate')
         
     except Exception as e:
         logger.error(f"Error generating organization calendar: {e}")
@@ -66,27 +72,11 @@ def user_calendar(user_id, org_id):
         org_id: Organization ID
     """
     try:
-        # Generate calendar
-        ical_data = calendar_service.generate_user_calendar(user_id, org_id)
+        # Generate (or reuse) calendar
+        feed = calendar_service.get_user_feed(user_id, org_id)
         
-        # Get user and org names for filename
-        user = User.query.get(user_id)
-        org = Organization.query.get(org_id)
-        
-        username = (user.name or user.username).replace(' ', '_') if user else 'user'
-        orgname = org.name.replace(' ', '_') if org else 'organization'
-        filename = f"{orgname}_{username}_calendar.ics"
-        
-        return Response(
-            ical_data,
-            mimetype='text/calendar',
-            headers={
-                'Content-Disposition': f'attachment; filename="{filename}"',
-                'Cache-Control': 'no-cache, no-store, must-revalidate',
-                'Pragma': 'no-cache',
-                'Expires': '0'
-            }
-        )
+        # Personal feeds must not be stored by shared caches
+        return _feed_response(feed, 'private, no-cache, must-revalidate')
         
     except Exception as e:
         logger.error(f"Error generating user calendar: {e}")
@@ -105,26 +95,10 @@ def section_calendar(section_id):
         section_id: Section ID
     """
     try:
-        # Generate calendar
-        ical_data = calendar_service.generate_section_calendar(section_id)
-        
-        # Get section name for filename
-        section = Section.query.get(section_id)
-        if section:
-            filename = f"{section.organization.name.replace(' ', '_')}_{section.name.replace(' ', '_')}_calendar.ics"
-        else:
-            filename = "section_calendar.ics"
+        # Generate (or reuse) calendar
+        feed = calendar_service.get_section_feed(section_id)
         
-        return Response(
-            ical_data,
-            mimetype='text/calendar',
-            headers={
-                'Content-Disposition': f'attachment; filename="{filename}"',
-                'Cache-Control': 'no-cache, no-store, must-revalidate',
-                'Pragma': 'no-cache',
-                'Expires': '0'
-            }
-        )
+        return _feed_response(feed, 'no-cache, must-revalidate')
         
     except Exception as e:
         logger.error(f"Error generating section calendar: {e}")
@@ -143,21 +117,10 @@ def public_calendar(org_id):
         org_id: Organization ID
     """
     try:
-        # Generate calendar
-        ical_data = calendar_service.generate_public_calendar(org_id)
+        # Generate (or reuse) calendar
+        feed = calendar_service.get_public_feed(org_id)
         
-        # Get organization name for filename
-        org = Organization.query.get(org_id)
-        filename = f"{org.name.replace(' ', '_')}_public_calendar.ics" if org else "public_calendar.ics"
-        
-        return Response(
-            ical_data,
-            mimetype='text/calendar',
-            headers={
-                'Content-Disposition': f'attachment; filename="{filename}"',
-                'Cache-Control': 'public, max-age=3600',  # Cache public calendars for 1 hour
-            }
-        )
+        return _feed_response(feed, 'public, max-age=3600')  # Cache public calendars for 1 hour
         
     except Exception as e:
         logger.error(f"Error generating public calendar: {e}")
@@ -278,8 +241,7 @@ def test_calendar_feed(org_id):
         org_id: Organization ID
     """
     try:
-        claims = get_jwt()
-        if claims.get('role') != 'Admin':
+        if not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
         # Generate test calendar
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User, Event, EventCustomField, EventFieldResponse, EventAttachment, EventSurvey, SurveyQuestion, SurveyResponse
+from models import db, Event, EventCustomField, EventFieldResponse, EventAttachment, EventSurvey, SurveyQuestion, SurveyResponse
+from services.field_summaries import field_summary_service
+from utils.auth_context import current_user, is_admin
 from werkzeug.utils import secure_filename
 import json
 import os
@@ -40,9 +42,7 @@ def get_event_custom_fields(event_id):
 def create_custom_field(event_id):
     """Create a custom field for an event"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-        if not user or user.role != 'Admin':
+        if not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
         event = Event.query.get_or_404(event_id)
@@ -84,9 +84,7 @@ def create_custom_field(event_id):
 def update_custom_field(event_id, field_id):
     """Update a custom field"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-        if not user or user.role != 'Admin':
+        if not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
         field = EventCustomField.query.get_or_404(field_id)
@@ -126,9 +124,7 @@ def update_custom_field(event_id, field_id):
 def delete_custom_field(event_id, field_id):
     """Delete a custom field"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-        if not user or user.role != 'Admin':
+        if not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
         field = EventCustomField.query.get_or_404(field_id)
@@ -149,7 +145,7 @@ def get_field_responses(event_id):
     """Get user's responses to custom fields"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
+        user = current_user()
         
         responses = EventFieldResponse.query.filter_by(event_id=event_id, user_id=user.id).all()
         
@@ -167,36 +163,13 @@ def submit_field_responses(event_id):
     """Submit responses to custom fields"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
+        user = current_user()
         
         data = request.get_json()
         responses = data.get('responses', {})
         
-        # Process each response
-        for field_id, response_value in responses.items():
-            field_id = int(field_id)
-            
-            # Check if response already exists
-            existing_response = EventFieldResponse.query.filter_by(
-                event_id=event_id,
-                user_id=user.id,
-                field_id=field_id
-            ).first()
-            
-            if existing_response:
-                # Update existing response
-                existing_response.response_value = response_value
-                existing_response.updated_at = datetime.utcnow()
-            else:
-                # Create new response
-                new_response = EventFieldResponse(
-                    event_id=event_id,
-                    user_id=user.id,
-                    field_id=field_id,
-                    response_value=response_value
-                )
-                db.session.add(new_response)
-        
+        # One upsert for all the answers, keyed by the (user_id, field_id) unique constraint
+        field_summary_service.upsert_responses(event_id, user.id, responses)
         db.session.commit()
         
         return jsonify({'message': 'Responses submitted successfully'}), 200
@@ -209,34 +182,13 @@ def get_field_responses_summary(event_id):
     """Get summary of all responses to custom fields (Admin only)"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-        if not user or user.role != 'Admin':
+        user = current_user()
+        if not user or not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
-        # Get all fields for this event
-        fields = EventCustomField.query.filter_by(event_id=event_id).all()
-        
-        summary = {}
-        for field in fields:
-            responses = EventFieldResponse.query.filter_by(field_id=field.id).all()
-            
-            field_summary = {
-                'field_name': field.field_name,
-                'field_type': field.field_type,
-                'total_responses': len(responses),
-                'responses': []
-            }
-            
-            for response in responses:
-                field_summary['responses'].append({
-                    'user_id': response.user_id,
-                    'username': response.user.username,
-                    'name': response.user.name,
-                    'response_value': response.response_value,
-                    'submitted_at': response.updated_at.isoformat()
-                })
-            
-            summary[field.id] = field_summary
+        # Counted with one GROUP BY and cached per event; see services/field_summaries.py
+        include_responses = request.args.get('include_responses', 'true').lower() != 'false'
+        summary = field_summary_service.summary(event_id, include_responses=include_responses)
         
         return jsonify(summary), 200
     except Exception as e:
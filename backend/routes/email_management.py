@@ -1,28 +1,12 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from models import db, User, Organization, OrganizationEmailAlias, EmailForwardingRule, Section
+from flask_jwt_extended import jwt_required
+from models import db, OrganizationEmailAlias, EmailForwardingRule, Section
+from utils.auth_context import get_current_user_and_org, is_admin
 from datetime import datetime
 import re
 
 email_management_bp = Blueprint('email_management', __name__)
 
-def get_current_user_and_org():
-    """Helper function to get current user and organization from JWT"""
-    current_user_id = get_jwt_identity()
-    claims = get_jwt()
-    organization_id = claims.get('organization_id')
-    
-    user = User.query.get(current_user_id)
-    organization = Organization.query.get(organization_id) if organization_id else None
-    
-    return user, organization
-
-def is_admin(user, organization_id):
-    """Check if user is admin in the specified organization"""
-    if not user or not organization_id:
-        return False
-    return user.get_role_in_organization(organization_id) == 'Admin'
-
 def validate_email_alias(alias_name):
     """Validate email alias name format"""
     # Allow alphanumeric, hyphens, and underscores, 3-20 characters
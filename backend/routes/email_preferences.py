@@ -3,8 +3,9 @@ Email preferences management routes
 """
 
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from models import db, User
+from utils.auth_context import current_user, is_admin
 import secrets
 
 email_prefs_bp = Blueprint('email_prefs', __name__)
@@ -13,8 +14,7 @@ email_prefs_bp = Blueprint('email_prefs', __name__)
 @jwt_required()
 def get_email_preferences():
     """Get current user's email preferences"""
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user = current_user()
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -31,15 +31,14 @@ def get_email_preferences():
         'admin_attendance_report_timing': user.admin_attendance_report_timing,
         'admin_attendance_report_unit': user.admin_attendance_report_unit,
         'email_admin_rsvp_changes': user.email_admin_rsvp_changes,
-        'is_admin': user.role == 'admin'
+        'is_admin': is_admin()
     })
 
 @email_prefs_bp.route('/preferences', methods=['PUT'])
 @jwt_required()
 def update_email_preferences():
     """Update user's email preferences"""
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user = current_user()
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -63,7 +62,7 @@ def update_email_preferences():
         user.email_substitute_requests = data['email_substitute_requests']
     
     # Admin attendance notification preferences (only for admins)
-    if user.role == 'admin':
+    if is_admin():
         if 'email_admin_attendance_reports' in data:
             user.email_admin_attendance_reports = data['email_admin_attendance_reports']
         if 'admin_attendance_report_timing' in data:
@@ -102,8 +101,7 @@ def unsubscribe_user(token):
 @jwt_required()
 def generate_unsubscribe_token():
     """Generate an unsubscribe token for the current user"""
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user = current_user()
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -119,10 +117,8 @@ def generate_unsubscribe_token():
 @jwt_required()
 def get_attendance_timing_options():
     """Get available timing options for admin attendance reports"""
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
     
-    if not user or user.role != 'admin':
+    if not is_admin():
         return jsonify({'error': 'Admin access required'}), 403
     
     from services.admin_attendance_service import AdminAttendanceService
@@ -134,8 +130,7 @@ def get_attendance_timing_options():
 @jwt_required()
 def send_test_email():
     """Send a test email to the current user"""
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user = current_user()
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -1,37 +1,153 @@
 from flask import Blueprint, request, jsonify, make_response
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from models import Event, RSVP, EventCategory, User, db
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload
+import base64
 import csv
 import io
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib import colors
-from dateutil.relativedelta import relativedelta
 
-# Import email service
-try:
-    from services.email_service import EmailService
-    email_service = EmailService()
-except ImportError:
-    email_service = None
-    print("Email service not available - emails will be skipped")
+from services.notification_queue import NotificationQueue
+from services.recurrence import RecurrenceService
+from services.rsvp_service import RSVPService
+from utils.auth_context import is_admin
 
 events_bp = Blueprint('events', __name__)
 
+def _iso(value):
+    return value.isoformat() if value else None
+
+def _time_field(name):
+    """Serializer for an optional time column (they only exist once their migration has run)"""
+    if not hasattr(Event, name):
+        return lambda e: None
+    return lambda e: getattr(e, name).strftime('%H:%M') if getattr(e, name) else None
+
+# Event list fields in response order; ?fields= picks a subset
+EVENT_LIST_FIELDS = {
+    'id': lambda e: e.id,
+    'title': lambda e: e.title,
+    'type': lambda e: e.type,
+    'description': lambda e: e.description,
+    'date': lambda e: _iso(e.date),
+    'end_date': lambda e: _iso(e.end_date),
+    'arrive_by_time': _time_field('arrive_by_time'),
+    'start_time': _time_field('start_time'),
+    'end_time': _time_field('end_time'),
+    'location': lambda e: e.location_address,  # For backward compatibility
+    'location_address': lambda e: e.location_address,
+    'lat': lambda e: e.location_lat,
+    'lng': lambda e: e.location_lng,
+    'location_place_id': lambda e: e.location_place_id,
+    'category_id': lambda e: e.category_id,
+    'category': lambda e: e.category.name if e.category else None,
+    'is_recurring': lambda e: e.is_recurring,
+    'recurring_pattern': lambda e: e.recurring_pattern,
+    'recurring_interval': lambda e: e.recurring_interval,
+    'recurring_end_date': lambda e: _iso(e.recurring_end_date),
+    'parent_event_id': lambda e: e.parent_event_id,
+    'recurrence_id': lambda e: _iso(e.recurrence_id),
+    'is_template': lambda e: e.is_template,
+    'template_name': lambda e: e.template_name,
+    'send_reminders': lambda e: e.send_reminders,
+    'reminder_days_before': lambda e: e.reminder_days_before,
+    'created_at': lambda e: _iso(e.created_at),
+    'created_by': lambda e: e.created_by,
+    'creator_name': lambda e: e.creator.name if e.creator else None,
+    # Cancellation information
+    'is_cancelled': lambda e: e.is_cancelled,
+    'cancelled_at': lambda e: _iso(e.cancelled_at),
+    'cancelled_by': lambda e: e.cancelled_by,
+    'canceller_name': lambda e: e.canceller.name if e.canceller else None,
+    'cancellation_reason': lambda e: e.cancellation_reason,
+    'cancellation_notification_sent': lambda e: e.cancellation_notification_sent
+}
+
+# Relationships behind list fields, eager-loaded only when those fields are requested
+EVENT_LIST_RELATIONSHIPS = {
+    'category': 'category',
+    'creator_name': 'creator',
+    'canceller_name': 'canceller'
+}
+
+EVENT_PAGE_SIZE = 100
+EVENT_MAX_PAGE_SIZE = 500
+# Unpaginated listings without from/to cover this many days back (and the
+# recurrence horizon ahead) rather than the organization's whole history
+EVENT_DEFAULT_PAST_DAYS = 90
+
+def _encode_event_cursor(event):
+    position = f'{event.date.isoformat()}|{RecurrenceService.sort_id(event)}'
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def _parse_window_bound(value):
+    """ISO datetime for from/to; offsets (including Z) become naive UTC like stored dates"""
+    when = datetime.fromisoformat(value)
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    return when
+
+def _decode_event_cursor(cursor):
+    try:
+        when, sort_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(when), int(sort_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
 @events_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_events():
+    """
+    List the organization's events, including expanded recurring occurrences.
+    
+    Query parameters:
+        from, to: ISO datetimes bounding the window (to is exclusive; offsets
+            are converted to UTC). Without
+            either, and without paging, the window is the last
+            EVENT_DEFAULT_PAST_DAYS days through the recurrence horizon,
+            plus undated events
+        limit, cursor: Keyset pagination on (date, id); either one switches the
+            response to {'events': [...], 'pagination': {...}}
+        fields: Comma-separated subset of the event fields to return
+        include_templates, category_id: Filters
+    """
     claims = get_jwt()
     org_id = claims.get('organization_id')
     
     # Get query parameters
     include_templates = request.args.get('include_templates', 'false').lower() == 'true'
     category_id = request.args.get('category_id')
-    
-    # Base query
-    query = Event.query.filter_by(organization_id=org_id)
+    paginate = 'limit' in request.args or 'cursor' in request.args
+    try:
+        window_start = _parse_window_bound(request.args['from']) if request.args.get('from') else None
+        window_end = _parse_window_bound(request.args['to']) if request.args.get('to') else None
+        cursor = _decode_event_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        limit = min(max(int(request.args.get('limit', EVENT_PAGE_SIZE)), 1), EVENT_MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid listing parameters: {str(e)}'}), 400
+    
+    default_window = not paginate and window_start is None and window_end is None
+    if default_window:
+        now = datetime.utcnow()
+        window_start = now - timedelta(days=EVENT_DEFAULT_PAST_DAYS)
+        window_end = now + timedelta(days=RecurrenceService.HORIZON_DAYS)
+    
+    fields = list(EVENT_LIST_FIELDS)
+    if request.args.get('fields'):
+        fields = [f.strip() for f in request.args['fields'].split(',') if f.strip()]
+        unknown = [f for f in fields if f not in EVENT_LIST_FIELDS]
+        if unknown:
+            return jsonify({'error': f'Unknown fields: {", ".join(unknown)}'}), 400
+    
+    # Base query (served by the organization_id/is_template/date index)
+    query = Event.query.filter_by(organization_id=org_id).options(
+        *[joinedload(getattr(Event, rel)) for field, rel in EVENT_LIST_RELATIONSHIPS.items() if field in fields]
+    )
     
     # Filter by template status
     if not include_templates:
@@ -41,60 +157,60 @@ def get_events():
     if category_id:
         query = query.filter_by(category_id=category_id)
     
-    events = query.order_by(Event.date.asc()).all()
-    
-    def safe_get_time_field(event, field_name):
-        """Safely get time field, handling missing columns"""
-        try:
-            value = getattr(event, field_name, None)
-            return value.strftime('%H:%M') if value else None
-        except AttributeError:
-            # Column doesn't exist yet (before migration)
-            return None
-    
-    return jsonify([{
-        'id': e.id,
-        'title': e.title,
-        'type': e.type,
-        'description': e.description,
-        'date': e.date.isoformat(),
-        'end_date': e.end_date.isoformat() if e.end_date else None,
-        'arrive_by_time': safe_get_time_field(e, 'arrive_by_time'),
-        'start_time': safe_get_time_field(e, 'start_time'),
-        'end_time': safe_get_time_field(e, 'end_time'),
-        'location': e.location_address,  # For backward compatibility
-        'location_address': e.location_address,
-        'lat': e.location_lat,
-        'lng': e.location_lng,
-        'location_place_id': e.location_place_id,
-        'category_id': e.category_id,
-        'category': e.category.name if e.category else None,
-        'is_recurring': e.is_recurring,
-        'recurring_pattern': e.recurring_pattern,
-        'recurring_interval': e.recurring_interval,
-        'recurring_end_date': e.recurring_end_date.isoformat() if e.recurring_end_date else None,
-        'parent_event_id': e.parent_event_id,
-        'is_template': e.is_template,
-        'template_name': e.template_name,
-        'send_reminders': e.send_reminders,
-        'reminder_days_before': e.reminder_days_before,
-        'created_at': e.created_at.isoformat() if e.created_at else None,
-        'created_by': e.created_by,
-        'creator_name': e.creator.name if e.creator else None,
-        # Cancellation information
-        'is_cancelled': e.is_cancelled,
-        'cancelled_at': e.cancelled_at.isoformat() if e.cancelled_at else None,
-        'cancelled_by': e.cancelled_by,
-        'canceller_name': e.canceller.name if e.canceller else None,
-        'cancellation_reason': e.cancellation_reason,
-        'cancellation_notification_sent': e.cancellation_notification_sent
-    } for e in events])
+    # Stored rows (one-off events, series and their materialized occurrences)
+    rows = query
+    in_window = []
+    if window_start:
+        in_window.append(Event.date >= window_start)
+    if window_end:
+        in_window.append(Event.date < window_end)
+    if in_window:
+        # The default window still lists undated events
+        rows = rows.filter(or_(Event.date.is_(None), and_(*in_window)) if default_window else and_(*in_window))
+    if paginate:
+        rows = rows.filter(Event.date.isnot(None))
+    if cursor:
+        rows = rows.filter(or_(
+            Event.date > cursor[0],
+            and_(Event.date == cursor[0], Event.id > cursor[1])
+        ))
+    rows = rows.order_by(Event.date.asc(), Event.id.asc())
+    if paginate:
+        rows = rows.limit(limit + 1)
+    events = rows.all()
+    
+    # Plus the occurrences of recurring series that have no row of their own.
+    # A full page of rows also bounds how far series need expanding.
+    occurrences_start = window_start
+    if cursor and (not window_start or cursor[0] > window_start):
+        occurrences_start = cursor[0]
+    occurrences_end = window_end or datetime.utcnow() + timedelta(days=RecurrenceService.HORIZON_DAYS)
+    if paginate and len(events) > limit:
+        occurrences_end = min(occurrences_end, events[limit].date + timedelta(microseconds=1))
+    occurrences = RecurrenceService.occurrences_between(query, occurrences_start, occurrences_end)
+    if cursor:
+        occurrences = [o for o in occurrences if (o.date, RecurrenceService.sort_id(o)) > cursor]
+    events = RecurrenceService.merge(events, occurrences)
+    
+    if not paginate:
+        return jsonify([{field: EVENT_LIST_FIELDS[field](e) for field in fields} for e in events])
+    
+    page = events[:limit]
+    has_next = len(events) > limit
+    return jsonify({
+        'events': [{field: EVENT_LIST_FIELDS[field](e) for field in fields} for e in page],
+        'pagination': {
+            'limit': limit,
+            'has_next': has_next,
+            'next_cursor': _encode_event_cursor(page[-1]) if has_next else None
+        }
+    })
 
 @events_bp.route('/', methods=['POST'])
 @jwt_required()
 def create_event():
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     org_id = claims.get('organization_id')
@@ -174,33 +290,35 @@ def create_event():
     event = Event(**event_data)
     
     db.session.add(event)
-    db.session.commit()
+    db.session.flush()
     
-    # Create recurring events if specified
-    if event.is_recurring and not event.is_template:
-        create_recurring_events(event)
-    
-    # Send new event notifications (only for non-template events)
-    if not event.is_template and email_service and data.get('send_notification', True):
+    # Queue new event notifications (only for non-template events). The jobs
+    # commit with the event and are delivered by the notification worker.
+    if not event.is_template and data.get('send_notification', True):
         try:
-            # Get all users in the organization
-            users = User.query.filter_by(organization_id=org_id).all()
-            email_service.send_new_event_notification(event, users)
+            NotificationQueue.enqueue_event_fanout(event, 'new_event')
         except Exception as e:
-            print(f"Failed to send new event notification: {e}")
+            print(f"Failed to queue new event notification: {e}")
+    
+    db.session.commit()
     
+    # Recurring events are stored once; occurrences are expanded on read
     return jsonify({'msg': 'Event created', 'id': event.id})
 
 @events_bp.route('/<int:event_id>', methods=['PUT'])
 @jwt_required()
 def edit_event(event_id):
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     org_id = claims.get('organization_id')
     event = Event.query.filter_by(id=event_id, organization_id=org_id).first_or_404()
     data = request.get_json()
     
+    # A series row is also its first date; edit that date alone
+    if event.is_recurring:
+        RecurrenceService.detach_first(event)
+    
     # Update basic fields
     event.title = data.get('title', event.title)
     event.type = data.get('type', event.type)
@@ -257,7 +375,7 @@ def edit_event(event_id):
 @jwt_required()
 def cancel_event(event_id):
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     org_id = claims.get('organization_id')
@@ -277,6 +395,10 @@ def cancel_event(event_id):
     if not reason:
         return jsonify({'msg': 'Cancellation reason is required'}), 400
     
+    # A series row is also its first date; cancel that date alone
+    if event.is_recurring:
+        RecurrenceService.detach_first(event)
+    
     # Mark event as cancelled
     event.is_cancelled = True
     event.cancelled_at = datetime.utcnow()
@@ -285,75 +407,22 @@ def cancel_event(event_id):
     event.cancellation_notification_sent = False
     
     try:
+        # Queue cancellation notifications in the same transaction as the cancellation
+        notifications_count = 0
+        if send_notification:
+            print(f"🔍 Queueing cancellation notifications for event {event_id}")
+            notifications_count = NotificationQueue.enqueue_event_fanout(
+                event, 'event_cancellation', payload={'reason': reason}
+            )
+            print(f"📧 Queued notifications for {notifications_count} users")
+        
         db.session.commit()
         
-        # Send cancellation notifications if requested
-        if send_notification and email_service:
-            try:
-                print(f"🔍 Starting cancellation notification process for event {event_id}")
-                
-                # Get all active members of the organization
-                from models import UserOrganization
-                user_orgs = UserOrganization.query.filter_by(
-                    organization_id=org_id,
-                    is_active=True
-                ).all()
-                
-                print(f"📊 Found {len(user_orgs)} active user organizations")
-                
-                users_to_notify = []
-                for user_org in user_orgs:
-                    user = User.query.get(user_org.user_id)
-                    if user and user.email and user.email_notifications:
-                        users_to_notify.append(user)
-                        print(f"✅ Added user {user.name} ({user.email}) to notification list")
-                    elif user:
-                        print(f"⚠️  Skipped user {user.name} - email: {user.email}, notifications: {user.email_notifications}")
-                
-                print(f"📧 Will send notifications to {len(users_to_notify)} users")
-                
-                success_count = 0
-                # Send cancellation email to each user
-                for user in users_to_notify:
-                    try:
-                        result = email_service.send_event_cancellation_notification(
-                            user=user,
-                            event=event,
-                            reason=reason
-                        )
-                        if result:
-                            success_count += 1
-                            print(f"✅ Successfully sent cancellation email to {user.email}")
-                        else:
-                            print(f"❌ Failed to send cancellation email to {user.email}")
-                    except Exception as e:
-                        print(f"❌ Error sending to {user.email}: {e}")
-                
-                print(f"📈 Successfully sent {success_count} of {len(users_to_notify)} cancellation emails")
-                
-                # Mark notification as sent
-                event.cancellation_notification_sent = True
-                db.session.commit()
-                
-                return jsonify({
-                    'msg': 'Event cancelled successfully',
-                    'notification_sent': True,
-                    'notifications_count': len(users_to_notify),
-                    'success_count': success_count
-                })
-                
-            except Exception as e:
-                print(f"Error sending cancellation notifications: {e}")
-                return jsonify({
-                    'msg': 'Event cancelled successfully but failed to send notifications',
-                    'notification_sent': False,
-                    'error': str(e)
-                })
-        else:
-            return jsonify({
-                'msg': 'Event cancelled successfully',
-                'notification_sent': False
-            })
+        return jsonify({
+            'msg': 'Event cancelled successfully',
+            'notification_sent': notifications_count > 0,
+            'notifications_count': notifications_count
+        })
             
     except Exception as e:
         db.session.rollback()
@@ -363,10 +432,15 @@ def cancel_event(event_id):
 @jwt_required()
 def delete_event(event_id):
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     org_id = claims.get('organization_id')
     event = Event.query.filter_by(id=event_id, organization_id=org_id).first_or_404()
+    # Deleting one date of a series leaves the others; the date isn't expanded again
+    if event.is_recurring:
+        RecurrenceService.detach_first(event)
+    elif event.parent_event_id:
+        RecurrenceService.exclude(event)
     db.session.delete(event)
     db.session.commit()
     return jsonify({'msg': 'Event deleted'})
@@ -375,39 +449,28 @@ def delete_event(event_id):
 @jwt_required()
 def rsvp_event(event_id):
     user_id = get_jwt_identity()
+    org_id = get_jwt().get('organization_id')
     data = request.get_json()
-    status = data.get('status')
     
-    # Normalize status values to proper case
-    valid_statuses = ['Yes', 'No', 'Maybe']
-    if status in valid_statuses:
-        # Already in proper case
-        pass
-    elif status in ['yes', 'no', 'maybe']:
-        # Convert lowercase to proper case
-        status = status.capitalize()
-    else:
+    # Accept 'yes'/'no'/'maybe' as well as the proper case
+    status = RSVPService.normalize_status(data.get('status'))
+    if not status:
         return jsonify({'msg': 'Invalid RSVP status'}), 400
     
-    # Track previous status for admin notifications
-    previous_status = None
-    rsvp = RSVP.query.filter_by(user_id=user_id, event_id=event_id).first()
-    if rsvp:
-        previous_status = rsvp.status
-        rsvp.status = status
-    else:
-        rsvp = RSVP(user_id=user_id, event_id=event_id, status=status)
-        db.session.add(rsvp)
+    recorded, previous_status = RSVPService.upsert(event_id, org_id, user_id, status)
+    if not recorded:
+        db.session.rollback()
+        return jsonify({'msg': 'Event not found'}), 404
     
-    db.session.commit()
+    # Admin change tracking runs in the notification worker, not in this request
+    if previous_status != status:
+        try:
+            NotificationQueue.enqueue_rsvp_change(event_id, org_id, user_id, previous_status, status)
+        except Exception as e:
+            # Don't fail the RSVP if notification tracking fails
+            print(f"Error queueing RSVP change: {str(e)}")
     
-    # Track RSVP change for admin notifications
-    try:
-        from services.admin_attendance_service import AdminAttendanceService
-        AdminAttendanceService.track_rsvp_change(event_id, user_id, previous_status, status)
-    except Exception as e:
-        # Don't fail the RSVP if notification tracking fails
-        print(f"Error tracking RSVP change: {str(e)}")
+    db.session.commit()
     
     return jsonify({'msg': 'RSVP updated'})
 
@@ -417,7 +480,10 @@ def get_event(event_id):
     claims = get_jwt()
     org_id = claims.get('organization_id')
     event = Event.query.filter_by(id=event_id, organization_id=org_id).first_or_404()
-    return jsonify({
+    return jsonify(_event_detail(event))
+
+def _event_detail(event):
+    return {
         'id': event.id,
         'title': event.title,
         'type': event.type,
@@ -436,6 +502,7 @@ def get_event(event_id):
         'recurring_interval': event.recurring_interval,
         'recurring_end_date': event.recurring_end_date.isoformat() if event.recurring_end_date else None,
         'parent_event_id': event.parent_event_id,
+        'recurrence_id': event.recurrence_id.isoformat() if event.recurrence_id else None,
         'is_template': event.is_template,
         'template_name': event.template_name,
         'send_reminders': event.send_reminders,
@@ -443,7 +510,104 @@ def get_event(event_id):
         'created_at': event.created_at.isoformat() if event.created_at else None,
         'created_by': event.created_by,
         'creator_name': event.creator.name if event.creator else None
-    })
+    }
+
+# Occurrences of a recurring event without a row of their own are addressed by
+# the key get_events returns as their id ("<series id>-<YYYYMMDDTHHMMSS>").
+# Reads expand them on the fly; the first edit, cancellation, RSVP or export
+# gives the occurrence a row and hands over to the regular event routes.
+
+@events_bp.route('/<occurrence>', methods=['GET'])
+@jwt_required()
+def get_occurrence(occurrence):
+    claims = get_jwt()
+    event = RecurrenceService.resolve(claims.get('organization_id'), occurrence)
+    if not event:
+        return jsonify({'msg': 'Event not found'}), 404
+    return jsonify(_event_detail(event))
+
+@events_bp.route('/<occurrence>/rsvps', methods=['GET'])
+@jwt_required()
+def get_occurrence_rsvps(occurrence):
+    from routes.rsvps import get_event_rsvps
+    claims = get_jwt()
+    event = RecurrenceService.resolve(claims.get('organization_id'), occurrence)
+    if not event:
+        return jsonify({'msg': 'Not found'}), 404
+    if getattr(event, 'is_occurrence', False):
+        return jsonify({'Yes': [], 'No': [], 'Maybe': []})
+    return get_event_rsvps(event.id)
+
+@events_bp.route('/<occurrence>/rsvp', methods=['POST'])
+@jwt_required()
+def rsvp_occurrence(occurrence):
+    claims = get_jwt()
+    event = RecurrenceService.resolve(claims.get('organization_id'), occurrence, materialize=True)
+    if not event:
+        return jsonify({'msg': 'Event not found'}), 404
+    return rsvp_event(event.id)
+
+@events_bp.route('/<occurrence>', methods=['PUT'])
+@jwt_required()
+def edit_occurrence(occurrence):
+    claims = get_jwt()
+    if not is_admin():
+        return jsonify({'msg': 'Admins only'}), 403
+    event = RecurrenceService.resolve(claims.get('organization_id'), occurrence, materialize=True)
+    if not event:
+        return jsonify({'msg': 'Event not found'}), 404
+    return edit_event(event.id)
+
+@events_bp.route('/<occurrence>/cancel', methods=['POST'])
+@jwt_required()
+def cancel_occurrence(occurrence):
+    claims = get_jwt()
+    if not is_admin():
+        return jsonify({'msg': 'Admins only'}), 403
+    event = RecurrenceService.resolve(claims.get('organization_id'), occurrence, materialize=True)
+    if not event:
+        return jsonify({'msg': 'Event not found'}), 404
+    return cancel_event(event.id)
+
+@events_bp.route('/<occurrence>', methods=['DELETE'])
+@jwt_required()
+def delete_occurrence(occurrence):
+    claims = get_jwt()
+    if not is_admin():
+        return jsonify({'msg': 'Admins only'}), 403
+    event = RecurrenceService.resolve(claims.get('organization_id'), occurrence)
+    if not event:
+        return jsonify({'msg': 'Event not found'}), 404
+    if not getattr(event, 'is_occurrence', False):
+        return delete_event(event.id)
+    # Nothing to delete but the date itself
+    RecurrenceService.exclude(event)
+    db.session.commit()
+    return jsonify({'msg': 'Event deleted'})
+
+@events_bp.route('/<occurrence>/export-rsvps', methods=['GET'])
+@jwt_required()
+def export_occurrence_rsvps(occurrence):
+    claims = get_jwt()
+    if not is_admin():
+        return jsonify({'msg': 'Admins only'}), 403
+    event = RecurrenceService.resolve(claims.get('organization_id'), occurrence, materialize=True)
+    if not event:
+        return jsonify({'msg': 'Event not found'}), 404
+    db.session.commit()
+    return export_rsvps(event.id)
+
+@events_bp.route('/<occurrence>/rsvp-report/pdf', methods=['GET'])
+@jwt_required()
+def download_occurrence_rsvp_pdf(occurrence):
+    claims = get_jwt()
+    if not is_admin():
+        return jsonify({'msg': 'Admins only'}), 403
+    event = RecurrenceService.resolve(claims.get('organization_id'), occurrence, materialize=True)
+    if not event:
+        return jsonify({'msg': 'Event not found'}), 404
+    db.session.commit()
+    return download_event_rsvp_pdf(event.id)
 
 @events_bp.route('/categories', methods=['GET'])
 @jwt_required()
@@ -487,7 +651,7 @@ def get_event_templates():
 def create_from_template(template_id):
     """Create a new event from a template."""
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     org_id = claims.get('organization_id')
@@ -528,7 +692,7 @@ def create_from_template(template_id):
 def export_rsvps(event_id):
     """Export RSVP list as CSV or PDF."""
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     org_id = claims.get('organization_id')
@@ -627,58 +791,6 @@ def export_rsvps_pdf(event, rsvps):
     response.headers['Content-Disposition'] = f'attachment; filename="{event.title}_rsvps.pdf"'
     return response
 
-def create_recurring_events(parent_event):
-    """Create recurring event instances based on the parent event's settings."""
-    if not parent_event.is_recurring:
-        return
-    
-    current_date = parent_event.date
-    count = 0
-    max_count = parent_event.recurring_count or 100  # Limit to prevent runaway creation
-    
-    while count < max_count:
-        # Calculate next occurrence
-        if parent_event.recurring_pattern == 'daily':
-            next_date = current_date + timedelta(days=parent_event.recurring_interval)
-        elif parent_event.recurring_pattern == 'weekly':
-            next_date = current_date + timedelta(weeks=parent_event.recurring_interval)
-        elif parent_event.recurring_pattern == 'monthly':
-            next_date = current_date + relativedelta(months=parent_event.recurring_interval)
-        elif parent_event.recurring_pattern == 'yearly':
-            next_date = current_date + relativedelta(years=parent_event.recurring_interval)
-        else:
-            break
-        
-        # Check if we've exceeded the end date
-        if parent_event.recurring_end_date and next_date > parent_event.recurring_end_date:
-            break
-        
-        # Create the recurring event instance
-        recurring_event = Event(
-            title=parent_event.title,
-            type=parent_event.type,
-            description=parent_event.description,
-            date=next_date,
-            end_date=parent_event.end_date + (next_date - parent_event.date) if parent_event.end_date else None,
-            location_address=parent_event.location_address,
-            location_lat=parent_event.location_lat,
-            location_lng=parent_event.location_lng,
-            location_place_id=parent_event.location_place_id,
-            category_id=parent_event.category_id,
-            is_recurring=False,  # Instances are not recurring themselves
-            parent_event_id=parent_event.id,
-            send_reminders=parent_event.send_reminders,
-            reminder_days_before=parent_event.reminder_days_before,
-            organization_id=parent_event.organization_id,
-            created_by=parent_event.created_by
-        )
-        
-        db.session.add(recurring_event)
-        current_date = next_date
-        count += 1
-    
-    db.session.commit()
-
 def send_event_reminder(event, users):
     """Send reminder emails for an event. Currently logs to console."""
     print(f"=== EVENT REMINDER ===")
@@ -694,7 +806,7 @@ def send_event_reminder(event, users):
 def download_event_rsvp_pdf(event_id):
     """Download PDF report of event RSVP status"""
     claims = get_jwt()
-    if claims.get('role') != 'Admin':
+    if not is_admin():
         return jsonify({'msg': 'Admins only'}), 403
     
     org_id = claims.get('organization_id')
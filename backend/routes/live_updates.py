@@ -0,0 +1,138 @@
+from flask import Blueprint, Response, request, jsonify, stream_with_context, current_app
+from flask_jwt_extended import decode_token, jwt_required, get_jwt_identity, get_jwt
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+import json
+import os
+import time
+import threading
+from services.live_updates import get_broker, org_channel, user_channel
+
+live_updates_bp = Blueprint('live_updates', __name__)
+
+# Comment lines keep proxies from closing an idle connection
+HEARTBEAT_SECONDS = 15
+# Connections end after this long so workers recycle them. Their stream token
+# has long expired by then, so the last event tells the client to fetch a new
+# one and reconnect itself rather than letting EventSource retry with it
+MAX_STREAM_SECONDS = int(os.environ.get('LIVE_UPDATES_MAX_STREAM_SECONDS', 300))
+RECONNECT_MILLISECONDS = 3000
+# Each open stream holds a worker thread; keep this well below gunicorn's
+# --threads so API requests always find a free one
+MAX_STREAMS = int(os.environ.get('LIVE_UPDATES_MAX_STREAMS', 16))
+# Clients turned away by the stream cap try again after this long
+FULL_RETRY_SECONDS = 30
+# Stream tokens end up in access logs, so they only need to outlive the connect
+STREAM_TOKEN_SECONDS = 60
+
+_open_streams = 0
+_open_streams_lock = threading.Lock()
+
+def _sse(event_type, data):
+    return f'event: {event_type}\ndata: {json.dumps(data)}\n\n'
+
+def _stream_serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='live-updates-stream')
+
+def _acquire_stream():
+    global _open_streams
+    with _open_streams_lock:
+        if _open_streams >= MAX_STREAMS:
+            return False
+        _open_streams += 1
+        return True
+
+def _release_stream():
+    global _open_streams
+    with _open_streams_lock:
+        _open_streams -= 1
+
+def open_stream_count():
+    return _open_streams
+
+def _stream_identity():
+    """(user_id, organization_id) from a stream token or an Authorization header, else None"""
+    token = request.args.get('token')
+    if token:
+        try:
+            payload = _stream_serializer().loads(token, max_age=STREAM_TOKEN_SECONDS)
+        except (BadSignature, SignatureExpired):
+            return None
+        return payload.get('sub'), payload.get('org')
+
+    if request.headers.get('Authorization', '').startswith('Bearer '):
+        try:
+            claims = decode_token(request.headers['Authorization'][len('Bearer '):])
+        except Exception:
+            return None
+        if claims.get('type') == 'access':
+            return claims.get('sub'), claims.get('organization_id')
+    return None
+
+@live_updates_bp.route('/token', methods=['POST'])
+@jwt_required()
+def stream_token():
+    """
+    A short-lived token that only opens a stream. EventSource can't send
+    headers, so the token goes in the URL - where proxies and access logs
+    see it - instead of the access token.
+    """
+    organization_id = get_jwt().get('organization_id')
+    if not organization_id:
+        return jsonify({'msg': 'No organization selected'}), 400
+    token = _stream_serializer().dumps({'sub': get_jwt_identity(), 'org': organization_id})
+    return jsonify({'token': token, 'expires_in': STREAM_TOKEN_SECONDS})
+
+@live_updates_bp.route('', methods=['GET'])
+def stream():
+    """
+    Server-Sent Events stream of the deltas for the current user's
+    organization and for them personally.
+
+    Authenticate with ?token= from POST /api/stream/token, or with the
+    access token in the Authorization header. A 'resync' event means deltas
+    were dropped and the client should refetch. After MAX_STREAM_SECONDS a
+    'reconnect' event asks the client to open a new stream with a new token
+    before this one closes. When this worker already
+    serves MAX_STREAMS streams it answers 503 with Retry-After.
+    """
+    identity = _stream_identity()
+    if identity is None or not all(identity):
+        return jsonify({'msg': 'Invalid or missing stream token'}), 401
+    user_id, organization_id = identity
+
+    if not _acquire_stream():
+        response = jsonify({'msg': 'Too many live update connections, try again shortly'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(FULL_RETRY_SECONDS)
+        return response
+
+    channels = [org_channel(organization_id), user_channel(user_id)]
+    subscription = get_broker().subscribe(channels)
+
+    def events():
+        yield f'retry: {RECONNECT_MILLISECONDS}\n\n'
+        yield _sse('ready', {'channels': channels})
+        deadline = time.monotonic() + MAX_STREAM_SECONDS
+        while time.monotonic() < deadline:
+            message = subscription.get(timeout=min(HEARTBEAT_SECONDS, max(deadline - time.monotonic(), 0)))
+            if subscription.overflowed:
+                yield _sse('resync', {})
+                return
+            if message is None:
+                yield ': keepalive\n\n'
+                continue
+            yield _sse(message['type'], message['data'])
+        yield _sse('reconnect', {})
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Don't let nginx-style proxies buffer the stream
+    })
+
+    # Runs however the connection ends, even if the stream never started
+    @response.call_on_close
+    def release():
+        subscription.close()
+        _release_stream()
+
+    return response
@@ -1,52 +1,152 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from models import db, User, Organization, MessageThread, Message, Section
+from flask_jwt_extended import jwt_required
+from models import db, User, Organization, UserOrganization, MessageThread, Message, MessageRecipient, Section
+from utils.auth_context import get_current_user_and_org, is_admin
 from datetime import datetime
-import uuid
-from sqlalchemy import or_, and_
+import base64
+from sqlalchemy import or_, and_, select, func, insert, literal, union
+from services import live_updates
 
 messages_bp = Blueprint('messages', __name__)
 
-def get_current_user_and_org():
-    """Helper function to get current user and organization from JWT"""
-    current_user_id = get_jwt_identity()
-    claims = get_jwt()
-    organization_id = claims.get('organization_id')
-    
-    user = User.query.get(current_user_id)
-    organization = Organization.query.get(organization_id) if organization_id else None
-    
-    return user, organization
+THREAD_PAGE_SIZE = 50
+THREAD_MAX_PAGE_SIZE = 200
+LAST_MESSAGE_PREVIEW = 100
+# Replies in these threads reach every member; in others, only the people
+# already in the conversation
+ORG_WIDE_THREAD_TYPES = ('general', 'announcement')
+
+def _encode_thread_cursor(thread):
+    position = f'{thread.last_message_at.isoformat()}|{thread.id}'
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def _decode_thread_cursor(cursor):
+    try:
+        when, thread_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(when), int(thread_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def _add_recipients(message, organization_id, user_ids=None):
+    """
+    Give a message an unread receipt for each active member of the organization
+    (only those in `user_ids`, a list or a select, if given) except its sender.
+    One INSERT ... SELECT however many members there are. Does not commit.
+    """
+    members = select(
+        literal(message.id).label('message_id'),
+        UserOrganization.user_id
+    ).where(
+        UserOrganization.organization_id == organization_id,
+        UserOrganization.is_active == True,
+        UserOrganization.user_id != message.sender_id
+    )
+    if user_ids is not None:
+        members = members.where(UserOrganization.user_id.in_(user_ids))
+    db.session.execute(insert(MessageRecipient).from_select(['message_id', 'user_id'], members))
 
-def is_admin(user, organization_id):
-    """Check if user is admin in the specified organization"""
-    if not user or not organization_id:
-        return False
-    return user.get_role_in_organization(organization_id) == 'Admin'
+def _thread_participants(thread_id):
+    """Everyone who has sent or received a message in the thread, as a select of user IDs"""
+    return union(
+        select(Message.sender_id).where(Message.thread_id == thread_id),
+        select(MessageRecipient.user_id).join(Message, Message.id == MessageRecipient.message_id)
+        .where(Message.thread_id == thread_id)
+    )
+
+def _publish_new_message(thread, message, sender):
+    """Tell the organization's inboxes about a message (sent when the session commits)"""
+    content = message.content or ''
+    live_updates.publish(db.session, [live_updates.org_channel(thread.organization_id)], 'message.created', {
+        'thread': {
+            'id': thread.id,
+            'subject': thread.subject,
+            'thread_type': thread.thread_type,
+            'created_by': thread.created_by,
+            'created_at': thread.created_at.isoformat() if thread.created_at else None,
+            'last_message_at': thread.last_message_at.isoformat() if thread.last_message_at else None
+        },
+        'last_message': {
+            'content': content[:LAST_MESSAGE_PREVIEW] + '...' if len(content) > LAST_MESSAGE_PREVIEW else content,
+            'sender_name': sender.name,
+            'sent_at': message.sent_at.isoformat() if message.sent_at else None
+        },
+        'sender_id': sender.id
+    })
 
 @messages_bp.route('/threads', methods=['GET'])
 @jwt_required()
 def get_message_threads():
-    """Get all message threads for the current user"""
+    """
+    Get the organization's message threads, most recently active first, each
+    with its latest message and the current user's unread count.
+    
+    Query parameters:
+        limit, cursor: Keyset pagination on (last_message_at, id); either one
+            switches the response to {'threads': [...], 'pagination': {...}}
+    """
     user, organization = get_current_user_and_org()
     if not organization:
         return jsonify({'error': 'Organization not found'}), 404
     
-    # Get threads where user is in the same organization
-    threads = MessageThread.query.filter(
-        MessageThread.organization_id == organization.id
-    ).order_by(MessageThread.last_message_at.desc()).all()
+    paginate = 'limit' in request.args or 'cursor' in request.args
+    try:
+        cursor = _decode_thread_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        limit = min(max(int(request.args.get('limit', THREAD_PAGE_SIZE)), 1), THREAD_MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid listing parameters: {str(e)}'}), 400
+    
+    # The page of threads (served by the organization_id/last_message_at index)
+    page = select(MessageThread.id).where(MessageThread.organization_id == organization.id)
+    if paginate:
+        page = page.where(MessageThread.last_message_at.isnot(None))
+    if cursor:
+        page = page.where(or_(
+            MessageThread.last_message_at < cursor[0],
+            and_(MessageThread.last_message_at == cursor[0], MessageThread.id < cursor[1])
+        ))
+    page = page.order_by(MessageThread.last_message_at.desc(), MessageThread.id.desc())
+    if paginate:
+        page = page.limit(limit + 1)
+    page = page.cte('thread_page')
+    page_ids = select(page.c.id)
+    
+    # Each thread's latest message; the preview is cut short in the database
+    latest = select(
+        Message.thread_id,
+        Message.sender_id,
+        Message.sent_at,
+        func.substr(Message.content, 1, LAST_MESSAGE_PREVIEW + 1).label('preview'),
+        func.row_number().over(
+            partition_by=Message.thread_id, order_by=(Message.sent_at.desc(), Message.id.desc())
+        ).label('position')
+    ).where(Message.thread_id.in_(page_ids)).subquery('latest')
+    
+    # The current user's unread receipts per thread
+    unread = select(
+        Message.thread_id, func.count().label('unread_count')
+    ).join(MessageRecipient, MessageRecipient.message_id == Message.id).where(
+        MessageRecipient.user_id == user.id,
+        MessageRecipient.read_at.is_(None),
+        Message.thread_id.in_(page_ids)
+    ).group_by(Message.thread_id).subquery('unread')
+    
+    rows = db.session.execute(
+        select(
+            MessageThread,
+            latest.c.preview,
+            latest.c.sent_at,
+            User.name.label('sender_name'),
+            func.coalesce(unread.c.unread_count, 0).label('unread_count')
+        )
+        .join(page, page.c.id == MessageThread.id)
+        .outerjoin(latest, and_(latest.c.thread_id == MessageThread.id, latest.c.position == 1))
+        .outerjoin(User, User.id == latest.c.sender_id)
+        .outerjoin(unread, unread.c.thread_id == MessageThread.id)
+        .order_by(MessageThread.last_message_at.desc(), MessageThread.id.desc())
+    ).all()
     
     result = []
-    for thread in threads:
-        # Get last message
-        last_message = Message.query.filter_by(
-            thread_id=thread.id
-        ).order_by(Message.sent_at.desc()).first()
-        
-        # Get participant info - Use message recipients instead
-        participants = []
-        
+    for thread, preview, sent_at, sender_name, unread_count in rows[:limit] if paginate else rows:
         thread_data = {
             'id': thread.id,
             'subject': thread.subject,
@@ -55,22 +155,33 @@ def get_message_threads():
             'created_at': thread.created_at.isoformat(),
             'last_message_at': thread.last_message_at.isoformat() if thread.last_message_at else None,
             'last_message': {
-                'content': last_message.content[:100] + '...' if last_message and len(last_message.content) > 100 else last_message.content if last_message else None,
-                'sender_name': last_message.sender.name if last_message else None,
-                'sent_at': last_message.sent_at.isoformat() if last_message else None
-            } if last_message else None,
+                'content': preview[:LAST_MESSAGE_PREVIEW] + '...' if len(preview) > LAST_MESSAGE_PREVIEW else preview,
+                'sender_name': sender_name,
+                'sent_at': sent_at.isoformat() if sent_at else None
+            } if preview is not None else None,
             'participants': [],  # Empty for now since we don't have participant tracking
             'participant_count': 0,
-            'unread_count': 0  # Simplified for now
+            'unread_count': unread_count
         }
         result.append(thread_data)
     
-    return jsonify(result)
+    if not paginate:
+        return jsonify(result)
+    
+    has_next = len(rows) > limit
+    return jsonify({
+        'threads': result,
+        'pagination': {
+            'limit': limit,
+            'has_next': has_next,
+            'next_cursor': _encode_thread_cursor(rows[limit - 1][0]) if has_next else None
+        }
+    })
 
 @messages_bp.route('/threads/<int:thread_id>/messages', methods=['GET'])
 @jwt_required()
 def get_thread_messages(thread_id):
-    """Get all messages in a specific thread"""
+    """Get a page of a thread's messages and mark the current user's receipts for them read"""
     user, organization = get_current_user_and_org()
     if not organization:
         return jsonify({'error': 'Organization not found'}), 404
@@ -84,30 +195,31 @@ def get_thread_messages(thread_id):
     if not thread:
         return jsonify({'error': 'Thread not found'}), 404
     
-    participant_ids = thread.participant_ids.split(',') if thread.participant_ids else []
-    if str(user.id) not in participant_ids and thread.created_by != user.id:
-        return jsonify({'error': 'Access denied'}), 403
-    
     # Get messages with pagination
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 50, type=int)
     
     messages = Message.query.filter_by(
         thread_id=thread_id
-    ).order_by(Message.created_at.desc()).paginate(
+    ).order_by(Message.sent_at.desc(), Message.id.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
-    
-    # Mark messages as read
-    unread_messages = Message.query.filter_by(
-        thread_id=thread_id,
-        is_read=False
-    ).filter(Message.sender_id != user.id).all()
-    
-    for message in unread_messages:
-        message.is_read = True
-    
-    db.session.commit()
+    message_ids = [msg.id for msg in messages.items]
+    
+    # Mark this page read for the current user, remembering what was new
+    unread_ids = set()
+    if message_ids:
+        unread_ids = set(db.session.scalars(select(MessageRecipient.message_id).where(
+            MessageRecipient.message_id.in_(message_ids),
+            MessageRecipient.user_id == user.id,
+            MessageRecipient.read_at.is_(None)
+        )))
+    if unread_ids:
+        MessageRecipient.query.filter(
+            MessageRecipient.message_id.in_(unread_ids),
+            MessageRecipient.user_id == user.id
+        ).update({'read_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
     
     result = {
         'messages': [{
@@ -115,10 +227,10 @@ def get_thread_messages(thread_id):
             'content': msg.content,
             'sender': {
                 'id': msg.sender.id,
-                'name': msg.sender.full_name
+                'name': msg.sender.name or msg.sender.username
             },
-            'created_at': msg.created_at.isoformat(),
-            'is_read': msg.is_read
+            'created_at': msg.sent_at.isoformat() if msg.sent_at else None,
+            'is_read': msg.id not in unread_ids
         } for msg in reversed(messages.items)],
         'pagination': {
             'current_page': messages.page,
@@ -150,39 +262,41 @@ def create_message_thread():
         return jsonify({'error': 'At least one participant is required'}), 400
     
     # Validate participants are in the organization
-    participant_ids = data['participants']
-    participants = User.query.filter(
-        User.id.in_(participant_ids),
-        User.organizations.any(Organization.id == organization.id)
-    ).all()
-    
-    if len(participants) != len(participant_ids):
+    participant_ids = set(data['participants'])
+    members = db.session.scalar(select(func.count()).select_from(UserOrganization).where(
+        UserOrganization.user_id.in_(participant_ids),
+        UserOrganization.organization_id == organization.id,
+        UserOrganization.is_active == True
+    ))
+    
+    if members != len(participant_ids):
         return jsonify({'error': 'Some participants are not in the organization'}), 400
     
     # Create thread
     thread = MessageThread(
-        id=str(uuid.uuid4()),
         subject=data['subject'],
         thread_type=data.get('thread_type', 'direct'),
         organization_id=organization.id,
         created_by=user.id,
-        participant_ids=','.join(map(str, participant_ids)),
         created_at=datetime.utcnow()
     )
     
     db.session.add(thread)
+    db.session.flush()
     
-    # Add initial message if provided
+    # Add initial message if provided; its receipts make the participants
     if data.get('initial_message'):
         message = Message(
-            id=str(uuid.uuid4()),
             thread_id=thread.id,
             sender_id=user.id,
             content=data['initial_message'],
-            created_at=datetime.utcnow()
+            sent_at=datetime.utcnow()
         )
         db.session.add(message)
-        thread.last_message_at = message.created_at
+        thread.last_message_at = message.sent_at
+        db.session.flush()
+        _add_recipients(message, organization.id, participant_ids)
+        _publish_new_message(thread, message, user)
     
     db.session.commit()
     
@@ -213,23 +327,23 @@ def send_message(thread_id):
     if not thread:
         return jsonify({'error': 'Thread not found'}), 404
     
-    participant_ids = thread.participant_ids.split(',') if thread.participant_ids else []
-    if str(user.id) not in participant_ids and thread.created_by != user.id:
-        return jsonify({'error': 'Access denied'}), 403
-    
     # Create message
     message = Message(
-        id=str(uuid.uuid4()),
         thread_id=thread_id,
         sender_id=user.id,
         content=data['content'],
-        created_at=datetime.utcnow()
+        sent_at=datetime.utcnow()
     )
     
     db.session.add(message)
     
     # Update thread last message time
-    thread.last_message_at = message.created_at
+    thread.last_message_at = message.sent_at
+    db.session.flush()
+    # Receipts for everyone the reply reaches
+    _add_recipients(message, organization.id,
+                    None if thread.thread_type in ORG_WIDE_THREAD_TYPES else _thread_participants(thread.id))
+    _publish_new_message(thread, message, user)
     db.session.commit()
     
     return jsonify({
@@ -279,7 +393,10 @@ def delete_thread(thread_id):
     if not thread:
         return jsonify({'error': 'Thread not found'}), 404
     
-    # Delete all messages in the thread
+    # Delete all messages in the thread, receipts first
+    MessageRecipient.query.filter(
+        MessageRecipient.message_id.in_(select(Message.id).where(Message.thread_id == thread_id))
+    ).delete(synchronize_session=False)
     Message.query.filter_by(thread_id=thread_id).delete()
     
     # Delete the thread
@@ -315,55 +432,60 @@ def broadcast_message():
         recipient_ids.update(data['recipients']['user_ids'])
     
     # Add users from sections
-    if 'section_ids' in data['recipients']:
-        for section_id in data['recipients']['section_ids']:
-            section = Section.query.get(section_id)
-            if section and section.organization_id == organization.id:
-                # Get all users in this section
-                section_users = User.query.filter(
-                    User.organizations.any(Organization.id == organization.id)
-                ).all()
-                # Note: This would need proper section membership table
-                # For now, we'll skip section-based targeting
-                pass
+    if data['recipients'].get('section_ids'):
+        recipient_ids.update(db.session.scalars(select(UserOrganization.user_id).join(
+            Section, Section.id == UserOrganization.section_id
+        ).where(
+            Section.id.in_(data['recipients']['section_ids']),
+            Section.organization_id == organization.id,
+            UserOrganization.organization_id == organization.id,
+            UserOrganization.is_active == True
+        )))
     
     # Send to all organization members if specified
     if data['recipients'].get('all_members'):
-        all_users = User.query.filter(
-            User.organizations.any(Organization.id == organization.id)
-        ).all()
-        recipient_ids.update([u.id for u in all_users])
+        recipient_ids.update(db.session.scalars(select(UserOrganization.user_id).where(
+            UserOrganization.organization_id == organization.id,
+            UserOrganization.is_active == True
+        )))
+    
+    # Only current members get a copy, never the sender
+    recipient_ids.discard(user.id)
+    if recipient_ids:
+        recipient_ids = set(db.session.scalars(select(UserOrganization.user_id).where(
+            UserOrganization.user_id.in_(recipient_ids),
+            UserOrganization.organization_id == organization.id,
+            UserOrganization.is_active == True
+        )))
     
     # Create individual threads for each recipient
     threads_created = 0
     for recipient_id in recipient_ids:
-        if recipient_id == user.id:  # Don't send to self
-            continue
-            
         # Create thread
         thread = MessageThread(
-            id=str(uuid.uuid4()),
             subject=data['subject'],
             thread_type='broadcast',
             organization_id=organization.id,
             created_by=user.id,
-            participant_ids=str(recipient_id),
             created_at=datetime.utcnow()
         )
         
         db.session.add(thread)
+        db.session.flush()
         
         # Add message
         message = Message(
-            id=str(uuid.uuid4()),
             thread_id=thread.id,
             sender_id=user.id,
             content=data['content'],
-            created_at=datetime.utcnow()
+            sent_at=datetime.utcnow()
         )
         
         db.session.add(message)
-        thread.last_message_at = message.created_at
+        thread.last_message_at = message.sent_at
+        db.session.flush()
+        db.session.add(MessageRecipient(message_id=message.id, user_id=recipient_id))
+        _publish_new_message(thread, message, user)
         threads_created += 1
     
     db.session.commit()
@@ -414,6 +536,9 @@ def send_simple_message():
     )
     
     db.session.add(message)
+    db.session.flush()
+    _add_recipients(message, organization.id)
+    _publish_new_message(thread, message, user)
     db.session.commit()
     
     return jsonify({
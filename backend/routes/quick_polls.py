@@ -1,38 +1,54 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from models import db, User, Organization
+from flask_jwt_extended import jwt_required
+from models import db, QuickPoll
+from utils.auth_context import get_current_user_and_org, is_admin
 from datetime import datetime, timedelta
+import json
+from services import live_updates
+from services.quick_polls import QuickPollService
 
 quick_polls_bp = Blueprint('quick_polls', __name__)
 
-def get_current_user_and_org():
-    """Helper function to get current user and organization from JWT"""
-    current_user_id = get_jwt_identity()
-    claims = get_jwt()
-    organization_id = claims.get('organization_id')
-    
-    user = User.query.get(current_user_id)
-    organization = Organization.query.get(organization_id) if organization_id else None
-    
-    return user, organization
+def _poll_data(poll, counts, own_vote, now):
+    """A poll with its tallies; `counts` maps option index to votes"""
+    options = QuickPollService.options(poll)
+    return {
+        'id': poll.id,
+        'question': poll.title,
+        'description': poll.description,
+        'options': options,
+        'is_anonymous': poll.is_anonymous,
+        'is_active': poll.is_active,
+        'is_expired': bool(poll.expires_at and poll.expires_at <= now),
+        'expires_at': poll.expires_at.isoformat() if poll.expires_at else None,
+        'created_at': poll.created_at.isoformat() if poll.created_at else None,
+        'created_by': poll.created_by,
+        'option_counts': {option: counts.get(i, 0) for i, option in enumerate(options)},
+        'total_responses': sum(counts.values()),
+        'user_responded': own_vote is not None,
+        'user_response': options[own_vote] if own_vote is not None and own_vote < len(options) else None
+    }
 
-def is_admin(user, organization_id):
-    """Check if user is admin in the organization"""
-    if not user or not organization_id:
-        return False
-    return user.get_role_in_organization(organization_id) == 'Admin'
+def _get_poll(poll_id, organization):
+    return QuickPoll.query.filter_by(id=poll_id, organization_id=organization.id).first()
 
 @quick_polls_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_quick_polls():
-    """Get all quick polls for the organization"""
+    """Get all quick polls for the organization, newest first, with their tallies"""
     try:
         user, organization = get_current_user_and_org()
         if not organization:
             return jsonify({'error': 'Organization not found'}), 404
         
-        # For now, return empty list since QuickPoll model needs to be created
-        return jsonify([])
+        polls = QuickPoll.query.filter_by(organization_id=organization.id).order_by(
+            QuickPoll.created_at.desc(), QuickPoll.id.desc()
+        ).all()
+        tallies = QuickPollService.tallies([poll.id for poll in polls])
+        own_votes = QuickPollService.own_votes(polls, user.id)
+        now = datetime.utcnow()
+        
+        return jsonify([_poll_data(poll, tallies[poll.id], own_votes.get(poll.id), now) for poll in polls])
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -56,21 +72,133 @@ def create_quick_poll():
         if not data.get('question'):
             return jsonify({'error': 'Question is required'}), 400
         
-        if not data.get('options') or len(data.get('options', [])) < 2:
+        options = [str(option).strip() for option in data.get('options', []) if str(option).strip()]
+        if len(options) < 2:
             return jsonify({'error': 'At least 2 options are required'}), 400
         
-        # For now, return success without creating since models need to be updated
-        return jsonify({
-            'id': 1,
-            'question': data['question'],
-            'options': data['options'],
-            'anonymous': data.get('anonymous', False),
-            'created_at': datetime.utcnow().isoformat(),
-            'is_active': True
-        }), 201
+        expires_at = None
+        if data.get('expires_in_hours'):
+            expires_at = datetime.utcnow() + timedelta(hours=float(data['expires_in_hours']))
+        
+        poll = QuickPoll(
+            organization_id=organization.id,
+            created_by=user.id,
+            title=data['question'],
+            description=data.get('description'),
+            options=json.dumps(options),
+            section_id=data.get('section_id'),
+            expires_at=expires_at,
+            is_anonymous=bool(data.get('is_anonymous', data.get('anonymous', False))),
+            is_active=True
+        )
+        db.session.add(poll)
+        db.session.flush()
+        
+        poll_data = _poll_data(poll, {}, None, datetime.utcnow())
+        live_updates.publish(db.session, [live_updates.org_channel(organization.id)], 'poll.created', poll_data)
+        db.session.commit()
+        return jsonify(poll_data), 201
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@quick_polls_bp.route('/<int:poll_id>', methods=['GET'])
+@jwt_required()
+def get_quick_poll(poll_id):
+    """Get a quick poll with its tallies"""
+    user, organization = get_current_user_and_org()
+    if not organization:
+        return jsonify({'error': 'Organization not found'}), 404
+    
+    poll = _get_poll(poll_id, organization)
+    if not poll:
+        return jsonify({'error': 'Poll not found'}), 404
+    
+    own_vote = QuickPollService.own_votes([poll], user.id).get(poll.id)
+    return jsonify(_poll_data(poll, QuickPollService.tallies([poll.id])[poll.id], own_vote, datetime.utcnow()))
+
+@quick_polls_bp.route('/<int:poll_id>/tallies', methods=['GET'])
+@jwt_required()
+def get_quick_poll_tallies(poll_id):
+    """
+    Just the vote counts, for clients refreshing a live poll. Answers 304 Not
+    Modified while the counts match the client's ETag. Clients connected to
+    /api/stream get the same counts pushed as 'poll.tally' deltas instead.
+    """
+    user, organization = get_current_user_and_org()
+    if not organization:
+        return jsonify({'error': 'Organization not found'}), 404
+    
+    poll = _get_poll(poll_id, organization)
+    if not poll:
+        return jsonify({'error': 'Poll not found'}), 404
+    
+    counts = QuickPollService.tallies([poll.id])[poll.id]
+    options = QuickPollService.options(poll)
+    is_open = QuickPollService.is_open(poll)
+    response = jsonify({
+        'poll_id': poll.id,
+        'is_open': is_open,
+        'option_counts': {option: counts.get(i, 0) for i, option in enumerate(options)},
+        'total_responses': sum(counts.values())
+    })
+    response.set_etag(f'{poll.id}-{int(is_open)}-' + '.'.join(str(counts.get(i, 0)) for i in range(len(options))))
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+@quick_polls_bp.route('/<int:poll_id>/respond', methods=['POST'])
+@jwt_required()
+def respond_to_quick_poll(poll_id):
+    """Vote in a quick poll: {"response": "<option>"} or {"option_index": n}. One vote per member."""
+    user, organization = get_current_user_and_org()
+    if not organization:
+        return jsonify({'error': 'Organization not found'}), 404
+    
+    poll = _get_poll(poll_id, organization)
+    if not poll:
+        return jsonify({'error': 'Poll not found'}), 404
+    if not QuickPollService.is_open(poll):
+        return jsonify({'error': 'Poll is closed'}), 400
+    
+    data = request.get_json() or {}
+    options = QuickPollService.options(poll)
+    option_index = data.get('option_index')
+    if option_index is None and data.get('response') in options:
+        option_index = options.index(data['response'])
+    if not isinstance(option_index, int) or isinstance(option_index, bool) or not 0 <= option_index < len(options):
+        return jsonify({'error': 'Invalid option'}), 400
     
+    try:
+        votes = QuickPollService.vote(poll, user.id, option_index)
+        if votes is None:
+            db.session.rollback()
+            return jsonify({'error': 'You have already voted in this poll'}), 409
+        db.session.commit()
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
+    
+    return jsonify({'message': 'Vote recorded', 'option_index': option_index, 'votes': votes})
+
+@quick_polls_bp.route('/<int:poll_id>/close', methods=['POST'])
+@jwt_required()
+def close_quick_poll(poll_id):
+    """Stop a quick poll taking votes (admin only)"""
+    user, organization = get_current_user_and_org()
+    if not organization:
+        return jsonify({'error': 'Organization not found'}), 404
+    if not is_admin(user, organization.id):
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    poll = _get_poll(poll_id, organization)
+    if not poll:
+        return jsonify({'error': 'Poll not found'}), 404
+    
+    poll.is_active = False
+    live_updates.publish(db.session, [live_updates.org_channel(organization.id)], 'poll.closed', {'poll_id': poll.id})
+    db.session.commit()
+    return jsonify({'message': 'Poll closed'})
 
 @quick_polls_bp.route('/templates', methods=['GET'])
 @jwt_required()
@@ -1,9 +1,61 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
-from models import RSVP, User, UserOrganization
+from sqlalchemy import and_, or_
+from models import db, RSVP, User, UserOrganization, Section
 
 rsvps_bp = Blueprint('rsvps', __name__)
 
+def normalize_rsvp_status(status):
+    """Normalize the status to proper case to handle any legacy data"""
+    if status in ['Yes', 'No', 'Maybe']:
+        return status
+    if status in ['yes', 'no', 'maybe']:
+        return status.capitalize()
+    return 'No'  # Default fallback
+
+# Most events one bulk roster request may ask for
+BULK_ROSTER_MAX_EVENTS = 500
+
+def _rsvp_summaries(org_id, event_ids):
+    """{event_id: {'Yes': [...], 'No': [...], 'Maybe': [...]}} for events in the organization, in one query"""
+    summaries = {event_id: {'Yes': [], 'No': [], 'Maybe': []} for event_id in event_ids}
+
+    # Load the whole roster in one round trip. A user belongs to the organization
+    # through the legacy field OR an active UserOrganization row (unique per
+    # user/org, so the outer join never duplicates an RSVP).
+    rows = db.session.query(
+        RSVP.event_id,
+        RSVP.status,
+        User.username,
+        User.name,
+        User.section_id,
+        Section.name
+    ).join(
+        User, User.id == RSVP.user_id
+    ).outerjoin(
+        Section, Section.id == User.section_id
+    ).outerjoin(
+        UserOrganization, and_(
+            UserOrganization.user_id == User.id,
+            UserOrganization.organization_id == org_id,
+            UserOrganization.is_active == True
+        )
+    ).filter(
+        RSVP.event_id.in_(event_ids),
+        or_(User.organization_id == org_id, UserOrganization.id.isnot(None))
+    ).order_by(RSVP.id).all()
+
+    for event_id, status, username, name, section_id, section_name in rows:
+        # Return both username and full name for better display
+        summaries[event_id][normalize_rsvp_status(status)].append({
+            'username': username,
+            'name': name or username,  # Fallback to username if name is empty
+            'display_name': name or username,  # Convenient display name
+            'section_id': section_id,
+            'section_name': section_name
+        })
+    return summaries
+
 @rsvps_bp.route('/<int:event_id>/rsvps', methods=['GET'])
 @jwt_required()
 def get_event_rsvps(event_id):
@@ -15,30 +67,36 @@ def get_event_rsvps(event_id):
     event = Event.query.filter_by(id=event_id, organization_id=org_id).first()
     if not event:
         return jsonify({'msg': 'Not found'}), 404
-    rsvps = RSVP.query.filter_by(event_id=event_id).all()
-    summary = {'Yes': [], 'No': [], 'Maybe': []}
-    for r in rsvps:
-        user = User.query.get(r.user_id)
-        if user:
-            # Check if user belongs to the organization (legacy field OR UserOrganization table)
-            user_in_org = (user.organization_id == org_id) or \
-                         UserOrganization.query.filter_by(user_id=user.id, organization_id=org_id, is_active=True).first()
-            
-            if user_in_org:
-                # Return both username and full name for better display
-                user_info = {
-                    'username': user.username,
-                    'name': user.name or user.username,  # Fallback to username if name is empty
-                    'display_name': user.name or user.username,  # Convenient display name
-                    'section_id': user.section_id,
-                    'section_name': user.section.name if user.section else None
-                }
-                # Normalize the status to proper case to handle any legacy data
-                status = r.status
-                if status in ['yes', 'no', 'maybe']:
-                    status = status.capitalize()
-                elif status not in ['Yes', 'No', 'Maybe']:
-                    status = 'No'  # Default fallback
-                
-                summary[status].append(user_info)
-    return jsonify(summary)
+
+    return jsonify(_rsvp_summaries(org_id, [event_id])[event_id])
+
+@rsvps_bp.route('/rsvps', methods=['GET'])
+@jwt_required()
+def get_events_rsvps():
+    """
+    Rosters for several events at once: ?ids=1,2,3 returns
+    {event_id: {'Yes': [...], 'No': [...], 'Maybe': [...]}}. Events outside the
+    organization are left out; occurrence keys of recurring events that have
+    no row yet get empty rosters.
+    """
+    from flask_jwt_extended import get_jwt
+    from models import Event
+    from services.recurrence import RecurrenceService
+    org_id = get_jwt().get('organization_id')
+
+    keys = [key.strip() for key in request.args.get('ids', '').split(',') if key.strip()]
+    if len(keys) > BULK_ROSTER_MAX_EVENTS:
+        return jsonify({'msg': f'At most {BULK_ROSTER_MAX_EVENTS} events per request'}), 400
+    event_ids = [int(key) for key in keys if key.isdigit()]
+    occurrence_keys = [key for key in keys if RecurrenceService.is_occurrence_key(key)]
+    if len(event_ids) + len(occurrence_keys) != len(keys):
+        return jsonify({'msg': 'ids must be event IDs or occurrence keys'}), 400
+
+    if event_ids:
+        event_ids = [event_id for (event_id,) in db.session.query(Event.id).filter(
+            Event.id.in_(event_ids), Event.organization_id == org_id
+        )]
+    summaries = _rsvp_summaries(org_id, event_ids) if event_ids else {}
+    empty = {'Yes': [], 'No': [], 'Maybe': []}
+    return jsonify({**{str(event_id): summary for event_id, summary in summaries.items()},
+                    **{key: empty for key in occurrence_keys}})
@@ -7,13 +7,17 @@ from flask import Blueprint, request, jsonify, g
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
 from sqlalchemy import func, desc, or_, and_
+from sqlalchemy.orm import joinedload
 from functools import wraps
+import base64
 import json
 import socket
 import hashlib
 
 from models import db, User, Organization, AuditLog, SecurityEvent, DataPrivacyRequest, UserSession, SecurityPolicy
 from routes.super_admin import is_super_admin
+from services.audit_sink import get_audit_sink
+from services.log_partitions import estimated_row_count
 
 # Phase 3 Security Blueprint
 security_bp = Blueprint('security', __name__)
@@ -43,7 +47,7 @@ def get_session_id():
 
 def log_audit_event(action_type, resource_type, resource_id=None, details=None, user_id=None, organization_id=None):
     """
-    Log an audit event to the database
+    Queue an audit event for the audit sink to write in the background
     
     Args:
         action_type: Type of action (login, logout, create, update, delete, view, etc.)
@@ -61,31 +65,25 @@ def log_audit_event(action_type, resource_type, resource_id=None, details=None,
             except:
                 user_id = None
         
-        audit_log = AuditLog(
-            user_id=user_id,
-            action_type=action_type,
-            resource_type=resource_type,
-            resource_id=resource_id,
-            details=details,
-            ip_address=get_client_ip(),
-            user_agent=request.headers.get('User-Agent'),
-            session_id=get_session_id(),
-            organization_id=organization_id
-        )
-        
-        db.session.add(audit_log)
-        db.session.commit()
-        
-        return True
+        return get_audit_sink().record('audit', {
+            'user_id': user_id,
+            'action_type': action_type,
+            'resource_type': resource_type,
+            'resource_id': resource_id,
+            'details': details,
+            'ip_address': get_client_ip(),
+            'user_agent': request.headers.get('User-Agent'),
+            'session_id': get_session_id(),
+            'organization_id': organization_id
+        })
         
     except Exception as e:
         print(f"Audit logging error: {e}")
-        db.session.rollback()
         return False
 
 def log_security_event(event_type, severity, details=None, user_id=None, source_ip=None):
     """
-    Log a security event
+    Queue a security event for the audit sink to write in the background
     
     Args:
         event_type: Type of security event (failed_login, brute_force, suspicious_activity, etc.)
@@ -98,22 +96,16 @@ def log_security_event(event_type, severity, details=None, user_id=None, source_
         if source_ip is None:
             source_ip = get_client_ip()
             
-        security_event = SecurityEvent(
-            event_type=event_type,
-            severity=severity,
-            source_ip=source_ip,
-            user_id=user_id,
-            details=details
-        )
-        
-        db.session.add(security_event)
-        db.session.commit()
-        
-        return True
+        return get_audit_sink().record('security', {
+            'event_type': event_type,
+            'severity': severity,
+            'source_ip': source_ip,
+            'user_id': user_id,
+            'details': details
+        })
         
     except Exception as e:
         print(f"Security event logging error: {e}")
-        db.session.rollback()
         return False
 
 def audit_required(action_type, resource_type):
@@ -169,6 +161,49 @@ def audit_required(action_type, resource_type):
 # AUDIT TRAIL API ENDPOINTS
 # =============================================================================
 
+# Log listings page by (timestamp, id) keyset rather than OFFSET, which gets
+# slower the deeper it goes into tables this size
+LOG_PAGE_SIZE = 50
+
+def _encode_log_cursor(entry):
+    position = f'{entry.timestamp.isoformat()}|{entry.id}'
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def _decode_log_cursor(cursor):
+    try:
+        when, entry_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(when), int(entry_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def _page_params(max_page_size):
+    """(cursor, limit) from the request; per_page is still accepted from older clients"""
+    cursor = _decode_log_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    limit = min(max(int(request.args.get('limit', request.args.get('per_page', LOG_PAGE_SIZE))), 1), max_page_size)
+    return cursor, limit
+
+def _keyset_page(query, model, cursor, limit):
+    """
+    One page of `query`, newest first, after `cursor`.
+    
+    Returns:
+        tuple: (entries, pagination dict)
+    """
+    if cursor:
+        when, entry_id = cursor
+        query = query.filter(or_(
+            model.timestamp < when,
+            and_(model.timestamp == when, model.id < entry_id)
+        ))
+    entries = query.order_by(desc(model.timestamp), desc(model.id)).limit(limit + 1).all()
+    has_next = len(entries) > limit
+    entries = entries[:limit]
+    return entries, {
+        'limit': limit,
+        'has_next': has_next,
+        'next_cursor': _encode_log_cursor(entries[-1]) if has_next else None
+    }
+
 @security_bp.route('/audit-log', methods=['GET'])
 @jwt_required()
 def get_audit_log():
@@ -179,10 +214,11 @@ def get_audit_log():
         return jsonify({'msg': 'Super Admin access required'}), 403
     
     try:
-        # Get query parameters
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 50, type=int), 200)  # Max 200 per page
-        
+        cursor, limit = _page_params(max_page_size=200)
+    except ValueError as e:
+        return jsonify({'msg': f'Invalid pagination parameters: {str(e)}'}), 400
+    
+    try:
         # Filtering parameters
         action_type = request.args.get('action_type')
         resource_type = request.args.get('resource_type')
@@ -193,7 +229,7 @@ def get_audit_log():
         ip_address = request.args.get('ip_address')
         
         # Build query
-        query = AuditLog.query
+        query = AuditLog.query.options(joinedload(AuditLog.user), joinedload(AuditLog.organization))
         
         # Apply filters
         if action_type:
@@ -222,18 +258,11 @@ def get_audit_log():
             except ValueError:
                 return jsonify({'msg': 'Invalid end_date format'}), 400
         
-        # Order by timestamp (newest first)
-        query = query.order_by(desc(AuditLog.timestamp))
-        
-        # Paginate
-        pagination = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
-        )
+        # Newest first, one keyset page
+        entries, pagination = _keyset_page(query, AuditLog, cursor, limit)
         
         # Get summary statistics
-        total_entries = AuditLog.query.count()
+        total_entries = estimated_row_count(db.session.connection(), 'audit_log')
         unique_users = db.session.query(AuditLog.user_id).distinct().count()
         recent_entries = AuditLog.query.filter(
             AuditLog.timestamp >= datetime.utcnow() - timedelta(hours=24)
@@ -252,21 +281,14 @@ def get_audit_log():
                     'ip_address': ip_address,
                     'date_range': f"{start_date} to {end_date}" if start_date or end_date else None
                 },
-                'page': page,
-                'per_page': per_page
+                'cursor': request.args.get('cursor'),
+                'limit': pagination['limit']
             }
         )
         
         return jsonify({
-            'audit_logs': [log.to_dict() for log in pagination.items],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            },
+            'audit_logs': [log.to_dict() for log in entries],
+            'pagination': pagination,
             'summary': {
                 'total_entries': total_entries,
                 'unique_users': unique_users,
@@ -297,10 +319,13 @@ def get_security_events():
     if not is_super_admin(user_id):
         return jsonify({'msg': 'Super Admin access required'}), 403
     
+    try:
+        cursor, limit = _page_params(max_page_size=100)
+    except ValueError as e:
+        return jsonify({'msg': f'Invalid pagination parameters: {str(e)}'}), 400
+    
     try:
         # Get query parameters
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 50, type=int), 100)
         severity = request.args.get('severity')
         event_type = request.args.get('event_type')
         resolved = request.args.get('resolved', type=bool)
@@ -308,7 +333,7 @@ def get_security_events():
         end_date = request.args.get('end_date')
         
         # Build query
-        query = SecurityEvent.query
+        query = SecurityEvent.query.options(joinedload(SecurityEvent.user))
         
         # Apply filters
         if severity:
@@ -333,18 +358,11 @@ def get_security_events():
             except ValueError:
                 return jsonify({'msg': 'Invalid end_date format'}), 400
         
-        # Order by timestamp (newest first)
-        query = query.order_by(desc(SecurityEvent.timestamp))
-        
-        # Paginate
-        pagination = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
-        )
+        # Newest first, one keyset page
+        entries, pagination = _keyset_page(query, SecurityEvent, cursor, limit)
         
         # Get summary statistics
-        total_events = SecurityEvent.query.count()
+        total_events = estimated_row_count(db.session.connection(), 'security_event')
         unresolved_critical = SecurityEvent.query.filter(
             and_(SecurityEvent.severity == 'critical', SecurityEvent.resolved == False)
         ).count()
@@ -366,15 +384,8 @@ def get_security_events():
         )
         
         return jsonify({
-            'security_events': [event.to_dict() for event in pagination.items],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            },
+            'security_events': [event.to_dict() for event in entries],
+            'pagination': pagination,
             'summary': {
                 'total_events': total_events,
                 'unresolved_critical': unresolved_critical,
@@ -458,13 +469,13 @@ def get_audit_summary():
         last_30d = now - timedelta(days=30)
         
         # Audit log statistics
-        total_audit_entries = AuditLog.query.count()
+        total_audit_entries = estimated_row_count(db.session.connection(), 'audit_log')
         audit_24h = AuditLog.query.filter(AuditLog.timestamp >= last_24h).count()
         audit_7d = AuditLog.query.filter(AuditLog.timestamp >= last_7d).count()
         audit_30d = AuditLog.query.filter(AuditLog.timestamp >= last_30d).count()
         
         # Security event statistics
-        total_security_events = SecurityEvent.query.count()
+        total_security_events = estimated_row_count(db.session.connection(), 'security_event')
         unresolved_events = SecurityEvent.query.filter(SecurityEvent.resolved == False).count()
         critical_events = SecurityEvent.query.filter(
             and_(SecurityEvent.severity == 'critical', SecurityEvent.resolved == False)
@@ -509,7 +520,7 @@ def get_audit_summary():
                 'total_events': total_security_events,
                 'unresolved_events': unresolved_events,
                 'critical_unresolved': critical_events,
-                'resolution_rate': round(((total_security_events - unresolved_events) / max(total_security_events, 1)) * 100, 2)
+                'resolution_rate': round((max(total_security_events - unresolved_events, 0) / max(total_security_events, 1)) * 100, 2)
             },
             'recent_activity': {
                 'actions_24h': [{'action': action, 'count': count} for action, count in recent_actions],
@@ -1,29 +1,22 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from models import (db, User, Organization, Event, RSVP, SubstituteRequest, 
-                   CallList, Section, EventCategory)
+from flask_jwt_extended import jwt_required
+from models import (db, User, Event, RSVP, SubstituteRequest, 
+                   CallList, CallListMember, Section, EventCategory)
+from utils.auth_context import get_current_user_and_org, is_admin
 from datetime import datetime
+import base64
 import uuid
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, func
+from sqlalchemy.orm import aliased, contains_eager, joinedload
+from services import live_updates
+from services.recurrence import RecurrenceService
+from services.rsvp_service import RSVPService
+from services.substitute_escalation import substitute_escalation
 
 substitutes_bp = Blueprint('substitutes', __name__)
 
-def get_current_user_and_org():
-    """Helper function to get current user and organization from JWT"""
-    current_user_id = get_jwt_identity()
-    claims = get_jwt()
-    organization_id = claims.get('organization_id')
-    
-    user = User.query.get(current_user_id)
-    organization = Organization.query.get(organization_id) if organization_id else None
-    
-    return user, organization
-
-def is_admin(user, organization_id):
-    """Check if user is admin in the specified organization"""
-    if not user or not organization_id:
-        return False
-    return user.get_role_in_organization(organization_id) == 'Admin'
+REQUEST_PAGE_SIZE = 50
+REQUEST_MAX_PAGE_SIZE = 200
 
 @substitutes_bp.route('/request', methods=['POST'])
 @jwt_required()
@@ -39,17 +32,21 @@ def create_substitute_request():
     if not data.get('event_id'):
         return jsonify({'error': 'Event ID is required'}), 400
     
-    # Verify event exists and user has RSVP
-    event = Event.query.filter_by(
-        id=data['event_id'],
-        organization_id=organization.id
-    ).first()
+    # Verify event exists and user has RSVP; occurrences of a recurring event
+    # come by their listing key
+    if RecurrenceService.is_occurrence_key(data['event_id']):
+        event = RecurrenceService.resolve(organization.id, data['event_id'])
+    else:
+        event = Event.query.filter_by(
+            id=data['event_id'],
+            organization_id=organization.id
+        ).first()
     
     if not event:
         return jsonify({'error': 'Event not found'}), 404
     
-    # Check if user has an RSVP for this event
-    rsvp = RSVP.query.filter_by(
+    # Check if user has an RSVP for this event (an occurrence without a row has none)
+    rsvp = None if getattr(event, 'is_occurrence', False) else RSVP.query.filter_by(
         event_id=event.id,
         user_id=user.id
     ).first()
@@ -61,7 +58,7 @@ def create_substitute_request():
     existing_request = SubstituteRequest.query.filter_by(
         event_id=event.id,
         requested_by=user.id,
-        status='pending'
+        status='open'
     ).first()
     
     if existing_request:
@@ -73,42 +70,123 @@ def create_substitute_request():
         requested_by=user.id,
         request_message=data.get('reason', ''),
         created_at=datetime.utcnow(),
-        status='open'
+        status='open',
+        # Queued for escalation even if contacting the first wave below fails
+        next_contact_at=datetime.utcnow()
     )
     
     db.session.add(substitute_request)
+    db.session.flush()
+    live_updates.publish(db.session, [live_updates.org_channel(organization.id)], 'substitute.requested', {
+        'request_id': substitute_request.id,
+        'event_id': event.id,
+        'event_title': event.title,
+        'requested_by': user.id,
+        'requester_name': user.name,
+        'status': substitute_request.status
+    })
     db.session.commit()
     
-    # Start the substitute finding process
-    _process_substitute_request(substitute_request)
+    # Contact the first wave of the call list now; later waves follow on the scheduler
+    try:
+        substitute_escalation.start(substitute_request)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error starting substitute escalation: {e}")
     
     return jsonify({
         'request_id': substitute_request.id,
         'message': 'Substitute request created successfully'
     }), 201
 
+def _encode_request_cursor(substitute_request):
+    position = f'{substitute_request.created_at.isoformat()}|{substitute_request.id}'
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def _decode_request_cursor(cursor):
+    try:
+        when, request_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(when), int(request_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def _listing_params():
+    """(paginate, cursor, limit, section_id) from the query string; raises ValueError"""
+    paginate = 'limit' in request.args or 'cursor' in request.args
+    cursor = _decode_request_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    limit = min(max(int(request.args.get('limit', REQUEST_PAGE_SIZE)), 1), REQUEST_MAX_PAGE_SIZE)
+    section_id = int(request.args['section_id']) if request.args.get('section_id') else None
+    return paginate, cursor, limit, section_id
+
+def _request_listing(query, paginate, cursor, limit):
+    """
+    Newest first, with the event and requester loaded in the same query.
+    Returns (rows, has_next); `query` must already join Event.
+    """
+    query = query.options(
+        contains_eager(SubstituteRequest.event),
+        joinedload(SubstituteRequest.requester)
+    )
+    if cursor:
+        query = query.filter(or_(
+            SubstituteRequest.created_at < cursor[0],
+            and_(SubstituteRequest.created_at == cursor[0], SubstituteRequest.id < cursor[1])
+        ))
+    query = query.order_by(SubstituteRequest.created_at.desc(), SubstituteRequest.id.desc())
+    if not paginate:
+        return query.all(), False
+    rows = query.limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+def _listing_response(key, result, last_request, paginate, has_next, limit):
+    if not paginate:
+        return jsonify(result)
+    return jsonify({
+        key: result,
+        'pagination': {
+            'limit': limit,
+            'has_next': has_next,
+            'next_cursor': _encode_request_cursor(last_request) if has_next else None
+        }
+    })
+
 @substitutes_bp.route('/requests', methods=['GET'])
 @jwt_required()
 def get_substitute_requests():
-    """Get substitute requests for the current user or organization"""
+    """
+    Get the substitute requests the current user made or filled.
+    
+    Query parameters:
+        limit, cursor: Keyset pagination on (created_at, id); either one
+            switches the response to {'requests': [...], 'pagination': {...}}
+        section_id: Only requests for this section
+    """
     user, organization = get_current_user_and_org()
     if not organization:
         return jsonify({'error': 'Organization not found'}), 404
     
-    # Get requests where user is the original user or potential substitute
-    requests = SubstituteRequest.query.filter(
-        SubstituteRequest.event.has(Event.organization_id == organization.id),
+    try:
+        paginate, cursor, limit, section_id = _listing_params()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid listing parameters: {str(e)}'}), 400
+    
+    # Requests where user is the original user or the substitute
+    query = SubstituteRequest.query.join(SubstituteRequest.event).filter(
+        Event.organization_id == organization.id,
         or_(
             SubstituteRequest.requested_by == user.id,
             SubstituteRequest.filled_by == user.id
         )
-    ).order_by(SubstituteRequest.created_at.desc()).all()
+    ).options(joinedload(SubstituteRequest.substitute))
+    if section_id:
+        query = query.filter(SubstituteRequest.section_id == section_id)
+    requests, has_next = _request_listing(query, paginate, cursor, limit)
     
     result = []
     for req in requests:
-        event = Event.query.get(req.event_id)
-        requester = User.query.get(req.requested_by)
-        substitute_user = User.query.get(req.filled_by) if req.filled_by else None
+        event = req.event
+        requester = req.requester
+        substitute_user = req.substitute
         
         request_data = {
             'id': req.id,
@@ -128,6 +206,7 @@ def get_substitute_requests():
                 'name': substitute_user.name
             } if substitute_user else None,
             'request_message': req.request_message,
+            'section_id': req.section_id,
             'status': req.status,
             'created_at': req.created_at.isoformat(),
             'filled_at': req.filled_at.isoformat() if req.filled_at else None,
@@ -136,51 +215,59 @@ def get_substitute_requests():
         }
         result.append(request_data)
     
-    return jsonify(result)
+    return _listing_response('requests', result, requests[-1] if requests else None, paginate, has_next, limit)
 
 @substitutes_bp.route('/available', methods=['GET'])
 @jwt_required()
 def get_available_substitutes():
-    """Get available substitute requests for the current user"""
+    """
+    Get the open substitute requests the current user could fill.
+    
+    Query parameters:
+        event_id: Only requests for this event
+        limit, cursor: Keyset pagination on (created_at, id); either one
+            switches the response to {'requests': [...], 'pagination': {...}}
+        section_id: Only requests for this section
+    """
     user, organization = get_current_user_and_org()
     if not organization:
         return jsonify({'error': 'Organization not found'}), 404
     
-    # Get pending substitute requests where user could be a substitute
-    # (not their own requests and they're available)
-    event_id = request.args.get('event_id')
-    
-    query = SubstituteRequest.query.filter(
-        SubstituteRequest.event.has(Event.organization_id == organization.id),
+    try:
+        paginate, cursor, limit, section_id = _listing_params()
+        event_id = int(request.args['event_id']) if request.args.get('event_id') else None
+    except ValueError as e:
+        return jsonify({'error': f'Invalid listing parameters: {str(e)}'}), 400
+    
+    # Open requests from other members, with the user's own RSVP to each
+    # event joined in; events they're already playing are left out
+    own_rsvp = aliased(RSVP)
+    query = db.session.query(SubstituteRequest, own_rsvp.status).join(SubstituteRequest.event).outerjoin(
+        own_rsvp, and_(own_rsvp.event_id == SubstituteRequest.event_id, own_rsvp.user_id == user.id)
+    ).filter(
+        Event.organization_id == organization.id,
         SubstituteRequest.requested_by != user.id,
-        SubstituteRequest.status == 'pending'
+        SubstituteRequest.status == 'open',
+        or_(own_rsvp.status.is_(None), own_rsvp.status != 'Yes')
     )
     
     if event_id:
         query = query.filter(SubstituteRequest.event_id == event_id)
+    if section_id:
+        query = query.filter(SubstituteRequest.section_id == section_id)
     
-    requests = query.order_by(SubstituteRequest.requested_at.desc()).all()
+    rows, has_next = _request_listing(query, paginate, cursor, limit)
     
     result = []
-    for req in requests:
-        event = Event.query.get(req.event_id)
-        requester = User.query.get(req.requested_by)
-        
-        # Check if user is already RSVP'd to this event
-        existing_rsvp = RSVP.query.filter_by(
-            event_id=event.id,
-            user_id=user.id
-        ).first()
-        
-        # Skip if user already has conflicting RSVP
-        if existing_rsvp and existing_rsvp.response == 'yes':
-            continue
+    for req, rsvp_status in rows:
+        event = req.event
+        requester = req.requester
         
         request_data = {
             'id': req.id,
             'event': {
                 'id': event.id,
-                'name': event.name,
+                'name': event.title,
                 'start_datetime': event.date.isoformat() if event.date else None,
                 'end_datetime': event.end_date.isoformat() if event.end_date else None,
                 'location': event.location_address,
@@ -188,15 +275,17 @@ def get_available_substitutes():
             },
             'requester': {
                 'id': requester.id,
-                'name': requester.full_name
+                'name': requester.name
             },
             'request_message': req.request_message,
+            'section_id': req.section_id,
             'created_at': req.created_at.isoformat(),
-            'can_substitute': not existing_rsvp or existing_rsvp.status in ['no', 'maybe']
+            'rsvp_status': rsvp_status,
+            'can_substitute': True
         }
         result.append(request_data)
     
-    return jsonify(result)
+    return _listing_response('requests', result, rows[-1][0] if rows else None, paginate, has_next, limit)
 
 @substitutes_bp.route('/accept', methods=['POST'])
 @jwt_required()
@@ -214,7 +303,7 @@ def accept_substitute_request():
     # Find the substitute request
     substitute_request = SubstituteRequest.query.filter_by(
         id=data['request_id'],
-        status='pending'
+        status='open'
     ).first()
     
     if not substitute_request:
@@ -233,48 +322,30 @@ def accept_substitute_request():
     if substitute_request.requested_by == user.id:
         return jsonify({'error': 'Cannot accept your own substitute request'}), 400
     
-    # Update substitute request
-    substitute_request.substitute_user_id = user.id
-    substitute_request.status = 'fulfilled'
-    substitute_request.fulfilled_at = datetime.utcnow()
+    # Only one member can take the spot; this also stops the call list escalation
+    if not substitute_escalation.fill(substitute_request.id, user.id):
+        db.session.rollback()
+        return jsonify({'error': 'Substitute request not found or already fulfilled'}), 409
     
-    # Create or update RSVP for substitute
-    substitute_rsvp = RSVP.query.filter_by(
-        event_id=event.id,
-        user_id=user.id
-    ).first()
-    
-    if substitute_rsvp:
-        substitute_rsvp.response = 'yes'
-        substitute_rsvp.is_substitute = True
-    else:
-        substitute_rsvp = RSVP(
-            event_id=event.id,
-            user_id=user.id,
-            response='yes',
-            is_substitute=True,
-            created_at=datetime.utcnow()
-        )
-        db.session.add(substitute_rsvp)
-    
-    # Update original user's RSVP
-    original_rsvp = RSVP.query.filter_by(
-        event_id=event.id,
-        user_id=substitute_request.requested_by
-    ).first()
-    
-    if original_rsvp:
-        original_rsvp.response = 'no'
-        original_rsvp.substitute_found = True
+    # The substitute is now playing and the original member isn't
+    RSVPService.upsert(event.id, organization.id, user.id, 'Yes')
+    RSVPService.upsert(event.id, organization.id, substitute_request.requested_by, 'No')
     
+    live_updates.publish(db.session, [
+        live_updates.org_channel(organization.id), live_updates.user_channel(substitute_request.requested_by)
+    ], 'substitute.filled', {
+        'request_id': substitute_request.id,
+        'event_id': event.id,
+        'event_title': event.title,
+        'requested_by': substitute_request.requested_by,
+        'substitute_id': user.id,
+        'substitute_name': user.name
+    })
     db.session.commit()
     
-    # Send notification to original user
-    # TODO: Implement notification system
-    
     return jsonify({
         'message': 'Substitute request accepted successfully',
-        'event_name': event.name
+        'event_name': event.title
     })
 
 @substitutes_bp.route('/decline', methods=['POST'])
@@ -291,49 +362,84 @@ def decline_substitute_request():
         return jsonify({'error': 'Request ID is required'}), 400
     
     # Find the substitute request
-    substitute_request = SubstituteRequest.query.filter_by(
-        id=data['request_id'],
-        status='pending'
+    substitute_request = SubstituteRequest.query.filter(
+        SubstituteRequest.id == data['request_id'],
+        SubstituteRequest.status == 'open',
+        SubstituteRequest.event.has(Event.organization_id == organization.id)
     ).first()
     
     if not substitute_request:
         return jsonify({'error': 'Substitute request not found or already fulfilled'}), 404
     
-    # For now, just log the decline - in a full implementation,
-    # we would track who declined and continue with the call list
+    # Once the whole wave has declined the next one is contacted right away
+    substitute_escalation.decline(substitute_request, user.id)
     
     return jsonify({'message': 'Substitute request declined'})
 
 @substitutes_bp.route('/call-list', methods=['GET'])
 @jwt_required()
 def get_call_list():
-    """Get call list for substitute requests"""
+    """
+    Get the organization's call list members in call order.
+    
+    Query parameters:
+        section_id: Only the call lists for this section
+        call_list_id: Only this call list
+    """
     user, organization = get_current_user_and_org()
     if not organization:
         return jsonify({'error': 'Organization not found'}), 404
     
-    # Get call list entries for this organization
-    call_list = CallList.query.filter_by(
-        organization_id=organization.id,
-        is_active=True
-    ).order_by(CallList.priority_order).all()
+    try:
+        section_id = int(request.args['section_id']) if request.args.get('section_id') else None
+        call_list_id = int(request.args['call_list_id']) if request.args.get('call_list_id') else None
+    except ValueError as e:
+        return jsonify({'error': f'Invalid listing parameters: {str(e)}'}), 400
+    
+    # When each member last stood in as a substitute
+    last_filled = db.session.query(
+        SubstituteRequest.filled_by.label('user_id'),
+        func.max(SubstituteRequest.filled_at).label('filled_at')
+    ).join(SubstituteRequest.event).filter(
+        Event.organization_id == organization.id,
+        SubstituteRequest.status == 'filled'
+    ).group_by(SubstituteRequest.filled_by).subquery()
+    
+    query = db.session.query(CallListMember, last_filled.c.filled_at).join(CallListMember.call_list).outerjoin(
+        last_filled, last_filled.c.user_id == CallListMember.user_id
+    ).filter(
+        CallList.organization_id == organization.id
+    ).options(
+        contains_eager(CallListMember.call_list),
+        joinedload(CallListMember.user)
+    )
+    if section_id:
+        query = query.filter(CallList.section_id == section_id)
+    if call_list_id:
+        query = query.filter(CallList.id == call_list_id)
+    members = query.order_by(CallList.is_default.desc(), CallList.id, CallListMember.order_position,
+                             CallListMember.id).all()
     
     result = []
-    for entry in call_list:
-        user_info = User.query.get(entry.user_id)
-        if user_info:
-            result.append({
-                'id': entry.id,
-                'user': {
-                    'id': user_info.id,
-                    'name': user_info.full_name,
-                    'email': user_info.email
-                },
-                'priority_order': entry.priority_order,
-                'available_for_substitution': entry.available_for_substitution,
-                'last_substitute_date': entry.last_substitute_date.isoformat() if entry.last_substitute_date else None,
-                'notes': entry.notes
-            })
+    for entry, last_substitute_date in members:
+        result.append({
+            'id': entry.id,
+            'call_list': {
+                'id': entry.call_list.id,
+                'name': entry.call_list.name,
+                'section_id': entry.call_list.section_id
+            },
+            'user': {
+                'id': entry.user.id,
+                'name': entry.user.name,
+                'email': entry.user.email
+            },
+            'priority_order': entry.order_position,
+            'available_for_substitution': entry.is_active,
+            'last_contacted': entry.last_contacted.isoformat() if entry.last_contacted else None,
+            'last_substitute_date': last_substitute_date.isoformat() if last_substitute_date else None,
+            'notes': entry.availability_notes
+        })
     
     return jsonify(result)
 
@@ -404,41 +510,3 @@ def update_substitute_availability():
     db.session.commit()
     
     return jsonify({'message': 'Substitute availability updated successfully'})
-
-def _process_substitute_request(substitute_request):
-    """Process substitute request by notifying potential substitutes"""
-    # Get the event and organization
-    event = Event.query.get(substitute_request.event_id)
-    if not event:
-        return
-    
-    organization = Organization.query.get(event.organization_id)
-    if not organization:
-        return
-    
-    # Get call list for this organization
-    call_list = CallList.query.filter_by(
-        organization_id=organization.id,
-        is_default=True
-    ).first()
-    
-    # If no default call list, get the first available one
-    if not call_list:
-        call_list = CallList.query.filter_by(
-            organization_id=organization.id
-        ).first()
-    
-    # Notify potential substitutes
-    # TODO: Implement notification system to send emails/push notifications
-    # For now, we'll just log
-    print(f"Processing substitute request {substitute_request.id} for event {event.title}")
-    if call_list:
-        print(f"Using call list: {call_list.name}")
-    else:
-        print("No call list available for substitute requests")
-    
-    # In a full implementation, we would:
-    # 1. Send notifications to users in priority order
-    # 2. Wait for responses with timeout
-    # 3. Move to next user if no response
-    # 4. Track who was contacted and when
@@ -6,12 +6,13 @@ Provides comprehensive analytics and reporting capabilities for system-wide insi
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from datetime import datetime, timedelta
-from sqlalchemy import func, text, desc, asc
+from sqlalchemy import func, text, desc, asc, case, and_
 from collections import defaultdict
 import calendar
 
 from models import db, User, Organization, Event, UserOrganization, RSVP
 from routes.super_admin import is_super_admin
+from utils.streaming import stream_rows, STREAM_FORMATS, STREAM_BATCH_SIZE
 
 super_analytics_bp = Blueprint('super_analytics', __name__)
 
@@ -208,90 +209,153 @@ def get_analytics_trends():
     except Exception as e:
         return jsonify({'msg': f'Error generating trends data: {str(e)}'}), 500
 
+# Sort keys accepted by /organizations/performance
+PERFORMANCE_SORT_FIELDS = (
+    'engagement_score', 'name', 'user_count', 'total_events', 'recent_events_30d',
+    'total_rsvps', 'recent_rsvps_30d', 'created_at'
+)
+
+def _organization_performance_query(since):
+    """
+    Every organization with its metrics and engagement score, as one SELECT.
+    
+    Each table is aggregated once per organization in a grouped subquery and
+    joined back, so the cost doesn't grow with the number of tenants.
+    """
+    users = db.session.query(
+        UserOrganization.organization_id,
+        func.count(UserOrganization.id).label('user_count')
+    ).group_by(UserOrganization.organization_id).subquery()
+    
+    events = db.session.query(
+        Event.organization_id,
+        func.count(Event.id).label('total_events'),
+        func.count(case((Event.date >= since, 1))).label('recent_events')
+    ).group_by(Event.organization_id).subquery()
+    
+    rsvps = db.session.query(
+        Event.organization_id,
+        func.count(RSVP.id).label('total_rsvps'),
+        func.count(case((Event.date >= since, 1))).label('recent_rsvps')
+    ).select_from(RSVP).join(Event, Event.id == RSVP.event_id).group_by(Event.organization_id).subquery()
+    
+    user_count = func.coalesce(users.c.user_count, 0)
+    total_events = func.coalesce(events.c.total_events, 0)
+    recent_events = func.coalesce(events.c.recent_events, 0)
+    total_rsvps = func.coalesce(rsvps.c.total_rsvps, 0)
+    recent_rsvps = func.coalesce(rsvps.c.recent_rsvps, 0)
+    
+    # Same formula as before, in SQL so the database can sort and page on it:
+    # min(events/user * 20 + rsvps/user * 10 + min(recent_events / max(users * 0.1, 1), 1) * 50, 100)
+    activity_base = case((user_count * 0.1 > 1, user_count * 0.1), else_=1.0)
+    recent_activity = case((recent_events / activity_base > 1, 1.0), else_=recent_events / activity_base)
+    raw_score = (total_events * 20.0 + total_rsvps * 10.0) / user_count + recent_activity * 50
+    engagement_score = case(
+        (user_count == 0, 0.0),
+        (raw_score > 100, 100.0),
+        else_=raw_score
+    ).label('engagement_score')
+    
+    return db.session.query(
+        Organization.id,
+        Organization.name,
+        Organization.created_at,
+        user_count.label('user_count'),
+        total_events.label('total_events'),
+        recent_events.label('recent_events_30d'),
+        total_rsvps.label('total_rsvps'),
+        recent_rsvps.label('recent_rsvps_30d'),
+        engagement_score
+    ).outerjoin(
+        users, users.c.organization_id == Organization.id
+    ).outerjoin(
+        events, events.c.organization_id == Organization.id
+    ).outerjoin(
+        rsvps, rsvps.c.organization_id == Organization.id
+    )
+
+def _health_status(engagement_score):
+    return 'excellent' if engagement_score >= 80 else \
+           'good' if engagement_score >= 60 else \
+           'fair' if engagement_score >= 40 else \
+           'needs_attention'
+
 @super_analytics_bp.route('/organizations/performance', methods=['GET'])
 @jwt_required()
 def get_organization_performance():
-    """Get detailed performance metrics for all organizations"""
+    """Get detailed performance metrics for all organizations, a page at a time"""
     user_id = get_jwt_identity()
     
     if not is_super_admin(user_id):
         return jsonify({'msg': 'Super Admin access required'}), 403
     
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 200)
+    sort_by = request.args.get('sort_by', 'engagement_score')
+    order = request.args.get('order', 'desc')
+    if sort_by not in PERFORMANCE_SORT_FIELDS:
+        return jsonify({'msg': f'sort_by must be one of: {", ".join(PERFORMANCE_SORT_FIELDS)}'}), 400
+    if order not in ('asc', 'desc'):
+        return jsonify({'msg': 'order must be asc or desc'}), 400
+    
     try:
         # Time periods
         now = datetime.utcnow()
         last_30_days = now - timedelta(days=30)
         
-        # Get organization performance data
-        org_performance = []
-        organizations = Organization.query.all()
+        performance = _organization_performance_query(last_30_days).subquery()
+        direction = desc if order == 'desc' else asc
+        rows = db.session.query(performance).order_by(
+            direction(performance.c[sort_by]), performance.c.id
+        ).limit(per_page).offset((page - 1) * per_page).all()
         
-        for org in organizations:
-            # User count
-            user_count = UserOrganization.query.filter_by(organization_id=org.id).count()
-            
-            # Event metrics
-            total_events = Event.query.filter_by(organization_id=org.id).count()
-            recent_events = Event.query.filter(
-                Event.organization_id == org.id,
-                Event.date >= last_30_days
-            ).count()
-            
-            # RSVP metrics
-            total_rsvps = db.session.query(func.count(RSVP.id)).join(Event).filter(
-                Event.organization_id == org.id
-            ).scalar() or 0
-            
-            recent_rsvps = db.session.query(func.count(RSVP.id)).join(Event).filter(
-                Event.organization_id == org.id,
-                Event.date >= last_30_days
-            ).scalar() or 0
-            
-            # Calculate engagement score (0-100)
-            engagement_score = 0
-            if user_count > 0:
-                events_per_user = total_events / user_count
-                rsvps_per_user = total_rsvps / user_count
-                recent_activity = min(recent_events / max(user_count * 0.1, 1), 1)  # Cap at reasonable activity
-                
-                engagement_score = min(
-                    (events_per_user * 20 + rsvps_per_user * 10 + recent_activity * 50), 100
-                )
-            
-            # Health status
-            health_status = 'excellent' if engagement_score >= 80 else \
-                          'good' if engagement_score >= 60 else \
-                          'fair' if engagement_score >= 40 else \
-                          'needs_attention'
-            
+        # Summary across every organization, not just this page
+        score = performance.c.engagement_score
+        summary = db.session.query(
+            func.count(performance.c.id),
+            func.count(case((score >= 80, 1))),
+            func.count(case((and_(score >= 60, score < 80), 1))),
+            func.count(case((score < 40, 1))),
+            func.avg(score)
+        ).one()
+        total_organizations = summary[0]
+        
+        org_performance = []
+        for row in rows:
+            engagement_score = float(row.engagement_score or 0)
             org_performance.append({
-                'id': org.id,
-                'name': org.name,
+                'id': row.id,
+                'name': row.name,
                 'metrics': {
-                    'user_count': user_count,
-                    'total_events': total_events,
-                    'recent_events_30d': recent_events,
-                    'total_rsvps': total_rsvps,
-                    'recent_rsvps_30d': recent_rsvps,
-                    'events_per_user': round(total_events / max(user_count, 1), 2),
-                    'rsvps_per_event': round(total_rsvps / max(total_events, 1), 1),
+                    'user_count': row.user_count,
+                    'total_events': row.total_events,
+                    'recent_events_30d': row.recent_events_30d,
+                    'total_rsvps': row.total_rsvps,
+                    'recent_rsvps_30d': row.recent_rsvps_30d,
+                    'events_per_user': round(row.total_events / max(row.user_count, 1), 2),
+                    'rsvps_per_event': round(row.total_rsvps / max(row.total_events, 1), 1),
                     'engagement_score': round(engagement_score, 1),
-                    'health_status': health_status
+                    'health_status': _health_status(engagement_score)
                 },
-                'created_at': org.created_at.isoformat() if hasattr(org, 'created_at') and org.created_at else None
+                'created_at': row.created_at.isoformat() if row.created_at else None
             })
         
-        # Sort by engagement score descending
-        org_performance.sort(key=lambda x: x['metrics']['engagement_score'], reverse=True)
-        
         return jsonify({
             'organizations': org_performance,
             'summary': {
-                'total_organizations': len(org_performance),
-                'excellent_health': len([o for o in org_performance if o['metrics']['health_status'] == 'excellent']),
-                'good_health': len([o for o in org_performance if o['metrics']['health_status'] == 'good']),
-                'needs_attention': len([o for o in org_performance if o['metrics']['health_status'] == 'needs_attention']),
-                'avg_engagement_score': round(sum(o['metrics']['engagement_score'] for o in org_performance) / len(org_performance), 1) if org_performance else 0
+                'total_organizations': total_organizations,
+                'excellent_health': summary[1],
+                'good_health': summary[2],
+                'needs_attention': summary[3],
+                'avg_engagement_score': round(float(summary[4] or 0), 1)
+            },
+            'pagination': {
+                'page': page,
+                'pages': (total_organizations + per_page - 1) // per_page,
+                'per_page': per_page,
+                'total': total_organizations,
+                'sort_by': sort_by,
+                'order': order
             },
             'timestamp': now.isoformat()
         })
@@ -299,6 +363,47 @@ def get_organization_performance():
     except Exception as e:
         return jsonify({'msg': f'Error generating organization performance data: {str(e)}'}), 500
 
+USER_ACTIVITY_FIELDS = ['id', 'username', 'email', 'events_created', 'rsvps_made', 'total_activity']
+
+def _user_activity_rows(start_date, end_date):
+    """
+    Yield one dict per user with their activity in the date range.
+    
+    A single query with per-user counts joined in, read through a
+    server-side cursor so memory stays flat however many users there are.
+    """
+    in_range = Event.date.between(start_date, end_date)
+    events_created = db.session.query(
+        Event.created_by.label('user_id'),
+        func.count(Event.id).label('count')
+    ).filter(in_range).group_by(Event.created_by).subquery()
+    rsvps_made = db.session.query(
+        RSVP.user_id,
+        func.count(RSVP.id).label('count')
+    ).join(Event, Event.id == RSVP.event_id).filter(in_range).group_by(RSVP.user_id).subquery()
+    
+    query = db.session.query(
+        User.id,
+        User.username,
+        User.email,
+        func.coalesce(events_created.c.count, 0).label('events_created'),
+        func.coalesce(rsvps_made.c.count, 0).label('rsvps_made')
+    ).outerjoin(
+        events_created, events_created.c.user_id == User.id
+    ).outerjoin(
+        rsvps_made, rsvps_made.c.user_id == User.id
+    ).order_by(User.id).yield_per(STREAM_BATCH_SIZE)
+    
+    for row in query:
+        yield {
+            'id': row.id,
+            'username': row.username,
+            'email': row.email,
+            'events_created': row.events_created,
+            'rsvps_made': row.rsvps_made,
+            'total_activity': row.events_created + row.rsvps_made
+        }
+
 @super_analytics_bp.route('/export/<report_type>', methods=['GET'])
 @jwt_required()
 def export_analytics_report(report_type):
@@ -310,7 +415,7 @@ def export_analytics_report(report_type):
     
     try:
         # Get query parameters
-        format_type = request.args.get('format', 'json')  # json, csv
+        format_type = request.args.get('format', 'json')  # json, csv, ndjson
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
@@ -325,6 +430,9 @@ def export_analytics_report(report_type):
         else:
             end_date = datetime.utcnow()
         
+        if format_type in STREAM_FORMATS and report_type != 'user_activity':
+            return jsonify({'msg': f'{format_type} export is only available for the user_activity report'}), 400
+        
         export_data = {}
         
         if report_type == 'system_overview':
@@ -361,33 +469,11 @@ def export_analytics_report(report_type):
             }
         
         elif report_type == 'user_activity':
-            # Get user activity data
-            users_data = []
-            users = User.query.all()
-            
-            for user in users:
-                user_events = Event.query.filter(
-                    Event.user_id == user.id,
-                    Event.date.between(start_date, end_date)
-                ).count()
-                
-                user_rsvps = RSVP.query.filter(
-                    RSVP.user_id == user.id,
-                    RSVP.event_id.in_(
-                        db.session.query(Event.id).filter(
-                            Event.date.between(start_date, end_date)
-                        ).subquery()
-                    )
-                ).count()
-                
-                users_data.append({
-                    'id': user.id,
-                    'username': user.username,
-                    'email': user.email,
-                    'events_created': user_events,
-                    'rsvps_made': user_rsvps,
-                    'total_activity': user_events + user_rsvps
-                })
+            if format_type in STREAM_FORMATS:
+                return stream_rows(
+                    _user_activity_rows(start_date, end_date), format_type, USER_ACTIVITY_FIELDS,
+                    f"user_activity_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}"
+                )
             
             export_data = {
                 'report_type': 'User Activity',
@@ -395,7 +481,7 @@ def export_analytics_report(report_type):
                     'start': start_date.isoformat(),
                     'end': end_date.isoformat()
                 },
-                'users': users_data,
+                'users': list(_user_activity_rows(start_date, end_date)),
                 'generated_at': datetime.utcnow().isoformat()
             }
         
@@ -1,7 +1,12 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User, Event, EventSurvey, SurveyQuestion, SurveyResponse
+from sqlalchemy.orm import joinedload
+from models import db, Event, EventSurvey, SurveyQuestion, SurveyResponse
+from services.survey_results import SurveyResultsService
+from utils.auth_context import current_user, is_admin
+from utils.db_utils import dialect_insert
 import json
+from collections import defaultdict
 from datetime import datetime
 
 surveys_bp = Blueprint('surveys', __name__)
@@ -13,7 +18,11 @@ def get_event_surveys(event_id):
     """Get surveys for an event"""
     try:
         event = Event.query.get_or_404(event_id)
-        surveys = EventSurvey.query.filter_by(event_id=event_id).order_by(EventSurvey.created_at.desc()).all()
+        surveys = EventSurvey.query.filter_by(event_id=event_id).options(
+            joinedload(EventSurvey.creator)
+        ).order_by(EventSurvey.created_at.desc()).all()
+        SurveyResultsService.ensure_aggregated(surveys)
+        question_counts = SurveyResultsService.question_counts([survey.id for survey in surveys])
         
         surveys_data = []
         for survey in surveys:
@@ -30,8 +39,8 @@ def get_event_surveys(event_id):
                 },
                 'created_at': survey.created_at.isoformat(),
                 'deadline': survey.deadline.isoformat() if survey.deadline else None,
-                'question_count': len(survey.questions),
-                'response_count': len(set(response.user_id for response in survey.responses if response.user_id))
+                'question_count': question_counts.get(survey.id, 0),
+                'response_count': survey.respondent_count
             }
             surveys_data.append(survey_data)
         
@@ -44,9 +53,8 @@ def get_event_surveys(event_id):
 def create_survey(event_id):
     """Create a new survey for an event"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-        if not user or user.role != 'Admin':
+        user = current_user()
+        if not user or not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
         event = Event.query.get_or_404(event_id)
@@ -132,7 +140,7 @@ def get_survey_details(event_id, survey_id):
         user_responses = {}
         if not survey.is_anonymous:
             user_id = get_jwt_identity()
-            user = User.query.get(int(user_id))
+            user = current_user()
             responses = SurveyResponse.query.filter_by(survey_id=survey_id, user_id=user.id).all()
             for response in responses:
                 user_responses[response.question_id] = response.response_value
@@ -162,7 +170,7 @@ def submit_survey_responses(event_id, survey_id):
     """Submit responses to a survey"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
+        user = current_user()
         
         survey = EventSurvey.query.get_or_404(survey_id)
         if survey.event_id != event_id:
@@ -178,35 +186,54 @@ def submit_survey_responses(event_id, survey_id):
         data = request.get_json()
         responses = data.get('responses', {})
         
-        # Process each response
+        # Only answers to this survey's questions count
+        questions = {q.id: q for q in SurveyQuestion.query.filter_by(survey_id=survey_id)}
+        submitted = {}
         for question_id, response_value in responses.items():
             question_id = int(question_id)
-            
-            # Verify question belongs to this survey
-            question = SurveyQuestion.query.get(question_id)
-            if not question or question.survey_id != survey_id:
+            if question_id not in questions:
                 continue
-            
-            # Check if response already exists
-            existing_response = SurveyResponse.query.filter_by(
-                survey_id=survey_id,
-                question_id=question_id,
-                user_id=user.id if not survey.is_anonymous else None
-            ).first()
-            
-            if existing_response:
+            if isinstance(response_value, list):
+                response_value = json.dumps(response_value)
+            submitted[question_id] = response_value
+        
+        # Anonymous answers are matched to earlier ones by respondent key, not user
+        respondent_key = SurveyResultsService.respondent_key(survey, user.id)
+        if survey.is_anonymous:
+            mine = SurveyResponse.query.filter_by(survey_id=survey_id, respondent_key=respondent_key)
+        else:
+            mine = SurveyResponse.query.filter_by(survey_id=survey_id, user_id=user.id)
+        existing = {r.question_id: r for r in mine}
+        previous = {question_id: existing[question_id].response_value
+                    for question_id in submitted if question_id in existing}
+        
+        for question_id, response_value in submitted.items():
+            if question_id in existing:
                 # Update existing response
-                existing_response.response_value = response_value
-            else:
-                # Create new response
-                new_response = SurveyResponse(
-                    survey_id=survey_id,
-                    question_id=question_id,
-                    user_id=user.id if not survey.is_anonymous else None,
-                    response_value=response_value
-                )
-                db.session.add(new_response)
-        
+                existing[question_id].response_value = response_value
+        
+        new_rows = [{
+            'survey_id': survey_id,
+            'question_id': question_id,
+            'user_id': None if survey.is_anonymous else user.id,
+            'respondent_key': respondent_key,
+            'response_value': response_value,
+            'created_at': datetime.utcnow()
+        } for question_id, response_value in submitted.items() if question_id not in existing]
+        if new_rows:
+            conflict_target = ['question_id', 'respondent_key'] if survey.is_anonymous else ['user_id', 'question_id']
+            inserted = set(db.session.execute(
+                dialect_insert(SurveyResponse).values(new_rows)
+                .on_conflict_do_nothing(index_elements=conflict_target)
+                .returning(SurveyResponse.question_id)
+            ).scalars())
+            # A concurrent submission by the same member stored these first; leave its totals alone
+            submitted = {question_id: value for question_id, value in submitted.items()
+                         if question_id in existing or question_id in inserted}
+        
+        db.session.flush()
+        SurveyResultsService.record_submission(survey_id, questions, previous, submitted,
+                                               new_respondent=bool(submitted) and not existing)
         db.session.commit()
         
         return jsonify({'message': 'Survey responses submitted successfully'}), 200
@@ -219,16 +246,35 @@ def get_survey_results(event_id, survey_id):
     """Get survey results (Admin only)"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-        if not user or user.role != 'Admin':
+        user = current_user()
+        if not user or not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
         survey = EventSurvey.query.get_or_404(survey_id)
         if survey.event_id != event_id:
             return jsonify({'error': 'Survey does not belong to this event'}), 400
         
-        # Get questions and responses
+        # Totals come from the survey's aggregates; see services/survey_results.py
+        SurveyResultsService.ensure_aggregated([survey])
         questions = SurveyQuestion.query.filter_by(survey_id=survey_id).order_by(SurveyQuestion.display_order).all()
+        aggregates = SurveyResultsService.question_results(survey_id)
+        
+        # Individual responses (if not anonymous), loaded in one query; the
+        # summary view skips them with ?include_responses=false
+        individual_responses = defaultdict(list)
+        include_individual = not survey.is_anonymous and request.args.get('include_responses', 'true').lower() != 'false'
+        if include_individual:
+            responses = SurveyResponse.query.filter_by(survey_id=survey_id).options(
+                joinedload(SurveyResponse.user)
+            ).order_by(SurveyResponse.id)
+            for response in responses:
+                individual_responses[response.question_id].append({
+                    'user_id': response.user_id,
+                    'username': response.user.username if response.user else 'Anonymous',
+                    'name': response.user.name if response.user else 'Anonymous',
+                    'response_value': response.response_value,
+                    'submitted_at': response.created_at.isoformat()
+                })
         
         results = {
             'survey': {
@@ -236,68 +282,36 @@ def get_survey_results(event_id, survey_id):
                 'title': survey.title,
                 'description': survey.description,
                 'is_anonymous': survey.is_anonymous,
-                'total_responses': len(set(response.user_id for response in survey.responses if response.user_id))
+                'total_responses': survey.respondent_count
             },
             'questions': []
         }
         
         for question in questions:
-            responses = SurveyResponse.query.filter_by(question_id=question.id).all()
+            stats = aggregates[question.id]['stats']
+            answers = aggregates[question.id]['answers']
             
             question_result = {
                 'id': question.id,
                 'question_text': question.question_text,
                 'question_type': question.question_type,
                 'question_options': json.loads(question.question_options) if question.question_options else None,
-                'total_responses': len(responses),
+                'total_responses': stats.response_count if stats else 0,
                 'responses': []
             }
             
-            # Aggregate responses
             if question.question_type in ['multiple_choice', 'checkbox']:
-                # Count responses by option
-                response_counts = {}
-                for response in responses:
-                    value = response.response_value
-                    if value:
-                        if question.question_type == 'checkbox':
-                            # Handle multiple selections
-                            selections = json.loads(value) if value.startswith('[') else [value]
-                            for selection in selections:
-                                response_counts[selection] = response_counts.get(selection, 0) + 1
-                        else:
-                            response_counts[value] = response_counts.get(value, 0) + 1
-                
-                question_result['response_counts'] = response_counts
+                question_result['response_counts'] = answers
             
             elif question.question_type == 'rating':
-                # Calculate average rating
-                ratings = []
-                for response in responses:
-                    try:
-                        rating = float(response.response_value)
-                        ratings.append(rating)
-                    except (ValueError, TypeError):
-                        continue
-                
-                if ratings:
-                    question_result['average_rating'] = sum(ratings) / len(ratings)
+                if stats and stats.rating_count:
+                    question_result['average_rating'] = stats.rating_sum / stats.rating_count
                     question_result['rating_distribution'] = {
-                        str(i): ratings.count(i) for i in range(1, 6)
+                        str(i): answers.get(str(i), 0) for i in range(1, 6)
                     }
             
-            # Individual responses (if not anonymous)
-            if not survey.is_anonymous:
-                individual_responses = []
-                for response in responses:
-                    individual_responses.append({
-                        'user_id': response.user_id,
-                        'username': response.user.username if response.user else 'Anonymous',
-                        'name': response.user.name if response.user else 'Anonymous',
-                        'response_value': response.response_value,
-                        'submitted_at': response.created_at.isoformat()
-                    })
-                question_result['individual_responses'] = individual_responses
+            if include_individual:
+                question_result['individual_responses'] = individual_responses[question.id]
             
             results['questions'].append(question_result)
         
@@ -310,9 +324,7 @@ def get_survey_results(event_id, survey_id):
 def update_survey(event_id, survey_id):
     """Update a survey"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-        if not user or user.role != 'Admin':
+        if not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
         survey = EventSurvey.query.get_or_404(survey_id)
@@ -352,9 +364,7 @@ def update_survey(event_id, survey_id):
 def delete_survey(event_id, survey_id):
     """Delete a survey"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-        if not user or user.role != 'Admin':
+        if not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
         survey = EventSurvey.query.get_or_404(survey_id)
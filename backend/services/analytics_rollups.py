@@ -0,0 +1,360 @@
+"""
+Analytics Rollups for BandSync
+
+Keeps small, pre-aggregated tables behind the analytics dashboards so they
+don't re-scan every RSVP/Event/Message row on each load:
+
+- analytics_event_rollups:    RSVP totals per event
+- analytics_member_rollups:   RSVP totals per (organization, member, event day)
+- analytics_activity_rollups: RSVPs made, messages, emails and substitute
+                              requests per (organization, day)
+
+Event and member rollups are kept current from RSVP/Event writes: each flush
+appends the (organization, event day) pairs it touched to
+analytics_dirty_days in the same transaction. Markers are plain inserts with
+no unique key, so a burst of RSVPs to one gig never queues on a shared row;
+the compactor dedupes them and recomputes each day once. Activity rollups
+are append-mostly and are filled up to yesterday by the same compactor;
+today's activity is always read live.
+
+Dashboard reads never write. The backfill, dirty days and activity are all
+handled by the scheduler's 15-minute compaction, so event and member figures
+can lag writes by up to one compaction interval.
+"""
+
+import os
+import logging
+from collections import defaultdict
+from datetime import datetime, date, time, timedelta
+from sqlalchemy import select, delete, func, case, literal, and_, or_
+from sqlalchemy import event as sa_event, inspect
+from sqlalchemy.orm import Session
+from models import (
+    db, Event, RSVP, Message, MessageThread, EmailLog, SubstituteRequest,
+    AnalyticsEventRollup, AnalyticsMemberRollup, AnalyticsActivityRollup,
+    AnalyticsDirtyDay, AnalyticsRollupState
+)
+from utils.db_utils import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_FIELDS = ('rsvps', 'messages', 'emails', 'emails_sent', 'emails_failed',
+                   'substitute_requests', 'substitutes_filled', 'substitute_response_hours')
+
+
+def _as_date(value):
+    """func.date() returns a string on SQLite and a date on PostgreSQL"""
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def _day_bounds(day):
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+
+class AnalyticsRollupService:
+    """Maintain and read the analytics rollup tables"""
+
+    # Activity days are re-rolled this far back on every compaction so late
+    # changes (e.g. a substitute request being filled) are picked up
+    ACTIVITY_LOOKBACK_DAYS = int(os.environ.get('ANALYTICS_ACTIVITY_LOOKBACK_DAYS', 7))
+    # Days per activity rollup statement when backfilling history
+    ACTIVITY_CHUNK_DAYS = 31
+
+    @staticmethod
+    def compact():
+        """
+        Periodic maintenance: backfill on first run, recompute every dirty
+        event day and roll activity forward to yesterday.
+
+        Returns:
+            dict: Counts for the run log
+        """
+        backfilled = False
+        if not AnalyticsRollupService._get_state('backfill'):
+            AnalyticsRollupService._mark_all_days_dirty()
+            backfilled = True
+        dirty_days = 0
+        while True:
+            refreshed = AnalyticsRollupService.refresh_dirty_days()
+            if not refreshed:
+                break
+            dirty_days += refreshed
+        return {
+            'backfilled': backfilled,
+            'dirty_days': dirty_days,
+            'activity_days': AnalyticsRollupService.roll_activity()
+        }
+
+    # =========================================================================
+    # Event and member rollups
+    # =========================================================================
+
+    @staticmethod
+    def mark_dirty(session, keys=(), event_ids=None):
+        """
+        Flag (organization_id, day) pairs - and the days of the given events
+        (IDs or a SELECT of IDs) - for recomputation. Runs on the session's
+        connection so the markers commit or roll back with the change that
+        caused them. Markers are appended, never upserted; duplicates are
+        folded together by refresh_dirty_days.
+        """
+        connection = session.connection()
+        now = datetime.utcnow()
+
+        if keys:
+            connection.execute(AnalyticsDirtyDay.__table__.insert().values([
+                {'organization_id': org_id, 'day': day, 'marked_at': now} for org_id, day in keys
+            ]))
+        if event_ids is not None and not (isinstance(event_ids, (set, list, tuple)) and not event_ids):
+            days = select(
+                Event.organization_id, func.date(Event.date), literal(now)
+            ).where(
+                Event.id.in_(event_ids), Event.date.isnot(None)
+            ).distinct()
+            connection.execute(AnalyticsDirtyDay.__table__.insert().from_select(
+                ['organization_id', 'day', 'marked_at'], days
+            ))
+
+    @staticmethod
+    def refresh_dirty_days(org_id=None, limit=5000):
+        """
+        Recompute event and member rollups for dirty days, once per distinct
+        (organization, day) however many markers it has.
+
+        Returns:
+            int: Number of days recomputed
+        """
+        query = AnalyticsDirtyDay.query
+        if org_id is not None:
+            query = query.filter(AnalyticsDirtyDay.organization_id == org_id)
+        dirty = query.order_by(AnalyticsDirtyDay.id).limit(limit).with_for_update(skip_locked=True).all()
+        if not dirty:
+            return 0
+
+        days = {(marker.organization_id, _as_date(marker.day)) for marker in dirty}
+        for marker_org_id, day in sorted(days):
+            AnalyticsRollupService._refresh_day(marker_org_id, day)
+        # Only the markers read above are cleared; a day marked again while
+        # we worked keeps its newer marker and is recomputed next time
+        db.session.execute(delete(AnalyticsDirtyDay).where(
+            AnalyticsDirtyDay.id.in_([marker.id for marker in dirty])
+        ))
+        db.session.commit()
+
+        logger.info(f"Refreshed analytics rollups for {len(days)} dirty days ({len(dirty)} markers)")
+        return len(days)
+
+    @staticmethod
+    def _refresh_day(org_id, day):
+        """Rebuild the event and member rollup rows for one organization/day"""
+        start, end = _day_bounds(day)
+        on_day = and_(Event.organization_id == org_id, Event.date >= start, Event.date < end)
+        yes = func.count(case((RSVP.status == 'Yes', 1)))
+        no = func.count(case((RSVP.status == 'No', 1)))
+        maybe = func.count(case((RSVP.status == 'Maybe', 1)))
+
+        # An event that moved here from another day may still have a row under its old day
+        db.session.execute(delete(AnalyticsEventRollup).where(or_(
+            and_(AnalyticsEventRollup.organization_id == org_id, AnalyticsEventRollup.day == day),
+            AnalyticsEventRollup.event_id.in_(select(Event.id).where(on_day))
+        )))
+        db.session.execute(AnalyticsEventRollup.__table__.insert().from_select(
+            ['event_id', 'organization_id', 'day', 'event_type', 'responses', 'yes_count', 'no_count', 'maybe_count'],
+            select(
+                Event.id, Event.organization_id, literal(day, db.Date), Event.type,
+                func.count(RSVP.id), yes, no, maybe
+            ).select_from(Event).outerjoin(RSVP, RSVP.event_id == Event.id).where(on_day).group_by(
+                Event.id, Event.organization_id, Event.type
+            )
+        ))
+
+        db.session.execute(delete(AnalyticsMemberRollup).where(
+            AnalyticsMemberRollup.organization_id == org_id, AnalyticsMemberRollup.day == day
+        ))
+        db.session.execute(AnalyticsMemberRollup.__table__.insert().from_select(
+            ['organization_id', 'day', 'user_id', 'responses', 'yes_count', 'no_count', 'maybe_count', 'last_rsvp_at'],
+            select(
+                literal(org_id), literal(day, db.Date), RSVP.user_id,
+                func.count(RSVP.id), yes, no, maybe, func.max(RSVP.created_at)
+            ).select_from(RSVP).join(Event, Event.id == RSVP.event_id).where(on_day).group_by(RSVP.user_id)
+        ))
+
+    @staticmethod
+    def _mark_all_days_dirty():
+        """First run: queue every (organization, event day) in history for a rebuild"""
+        AnalyticsRollupService.mark_dirty(db.session, event_ids=select(Event.id).where(Event.date.isnot(None)))
+        AnalyticsRollupService._set_state('backfill', datetime.utcnow().date())
+        db.session.commit()
+
+    # =========================================================================
+    # Activity rollups
+    # =========================================================================
+
+    @staticmethod
+    def roll_activity(through=None):
+        """
+        Fill activity rollups up to `through` (default: yesterday).
+
+        Returns:
+            int: Number of days rolled
+        """
+        through = through or datetime.utcnow().date() - timedelta(days=1)
+        rolled_through = AnalyticsRollupService._get_state('activity')
+        if rolled_through is not None:
+            start = rolled_through - timedelta(days=AnalyticsRollupService.ACTIVITY_LOOKBACK_DAYS - 1)
+        else:
+            start = AnalyticsRollupService._first_activity_day()
+        if start is None or start > through:
+            return 0
+
+        chunk_start = start
+        while chunk_start <= through:
+            chunk_end = min(chunk_start + timedelta(days=AnalyticsRollupService.ACTIVITY_CHUNK_DAYS - 1), through)
+            totals = AnalyticsRollupService._collect_activity(
+                datetime.combine(chunk_start, time.min), _day_bounds(chunk_end)[1]
+            )
+            db.session.execute(delete(AnalyticsActivityRollup).where(
+                AnalyticsActivityRollup.day >= chunk_start, AnalyticsActivityRollup.day <= chunk_end
+            ))
+            if totals:
+                db.session.execute(AnalyticsActivityRollup.__table__.insert(), [
+                    {'organization_id': org_id, 'day': day, **counts}
+                    for (org_id, day), counts in totals.items()
+                ])
+            AnalyticsRollupService._set_state('activity', chunk_end)
+            db.session.commit()
+            chunk_start = chunk_end + timedelta(days=1)
+
+        days = (through - start).days + 1
+        logger.info(f"Rolled up analytics activity for {days} days through {through}")
+        return days
+
+    @staticmethod
+    def activity_totals(org_id, start_date):
+        """
+        Sum an organization's activity from start_date until now: rolled-up
+        days from the rollup table, anything newer straight from the source tables.
+        """
+        totals = dict.fromkeys(ACTIVITY_FIELDS, 0)
+        rolled_through = AnalyticsRollupService._get_state('activity')
+        live_from = start_date
+
+        if rolled_through is not None and rolled_through >= start_date.date():
+            row = db.session.query(*[
+                func.coalesce(func.sum(getattr(AnalyticsActivityRollup, field)), 0) for field in ACTIVITY_FIELDS
+            ]).filter(
+                AnalyticsActivityRollup.organization_id == org_id,
+                AnalyticsActivityRollup.day >= start_date.date(),
+                AnalyticsActivityRollup.day <= rolled_through
+            ).one()
+            totals.update(zip(ACTIVITY_FIELDS, row))
+            live_from = _day_bounds(rolled_through)[1]
+
+        for counts in AnalyticsRollupService._collect_activity(live_from, datetime.utcnow() + timedelta(seconds=1),
+                                                               org_id).values():
+            for field in ACTIVITY_FIELDS:
+                totals[field] += counts[field]
+        return totals
+
+    @staticmethod
+    def _collect_activity(start, end, org_id=None):
+        """Activity counts from the source tables in [start, end), keyed by (organization_id, day)"""
+        totals = defaultdict(lambda: dict.fromkeys(ACTIVITY_FIELDS, 0))
+
+        def org_filter(column):
+            return [column == org_id] if org_id is not None else []
+
+        rsvp_day = func.date(RSVP.created_at)
+        for org, day, count in db.session.query(Event.organization_id, rsvp_day, func.count(RSVP.id)).join(
+            Event, Event.id == RSVP.event_id
+        ).filter(
+            RSVP.created_at >= start, RSVP.created_at < end, *org_filter(Event.organization_id)
+        ).group_by(Event.organization_id, rsvp_day):
+            totals[(org, _as_date(day))]['rsvps'] = count
+
+        message_day = func.date(Message.sent_at)
+        for org, day, count in db.session.query(MessageThread.organization_id, message_day, func.count(Message.id)).join(
+            MessageThread, MessageThread.id == Message.thread_id
+        ).filter(
+            Message.sent_at >= start, Message.sent_at < end, *org_filter(MessageThread.organization_id)
+        ).group_by(MessageThread.organization_id, message_day):
+            totals[(org, _as_date(day))]['messages'] = count
+
+        email_day = func.date(EmailLog.sent_at)
+        for org, day, count, sent, failed in db.session.query(
+            EmailLog.organization_id, email_day, func.count(EmailLog.id),
+            func.count(case((EmailLog.status == 'sent', 1))),
+            func.count(case((EmailLog.status == 'failed', 1)))
+        ).filter(
+            EmailLog.sent_at >= start, EmailLog.sent_at < end, *org_filter(EmailLog.organization_id)
+        ).group_by(EmailLog.organization_id, email_day):
+            totals[(org, _as_date(day))].update(emails=count, emails_sent=sent, emails_failed=failed)
+
+        # Substitute requests are few; response times are summed here to stay database-agnostic
+        for org, created_at, status, filled_at in db.session.query(
+            Event.organization_id, SubstituteRequest.created_at, SubstituteRequest.status, SubstituteRequest.filled_at
+        ).join(Event, Event.id == SubstituteRequest.event_id).filter(
+            SubstituteRequest.created_at >= start, SubstituteRequest.created_at < end, *org_filter(Event.organization_id)
+        ):
+            counts = totals[(org, created_at.date())]
+            counts['substitute_requests'] += 1
+            if status == 'filled':
+                counts['substitutes_filled'] += 1
+                if filled_at:
+                    counts['substitute_response_hours'] += (filled_at - created_at).total_seconds() / 3600
+
+        return totals
+
+    @staticmethod
+    def _first_activity_day():
+        firsts = [
+            db.session.query(func.min(RSVP.created_at)).scalar(),
+            db.session.query(func.min(Message.sent_at)).scalar(),
+            db.session.query(func.min(EmailLog.sent_at)).scalar(),
+            db.session.query(func.min(SubstituteRequest.created_at)).scalar()
+        ]
+        firsts = [first for first in firsts if first]
+        return min(firsts).date() if firsts else None
+
+    # =========================================================================
+    # State
+    # =========================================================================
+
+    @staticmethod
+    def _get_state(name):
+        state = db.session.get(AnalyticsRollupState, name)
+        return _as_date(state.rolled_through) if state and state.rolled_through else None
+
+    @staticmethod
+    def _set_state(name, rolled_through):
+        state = db.session.get(AnalyticsRollupState, name)
+        if state is None:
+            state = AnalyticsRollupState(name=name)
+            db.session.add(state)
+        state.rolled_through = rolled_through
+        state.updated_at = datetime.utcnow()
+
+
+def _event_keys(event):
+    """(organization_id, day) for an Event before and after this flush"""
+    state = inspect(event)
+    org_history = state.attrs.organization_id.history
+    date_history = state.attrs.date.history
+    orgs = set(org_history.added or org_history.unchanged or ()) | set(org_history.deleted or ())
+    dates = set(date_history.added or date_history.unchanged or ()) | set(date_history.deleted or ())
+    return {(org, when.date()) for org in orgs for when in dates if org and when}
+
+
+@sa_event.listens_for(Session, 'after_flush')
+def _mark_analytics_dirty(session, flush_context):
+    """Flag the event days touched by Event/RSVP writes in this flush"""
+    keys = set()
+    event_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Event):
+            keys |= _event_keys(obj)
+        elif isinstance(obj, RSVP) and obj.event_id:
+            event_ids.add(obj.event_id)
+    if keys or event_ids:
+        AnalyticsRollupService.mark_dirty(session, keys, event_ids or None)
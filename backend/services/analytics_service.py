@@ -25,8 +25,10 @@ from datetime import datetime, timedelta
 from sqlalchemy import func, and_, case, desc
 from models import (
     db, User, Event, RSVP, Organization, Section, 
-    Message, MessageThread, EmailLog, SubstituteRequest
+    Message, MessageThread, EmailLog, SubstituteRequest,
+    AnalyticsEventRollup, AnalyticsMemberRollup
 )
+from services.analytics_rollups import AnalyticsRollupService
 
 class AnalyticsService:
     
@@ -41,15 +43,12 @@ class AnalyticsService:
         total_events = Event.query.filter_by(organization_id=org_id).count()
         
         # Recent activity
-        recent_events = Event.query.filter(
-            Event.organization_id == org_id,
-            Event.date >= start_date
+        recent_events = AnalyticsEventRollup.query.filter(
+            AnalyticsEventRollup.organization_id == org_id,
+            AnalyticsEventRollup.day >= start_date.date()
         ).count()
         
-        recent_rsvps = RSVP.query.join(Event, RSVP.event_id == Event.id).filter(
-            Event.organization_id == org_id,
-            RSVP.created_at >= start_date
-        ).count()
+        recent_rsvps = AnalyticsRollupService.activity_totals(org_id, start_date)['rsvps']
         
         # Simplified engagement rate calculation
         # Calculate as: (actual RSVPs / (total members * recent events)) * 100
@@ -73,51 +72,51 @@ class AnalyticsService:
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        # Member engagement scores
+        # Member engagement scores, summed from the daily member rollups
+        window = db.session.query(
+            AnalyticsMemberRollup.user_id,
+            func.sum(AnalyticsMemberRollup.responses).label('total_rsvps'),
+            func.sum(AnalyticsMemberRollup.yes_count).label('yes_rsvps'),
+            func.sum(AnalyticsMemberRollup.no_count).label('no_rsvps'),
+            func.sum(AnalyticsMemberRollup.maybe_count).label('maybe_rsvps'),
+            func.max(AnalyticsMemberRollup.last_rsvp_at).label('last_rsvp')
+        ).filter(
+            AnalyticsMemberRollup.organization_id == org_id,
+            AnalyticsMemberRollup.day >= start_date.date()
+        ).group_by(AnalyticsMemberRollup.user_id).subquery()
+        
         member_stats = db.session.query(
             User.id,
             User.name,
             User.username,
             User.email,
             User.section_id,
-            func.count(RSVP.id).label('total_rsvps'),
-            func.count(case((RSVP.status == 'Yes', 1))).label('yes_rsvps'),
-            func.count(case((RSVP.status == 'No', 1))).label('no_rsvps'),
-            func.count(case((RSVP.status == 'Maybe', 1))).label('maybe_rsvps'),
-            func.max(RSVP.created_at).label('last_rsvp')
-        ).select_from(User).outerjoin(RSVP, RSVP.user_id == User.id).outerjoin(Event, Event.id == RSVP.event_id).filter(
-            User.organization_id == org_id,
-            db.or_(Event.date >= start_date, Event.date.is_(None))
-        ).group_by(User.id).all()
-        
-        # Section participation - fix nested aggregate function
-        section_stats = db.session.query(
-            Section.id.label('section_id'),
-            Section.name.label('section_name'),
-            func.count(func.distinct(User.id)).label('member_count')
-        ).select_from(Section).outerjoin(User, User.section_id == Section.id).filter(
-            Section.organization_id == org_id
-        ).group_by(Section.id, Section.name).all()
-        
-        # Calculate average participation per section separately
-        section_participation = []
-        for section in section_stats:
-            # Get RSVP count for this section's users
-            rsvp_count = db.session.query(func.count(RSVP.id)).select_from(RSVP).join(User, RSVP.user_id == User.id).join(Event, RSVP.event_id == Event.id).filter(
-                User.section_id == section.section_id,
-                Event.organization_id == org_id,
-                Event.date >= start_date
-            ).scalar() or 0
-            
-            avg_participation = (rsvp_count / section.member_count) if section.member_count > 0 else 0
-            section_participation.append({
-                'section_name': section.section_name,
-                'member_count': section.member_count,
+            func.coalesce(window.c.total_rsvps, 0).label('total_rsvps'),
+            func.coalesce(window.c.yes_rsvps, 0).label('yes_rsvps'),
+            func.coalesce(window.c.no_rsvps, 0).label('no_rsvps'),
+            func.coalesce(window.c.maybe_rsvps, 0).label('maybe_rsvps'),
+            window.c.last_rsvp
+        ).select_from(User).outerjoin(window, window.c.user_id == User.id).filter(
+            User.organization_id == org_id
+        ).all()
+        
+        # Section participation, from the member rows already loaded
+        section_members = {}
+        section_rsvps = {}
+        for m in member_stats:
+            section_members[m.section_id] = section_members.get(m.section_id, 0) + 1
+            section_rsvps[m.section_id] = section_rsvps.get(m.section_id, 0) + m.total_rsvps
+        
+        section_stats = []
+        for section in Section.query.filter_by(organization_id=org_id).order_by(Section.id).all():
+            member_count = section_members.get(section.id, 0)
+            avg_participation = (section_rsvps.get(section.id, 0) / member_count) if member_count > 0 else 0
+            section_stats.append({
+                'section_name': section.name,
+                'member_count': member_count,
                 'avg_participation': round(avg_participation, 1)
             })
         
-        section_stats = section_participation
-        
         # Top participants
         top_participants = sorted(
             member_stats, 
@@ -167,50 +166,40 @@ class AnalyticsService:
             Event.title,
             Event.date,
             Event.type,
-            func.count(RSVP.id).label('total_responses'),
-            func.count(case((RSVP.status == 'Yes', 1))).label('yes_count'),
-            func.count(case((RSVP.status == 'No', 1))).label('no_count'),
-            func.count(case((RSVP.status == 'Maybe', 1))).label('maybe_count')
-        ).select_from(Event).outerjoin(RSVP, RSVP.event_id == Event.id).filter(
-            Event.organization_id == org_id,
-            Event.date >= start_date
-        ).group_by(Event.id).order_by(desc(Event.date)).all()
-        
-        # Event type performance - simplified approach
-        type_stats = db.session.query(
-            Event.type,
-            func.count(Event.id).label('event_count'),
-            func.count(case((RSVP.status == 'Yes', 1))).label('total_attendance'),
-            func.count(RSVP.id).label('total_responses')
-        ).select_from(Event).outerjoin(RSVP, RSVP.event_id == Event.id).filter(
-            Event.organization_id == org_id,
-            Event.date >= start_date
-        ).group_by(Event.type).all()
-        
-        # Calculate averages manually
-        type_performance = []
-        for event_type in type_stats:
-            avg_attendance = (event_type.total_attendance / event_type.event_count) if event_type.event_count > 0 else 0
-            avg_responses = (event_type.total_responses / event_type.event_count) if event_type.event_count > 0 else 0
+            AnalyticsEventRollup.responses.label('total_responses'),
+            AnalyticsEventRollup.yes_count,
+            AnalyticsEventRollup.no_count,
+            AnalyticsEventRollup.maybe_count
+        ).select_from(AnalyticsEventRollup).join(Event, Event.id == AnalyticsEventRollup.event_id).filter(
+            AnalyticsEventRollup.organization_id == org_id,
+            AnalyticsEventRollup.day >= start_date.date()
+        ).order_by(desc(Event.date)).all()
+        
+        # Event type performance and monthly trends, from the per-event rows
+        type_totals = {}
+        monthly_totals = {}
+        for e in event_stats:
+            totals = type_totals.setdefault(e.type, {'event_count': 0, 'attendance': 0, 'responses': 0})
+            totals['event_count'] += 1
+            totals['attendance'] += e.yes_count
+            totals['responses'] += e.total_responses
             
-            type_performance.append({
-                'event_type': event_type.type,
-                'event_count': event_type.event_count,
-                'avg_attendance': round(avg_attendance, 1),
-                'avg_responses': round(avg_responses, 1)
-            })
-        
-        type_stats = type_performance
-        
-        # Monthly trends
-        monthly_stats = db.session.query(
-            func.date_trunc('month', Event.date).label('month'),
-            func.count(Event.id).label('event_count'),
-            func.count(case((RSVP.status == 'Yes', 1))).label('total_attendance')
-        ).select_from(Event).outerjoin(RSVP, RSVP.event_id == Event.id).filter(
-            Event.organization_id == org_id,
-            Event.date >= start_date
-        ).group_by(func.date_trunc('month', Event.date)).order_by('month').all()
+            month = monthly_totals.setdefault(e.date.strftime('%Y-%m'), {'event_count': 0, 'total_attendance': 0})
+            month['event_count'] += 1
+            month['total_attendance'] += e.yes_count
+        
+        type_stats = [
+            {
+                'event_type': event_type,
+                'event_count': totals['event_count'],
+                'avg_attendance': round(totals['attendance'] / totals['event_count'], 1),
+                'avg_responses': round(totals['responses'] / totals['event_count'], 1)
+            } for event_type, totals in type_totals.items()
+        ]
+        
+        monthly_stats = [
+            {'month': month, **totals} for month, totals in sorted(monthly_totals.items())
+        ]
         
         return {
             'event_stats': [
@@ -227,13 +216,7 @@ class AnalyticsService:
                 } for e in event_stats
             ],
             'type_stats': type_stats,
-            'monthly_trends': [
-                {
-                    'month': m.month.strftime('%Y-%m') if m.month else None,
-                    'event_count': m.event_count,
-                    'total_attendance': m.total_attendance
-                } for m in monthly_stats
-            ]
+            'monthly_trends': monthly_stats
         }
     
     @staticmethod
@@ -242,9 +225,10 @@ class AnalyticsService:
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        # Message statistics
+        activity = AnalyticsRollupService.activity_totals(org_id, start_date)
+        
+        # Distinct threads/senders can't be summed across days, so count them directly
         message_stats = db.session.query(
-            func.count(Message.id).label('total_messages'),
             func.count(func.distinct(MessageThread.id)).label('active_threads'),
             func.count(func.distinct(Message.sender_id)).label('active_users')
         ).select_from(Message).join(MessageThread).filter(
@@ -252,43 +236,27 @@ class AnalyticsService:
             Message.sent_at >= start_date
         ).first()
         
-        # Email statistics
-        email_stats = db.session.query(
-            func.count(EmailLog.id).label('total_emails'),
-            func.count(case((EmailLog.status == 'sent', 1))).label('sent_emails'),
-            func.count(case((EmailLog.status == 'failed', 1))).label('failed_emails')
-        ).filter(
-            EmailLog.organization_id == org_id,
-            EmailLog.sent_at >= start_date
-        ).first()
-        
-        # Substitute request analytics
-        substitute_stats = db.session.query(
-            func.count(SubstituteRequest.id).label('total_requests'),
-            func.count(case((SubstituteRequest.status == 'filled', 1))).label('fulfilled_requests'),
-            func.avg(func.extract('epoch', SubstituteRequest.filled_at - SubstituteRequest.created_at) / 3600).label('avg_response_hours')
-        ).select_from(SubstituteRequest).join(Event).filter(
-            Event.organization_id == org_id,
-            SubstituteRequest.created_at >= start_date
-        ).first()
+        total_emails = activity['emails']
+        total_requests = activity['substitute_requests']
+        fulfilled_requests = activity['substitutes_filled']
         
         return {
             'messaging': {
-                'total_messages': message_stats.total_messages or 0,
+                'total_messages': activity['messages'],
                 'active_threads': message_stats.active_threads or 0,
                 'active_users': message_stats.active_users or 0
             },
             'email': {
-                'total_emails': email_stats.total_emails or 0,
-                'sent_emails': email_stats.sent_emails or 0,
-                'failed_emails': email_stats.failed_emails or 0,
-                'success_rate': round((email_stats.sent_emails / email_stats.total_emails * 100) if email_stats.total_emails > 0 else 0, 1)
+                'total_emails': total_emails,
+                'sent_emails': activity['emails_sent'],
+                'failed_emails': activity['emails_failed'],
+                'success_rate': round((activity['emails_sent'] / total_emails * 100) if total_emails > 0 else 0, 1)
             },
             'substitution': {
-                'total_requests': substitute_stats.total_requests or 0,
-                'fulfilled_requests': substitute_stats.fulfilled_requests or 0,
-                'fulfillment_rate': round((substitute_stats.fulfilled_requests / substitute_stats.total_requests * 100) if substitute_stats.total_requests > 0 else 0, 1),
-                'avg_response_hours': round(substitute_stats.avg_response_hours or 0, 1)
+                'total_requests': total_requests,
+                'fulfilled_requests': fulfilled_requests,
+                'fulfillment_rate': round((fulfilled_requests / total_requests * 100) if total_requests > 0 else 0, 1),
+                'avg_response_hours': round((activity['substitute_response_hours'] / fulfilled_requests) if fulfilled_requests > 0 else 0, 1)
             }
         }
     
@@ -299,7 +267,6 @@ class AnalyticsService:
         # Get recent metrics (last 30 days)
         overview = AnalyticsService.get_organization_overview(org_id, 30)
         member_analytics = AnalyticsService.get_member_analytics(org_id, 30)
-        event_analytics = AnalyticsService.get_event_analytics(org_id, 30)
         comm_analytics = AnalyticsService.get_communication_analytics(org_id, 30)
         
         # Calculate health metrics (0-100 scale)
@@ -0,0 +1,150 @@
+"""
+Audit Sink for BandSync
+Buffers audit log and security event records in memory and writes them in
+batches from a background thread, on its own connection, so audited requests
+pay for a list append instead of an INSERT and COMMIT on their own session.
+
+Loss is bounded: at most AUDIT_BUFFER_SIZE records are held in memory. When
+the buffer is full new records are dropped and counted (see `dropped`), and a
+batch that still fails after AUDIT_WRITE_RETRIES retries is dropped and
+logged. The buffer is flushed on interpreter exit, so a graceful worker
+shutdown loses nothing; a hard kill loses at most what's buffered.
+"""
+
+import os
+import time
+import atexit
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from models import db, AuditLog, SecurityEvent
+
+logger = logging.getLogger(__name__)
+
+AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 100))
+AUDIT_FLUSH_SECONDS = float(os.environ.get('AUDIT_FLUSH_SECONDS', 1.0))
+AUDIT_BUFFER_SIZE = int(os.environ.get('AUDIT_BUFFER_SIZE', 10000))
+AUDIT_WRITE_RETRIES = int(os.environ.get('AUDIT_WRITE_RETRIES', 2))
+
+# Record kinds and the tables they're written to
+TABLES = {
+    'audit': AuditLog.__table__,
+    'security': SecurityEvent.__table__,
+}
+
+
+class AuditSink:
+    """Buffers records and writes them to `engine` in batches from a daemon thread"""
+
+    def __init__(self, engine, batch_size: int = AUDIT_BATCH_SIZE, flush_seconds: float = AUDIT_FLUSH_SECONDS,
+                 max_buffer: int = AUDIT_BUFFER_SIZE, max_retries: int = AUDIT_WRITE_RETRIES):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_buffer = max_buffer
+        self.max_retries = max_retries
+        self.dropped = 0
+        self.written = 0
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        # Serializes writers so flush() returns only once earlier batches have landed
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    def record(self, kind: str, values: Dict) -> bool:
+        """Queue one record; False if it was dropped because the buffer is full"""
+        values.setdefault('timestamp', datetime.utcnow())
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % 1000 == 0:
+                    logger.error(f"Audit buffer full, {self.dropped} records dropped so far")
+                return False
+            self._buffer.append((kind, values))
+            full_batch = len(self._buffer) >= self.batch_size
+            if self._thread is None and not self._stopping:
+                self._start()
+        if full_batch:
+            self._wakeup.set()
+        return True
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+    def flush(self):
+        """Write everything buffered so far, on the calling thread"""
+        while self._write_batch():
+            pass
+
+    def shutdown(self, timeout: Optional[float] = 10):
+        """Stop the background thread and write whatever is still buffered"""
+        with self._lock:
+            self._stopping = True
+            thread = self._thread
+        self._wakeup.set()
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name='audit-sink', daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Audit sink error: {str(e)}")
+
+    def _take(self) -> List:
+        with self._lock:
+            return [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+
+    def _write_batch(self) -> bool:
+        """Write up to one batch; False once the buffer is empty"""
+        with self._write_lock:
+            batch = self._take()
+            if not batch:
+                return False
+            rows = {}
+            for kind, values in batch:
+                rows.setdefault(kind, []).append(values)
+
+            for attempt in range(self.max_retries + 1):
+                try:
+                    # One transaction on a pooled connection of our own, never a request's session
+                    with self.engine.begin() as connection:
+                        for kind, values in rows.items():
+                            connection.execute(TABLES[kind].insert(), values)
+                    self.written += len(batch)
+                    return True
+                except Exception as e:
+                    if attempt < self.max_retries:
+                        time.sleep(0.1 * 2 ** attempt)
+                        continue
+                    with self._lock:
+                        self.dropped += len(batch)
+                    logger.error(f"Dropping {len(batch)} audit records after {attempt + 1} attempts: {str(e)}")
+            return True
+
+
+_default_sink = None
+_default_sink_lock = threading.Lock()
+
+def get_audit_sink() -> AuditSink:
+    """Process-wide sink on the app's engine (first call must be inside an app context)"""
+    global _default_sink
+    with _default_sink_lock:
+        if _default_sink is None:
+            _default_sink = AuditSink(db.engine)
+        return _default_sink
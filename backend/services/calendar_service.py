@@ -4,15 +4,89 @@ Handles iCal feed generation and calendar integration.
 """
 
 import os
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 from icalendar import Calendar, Event as ICalEvent, vText
-from models import db, Event, Organization, User, UserOrganization, Section
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session, joinedload
+from models import db, Event, Organization, User, UserOrganization, Section, RSVP
+from services.recurrence import RecurrenceService
 from flask import current_app
 
 logger = logging.getLogger(__name__)
 
+
+@dataclass
+class CalendarFeed:
+    """A rendered iCal feed plus the validators used for conditional GETs"""
+    data: bytes
+    etag: str
+    last_modified: datetime
+    filename: str
+    organization_id: int
+    user_id: Optional[int]
+    expires_at: datetime
+
+
+class CalendarFeedCache:
+    """
+    In-process cache of rendered iCal feeds.
+    
+    Entries are dropped when Event rows of their organization (or RSVP rows of
+    their user) are committed. The TTL bounds staleness for writes made by
+    other workers, which this process never sees. Expired entries stay until
+    evicted so a rebuild can keep their stamp; the cache holds at most
+    `max_entries` feeds, dropping the least recently used.
+    """
+    
+    def __init__(self, ttl_seconds: int, max_entries: int = 1000):
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.max_entries = max_entries
+        self._entries: Dict[Tuple, CalendarFeed] = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Tuple) -> Optional[CalendarFeed]:
+        with self._lock:
+            feed = self._entries.get(key)
+            if feed is not None:
+                self._entries.move_to_end(key)
+            return feed
+    
+    def set(self, key: Tuple, feed: CalendarFeed):
+        with self._lock:
+            self._entries[key] = feed
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def invalidate(self, organization_ids=(), user_ids=()):
+        """Drop feeds for the given organizations and personal feeds of the given users"""
+        organization_ids = set(organization_ids)
+        user_ids = set(user_ids)
+        if not organization_ids and not user_ids:
+            return
+        with self._lock:
+            stale = [
+                key for key, feed in self._entries.items()
+                if feed.organization_id in organization_ids
+                or (feed.user_id is not None and feed.user_id in user_ids)
+            ]
+            for key in stale:
+                del self._entries[key]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
 class CalendarService:
     """Service for generating calendar feeds and managing calendar integrations"""
     
@@ -20,6 +94,38 @@ class CalendarService:
         self.base_url = os.environ.get('BASE_URL', 'http://localhost:3000')
         # Calendar URLs should use the same base URL as the main application
         self.calendar_url = os.environ.get('CALENDAR_URL', self.base_url)
+        self.feed_cache = CalendarFeedCache(
+            int(os.environ.get('CALENDAR_FEED_CACHE_TTL', 300)),
+            int(os.environ.get('CALENDAR_FEED_CACHE_SIZE', 1000))
+        )
+    
+    def get_organization_feed(self, organization_id: int, include_templates: bool = False) -> CalendarFeed:
+        """Get the (cached) iCal feed for an organization"""
+        return self._get_feed(
+            ('org', organization_id, include_templates),
+            lambda stamp: self._build_organization_calendar(organization_id, include_templates, stamp)
+        )
+    
+    def get_user_feed(self, user_id: int, organization_id: int) -> CalendarFeed:
+        """Get the (cached) personal iCal feed for a user in an organization"""
+        return self._get_feed(
+            ('user', user_id, organization_id),
+            lambda stamp: self._build_user_calendar(user_id, organization_id, stamp)
+        )
+    
+    def get_section_feed(self, section_id: int) -> CalendarFeed:
+        """Get the (cached) iCal feed for a section"""
+        return self._get_feed(
+            ('section', section_id),
+            lambda stamp: self._build_section_calendar(section_id, stamp)
+        )
+    
+    def get_public_feed(self, organization_id: int) -> CalendarFeed:
+        """Get the (cached) public iCal feed for an organization"""
+        return self._get_feed(
+            ('public', organization_id),
+            lambda stamp: self._build_public_calendar(organization_id, stamp)
+        )
     
     def generate_organization_calendar(self, organization_id: int, include_templates: bool = False) -> bytes:
         """
@@ -32,6 +138,94 @@ class CalendarService:
         Returns:
             bytes: iCal calendar data
         """
+        return self.get_organization_feed(organization_id, include_templates).data
+    
+    def generate_user_calendar(self, user_id: int, organization_id: int) -> bytes:
+        """
+        Generate iCal feed for a specific user in an organization
+        
+        Args:
+            user_id: ID of the user
+            organization_id: ID of the organization
+            
+        Returns:
+            bytes: iCal calendar data
+        """
+        return self.get_user_feed(user_id, organization_id).data
+    
+    def generate_section_calendar(self, section_id: int) -> bytes:
+        """
+        Generate iCal feed for a specific section
+        
+        Args:
+            section_id: ID of the section
+            
+        Returns:
+            bytes: iCal calendar data
+        """
+        return self.get_section_feed(section_id).data
+    
+    def generate_public_calendar(self, organization_id: int) -> bytes:
+        """
+        Generate public iCal feed for an organization (public events only)
+        
+        Args:
+            organization_id: ID of the organization
+            
+        Returns:
+            bytes: iCal calendar data
+        """
+        return self.get_public_feed(organization_id).data
+    
+    def _get_feed(self, key: Tuple, build: Callable) -> CalendarFeed:
+        """
+        Return a cached feed, rebuilding it when missing or expired.
+        
+        A rebuild after TTL expiry keeps the previous stamp, so if nothing
+        actually changed the bytes (and therefore the ETag and Last-Modified)
+        are identical and clients keep getting 304s.
+        """
+        now = datetime.utcnow()
+        cached = self.feed_cache.get(key)
+        if cached and cached.expires_at > now:
+            return cached
+        
+        stamp = cached.last_modified if cached else now.replace(microsecond=0)
+        data, organization_id, user_id, filename = build(stamp)
+        etag = hashlib.sha256(data).hexdigest()
+        
+        if cached and cached.etag != etag:
+            # Content changed behind our back (e.g. another worker) - rebuild with a fresh stamp
+            stamp = now.replace(microsecond=0)
+            data, organization_id, user_id, filename = build(stamp)
+            etag = hashlib.sha256(data).hexdigest()
+        
+        feed = CalendarFeed(
+            data=data,
+            etag=etag,
+            last_modified=stamp,
+            filename=filename,
+            organization_id=organization_id,
+            user_id=user_id,
+            expires_at=now + self.feed_cache.ttl
+        )
+        self.feed_cache.set(key, feed)
+        return feed
+    
+    def _get_feed_events(self, organization_id: int, include_templates: bool = False) -> List[Event]:
+        """
+        Load the events of a feed with everything _create_ical_event touches.
+        Recurring series go out once with an RRULE, so only stored rows are needed.
+        """
+        query = Event.query.options(
+            joinedload(Event.category),
+            joinedload(Event.creator)
+        ).filter_by(organization_id=organization_id)
+        if not include_templates:
+            query = query.filter_by(is_template=False)
+        return query.filter(Event.date.isnot(None)).order_by(Event.date, Event.id).all()
+    
+    def _build_organization_calendar(self, organization_id: int, include_templates: bool, stamp: datetime):
         try:
             # Get organization
             organization = Organization.query.get(organization_id)
@@ -49,35 +243,23 @@ class CalendarService:
             cal.add('x-wr-timezone', 'America/New_York')  # TODO: Make configurable
             
             # Get events
-            query = Event.query.filter_by(organization_id=organization_id)
-            if not include_templates:
-                query = query.filter_by(is_template=False)
-            
-            events = query.filter(Event.date.isnot(None)).all()
+            events = self._get_feed_events(organization_id, include_templates)
+            exdates = RecurrenceService.exclusions([event.id for event in events if event.is_recurring])
             
             # Add events to calendar
             for event in events:
-                ical_event = self._create_ical_event(event, organization)
+                ical_event = self._create_ical_event(event, organization, exdates=exdates, stamp=stamp)
                 cal.add_component(ical_event)
             
             logger.info(f"Generated calendar for organization {organization_id} with {len(events)} events")
-            return cal.to_ical()
+            filename = f"{organization.name.replace(' ', '_')}_calendar.ics"
+            return cal.to_ical(), organization_id, None, filename
             
         except Exception as e:
             logger.error(f"Error generating organization calendar: {e}")
             raise
     
-    def generate_user_calendar(self, user_id: int, organization_id: int) -> bytes:
-        """
-        Generate iCal feed for a specific user in an organization
-        
-        Args:
-            user_id: ID of the user
-            organization_id: ID of the organization
-            
-        Returns:
-            bytes: iCal calendar data
-        """
+    def _build_user_calendar(self, user_id: int, organization_id: int, stamp: datetime):
         try:
             # Get user and organization
             user = User.query.get(user_id)
@@ -107,33 +289,33 @@ class CalendarService:
             cal.add('x-wr-timezone', 'America/New_York')
             
             # Get events for this organization
-            events = Event.query.filter_by(
-                organization_id=organization_id,
-                is_template=False
-            ).filter(Event.date.isnot(None)).all()
+            events = self._get_feed_events(organization_id)
+            exdates = RecurrenceService.exclusions([event.id for event in events if event.is_recurring])
+            
+            # Load this user's RSVPs for the whole organization in one query
+            user_rsvps = dict(
+                db.session.query(RSVP.event_id, RSVP.status)
+                .join(Event, Event.id == RSVP.event_id)
+                .filter(RSVP.user_id == user_id, Event.organization_id == organization_id)
+                .all()
+            )
             
             # Add events to calendar
             for event in events:
-                ical_event = self._create_ical_event(event, organization, user)
+                ical_event = self._create_ical_event(event, organization, user, user_rsvps=user_rsvps,
+                                                      exdates=exdates, stamp=stamp)
                 cal.add_component(ical_event)
             
             logger.info(f"Generated user calendar for user {user_id} in organization {organization_id}")
-            return cal.to_ical()
+            username = (user.name or user.username).replace(' ', '_')
+            filename = f"{organization.name.replace(' ', '_')}_{username}_calendar.ics"
+            return cal.to_ical(), organization_id, user.id, filename
             
         except Exception as e:
             logger.error(f"Error generating user calendar: {e}")
             raise
     
-    def generate_section_calendar(self, section_id: int) -> bytes:
-        """
-        Generate iCal feed for a specific section
-        
-        Args:
-            section_id: ID of the section
-            
-        Returns:
-            bytes: iCal calendar data
-        """
+    def _build_section_calendar(self, section_id: int, stamp: datetime):
         try:
             # Get section
             section = Section.query.get(section_id)
@@ -151,33 +333,23 @@ class CalendarService:
             cal.add('x-wr-timezone', 'America/New_York')
             
             # Get events for this organization (sections see all org events)
-            events = Event.query.filter_by(
-                organization_id=section.organization_id,
-                is_template=False
-            ).filter(Event.date.isnot(None)).all()
+            events = self._get_feed_events(section.organization_id)
+            exdates = RecurrenceService.exclusions([event.id for event in events if event.is_recurring])
             
             # Add events to calendar
             for event in events:
-                ical_event = self._create_ical_event(event, section.organization)
+                ical_event = self._create_ical_event(event, section.organization, exdates=exdates, stamp=stamp)
                 cal.add_component(ical_event)
             
             logger.info(f"Generated section calendar for section {section_id}")
-            return cal.to_ical()
+            filename = f"{section.organization.name.replace(' ', '_')}_{section.name.replace(' ', '_')}_calendar.ics"
+            return cal.to_ical(), section.organization_id, None, filename
             
         except Exception as e:
             logger.error(f"Error generating section calendar: {e}")
             raise
     
-    def generate_public_calendar(self, organization_id: int) -> bytes:
-        """
-        Generate public iCal feed for an organization (public events only)
-        
-        Args:
-            organization_id: ID of the organization
-            
-        Returns:
-            bytes: iCal calendar data
-        """
+    def _build_public_calendar(self, organization_id: int, stamp: datetime):
         try:
             # Get organization
             organization = Organization.query.get(organization_id)
@@ -196,25 +368,28 @@ class CalendarService:
             
             # Get public events (assume all events are public for now)
             # TODO: Add public/private flag to events
-            events = Event.query.filter_by(
-                organization_id=organization_id,
-                is_template=False
-            ).filter(Event.date.isnot(None)).all()
+            events = self._get_feed_events(organization_id)
+            exdates = RecurrenceService.exclusions([event.id for event in events if event.is_recurring])
             
             # Add events to calendar
             for event in events:
-                ical_event = self._create_ical_event(event, organization, include_sensitive=False)
+                ical_event = self._create_ical_event(event, organization, include_sensitive=False,
+                                                      exdates=exdates, stamp=stamp)
                 cal.add_component(ical_event)
             
             logger.info(f"Generated public calendar for organization {organization_id}")
-            return cal.to_ical()
+            filename = f"{organization.name.replace(' ', '_')}_public_calendar.ics"
+            return cal.to_ical(), organization_id, None, filename
             
         except Exception as e:
             logger.error(f"Error generating public calendar: {e}")
             raise
     
     def _create_ical_event(self, event: Event, organization: Organization, 
-                          user: Optional[User] = None, include_sensitive: bool = True) -> ICalEvent:
+                          user: Optional[User] = None, include_sensitive: bool = True,
+                          user_rsvps: Optional[Dict[int, str]] = None,
+                          exdates: Optional[Dict[int, List[datetime]]] = None,
+                          stamp: Optional[datetime] = None) -> ICalEvent:
         """
         Create an iCal event from a BandSync event
         
@@ -223,19 +398,33 @@ class CalendarService:
             organization: Organization object
             user: User object (optional, for personalized info)
             include_sensitive: Whether to include sensitive information
+            user_rsvps: Preloaded {event_id: status} for the user (avoids loading event.rsvps)
+            exdates: Preloaded {series_id: [deleted occurrence starts]} (see RecurrenceService.exclusions)
+            stamp: Timestamp for DTSTAMP/LAST-MODIFIED (defaults to now)
             
         Returns:
             ICalEvent: iCal event object
         """
         ical_event = ICalEvent()
+        stamp = stamp or datetime.utcnow()
         
-        # Basic event info
-        ical_event.add('uid', f'event-{event.id}@bandsync.com')
+        # Basic event info. A materialized occurrence overrides its slot in
+        # the series (same UID plus RECURRENCE-ID).
+        if event.parent_event_id and event.recurrence_id:
+            ical_event.add('uid', f'event-{event.parent_event_id}@bandsync.com')
+            ical_event.add('recurrence-id', event.recurrence_id)
+        else:
+            ical_event.add('uid', f'event-{event.id}@bandsync.com')
+        rule = RecurrenceService.ical_rule(event)
+        if rule:
+            ical_event.add('rrule', rule)
+            if exdates and exdates.get(event.id):
+                ical_event.add('exdate', exdates[event.id])
         ical_event.add('dtstart', event.date)
         ical_event.add('dtend', event.end_date or event.date + timedelta(hours=2))
-        ical_event.add('dtstamp', datetime.utcnow())
-        ical_event.add('created', event.created_at or datetime.utcnow())
-        ical_event.add('last-modified', datetime.utcnow())
+        ical_event.add('dtstamp', stamp)
+        ical_event.add('created', event.created_at or stamp)
+        ical_event.add('last-modified', stamp)
         
         # Event details
         ical_event.add('summary', event.title)
@@ -252,11 +441,16 @@ class CalendarService:
             description_parts.append(f"Category: {event.category.name}")
         
         if include_sensitive:
-            # Add RSVP information for authenticated users
-            if user:
-                rsvp = next((r for r in event.rsvps if r.user_id == user.id), None)
-                if rsvp:
-                    description_parts.append(f"Your RSVP: {rsvp.status.title()}")
+            # Add RSVP information for authenticated users (a series' RSVPs
+            # belong to its first occurrence only)
+            if user and not rule:
+                if user_rsvps is not None:
+                    status = user_rsvps.get(event.id)
+                else:
+                    rsvp = next((r for r in event.rsvps if r.user_id == user.id), None)
+                    status = rsvp.status if rsvp else None
+                if status:
+                    description_parts.append(f"Your RSVP: {status.title()}")
                 else:
                     description_parts.append("RSVP: Not responded")
         
@@ -286,7 +480,7 @@ class CalendarService:
         ical_event.add('url', f'{self.base_url}/events')
         
         # Status
-        ical_event.add('status', 'CONFIRMED')
+        ical_event.add('status', 'CANCELLED' if event.is_cancelled else 'CONFIRMED')
         
         # Class (privacy)
         ical_event.add('class', 'PUBLIC' if not include_sensitive else 'PRIVATE')
@@ -383,3 +577,36 @@ class CalendarService:
 
 # Global instance
 calendar_service = CalendarService()
+
+
+def note_calendar_change(session, organization_ids=(), user_ids=()):
+    """
+    Drop these organizations' and users' cached feeds once `session` commits.
+    Called by the flush hook; core statements that skip it call it directly.
+    """
+    changes = session.info.setdefault('calendar_changes', {'organizations': set(), 'users': set()})
+    changes['organizations'].update(organization_ids)
+    changes['users'].update(int(user_id) for user_id in user_ids)
+
+
+@sa_event.listens_for(Session, 'after_flush')
+def _collect_calendar_changes(session, flush_context):
+    """Remember which organizations/users had Event or RSVP rows written in this transaction"""
+    objects = list(session.new) + list(session.dirty) + list(session.deleted)
+    note_calendar_change(
+        session,
+        organization_ids=[obj.organization_id for obj in objects if isinstance(obj, Event) and obj.organization_id],
+        user_ids=[obj.user_id for obj in objects if isinstance(obj, RSVP) and obj.user_id]
+    )
+
+
+@sa_event.listens_for(Session, 'after_commit')
+def _invalidate_calendar_feeds(session):
+    changes = session.info.pop('calendar_changes', None)
+    if changes:
+        calendar_service.feed_cache.invalidate(changes['organizations'], changes['users'])
+
+
+@sa_event.listens_for(Session, 'after_rollback')
+def _discard_calendar_changes(session):
+    session.info.pop('calendar_changes', None)
@@ -0,0 +1,339 @@
+"""
+Email Delivery Pipeline for BandSync
+Sends outbound email in batches on a bounded thread pool, with per-recipient
+retry/backoff, provider rate limiting and bulk EmailLog writes.
+"""
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional, Dict, Callable
+
+import requests
+import resend
+from resend.exceptions import ResendError
+from models import db, EmailLog
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OutboundEmail:
+    """A fully rendered email for a single recipient.
+
+    Only plain values are stored so messages can be delivered from a
+    background thread without touching ORM instances from the request.
+    """
+    to: str
+    subject: str
+    html: str
+    text: Optional[str] = None
+    attachments: Optional[List[Dict]] = None
+    # EmailLog metadata - a log row is written only when email_type and organization_id are set
+    user_id: Optional[int] = None
+    organization_id: Optional[int] = None
+    email_type: Optional[str] = None
+    event_id: Optional[int] = None
+
+
+@dataclass
+class DeliveryResult:
+    """Outcome of delivering one OutboundEmail"""
+    email: OutboundEmail
+    status: str  # 'sent' or 'failed'
+    message_id: Optional[str] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    sent_at: datetime = field(default_factory=datetime.utcnow)
+
+
+class RateLimitedError(Exception):
+    """Provider asked us to slow down (HTTP 429)"""
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TransientDeliveryError(Exception):
+    """Temporary provider/network failure - worth retrying"""
+
+
+# =============================================================================
+# Transports
+# =============================================================================
+
+class EmailTransport:
+    """Base class for provider transports.
+
+    send_batch() receives a list of provider payloads and returns one message
+    ID per payload. It raises RateLimitedError or TransientDeliveryError for
+    retryable failures; any other exception is treated as permanent.
+    """
+    max_batch_size = 1
+
+    def send_batch(self, payloads: List[Dict]) -> List[Optional[str]]:
+        raise NotImplementedError
+
+
+class ResendTransport(EmailTransport):
+    """Transport backed by the Resend API"""
+    max_batch_size = 100  # Resend batch endpoint limit
+
+    def send_batch(self, payloads: List[Dict]) -> List[Optional[str]]:
+        try:
+            # The batch endpoint doesn't accept attachments
+            if len(payloads) == 1 or any(p.get('attachments') for p in payloads):
+                return [self._message_id(resend.Emails.send(p)) for p in payloads]
+
+            response = resend.Batch.send(payloads)
+            items = response.get('data', []) if isinstance(response, dict) else (response or [])
+            return [self._message_id(item) for item in items] + [None] * (len(payloads) - len(items))
+        except ResendError as e:
+            code = str(getattr(e, 'code', ''))
+            if code == '429':
+                raise RateLimitedError(str(e))
+            if code.startswith('5'):
+                raise TransientDeliveryError(str(e))
+            raise
+        except requests.RequestException as e:
+            raise TransientDeliveryError(str(e))
+
+    @staticmethod
+    def _message_id(response) -> Optional[str]:
+        return response.get('id') if isinstance(response, dict) else None
+
+
+class FakeTransport(EmailTransport):
+    """In-memory transport for tests and local development.
+
+    Args:
+        max_batch_size: Largest batch accepted per call
+        transient_failures: {address: n} - fail the first n attempts for that address
+        permanent_failures: Addresses that always fail permanently
+        rate_limit_every: Raise RateLimitedError on every Nth call (0 disables)
+    """
+
+    def __init__(self, max_batch_size: int = 100, transient_failures: Optional[Dict[str, int]] = None,
+                 permanent_failures: Optional[List[str]] = None, rate_limit_every: int = 0):
+        self.max_batch_size = max_batch_size
+        self.transient_failures = dict(transient_failures or {})
+        self.permanent_failures = set(permanent_failures or [])
+        self.rate_limit_every = rate_limit_every
+        self.sent: List[Dict] = []
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def send_batch(self, payloads: List[Dict]) -> List[Optional[str]]:
+        with self._lock:
+            self.calls += 1
+            if self.rate_limit_every and self.calls % self.rate_limit_every == 0:
+                raise RateLimitedError('Too many requests', retry_after=0)
+
+            for payload in payloads:
+                if payload['to'] in self.permanent_failures:
+                    raise ValueError(f"Invalid recipient {payload['to']}")
+            for payload in payloads:
+                if self.transient_failures.get(payload['to'], 0) > 0:
+                    self.transient_failures[payload['to']] -= 1
+                    raise TransientDeliveryError(f"Temporary failure for {payload['to']}")
+
+            ids = []
+            for payload in payloads:
+                self.sent.append(payload)
+                ids.append(f'fake-{len(self.sent)}')
+            return ids
+
+
+# =============================================================================
+# Dispatcher
+# =============================================================================
+
+class RateLimiter:
+    """Thread-safe token bucket shared by all delivery threads"""
+
+    def __init__(self, rate_per_second: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate_per_second
+        self.capacity = max(1.0, rate_per_second)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            self.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for `seconds` (used when the provider returns 429)"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+            self.tokens = 0
+
+
+class EmailDispatcher:
+    """Delivers OutboundEmails through a transport using a bounded thread pool"""
+
+    def __init__(self, transport: EmailTransport, from_address: str, max_workers: Optional[int] = None,
+                 batch_size: Optional[int] = None, max_retries: Optional[int] = None,
+                 backoff_seconds: Optional[float] = None, rate_per_second: Optional[float] = None,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.transport = transport
+        self.from_address = from_address
+        self.max_workers = max_workers or int(os.environ.get('EMAIL_DISPATCH_WORKERS', 4))
+        self.batch_size = min(batch_size or int(os.environ.get('EMAIL_BATCH_SIZE', 50)),
+                              transport.max_batch_size)
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get('EMAIL_MAX_RETRIES', 3))
+        self.backoff_seconds = backoff_seconds if backoff_seconds is not None else \
+            float(os.environ.get('EMAIL_RETRY_BACKOFF_SECONDS', 1.0))
+        # Resend allows 2 requests/second on the default plan
+        rate = rate_per_second if rate_per_second is not None else float(os.environ.get('EMAIL_RATE_LIMIT_PER_SECOND', 2))
+        self.sleep = sleep
+        self.rate_limiter = RateLimiter(rate, sleep=sleep)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='email-send')
+        # Separate single-threaded executor for background jobs so a job waiting
+        # on its batches can never starve the send pool
+        self._jobs = ThreadPoolExecutor(max_workers=1, thread_name_prefix='email-jobs')
+
+    def send(self, emails: List[OutboundEmail]) -> List[DeliveryResult]:
+        """Deliver emails and block until every one has succeeded or given up"""
+        if not emails:
+            return []
+        batches = [emails[i:i + self.batch_size] for i in range(0, len(emails), self.batch_size)]
+        futures = [self._pool.submit(self._deliver_batch, batch) for batch in batches]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+
+    def send_async(self, emails: List[OutboundEmail], app=None,
+                   on_complete: Optional[Callable[[List[DeliveryResult]], None]] = None) -> Future:
+        """
+        Queue emails for background delivery and return immediately.
+
+        EmailLog rows are written in bulk once the whole job has finished,
+        inside `app`'s context (pass the Flask app when calling from a request).
+        """
+        def job():
+            results = self.send(emails)
+            if app is not None:
+                with app.app_context():
+                    self.write_logs(results)
+                    if on_complete:
+                        on_complete(results)
+            elif on_complete:
+                on_complete(results)
+            return results
+        return self._jobs.submit(job)
+
+    @staticmethod
+    def write_logs(results: List[DeliveryResult]):
+        """Write EmailLog rows for all results in a single round trip"""
+        logs = [
+            EmailLog(
+                user_id=r.email.user_id,
+                event_id=r.email.event_id,
+                organization_id=r.email.organization_id,
+                email_type=r.email.email_type,
+                sent_at=r.sent_at,
+                status=r.status,
+                error_message=r.error,
+                sendgrid_message_id=r.message_id  # Reusing the column for Resend message ID
+            )
+            for r in results if r.email.email_type and r.email.organization_id
+        ]
+        if not logs:
+            return
+        try:
+            db.session.bulk_save_objects(logs)
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Error writing email logs: {str(e)}")
+            db.session.rollback()
+
+    def _payload(self, email: OutboundEmail) -> Dict:
+        payload = {
+            "from": self.from_address,
+            "to": email.to,
+            "subject": email.subject,
+            "html": email.html,
+        }
+        if email.text:
+            payload["text"] = email.text
+        if email.attachments:
+            payload["attachments"] = [{
+                "filename": attachment["filename"],
+                "content": attachment["content"],
+                "content_type": attachment.get("type", "application/octet-stream")
+            } for attachment in email.attachments]
+        return payload
+
+    def _call(self, emails: List[OutboundEmail], attempt: int) -> List[Optional[str]]:
+        """One rate-limited provider call. Returns message IDs or raises."""
+        self.rate_limiter.acquire()
+        try:
+            return self.transport.send_batch([self._payload(e) for e in emails])
+        except RateLimitedError as e:
+            self.rate_limiter.pause(e.retry_after if e.retry_after is not None else self._backoff(attempt))
+            raise
+
+    def _backoff(self, attempt: int) -> float:
+        return self.backoff_seconds * (2 ** (attempt - 1))
+
+    def _deliver_batch(self, batch: List[OutboundEmail]) -> List[DeliveryResult]:
+        attempt = 0
+        while attempt <= self.max_retries:
+            attempt += 1
+            try:
+                ids = self._call(batch, attempt)
+                logger.info(f"Sent batch of {len(batch)} emails")
+                return [DeliveryResult(email=e, status='sent', message_id=i, attempts=attempt)
+                        for e, i in zip(batch, ids)]
+            except RateLimitedError:
+                continue
+            except TransientDeliveryError:
+                if len(batch) > 1:
+                    break  # Let each recipient retry on its own
+                if attempt <= self.max_retries:
+                    self.sleep(self._backoff(attempt))
+            except Exception as e:
+                if len(batch) == 1:
+                    return [DeliveryResult(email=batch[0], status='failed', error=str(e), attempts=attempt)]
+                break  # One bad recipient shouldn't fail the whole batch
+
+        if len(batch) > 1:
+            return [result for email in batch for result in self._deliver_batch([email])]
+        logger.error(f"Giving up on email to {batch[0].to} after {attempt} attempts")
+        return [DeliveryResult(email=batch[0], status='failed', error='Retries exhausted', attempts=attempt)]
+
+    def shutdown(self, wait: bool = True):
+        self._jobs.shutdown(wait=wait)
+        self._pool.shutdown(wait=wait)
+
+
+_default_dispatcher = None
+_default_dispatcher_lock = threading.Lock()
+
+def get_default_dispatcher(from_address: str) -> EmailDispatcher:
+    """Process-wide Resend dispatcher, so every EmailService() shares one thread pool"""
+    global _default_dispatcher
+    with _default_dispatcher_lock:
+        if _default_dispatcher is None:
+            _default_dispatcher = EmailDispatcher(ResendTransport(), from_address)
+        return _default_dispatcher
@@ -8,26 +8,35 @@ import logging
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 from jinja2 import Environment, FileSystemLoader
+from flask import current_app, has_app_context
 import resend
 from models import db, EmailLog
+from services.email_delivery import EmailDispatcher, EmailTransport, OutboundEmail, get_default_dispatcher
 
 logger = logging.getLogger(__name__)
 
 class EmailService:
     """Main email service class for BandSync"""
     
-    def __init__(self):
+    def __init__(self, transport: Optional[EmailTransport] = None):
         self.api_key = os.environ.get('RESEND_API_KEY')
         self.from_email = os.environ.get('FROM_EMAIL', 'noreply@bandsync.com')
         self.from_name = os.environ.get('FROM_NAME', 'BandSync')
         self.base_url = os.environ.get('BASE_URL', 'https://bandsync.com')
+        from_address = f"{self.from_name} <{self.from_email}>"
         
-        if self.api_key:
+        if transport:
+            # Explicit transport (e.g. FakeTransport in tests) gets its own dispatcher
+            self.client = True
+            self.dispatcher = EmailDispatcher(transport, from_address)
+        elif self.api_key:
             resend.api_key = self.api_key
             self.client = True  # Mark as available
+            self.dispatcher = get_default_dispatcher(from_address)
         else:
             logger.warning("RESEND_API_KEY not found. Email functionality will be disabled.")
             self.client = None
+            self.dispatcher = None
         
         # Initialize template environment
         template_dir = os.path.join(os.path.dirname(__file__), '..', 'templates', 'email')
@@ -36,7 +45,7 @@ class EmailService:
     def _send_email(self, to_emails: List[str], subject: str, html_content: str, 
                    text_content: Optional[str] = None, attachments: Optional[List[Dict]] = None) -> bool:
         """
-        Send email using Resend
+        Send email using the delivery pipeline (batched, rate limited, retried)
         
         Args:
             to_emails: List of recipient email addresses
@@ -52,56 +61,48 @@ class EmailService:
             logger.warning(f"Email service not configured. Would send email to {to_emails} with subject: {subject}")
             return False
         
-        try:
-            # For multiple recipients, send individual emails
-            # Resend doesn't support bulk sending to multiple recipients in one call
-            success_count = 0
-            
-            for to_email in to_emails:
-                email_data = {
-                    "from": f"{self.from_name} <{self.from_email}>",
-                    "to": to_email,
-                    "subject": subject,
-                    "html": html_content,
-                }
-                
-                # Add plain text version if provided
-                if text_content:
-                    email_data["text"] = text_content
-                
-                # Add attachments if provided
-                if attachments:
-                    email_data["attachments"] = []
-                    for attachment in attachments:
-                        email_data["attachments"].append({
-                            "filename": attachment["filename"],
-                            "content": attachment["content"],
-                            "content_type": attachment.get("type", "application/octet-stream")
-                        })
-                
-                # Send the email using Resend
-                response = resend.Emails.send(email_data)
-                
-                if response.get("id"):
-                    success_count += 1
-                    logger.info(f"Email sent successfully to {to_email}, ID: {response['id']}")
-                else:
-                    logger.error(f"Failed to send email to {to_email}: {response}")
-            
-            if success_count == len(to_emails):
-                logger.info(f"All {len(to_emails)} emails sent successfully")
-                return True
-            elif success_count > 0:
-                logger.warning(f"Sent {success_count} of {len(to_emails)} emails successfully")
-                return True
-            else:
-                logger.error(f"Failed to send all emails")
-                return False
-                
-        except Exception as e:
-            logger.error(f"Error sending email: {str(e)}")
+        emails = [
+            OutboundEmail(to=to_email, subject=subject, html=html_content,
+                          text=text_content, attachments=attachments)
+            for to_email in to_emails
+        ]
+        results = self.dispatcher.send(emails)
+        success_count = sum(1 for r in results if r.status == 'sent')
+        
+        if success_count == len(to_emails):
+            logger.info(f"All {len(to_emails)} emails sent successfully")
+            return True
+        elif success_count > 0:
+            logger.warning(f"Sent {success_count} of {len(to_emails)} emails successfully")
+            return True
+        else:
+            logger.error(f"Failed to send all emails")
             return False
     
+    def send_bulk(self, emails: List[OutboundEmail], background: bool = True):
+        """
+        Deliver pre-rendered emails through the batched delivery pipeline
+        
+        Args:
+            emails: List of OutboundEmail (one per recipient)
+            background: Return immediately and deliver on the dispatcher's threads
+        
+        Returns:
+            Future when background=True, otherwise the list of DeliveryResults.
+            EmailLog rows are written in bulk once delivery finishes.
+        """
+        if not self.client:
+            logger.warning(f"Email service not configured. Would send {len(emails)} emails")
+            return None if background else []
+        
+        if background:
+            app = current_app._get_current_object() if has_app_context() else None
+            return self.dispatcher.send_async(emails, app=app)
+        
+        results = self.dispatcher.send(emails)
+        self.dispatcher.write_logs(results)
+        return results
+    
     def _log_email(self, user_id: int, organization_id: int, email_type: str, 
                   status: str, event_id: Optional[int] = None, 
                   error_message: Optional[str] = None, 
@@ -151,32 +152,15 @@ class EmailService:
             bool: True if emails sent successfully
         """
         try:
-            template = self.template_env.get_template('event_reminder.html')
-            
-            # Generate RSVP URL
-            rsvp_url = f"{self.base_url}/events/{event.id}"
-            
-            success_count = 0
+            emails = []
             for user in users:
                 # Check if user has email preferences that disable reminders
                 if hasattr(user, 'email_preferences') and not user.email_preferences.get('event_reminders', True):
                     continue
-                
-                html_content = template.render(
-                    user=user,
-                    event=event,
-                    organization=event.organization,
-                    rsvp_url=rsvp_url,
-                    days_before=days_before,
-                    base_url=self.base_url
-                )
-                
-                subject = f"Reminder: {event.title} - {event.date.strftime('%B %d, %Y')}"
-                
-                if self._send_email([user.email], subject, html_content):
-                    success_count += 1
-                else:
-                    logger.error(f"Failed to send reminder to {user.email}")
+                emails.append(self.render_event_reminder(event, user, days_before))
+            
+            results = self.send_bulk(emails, background=False)
+            success_count = sum(1 for r in results if r.status == 'sent')
             
             logger.info(f"Sent event reminders to {success_count} of {len(users)} users")
             return success_count > 0
@@ -189,40 +173,27 @@ class EmailService:
         """
         Send new event notification to specified users
         
+        Renders every email up front and hands delivery to the background
+        pipeline, so the caller returns without waiting on the provider.
+        
         Args:
             event: Event model instance
             users: List of User model instances
         
         Returns:
-            bool: True if emails sent successfully
+            bool: True if emails were queued for delivery
         """
         try:
-            template = self.template_env.get_template('new_event_notification.html')
-            
-            # Generate RSVP URL
-            rsvp_url = f"{self.base_url}/events/{event.id}"
-            
-            success_count = 0
+            emails = []
             for user in users:
                 # Check email preferences
                 if hasattr(user, 'email_preferences') and not user.email_preferences.get('new_events', True):
                     continue
-                
-                html_content = template.render(
-                    user=user,
-                    event=event,
-                    organization=event.organization,
-                    rsvp_url=rsvp_url,
-                    base_url=self.base_url
-                )
-                
-                subject = f"New Event: {event.title} - {event.date.strftime('%B %d, %Y')}"
-                
-                if self._send_email([user.email], subject, html_content):
-                    success_count += 1
+                emails.append(self.render_new_event_notification(event, user))
             
-            logger.info(f"Sent new event notifications to {success_count} of {len(users)} users")
-            return success_count > 0
+            queued = self.send_bulk(emails)
+            logger.info(f"Queued new event notifications for {len(emails)} of {len(users)} users")
+            return queued is not None and len(emails) > 0
             
         except Exception as e:
             logger.error(f"Error sending new event notifications: {str(e)}")
@@ -243,8 +214,9 @@ class EmailService:
             template = self.template_env.get_template('rsvp_deadline_reminder.html')
             
             rsvp_url = f"{self.base_url}/events/{event.id}"
+            subject = f"RSVP Needed: {event.title} - {event.date.strftime('%B %d, %Y')}"
             
-            success_count = 0
+            emails = []
             for user in non_responders:
                 html_content = template.render(
                     user=user,
@@ -253,29 +225,15 @@ class EmailService:
                     rsvp_url=rsvp_url,
                     base_url=self.base_url
                 )
-                
-                subject = f"RSVP Needed: {event.title} - {event.date.strftime('%B %d, %Y')}"
-                
-                if self._send_email([user.email], subject, html_content):
-                    # Log successful email
-                    self._log_email(
-                        user_id=user.id,
-                        event_id=event.id,
-                        organization_id=event.organization_id,
-                        email_type='rsvp_deadline_reminder',
-                        status='sent'
-                    )
-                    success_count += 1
-                else:
-                    # Log failed email
-                    self._log_email(
-                        user_id=user.id,
-                        event_id=event.id,
-                        organization_id=event.organization_id,
-                        email_type='rsvp_deadline_reminder',
-                        status='failed',
-                        error_message='Failed to send via email service'
-                    )
+                emails.append(OutboundEmail(
+                    to=user.email, subject=subject, html=html_content,
+                    user_id=user.id, organization_id=event.organization_id,
+                    email_type='rsvp_deadline_reminder', event_id=event.id
+                ))
+            
+            # Sent and failed deliveries are both logged in bulk by the pipeline
+            results = self.send_bulk(emails, background=False)
+            success_count = sum(1 for r in results if r.status == 'sent')
             
             logger.info(f"Sent RSVP reminders to {success_count}/{len(non_responders)} non-responders")
             return success_count > 0
@@ -284,56 +242,75 @@ class EmailService:
             logger.error(f"Error sending RSVP deadline reminders: {str(e)}")
             return False
     
-    def send_event_cancellation_notification(self, user, event, reason: str) -> bool:
-        """
-        Send event cancellation notification to a user
+    def render_event_reminder(self, event, user, days_before: int = 1) -> OutboundEmail:
+        """Render the event reminder email for one user"""
+        template = self.template_env.get_template('event_reminder.html')
+        html_content = template.render(
+            user=user,
+            event=event,
+            organization=event.organization,
+            rsvp_url=f"{self.base_url}/events/{event.id}",
+            days_before=days_before,
+            base_url=self.base_url
+        )
+        return OutboundEmail(
+            to=user.email,
+            subject=f"Reminder: {event.title} - {event.date.strftime('%B %d, %Y')}",
+            html=html_content,
+            user_id=user.id,
+            organization_id=event.organization_id,
+            email_type='event_reminder',
+            event_id=event.id
+        )
+    
+    def render_new_event_notification(self, event, user) -> OutboundEmail:
+        """Render the new event email for one user"""
+        template = self.template_env.get_template('new_event_notification.html')
+        html_content = template.render(
+            user=user,
+            event=event,
+            organization=event.organization,
+            rsvp_url=f"{self.base_url}/events/{event.id}",
+            base_url=self.base_url
+        )
+        return OutboundEmail(
+            to=user.email,
+            subject=f"New Event: {event.title} - {event.date.strftime('%B %d, %Y')}",
+            html=html_content,
+            user_id=user.id,
+            organization_id=event.organization_id,
+            email_type='new_event',
+            event_id=event.id
+        )
+    
+    def render_event_cancellation(self, user, event, reason: str) -> OutboundEmail:
+        """Render the cancellation email for one user"""
+        # Format event date
+        event_date = event.date.strftime('%A, %B %d, %Y')
+        event_time = event.date.strftime('%I:%M %p') if event.date else ''
         
-        Args:
-            user: User object to send notification to
-            event: Event object that was cancelled
-            reason: Reason for cancellation
+        # Calculate how far in advance the cancellation is
+        days_until_event = (event.date.date() - datetime.now().date()).days if event.date else 0
         
-        Returns:
-            bool: True if email sent successfully, False otherwise
-        """
-        try:
-            print(f"📧 Attempting to send cancellation notification to {user.email}")
-            
-            # Check if email service is available
-            if not self.client:
-                print("❌ Email service not available (no API key)")
-                return False
-            
-            # Format event date
-            event_date = event.date.strftime('%A, %B %d, %Y')
-            event_time = event.date.strftime('%I:%M %p') if event.date else ''
-            
-            # Calculate how far in advance the cancellation is
-            days_until_event = (event.date.date() - datetime.now().date()).days if event.date else 0
-            
-            # Prepare template context
-            context = {
-                'user_name': user.name,
-                'event_title': event.title,
-                'event_date': event_date,
-                'event_time': event_time,
-                'event_location': event.location_address or 'Location TBD',
-                'cancellation_reason': reason,
-                'days_until_event': days_until_event,
-                'cancelled_at': event.cancelled_at.strftime('%B %d, %Y at %I:%M %p') if event.cancelled_at else 'Unknown',
-                'base_url': self.base_url
-            }
-            
-            print(f"📄 Template context prepared: {context}")
-            
-            # Load and render template
-            template = self.template_env.get_template('event_cancellation.html')
-            html_content = template.render(**context)
-            
-            print(f"📝 HTML content rendered, length: {len(html_content)}")
-            
-            # Create plain text version
-            text_content = f"""
+        # Prepare template context
+        context = {
+            'user_name': user.name,
+            'event_title': event.title,
+            'event_date': event_date,
+            'event_time': event_time,
+            'event_location': event.location_address or 'Location TBD',
+            'cancellation_reason': reason,
+            'days_until_event': days_until_event,
+            'cancelled_at': event.cancelled_at.strftime('%B %d, %Y at %I:%M %p') if event.cancelled_at else 'Unknown',
+            'base_url': self.base_url
+        }
+        
+        # Load and render template
+        template = self.template_env.get_template('event_cancellation.html')
+        html_content = template.render(**context)
+        
+        # Create plain text version
+        text_content = f"""
 Hello {user.name},
 
 We regret to inform you that the following event has been cancelled:
@@ -352,34 +329,48 @@ We apologize for any inconvenience this may cause.
 Best regards,
 The BandSync Team
 """
+        
+        return OutboundEmail(
+            to=user.email,
+            subject=f"Event Cancelled: {event.title}",
+            html=html_content,
+            text=text_content,
+            user_id=user.id,
+            organization_id=event.organization_id,
+            email_type='event_cancellation',
+            event_id=event.id
+        )
+    
+    def send_event_cancellation_notification(self, user, event, reason: str) -> bool:
+        """
+        Send event cancellation notification to a user
+        
+        Args:
+            user: User object to send notification to
+            event: Event object that was cancelled
+            reason: Reason for cancellation
+        
+        Returns:
+            bool: True if email sent successfully, False otherwise
+        """
+        try:
+            print(f"📧 Attempting to send cancellation notification to {user.email}")
             
-            subject = f"Event Cancelled: {event.title}"
+            # Check if email service is available
+            if not self.client:
+                print("❌ Email service not available (no API key)")
+                return False
             
-            print(f"📬 Sending email with subject: {subject}")
+            email = self.render_event_cancellation(user, event, reason)
+            print(f"📬 Sending email with subject: {email.subject}")
             
-            # Send email
-            if self._send_email([user.email], subject, html_content, text_content):
+            # Send email (the pipeline logs sent/failed to EmailLog)
+            results = self.send_bulk([email], background=False)
+            if results and results[0].status == 'sent':
                 print(f"✅ Email sent successfully to {user.email}")
-                # Log successful email
-                self._log_email(
-                    user_id=user.id,
-                    event_id=event.id,
-                    organization_id=event.organization_id,
-                    email_type='event_cancellation',
-                    status='sent'
-                )
                 return True
             else:
                 print(f"❌ Failed to send email to {user.email}")
-                # Log failed email
-                self._log_email(
-                    user_id=user.id,
-                    event_id=event.id,
-                    organization_id=event.organization_id,
-                    email_type='event_cancellation',
-                    status='failed',
-                    error_message='Failed to send via email service'
-                )
                 return False
                 
         except Exception as e:
@@ -387,6 +378,54 @@ The BandSync Team
             logger.error(f"Error sending event cancellation notification to {user.email}: {str(e)}")
             return False
     
+    def build_event_summary_context(self, organization, events: List, period: str) -> Dict[str, Any]:
+        """
+        Precompute everything in a member summary that doesn't depend on the
+        recipient, so an organization's events are formatted once per run
+        
+        Args:
+            organization: Organization model instance
+            events: Events in the summary window, in date order
+            period: 'daily' or 'weekly'
+        
+        Returns:
+            dict: Context for render_event_summary
+        """
+        heading = 'Your Week Ahead' if period == 'weekly' else "Today & Tomorrow"
+        intro = (f"{organization.name} has {len(events)} event{'s' if len(events) != 1 else ''} "
+                 f"{'this week' if period == 'weekly' else 'coming up today and tomorrow'}:")
+        return {
+            'period': period,
+            'organization_id': organization.id,
+            'organization_name': organization.name,
+            'heading': heading,
+            'intro': intro,
+            'subject': f"{heading} - {organization.name} - {datetime.now().strftime('%B %d, %Y')}",
+            'events': [{
+                'title': event.title,
+                'date': event.date.strftime('%A, %B %d'),
+                'time': event.date.strftime('%I:%M %p'),
+                'location': event.location_address,
+                'type': event.type,
+                'is_cancelled': event.is_cancelled,
+                'url': f"{self.base_url}/events/{event.id}"
+            } for event in events],
+            'events_url': f"{self.base_url}/events",
+            'base_url': self.base_url
+        }
+    
+    def render_event_summary(self, user, context: Dict[str, Any]) -> OutboundEmail:
+        """Render a daily/weekly summary for one user from a precomputed context"""
+        template = self.template_env.get_template('event_summary.html')
+        return OutboundEmail(
+            to=user.email,
+            subject=context['subject'],
+            html=template.render(user_name=user.name or user.username, **context),
+            user_id=user.id,
+            organization_id=context['organization_id'],
+            email_type=f"{context['period']}_summary"
+        )
+    
     def send_daily_summary(self, organization, admin_users: List, summary_data: Dict) -> bool:
         """
         Send daily summary of changes to admin users
@@ -402,19 +441,22 @@ The BandSync Team
         try:
             template = self.template_env.get_template('daily_summary.html')
             
-            success_count = 0
-            for admin in admin_users:
-                html_content = template.render(
-                    user=admin,
-                    organization=organization,
-                    summary=summary_data,
-                    base_url=self.base_url
+            subject = f"Daily Summary - {organization.name} - {datetime.now().strftime('%B %d, %Y')}"
+            emails = [
+                OutboundEmail(
+                    to=admin.email,
+                    subject=subject,
+                    html=template.render(
+                        user=admin,
+                        organization=organization,
+                        summary=summary_data,
+                        base_url=self.base_url
+                    )
                 )
-                
-                subject = f"Daily Summary - {organization.name} - {datetime.now().strftime('%B %d, %Y')}"
-                
-                if self._send_email([admin.email], subject, html_content):
-                    success_count += 1
+                for admin in admin_users
+            ]
+            results = self.send_bulk(emails, background=False)
+            success_count = sum(1 for r in results if r.status == 'sent')
             
             logger.info(f"Sent daily summary to {success_count} admins")
             return success_count > 0
@@ -437,26 +479,10 @@ The BandSync Team
             bool: True if emails sent successfully
         """
         try:
-            template = self.template_env.get_template('substitute_request.html')
-            
-            substitute_url = f"{self.base_url}/events/{event.id}/substitute/{requesting_user.id}"
-            
-            success_count = 0
-            for substitute in potential_substitutes:
-                html_content = template.render(
-                    substitute_user=substitute,
-                    requesting_user=requesting_user,
-                    event=event,
-                    organization=event.organization,
-                    message=message,
-                    substitute_url=substitute_url,
-                    base_url=self.base_url
-                )
-                
-                subject = f"Substitute Request: {event.title} - {event.date.strftime('%B %d, %Y')}"
-                
-                if self._send_email([substitute.email], subject, html_content):
-                    success_count += 1
+            emails = [self.render_substitute_request(event, requesting_user, substitute, message)
+                      for substitute in potential_substitutes]
+            results = self.send_bulk(emails, background=False)
+            success_count = sum(1 for r in results if r.status == 'sent')
             
             logger.info(f"Sent substitute requests to {success_count} potential substitutes")
             return success_count > 0
@@ -465,6 +491,28 @@ The BandSync Team
             logger.error(f"Error sending substitute requests: {str(e)}")
             return False
     
+    def render_substitute_request(self, event, requesting_user, substitute, message: str = "") -> OutboundEmail:
+        """Render the substitute request email for one call-list member"""
+        template = self.template_env.get_template('substitute_request.html')
+        html_content = template.render(
+            substitute_user=substitute,
+            requesting_user=requesting_user,
+            event=event,
+            organization=event.organization,
+            message=message,
+            substitute_url=f"{self.base_url}/substitution",
+            base_url=self.base_url
+        )
+        return OutboundEmail(
+            to=substitute.email,
+            subject=f"Substitute Request: {event.title} - {event.date.strftime('%B %d, %Y')}",
+            html=html_content,
+            user_id=substitute.id,
+            organization_id=event.organization_id,
+            email_type='substitute_request',
+            event_id=event.id
+        )
+    
     def send_user_invitation(self, user, temporary_password: str, inviting_admin, organization) -> bool:
         """
         Send user invitation email with login credentials
@@ -502,3 +550,7 @@ The BandSync Team
 
 # Global email service instance
 email_service = EmailService()
+
+def send_email(to_email: str, subject: str, html_content: str, email_type: Optional[str] = None) -> bool:
+    """Send a single email through the global email service"""
+    return email_service._send_email([to_email], subject, html_content)
@@ -0,0 +1,219 @@
+"""
+Custom Field Summaries for BandSync
+
+Summarizes members' answers to an event's custom fields for the organizers'
+summary page. Counts come from one GROUP BY (field_id, response_value) over
+the event's responses rather than a query per field, and the finished
+summary is cached per event.
+
+Cached summaries are dropped when responses or fields of their event are
+committed in this process. Writes made by other workers never reach this
+cache, so entries only live FIELD_SUMMARY_CACHE_TTL seconds: long enough to
+absorb organizers refreshing the page, short enough that another worker's
+answers show up within a refresh or two.
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+from sqlalchemy import event as sa_event, select, func
+from sqlalchemy.orm import Session, joinedload
+from models import db, EventCustomField, EventFieldResponse
+from utils.db_utils import dialect_insert
+
+# Field types whose answers are summarized as a distribution of values
+DISTRIBUTION_TYPES = ('select', 'checkbox', 'number')
+
+
+class FieldSummaryCache:
+    """In-process cache of field summaries: (event_id, include_responses) -> (summary, expires_at)"""
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self._entries: Dict[Tuple, Tuple[dict, datetime]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry[1] > datetime.utcnow():
+            return entry[0]
+        return None
+
+    def set(self, key: Tuple, summary: dict):
+        with self._lock:
+            self._entries[key] = (summary, datetime.utcnow() + self.ttl)
+
+    def invalidate(self, event_ids):
+        event_ids = set(event_ids)
+        if not event_ids:
+            return
+        with self._lock:
+            for key in [key for key in self._entries if key[0] in event_ids]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FieldSummaryService:
+    """Record and summarize custom field responses"""
+
+    def __init__(self):
+        self.cache = FieldSummaryCache(int(os.environ.get('FIELD_SUMMARY_CACHE_TTL', 30)))
+
+    def summary(self, event_id, include_responses=True):
+        """
+        Per-field summary of an event's responses, keyed by field ID.
+
+        Every field has field_name, field_type, total_responses and answered
+        (non-empty answers). Select, checkbox and number fields add a
+        'distribution' of answer -> count (per ticked option for
+        checkboxes); number fields also get min, max and average.
+        With include_responses each field lists the individual responses as
+        well.
+        """
+        key = (event_id, include_responses)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        fields = EventCustomField.query.filter_by(event_id=event_id).order_by(
+            EventCustomField.display_order, EventCustomField.id
+        ).all()
+        summary = {
+            field.id: {
+                'field_name': field.field_name,
+                'field_type': field.field_type,
+                'total_responses': 0,
+                'answered': 0
+            } for field in fields
+        }
+        for field in fields:
+            if field.field_type in DISTRIBUTION_TYPES:
+                summary[field.id]['distribution'] = {}
+
+        counts = db.session.execute(
+            select(EventFieldResponse.field_id, EventFieldResponse.response_value, func.count())
+            .where(EventFieldResponse.event_id == event_id)
+            .group_by(EventFieldResponse.field_id, EventFieldResponse.response_value)
+        )
+        numbers = {}
+        for field_id, value, count in counts:
+            field_summary = summary.get(field_id)
+            if field_summary is None:
+                continue
+            field_summary['total_responses'] += count
+            if value in (None, ''):
+                continue
+            field_summary['answered'] += count
+            if field_summary['field_type'] == 'checkbox':
+                # Ticked options are stored comma-separated; count each option
+                distribution = field_summary['distribution']
+                for option in filter(None, value.split(',')):
+                    distribution[option] = distribution.get(option, 0) + count
+            elif 'distribution' in field_summary:
+                field_summary['distribution'][value] = count
+            if field_summary['field_type'] == 'number':
+                try:
+                    numbers.setdefault(field_id, []).append((float(value), count))
+                except ValueError:
+                    pass
+
+        for field_id, values in numbers.items():
+            total = sum(count for _, count in values)
+            summary[field_id].update({
+                'min': min(number for number, _ in values),
+                'max': max(number for number, _ in values),
+                'average': sum(number * count for number, count in values) / total
+            })
+
+        if include_responses:
+            for field_summary in summary.values():
+                field_summary['responses'] = []
+            responses = EventFieldResponse.query.filter_by(event_id=event_id).options(
+                joinedload(EventFieldResponse.user)
+            ).order_by(EventFieldResponse.field_id, EventFieldResponse.id)
+            for response in responses:
+                if response.field_id not in summary:
+                    continue
+                summary[response.field_id]['responses'].append({
+                    'user_id': response.user_id,
+                    'username': response.user.username,
+                    'name': response.user.name,
+                    'response_value': response.response_value,
+                    'submitted_at': response.updated_at.isoformat()
+                })
+
+        self.cache.set(key, summary)
+        return summary
+
+    @staticmethod
+    def upsert_responses(event_id, user_id, responses):
+        """
+        Store a member's answers to the event's fields in one statement,
+        replacing earlier answers. Answers to fields the event doesn't have
+        are ignored. Does not commit.
+
+        Returns:
+            int: Number of answers stored
+        """
+        field_ids = set(db.session.scalars(
+            select(EventCustomField.id).where(EventCustomField.event_id == event_id)
+        ))
+        now = datetime.utcnow()
+        rows = [{
+            'event_id': event_id,
+            'user_id': user_id,
+            'field_id': int(field_id),
+            'response_value': response_value,
+            'created_at': now,
+            'updated_at': now
+        } for field_id, response_value in responses.items() if int(field_id) in field_ids]
+        if not rows:
+            return 0
+
+        stmt = dialect_insert(EventFieldResponse).values(rows)
+        db.session.execute(stmt.on_conflict_do_update(
+            # A field belongs to one event, so (user_id, field_id) identifies the answer
+            index_elements=['user_id', 'field_id'],
+            set_={'response_value': stmt.excluded.response_value, 'updated_at': stmt.excluded.updated_at}
+        ))
+        note_field_change(db.session, [event_id])
+        return len(rows)
+
+
+# Global instance
+field_summary_service = FieldSummaryService()
+
+
+def note_field_change(session, event_ids):
+    """
+    Drop these events' cached summaries once `session` commits. Called by
+    the flush hook; core statements that skip it call it directly.
+    """
+    session.info.setdefault('field_summary_changes', set()).update(event_ids)
+
+
+@sa_event.listens_for(Session, 'after_flush')
+def _collect_field_changes(session, flush_context):
+    """Remember which events had custom fields or responses written in this transaction"""
+    objects = list(session.new) + list(session.dirty) + list(session.deleted)
+    event_ids = [obj.event_id for obj in objects
+                 if isinstance(obj, (EventCustomField, EventFieldResponse)) and obj.event_id]
+    if event_ids:
+        note_field_change(session, event_ids)
+
+
+@sa_event.listens_for(Session, 'after_commit')
+def _invalidate_field_summaries(session):
+    changes = session.info.pop('field_summary_changes', None)
+    if changes:
+        field_summary_service.cache.invalidate(changes)
+
+
+@sa_event.listens_for(Session, 'after_rollback')
+def _discard_field_changes(session):
+    session.info.pop('field_summary_changes', None)
@@ -0,0 +1,189 @@
+"""
+Live Updates for BandSync
+Writes publish small JSON deltas (a new message, a changed RSVP, a substitute
+request) to channels, and browsers hold a Server-Sent Events connection to
+GET /api/stream to receive the ones on their channels:
+
+    org:<organization_id>   everyone signed in to the organization
+    user:<user_id>          one member
+
+Deltas queued with publish() go out only once the session commits. The
+broker is in-process by default, which only reaches clients connected to the
+same worker; LIVE_UPDATES_REDIS_URL (required in production, which runs
+several workers) fans out across workers through Redis pub/sub.
+"""
+
+import os
+import json
+import queue
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Deltas buffered per connection before it's told to resync instead
+SUBSCRIBER_QUEUE_SIZE = int(os.environ.get('LIVE_UPDATES_QUEUE_SIZE', 256))
+
+
+def org_channel(organization_id) -> str:
+    return f'org:{organization_id}'
+
+
+def user_channel(user_id) -> str:
+    return f'user:{user_id}'
+
+
+class Subscription:
+    """One client connection's view of its channels"""
+
+    def __init__(self, broker: 'LiveUpdateBroker', channels: Iterable[str], maxsize: int = SUBSCRIBER_QUEUE_SIZE):
+        self.broker = broker
+        self.channels = frozenset(channels)
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize)
+
+    def put(self, message: Dict):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            # A client this far behind refetches rather than replaying deltas
+            self.overflowed = True
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """The next delta, or None if none arrived within `timeout` seconds"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+# =============================================================================
+# Brokers
+# =============================================================================
+
+class LiveUpdateBroker:
+    """In-process pub/sub: delivers to subscriptions in this worker.
+
+    Subclasses that fan out between processes override publish() and call
+    deliver() for messages arriving from elsewhere.
+    """
+
+    def __init__(self):
+        self._subscriptions: Dict[str, set] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels: Iterable[str]) -> Subscription:
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscriptions[channel].discard(subscription)
+                if not self._subscriptions[channel]:
+                    del self._subscriptions[channel]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len({s for subscriptions in self._subscriptions.values() for s in subscriptions})
+
+    def publish(self, channel: str, message: Dict):
+        self.deliver(channel, message)
+
+    def deliver(self, channel: str, message: Dict):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+
+class RedisLiveUpdateBroker(LiveUpdateBroker):
+    """Fans deltas out to every worker through Redis pub/sub"""
+
+    prefix = 'bandsync:live:'
+
+    def __init__(self, url: str):
+        super().__init__()
+        import redis  # Only needed for multi-worker deployments
+
+        self._redis = redis.Redis.from_url(url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.psubscribe(f'{self.prefix}*')
+        self._listener = threading.Thread(target=self._listen, name='live-updates-redis', daemon=True)
+        self._listener.start()
+
+    def publish(self, channel: str, message: Dict):
+        self._redis.publish(f'{self.prefix}{channel}', json.dumps(message))
+
+    def _listen(self):
+        for item in self._pubsub.listen():
+            try:
+                channel = item['channel'].decode()[len(self.prefix):]
+                self.deliver(channel, json.loads(item['data']))
+            except Exception as e:
+                logger.error(f"Dropped malformed live update: {str(e)}")
+
+
+_default_broker = None
+_default_broker_lock = threading.Lock()
+
+def get_broker() -> LiveUpdateBroker:
+    """Process-wide broker, Redis-backed when LIVE_UPDATES_REDIS_URL is set"""
+    global _default_broker
+    with _default_broker_lock:
+        if _default_broker is None:
+            redis_url = os.environ.get('LIVE_UPDATES_REDIS_URL')
+            if not redis_url and os.environ.get('ENVIRONMENT') == 'production':
+                logger.error("LIVE_UPDATES_REDIS_URL is not set: live updates only reach "
+                             "clients connected to the worker that published them")
+            _default_broker = RedisLiveUpdateBroker(redis_url) if redis_url else LiveUpdateBroker()
+        return _default_broker
+
+
+# =============================================================================
+# Publishing
+# =============================================================================
+
+def publish(session, channels: Iterable[str], event_type: str, data: Dict):
+    """Queue a delta for `channels`, sent when `session` commits and dropped if it rolls back"""
+    pending: List = session.info.setdefault('live_updates', [])
+    pending.append((tuple(channels), {'type': event_type, 'data': data}))
+
+
+def publish_now(channels: Iterable[str], event_type: str, data: Dict):
+    """Send a delta that isn't tied to a database write"""
+    message = {'type': event_type, 'data': data}
+    broker = get_broker()
+    for channel in channels:
+        broker.publish(channel, message)
+
+
+@sa_event.listens_for(Session, 'after_commit')
+def _send_live_updates(session):
+    pending = session.info.pop('live_updates', None)
+    if not pending:
+        return
+    broker = get_broker()
+    for channels, message in pending:
+        for channel in channels:
+            try:
+                broker.publish(channel, message)
+            except Exception as e:
+                # Clients resync on reconnect; never fail the write over a delta
+                logger.error(f"Failed to publish live update to {channel}: {str(e)}")
+
+
+@sa_event.listens_for(Session, 'after_rollback')
+def _discard_live_updates(session):
+    session.info.pop('live_updates', None)
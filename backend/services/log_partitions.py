@@ -0,0 +1,358 @@
+"""
+Log Partitions for BandSync
+The append-only log tables (audit_log, security_event, email_log) are split
+into monthly partitions so retention can drop a whole month at once instead
+of DELETEing rows and leaving vacuum to clean up after it.
+
+On PostgreSQL, partition_table() converts an existing table into one
+range-partitioned on its timestamp column, with one partition per month plus
+a default partition, and ensure_partitions() keeps the next few months
+created ahead of time. SQLite (dev) has no partitioning, so there a month is
+just a range of rows and dropping one is a DELETE; the same holds for a
+PostgreSQL table that hasn't been converted yet.
+
+Retention is driven by the active global SecurityPolicy of type
+'data_retention', e.g.
+
+    {"audit_log_days": 365, "security_event_days": 730,
+     "email_log_days": 180, "action": "archive"}
+
+Tables without a period are kept forever. With action 'archive' (the
+default) each expired month is written to <archive_dir>/<table>/
+<table>_YYYY_MM.ndjson.gz before it's dropped; 'drop' discards it.
+
+Every function takes a Connection and leaves committing to the caller,
+except apply_retention(), which commits after each month.
+"""
+
+import os
+import re
+import gzip
+import json
+import logging
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, text, func, and_
+from sqlalchemy.schema import CreateIndex, AddConstraint
+from models import AuditLog, SecurityEvent, EmailLog, SecurityPolicy
+
+logger = logging.getLogger(__name__)
+
+# Log table -> the timestamp column it's partitioned and expired on
+LOG_TABLES = {
+    'audit_log': 'timestamp',
+    'security_event': 'timestamp',
+    'email_log': 'sent_at',
+}
+MODELS = {
+    'audit_log': AuditLog,
+    'security_event': SecurityEvent,
+    'email_log': EmailLog,
+}
+
+# Monthly partitions created ahead of the current month
+PARTITION_MONTHS_AHEAD = int(os.environ.get('LOG_PARTITION_MONTHS_AHEAD', 3))
+LOG_ARCHIVE_DIR = os.environ.get('LOG_ARCHIVE_DIR', 'log_archive')
+
+DEFAULT_RETENTION = {
+    'audit_log_days': None,
+    'security_event_days': None,
+    'email_log_days': None,
+    'action': 'archive',
+}
+
+ARCHIVE_BATCH_SIZE = 1000
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f'{table}_{month:%Y_%m}'
+
+
+def _column(table: str):
+    return MODELS[table].__table__.c[LOG_TABLES[table]]
+
+
+def _month_range(table: str, month: datetime):
+    column = _column(table)
+    return and_(column >= month, column < add_months(month, 1))
+
+
+def is_partitioned(connection, table: str) -> bool:
+    if connection.dialect.name != 'postgresql':
+        return False
+    return bool(connection.execute(text(
+        'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))'
+    ), {'table': table}).scalar())
+
+
+def _partitions(connection, table: str) -> Dict[datetime, str]:
+    """Month -> partition name for the table's monthly partitions"""
+    names = connection.execute(text(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = to_regclass(:table)'
+    ), {'table': table}).scalars()
+    pattern = re.compile(rf'^{table}_(\d{{4}})_(\d{{2}})$')
+    months = {}
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            months[datetime(int(match.group(1)), int(match.group(2)), 1)] = name
+    return months
+
+
+def _create_partition(connection, table: str, month: datetime):
+    """
+    Create one month's partition. Rows that already landed in the default
+    partition for that month are moved into it.
+    """
+    name, default = partition_name(table, month), f'{table}_default'
+    bounds = f"FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+    column = LOG_TABLES[table]
+    stray = connection.execute(text(
+        f'SELECT 1 FROM "{default}" WHERE "{column}" >= :start AND "{column}" < :end LIMIT 1'
+    ), {'start': month, 'end': add_months(month, 1)}).first()
+    if not stray:
+        connection.execute(text(f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" FOR VALUES {bounds}'))
+        return
+
+    connection.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{default}"'))
+    connection.execute(text(f'CREATE TABLE "{name}" PARTITION OF "{table}" FOR VALUES {bounds}'))
+    connection.execute(text(
+        f'WITH moved AS (DELETE FROM "{default}" WHERE "{column}" >= :start AND "{column}" < :end RETURNING *) '
+        f'INSERT INTO "{table}" SELECT * FROM moved'
+    ), {'start': month, 'end': add_months(month, 1)})
+    connection.execute(text(f'ALTER TABLE "{table}" ATTACH PARTITION "{default}" DEFAULT'))
+
+
+def ensure_partitions(connection, table: str, now: Optional[datetime] = None) -> List[str]:
+    """
+    Create the current month's partition and PARTITION_MONTHS_AHEAD after it.
+    Does nothing for tables that aren't partitioned.
+
+    Returns:
+        list: Names of the partitions created
+    """
+    if not is_partitioned(connection, table):
+        return []
+    existing = _partitions(connection, table)
+    current = month_start(now or datetime.utcnow())
+    created = []
+    for offset in range(PARTITION_MONTHS_AHEAD + 1):
+        month = add_months(current, offset)
+        if month not in existing:
+            _create_partition(connection, table, month)
+            created.append(partition_name(table, month))
+    return created
+
+
+def partition_table(connection, table: str, now: Optional[datetime] = None) -> bool:
+    """
+    Convert a PostgreSQL log table into a monthly range-partitioned one,
+    copying its rows across. Takes an ACCESS EXCLUSIVE lock on the table for
+    the duration, so run it in a quiet period. Run inside a transaction.
+
+    Returns:
+        bool: False if the table was already partitioned
+    """
+    if connection.dialect.name != 'postgresql':
+        raise NotImplementedError(f"Partitioning is not supported on {connection.dialect.name}")
+
+    # Two processes converting at once would rename the new table away
+    connection.execute(text('SELECT pg_advisory_xact_lock(hashtext(:key))'), {'key': f'partition:{table}'})
+    if is_partitioned(connection, table):
+        return False
+
+    sa_table = MODELS[table].__table__
+    column = LOG_TABLES[table]
+    legacy = f'{table}_unpartitioned'
+    sequence = connection.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {'table': table}).scalar()
+
+    # The partition key is part of the primary key, so it can't be NULL
+    connection.execute(text(f'''UPDATE "{table}" SET "{column}" = now() AT TIME ZONE 'utc' WHERE "{column}" IS NULL'''))
+    first = connection.execute(text(f'SELECT min("{column}") FROM "{table}"')).scalar()
+
+    connection.execute(text(f'ALTER TABLE "{table}" RENAME TO "{legacy}"'))
+    connection.execute(text(
+        f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS) PARTITION BY RANGE ("{column}")'
+    ))
+    connection.execute(text(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT'))
+    current = month_start(now or datetime.utcnow())
+    month = min(month_start(first), current) if first else current
+    while month <= add_months(current, PARTITION_MONTHS_AHEAD):
+        _create_partition(connection, table, month)
+        month = add_months(month, 1)
+
+    connection.execute(text(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"'))
+    if sequence:
+        connection.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY "{table}".id'))
+    connection.execute(text(f'DROP TABLE "{legacy}"'))
+
+    # Constraints and indexes go on after the copy, once the old table's names are free
+    connection.execute(text(f'ALTER TABLE "{table}" ADD PRIMARY KEY (id, "{column}")'))
+    for index in sa_table.indexes:
+        connection.execute(CreateIndex(index, if_not_exists=True))
+    for constraint in sa_table.foreign_key_constraints:
+        connection.execute(AddConstraint(constraint))
+    logger.info(f"Partitioned {table} by month on {column}")
+    return True
+
+
+def expired_months(connection, table: str, cutoff: datetime) -> List[datetime]:
+    """Months of the table that ended on or before `cutoff` and still hold rows (or a partition)"""
+    last = month_start(cutoff)
+    column = LOG_TABLES[table]
+    if is_partitioned(connection, table):
+        months = {month for month in _partitions(connection, table) if month < last}
+        # Plus anything that fell into the default partition
+        values = connection.execute(text(
+            f'''SELECT DISTINCT to_char("{column}", 'YYYY-MM') FROM "{table}_default" WHERE "{column}" < :last'''
+        ), {'last': last}).scalars()
+    else:
+        months = set()
+        bucket = _column(table)
+        bucket = func.strftime('%Y-%m', bucket) if connection.dialect.name == 'sqlite' else func.to_char(bucket, 'YYYY-MM')
+        values = connection.execute(select(bucket).where(_column(table) < last).group_by(bucket)).scalars()
+    for value in values:
+        year, month = value.split('-')
+        months.add(datetime(int(year), int(month), 1))
+    return sorted(months)
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def archive_month(connection, table: str, month: datetime, archive_dir: str) -> Tuple[str, int]:
+    """
+    Stream one month of rows to <archive_dir>/<table>/<table>_YYYY_MM.ndjson.gz
+
+    Returns:
+        tuple: (archive path, rows written)
+    """
+    sa_table = MODELS[table].__table__
+    directory = os.path.join(archive_dir, table)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{partition_name(table, month)}.ndjson.gz')
+    partial = f'{path}.partial'
+
+    rows = 0
+    result = connection.execution_options(stream_results=True, yield_per=ARCHIVE_BATCH_SIZE).execute(
+        select(sa_table).where(_month_range(table, month)).order_by(sa_table.c.id)
+    )
+    with gzip.open(partial, 'wt', encoding='utf-8') as archive:
+        for row in result:
+            archive.write(json.dumps(dict(row._mapping), default=_json_default) + '\n')
+            rows += 1
+    # Only a complete archive takes the final name
+    os.replace(partial, path)
+    return path, rows
+
+
+def drop_month(connection, table: str, month: datetime) -> Optional[int]:
+    """
+    Remove one month of rows: detach and drop its partition, or DELETE the
+    range where there isn't one.
+
+    Returns:
+        int: Rows deleted by DELETE (None when only a partition was dropped)
+    """
+    deleted = None
+    if is_partitioned(connection, table):
+        name = _partitions(connection, table).get(month)
+        if name:
+            connection.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"'))
+            connection.execute(text(f'DROP TABLE "{name}"'))
+    sa_table = MODELS[table].__table__
+    result = connection.execute(sa_table.delete().where(_month_range(table, month)))
+    if result.rowcount:
+        deleted = result.rowcount
+    return deleted
+
+
+def estimated_row_count(connection, table: str) -> int:
+    """
+    Planner estimate of the table's rows on PostgreSQL (summed over its
+    partitions), so dashboards don't count(*) the largest tables; exact elsewhere.
+    """
+    if connection.dialect.name == 'postgresql':
+        return int(connection.execute(text(
+            'SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0) FROM pg_class c '
+            'WHERE c.oid = to_regclass(:table) '
+            'OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(:table))'
+        ), {'table': table}).scalar())
+    return connection.execute(select(func.count()).select_from(MODELS[table].__table__)).scalar()
+
+
+def retention_policy() -> Dict:
+    """The active global 'data_retention' SecurityPolicy merged over DEFAULT_RETENTION"""
+    policy = SecurityPolicy.query.filter_by(
+        policy_type='data_retention', organization_id=None, is_active=True
+    ).order_by(SecurityPolicy.updated_at.desc()).first()
+    return {**DEFAULT_RETENTION, **(policy.policy_config if policy else {})}
+
+
+def apply_retention(connection, policy: Dict, archive_dir: Optional[str] = None,
+                    now: Optional[datetime] = None, dry_run: bool = False) -> List[Dict]:
+    """
+    Archive (unless the policy's action is 'drop') and drop every month
+    that ended before its table's retention period, committing per month.
+
+    Returns:
+        list: One dict per expired month: table, month, rows, archive
+    """
+    action = policy.get('action', 'archive')
+    if action not in ('archive', 'drop'):
+        raise ValueError(f"Unknown retention action: {action}")
+    archive_dir = archive_dir or LOG_ARCHIVE_DIR
+    now = now or datetime.utcnow()
+
+    expired = []
+    for table in LOG_TABLES:
+        days = policy.get(f'{table}_days')
+        if not days:
+            continue
+        for month in expired_months(connection, table, now - timedelta(days=int(days))):
+            entry = {'table': table, 'month': f'{month:%Y-%m}', 'rows': None, 'archive': None}
+            expired.append(entry)
+            if dry_run:
+                continue
+            try:
+                if action == 'archive':
+                    entry['archive'], entry['rows'] = archive_month(connection, table, month, archive_dir)
+                deleted = drop_month(connection, table, month)
+                if entry['rows'] is None:
+                    entry['rows'] = deleted
+                connection.commit()
+                logger.info(f"Retention: {'archived' if action == 'archive' else 'dropped'} "
+                            f"{table} {entry['month']} ({entry['rows']} rows)")
+            except Exception:
+                connection.rollback()
+                raise
+        if not dry_run:
+            ensure_partitions(connection, table, now)
+            connection.commit()
+    return expired
+
+
+def maintain_partitions(connection, now: Optional[datetime] = None) -> List[str]:
+    """Create upcoming monthly partitions for every partitioned log table"""
+    created = []
+    for table in LOG_TABLES:
+        created.extend(ensure_partitions(connection, table, now))
+    connection.commit()
+    return created
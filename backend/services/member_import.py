@@ -0,0 +1,322 @@
+"""
+Member Import for BandSync
+
+Imports CSV member rosters in the background, a chunk at a time. Each chunk
+is validated with one conflict query, inserted with executemany and
+committed on its own, so a bad row or chunk never throws away the rest of
+the roster. Password hashing (deliberately slow) runs on a pool of threads
+and progress is recorded in member_import_jobs for the client to poll.
+
+Imports run on a thread of the worker that received the upload, so a
+restart loses them; the scheduler marks running jobs that stopped making
+progress as failed (see fail_stale_jobs).
+"""
+
+import io
+import os
+import re
+import csv
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, insert
+from werkzeug.security import generate_password_hash
+from models import db, User, UserOrganization, Section, MemberImportJob
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ['email', 'first_name', 'last_name']
+OPTIONAL_COLUMNS = ['phone', 'section', 'role', 'instrument']
+ROLES = ['Admin', 'Member']
+
+# Imported members sign in with this until they reset their password
+TEMPORARY_PASSWORD = 'TempPassword123!'
+
+# Errors kept on the job row; the count is always exact
+MAX_RECORDED_ERRORS = 500
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+
+class MemberImportError(Exception):
+    """The upload can't be imported at all (e.g. missing columns)"""
+    def __init__(self, message, **details):
+        super().__init__(message)
+        self.details = details
+
+
+def read_member_csv(file_storage):
+    """
+    Decode an uploaded roster lazily.
+
+    Returns:
+        tuple: (headers, iterator of (row_number, row dict))
+    """
+    text = io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    headers = reader.fieldnames or []
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in headers]
+    if missing_columns:
+        raise MemberImportError(
+            f'Missing required columns: {", ".join(missing_columns)}',
+            required_columns=REQUIRED_COLUMNS,
+            optional_columns=OPTIONAL_COLUMNS
+        )
+    return headers, enumerate(reader, start=1)
+
+
+def iter_chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class MemberImportService:
+    """Validate and import member rosters"""
+
+    CHUNK_SIZE = int(os.environ.get('MEMBER_IMPORT_CHUNK_SIZE', 500))
+    HASH_WORKERS = int(os.environ.get('MEMBER_IMPORT_HASH_WORKERS', os.cpu_count() or 2))
+    # A chunk takes seconds, so a running job this long without progress is gone
+    STALE_AFTER = timedelta(minutes=int(os.environ.get('MEMBER_IMPORT_STALE_MINUTES', 10)))
+
+    _jobs = ThreadPoolExecutor(max_workers=1, thread_name_prefix='member-import')
+    # hashlib's scrypt/pbkdf2 release the GIL, so threads hash in parallel
+    # without re-importing the app in child processes
+    _hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='member-import-hash')
+
+    @staticmethod
+    def normalize_row(row_number, row):
+        """Clean up one CSV (or JSON) row into the fields the importer uses"""
+        return {
+            'row_number': row_number,
+            'email': (row.get('email') or '').strip(),
+            'first_name': (row.get('first_name') or '').strip(),
+            'last_name': (row.get('last_name') or '').strip(),
+            'phone': (row.get('phone') or '').strip(),
+            'section': (row.get('section') or '').strip(),
+            'role': (row.get('role') or 'Member').strip(),
+            'instrument': (row.get('instrument') or '').strip()
+        }
+
+    @staticmethod
+    def validate_chunk(rows, organization_id, seen_emails):
+        """
+        Validate a chunk of normalized rows in place.
+
+        Field errors are added to row['errors']. Account conflicts for the
+        whole chunk are resolved with one query: row['existing_user_id'] is
+        set when the email already has an account and row['is_member'] when
+        that account already belongs to the organization. seen_emails carries
+        duplicate detection across chunks.
+        """
+        emails = {row['email'].lower() for row in rows if row['email']}
+        existing = {}
+        if emails:
+            existing = {
+                email.lower(): (user_id, membership_id is not None)
+                for user_id, email, membership_id in db.session.query(
+                    User.id, User.email, UserOrganization.id
+                ).outerjoin(UserOrganization, and_(
+                    UserOrganization.user_id == User.id,
+                    UserOrganization.organization_id == organization_id
+                )).filter(func.lower(User.email).in_(emails))
+            }
+
+        for row in rows:
+            errors = []
+            email = row['email'].lower()
+            if not email:
+                errors.append('Email is required')
+            elif not EMAIL_PATTERN.match(row['email']):
+                errors.append('Invalid email format')
+            elif email in seen_emails:
+                errors.append('Duplicate email in import file')
+            else:
+                seen_emails.add(email)
+
+            if not row['first_name']:
+                errors.append('First name is required')
+            if not row['last_name']:
+                errors.append('Last name is required')
+            if row['role'] not in ROLES:
+                errors.append('Role must be Admin or Member')
+
+            row['errors'] = errors
+            row['existing_user_id'], row['is_member'] = existing.get(email, (None, False))
+        return rows
+
+    @staticmethod
+    def start_import(app, organization_id, created_by, rows):
+        """
+        Record a job and import `rows` (normalized dicts) in the background.
+
+        Returns:
+            MemberImportJob: The queued job, for its ID
+        """
+        job = MemberImportJob(
+            id=str(uuid.uuid4()),
+            organization_id=organization_id,
+            created_by=created_by,
+            total_rows=len(rows),
+            errors=[]
+        )
+        db.session.add(job)
+        db.session.commit()
+        MemberImportService._jobs.submit(MemberImportService._run_import, app, job.id, rows)
+        return job
+
+    @staticmethod
+    def fail_stale_jobs(now=None):
+        """
+        Mark running jobs whose worker went away (no progress for STALE_AFTER)
+        as failed, so clients polling them stop waiting. Commits.
+
+        Returns:
+            int: Number of jobs marked failed
+        """
+        now = now or datetime.utcnow()
+        stale = MemberImportJob.query.filter(
+            MemberImportJob.status == 'running',
+            func.coalesce(MemberImportJob.updated_at, MemberImportJob.started_at) < now - MemberImportService.STALE_AFTER
+        ).all()
+        for job in stale:
+            job.status = 'failed'
+            job.finished_at = now
+            job.errors = (job.errors or []) + [{
+                'row_number': None, 'email': None,
+                'error': f'Import stopped after {job.processed_rows} of {job.total_rows} rows; upload the remaining rows again'
+            }]
+            logger.warning(f"Member import {job.id} stopped making progress; marked failed")
+        if stale:
+            db.session.commit()
+        return len(stale)
+
+    @staticmethod
+    def _run_import(app, job_id, rows):
+        with app.app_context():
+            try:
+                job = db.session.get(MemberImportJob, job_id)
+                job.status = 'running'
+                job.started_at = datetime.utcnow()
+                db.session.commit()
+
+                sections = {
+                    name.lower(): section_id for section_id, name in db.session.query(Section.id, Section.name).filter(
+                        Section.organization_id == job.organization_id
+                    )
+                }
+                seen_emails = set()
+
+                for chunk in iter_chunks(rows, MemberImportService.CHUNK_SIZE):
+                    try:
+                        counts, errors = MemberImportService._import_chunk(job.organization_id, chunk, sections, seen_emails)
+                    except Exception as e:
+                        # Only this chunk is lost; earlier chunks are already committed
+                        db.session.rollback()
+                        logger.error(f"Member import {job_id} chunk failed: {str(e)}")
+                        counts = {}
+                        errors = [{'row_number': row['row_number'], 'email': row['email'], 'error': str(e)}
+                                  for row in chunk]
+
+                    job = db.session.get(MemberImportJob, job_id)
+                    job.processed_rows += len(chunk)
+                    job.created_count += counts.get('created', 0)
+                    job.added_count += counts.get('added', 0)
+                    job.skipped_count += counts.get('skipped', 0)
+                    job.error_count += len(errors)
+                    room = MAX_RECORDED_ERRORS - len(job.errors or [])
+                    if errors and room > 0:
+                        job.errors = (job.errors or []) + errors[:room]
+                    db.session.commit()
+
+                job.status = 'completed'
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+                logger.info(f"Member import {job_id} finished: {job.created_count} created, "
+                            f"{job.added_count} added, {job.skipped_count} skipped, {job.error_count} errors")
+
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Member import {job_id} failed: {str(e)}")
+                job = db.session.get(MemberImportJob, job_id)
+                if job:
+                    job.status = 'failed'
+                    job.finished_at = datetime.utcnow()
+                    job.errors = (job.errors or []) + [{'row_number': None, 'email': None, 'error': str(e)}]
+                    db.session.commit()
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def _import_chunk(organization_id, chunk, sections, seen_emails):
+        """Validate, insert and commit one chunk. Returns (counts, errors)."""
+        MemberImportService.validate_chunk(chunk, organization_id, seen_emails)
+
+        errors = [{'row_number': row['row_number'], 'email': row['email'], 'error': '; '.join(row['errors'])}
+                  for row in chunk if row['errors']]
+        valid = [row for row in chunk if not row['errors']]
+        skipped = [row for row in valid if row['is_member']]
+        to_add = [row for row in valid if row['existing_user_id'] and not row['is_member']]
+        to_create = [row for row in valid if not row['existing_user_id']]
+
+        user_ids = {row['email']: row['existing_user_id'] for row in to_add}
+        if to_create:
+            usernames = MemberImportService._assign_usernames([row['email'] for row in to_create])
+            hashes = MemberImportService._hash_passwords(len(to_create))
+            new_users = [{
+                'username': usernames[row['email']],
+                'email': row['email'],
+                'name': f"{row['first_name']} {row['last_name']}",
+                'phone': row['phone'],
+                'password_hash': password_hash,
+                'role': row['role'],
+                'organization_id': organization_id,  # Legacy field
+                'current_organization_id': organization_id,
+                'primary_organization_id': organization_id,
+                'section_id': sections.get(row['section'].lower())
+            } for row, password_hash in zip(to_create, hashes)]
+            for user_id, email in db.session.execute(insert(User).returning(User.id, User.email), new_users):
+                user_ids[email] = user_id
+
+        memberships = [{
+            'user_id': user_ids[row['email']],
+            'organization_id': organization_id,
+            'role': row['role'],
+            'section_id': sections.get(row['section'].lower()),
+            'is_active': True,
+            'joined_at': datetime.utcnow()
+        } for row in to_create + to_add]
+        if memberships:
+            db.session.execute(insert(UserOrganization), memberships)
+        db.session.commit()
+
+        return {'created': len(to_create), 'added': len(to_add), 'skipped': len(skipped)}, errors
+
+    @staticmethod
+    def _assign_usernames(emails):
+        """Unique usernames from email local parts, checked against the database in one query"""
+        bases = {email: re.sub(r'[^a-z0-9._-]', '', email.split('@')[0].lower())[:60] or 'member' for email in emails}
+        taken = {name for (name,) in db.session.query(User.username).filter(User.username.in_(set(bases.values())))}
+        usernames = {}
+        for email, base in bases.items():
+            username = base
+            if username in taken:
+                username = f'{base}_{uuid.uuid4().hex[:6]}'
+            taken.add(username)
+            usernames[email] = username
+        return usernames
+
+    @staticmethod
+    def _hash_passwords(count):
+        """Hash the temporary password `count` times, each with its own salt, in parallel"""
+        if count < 10 or MemberImportService.HASH_WORKERS <= 1:
+            return [generate_password_hash(TEMPORARY_PASSWORD) for _ in range(count)]
+        return list(MemberImportService._hash_pool.map(
+            generate_password_hash, [TEMPORARY_PASSWORD] * count
+        ))
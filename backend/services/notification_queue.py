@@ -0,0 +1,292 @@
+"""
+Notification Queue for BandSync
+
+Persistent, DB-backed queue for notification fan-out. Jobs are added to the
+session of the request that triggers them, so they only become visible when
+that change commits. The scheduler's process_notification_jobs job drains
+the queue every minute in each web worker; jobs/notification_worker.py can
+run alongside it as a dedicated process where the platform supports one.
+Claims use SKIP LOCKED, so any number of drainers can share the queue.
+"""
+
+import os
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, select, insert, literal, cast, String, exists
+from sqlalchemy.exc import IntegrityError
+from models import db, NotificationJob, Event, User, UserOrganization, SubstituteRequest
+from utils.db_utils import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationQueue:
+    """Enqueue and drain notification jobs"""
+
+    MAX_ATTEMPTS = int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', 5))
+    # A job left 'processing' this long belongs to a worker that died - hand it out again
+    LOCK_TIMEOUT = timedelta(minutes=10)
+
+    @staticmethod
+    def idempotency_key(job_type, event_id, user_id):
+        return f"{job_type}:{event_id}:{user_id}"
+
+    @staticmethod
+    def enqueue_event_fanout(event, job_type, payload=None):
+        """
+        Queue one job per notifiable member of the event's organization.
+
+        Runs as a single INSERT ... SELECT so the cost doesn't depend on
+        organization size. Members that already have a job with the same
+        (event, user, type) key are skipped. Does not commit.
+
+        Returns:
+            int: Number of jobs queued
+        """
+        key = (literal(f"{job_type}:{event.id}:") + cast(User.id, String)).label('idempotency_key')
+
+        recipients = select(
+            literal(job_type).label('job_type'),
+            key,
+            literal(event.organization_id).label('organization_id'),
+            literal(event.id).label('event_id'),
+            User.id.label('user_id'),
+            literal('pending').label('status'),
+            literal(0).label('attempts'),
+            literal(datetime.utcnow()).label('run_after'),
+            literal(datetime.utcnow()).label('created_at')
+        ).select_from(User).join(
+            UserOrganization, UserOrganization.user_id == User.id
+        ).where(
+            UserOrganization.organization_id == event.organization_id,
+            UserOrganization.is_active == True,
+            User.email.isnot(None),
+            User.email_notifications == True
+        )
+        if job_type == 'new_event':
+            recipients = recipients.where(User.email_new_events == True)
+
+        recipients = recipients.where(~exists().where(
+            NotificationJob.idempotency_key == (literal(f"{job_type}:{event.id}:") + cast(User.id, String))
+        ))
+
+        columns = ['job_type', 'idempotency_key', 'organization_id', 'event_id', 'user_id',
+                   'status', 'attempts', 'run_after', 'created_at']
+        result = db.session.execute(insert(NotificationJob).from_select(columns, recipients))
+
+        if payload:
+            db.session.query(NotificationJob).filter(
+                NotificationJob.event_id == event.id,
+                NotificationJob.job_type == job_type,
+                NotificationJob.status == 'pending'
+            ).update({'payload': payload}, synchronize_session=False)
+
+        logger.info(f"Queued {result.rowcount} {job_type} notifications for event {event.id}")
+        return result.rowcount
+
+    @staticmethod
+    def enqueue_rsvp_change(event_id, organization_id, user_id, previous_status, new_status):
+        """
+        Queue an admin RSVP-change notification. Does not commit.
+
+        Changes by the same member to the same event coalesce: while a job is
+        still pending only its new status is updated, and a finished job is
+        re-armed for the next change.
+        """
+        key = NotificationQueue.idempotency_key('rsvp_change', event_id, user_id)
+        job = NotificationJob.query.filter_by(idempotency_key=key).first()
+
+        if job and job.status == 'pending':
+            job.payload = {**(job.payload or {}), 'new_status': new_status}
+            return job
+
+        payload = {'previous_status': previous_status, 'new_status': new_status}
+        if job:
+            job.payload = payload
+            job.status = 'pending'
+            job.attempts = 0
+            job.run_after = datetime.utcnow()
+            job.locked_at = None
+            job.last_error = None
+            job.completed_at = None
+            return job
+
+        job = NotificationJob(
+            job_type='rsvp_change',
+            idempotency_key=key,
+            organization_id=organization_id,
+            event_id=event_id,
+            user_id=user_id,
+            payload=payload
+        )
+        try:
+            with db.session.begin_nested():
+                db.session.add(job)
+        except IntegrityError:
+            # Another request queued the same change first
+            job = NotificationJob.query.filter_by(idempotency_key=key).first()
+        return job
+
+    @staticmethod
+    def enqueue_substitute_offers(substitute_request, organization_id, user_ids):
+        """
+        Queue substitute request emails to one wave of call-list members.
+        Keyed by request rather than event, since an event can have several
+        requests. Does not commit.
+        """
+        now = datetime.utcnow()
+        rows = [{
+            'job_type': 'substitute_offer',
+            'idempotency_key': NotificationQueue.idempotency_key('substitute_offer', substitute_request.id, user_id),
+            'organization_id': organization_id,
+            'event_id': substitute_request.event_id,
+            'user_id': user_id,
+            'payload': {'request_id': substitute_request.id},
+            'status': 'pending',
+            'attempts': 0,
+            'run_after': now,
+            'created_at': now
+        } for user_id in user_ids]
+        if rows:
+            db.session.execute(
+                dialect_insert(NotificationJob).values(rows).on_conflict_do_nothing(index_elements=['idempotency_key'])
+            )
+        return len(rows)
+
+    @staticmethod
+    def claim(batch_size=100):
+        """Lock up to batch_size due jobs for this worker and mark them processing"""
+        now = datetime.utcnow()
+        jobs = NotificationJob.query.filter(or_(
+            and_(NotificationJob.status == 'pending', NotificationJob.run_after <= now),
+            and_(NotificationJob.status == 'processing', NotificationJob.locked_at < now - NotificationQueue.LOCK_TIMEOUT)
+        )).order_by(
+            NotificationJob.run_after, NotificationJob.id
+        ).limit(batch_size).with_for_update(skip_locked=True).all()
+
+        for job in jobs:
+            job.status = 'processing'
+            job.locked_at = now
+            job.attempts = (job.attempts or 0) + 1
+        db.session.commit()
+        return jobs
+
+    @staticmethod
+    def process_batch(batch_size=100, email_service=None):
+        """
+        Claim and deliver one batch of jobs.
+
+        Returns:
+            int: Number of jobs claimed (0 when the queue is drained)
+        """
+        if email_service is None:
+            from services.email_service import email_service
+
+        jobs = NotificationQueue.claim(batch_size)
+        if not jobs:
+            return 0
+
+        # Load every event and user the batch needs in two queries
+        event_ids = {job.event_id for job in jobs if job.event_id}
+        user_ids = {job.user_id for job in jobs if job.user_id}
+        events = {e.id: e for e in Event.query.filter(Event.id.in_(event_ids)).all()} if event_ids else {}
+        users = {u.id: u for u in User.query.filter(User.id.in_(user_ids)).all()} if user_ids else {}
+
+        pending_emails = []  # (job, OutboundEmail)
+        finished = set()
+        for job in jobs:
+            try:
+                emails = NotificationQueue._build_emails(job, events.get(job.event_id), users.get(job.user_id), email_service)
+                pending_emails.extend((job, email) for email in emails)
+            except Exception as e:
+                logger.error(f"Error preparing notification job {job.id}: {str(e)}")
+                NotificationQueue._retry_or_fail(job, str(e))
+                finished.add(job.id)
+
+        # Deliver the whole batch through the email pipeline (it writes EmailLog in bulk)
+        failures = {}
+        if pending_emails:
+            results = email_service.send_bulk([email for _, email in pending_emails], background=False)
+            if len(results) != len(pending_emails):
+                results = [None] * len(pending_emails)  # Email service not configured
+            for (job, _), result in zip(pending_emails, results):
+                if result is None or result.status != 'sent':
+                    failures[job.id] = result.error if result else 'Email service not configured'
+
+        now = datetime.utcnow()
+        for job in jobs:
+            if job.id in finished:
+                continue
+            if job.id in failures:
+                NotificationQueue._retry_or_fail(job, failures[job.id])
+            else:
+                job.status = 'sent'
+                job.completed_at = now
+                job.last_error = None
+
+        NotificationQueue._mark_cancellations_notified(
+            {job.event_id for job in jobs if job.job_type == 'event_cancellation'}
+        )
+        db.session.commit()
+
+        logger.info(f"Processed {len(jobs)} notification jobs ({len(failures)} failed)")
+        return len(jobs)
+
+    @staticmethod
+    def _build_emails(job, event, user, email_service):
+        """Turn a job into the emails it should send (may be empty)"""
+        if job.job_type == 'new_event':
+            if not event or not user or event.is_cancelled:
+                return []
+            return [email_service.render_new_event_notification(event, user)]
+
+        if job.job_type == 'event_cancellation':
+            if not event or not user:
+                return []
+            reason = event.cancellation_reason or (job.payload or {}).get('reason', '')
+            return [email_service.render_event_cancellation(user, event, reason)]
+
+        if job.job_type == 'rsvp_change':
+            from services.admin_attendance_service import AdminAttendanceService
+            payload = job.payload or {}
+            AdminAttendanceService.track_rsvp_change(
+                job.event_id, job.user_id, payload.get('previous_status'), payload.get('new_status')
+            )
+            return []
+
+        if job.job_type == 'substitute_offer':
+            substitute_request = db.session.get(SubstituteRequest, (job.payload or {}).get('request_id'))
+            # Nothing to offer once someone has taken the spot
+            if not event or not user or not substitute_request or substitute_request.status != 'open':
+                return []
+            return [email_service.render_substitute_request(
+                event, substitute_request.requester, user, substitute_request.request_message or ''
+            )]
+
+        raise ValueError(f"Unknown notification job type: {job.job_type}")
+
+    @staticmethod
+    def _retry_or_fail(job, error):
+        job.last_error = error
+        job.locked_at = None
+        if (job.attempts or 0) >= NotificationQueue.MAX_ATTEMPTS:
+            job.status = 'failed'
+            job.completed_at = datetime.utcnow()
+        else:
+            # Exponential backoff: 1, 2, 4, 8... minutes
+            job.status = 'pending'
+            job.run_after = datetime.utcnow() + timedelta(minutes=2 ** ((job.attempts or 1) - 1))
+
+    @staticmethod
+    def _mark_cancellations_notified(event_ids):
+        """Flag cancelled events once none of their cancellation jobs is outstanding"""
+        for event_id in event_ids:
+            outstanding = db.session.query(NotificationJob.id).filter(
+                NotificationJob.event_id == event_id,
+                NotificationJob.job_type == 'event_cancellation',
+                NotificationJob.status.in_(['pending', 'processing'])
+            ).first()
+            if not outstanding:
+                Event.query.filter_by(id=event_id).update(
+                    {'cancellation_notification_sent': True}, synchronize_session=False
+                )
@@ -0,0 +1,116 @@
+"""
+Quick Polls for BandSync
+
+Polls run live during rehearsals, where the whole band votes within a few
+seconds, so a vote never reads anything back:
+
+- The vote row is inserted with ON CONFLICT DO NOTHING against the unique
+  (poll_id, voter_key) index, which is what rejects a second vote.
+- The option's counter in poll_option_counts is bumped with an upsert that
+  returns the new count, which is pushed to the organization as a
+  'poll.tally' delta once the vote commits.
+
+Tallies are read from poll_option_counts, a row per option, however many
+members voted. voter_key is the user ID, or for anonymous polls an HMAC of
+it keyed with the app's secret, so a vote can't be traced back to a member
+but a member still can't vote twice.
+"""
+
+import hmac
+import json
+import hashlib
+from datetime import datetime
+from typing import Dict, List, Optional
+from flask import current_app
+from sqlalchemy import select
+from models import db, QuickPoll, PollResponse, PollOptionCount
+from services import live_updates
+from utils.db_utils import dialect_insert
+
+
+class QuickPollService:
+    """Record quick poll votes and read their tallies"""
+
+    @staticmethod
+    def voter_key(poll, user_id) -> str:
+        if not poll.is_anonymous:
+            return str(user_id)
+        secret = (current_app.config.get('SECRET_KEY') or '').encode()
+        return hmac.new(secret, f'{poll.id}:{user_id}'.encode(), hashlib.sha256).hexdigest()
+
+    @staticmethod
+    def options(poll) -> List[str]:
+        return json.loads(poll.options) if poll.options else []
+
+    @staticmethod
+    def is_open(poll, now=None) -> bool:
+        now = now or datetime.utcnow()
+        return bool(poll.is_active) and not (poll.expires_at and poll.expires_at <= now)
+
+    @staticmethod
+    def vote(poll, user_id, option_index) -> Optional[int]:
+        """
+        Record a member's vote and queue the new tally for the organization.
+        Does not commit.
+
+        Returns:
+            int: The option's new vote count, or None if they had already voted
+        """
+        options = QuickPollService.options(poll)
+        recorded = db.session.execute(
+            dialect_insert(PollResponse).values(
+                poll_id=poll.id,
+                user_id=None if poll.is_anonymous else user_id,
+                voter_key=QuickPollService.voter_key(poll, user_id),
+                response_data=json.dumps({'option_index': option_index, 'option': options[option_index]}),
+                responded_at=datetime.utcnow()
+            ).on_conflict_do_nothing(index_elements=['poll_id', 'voter_key']).returning(PollResponse.id)
+        ).first()
+        if recorded is None:
+            return None
+
+        stmt = dialect_insert(PollOptionCount).values(poll_id=poll.id, option_index=option_index, votes=1)
+        votes = db.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=['poll_id', 'option_index'],
+                set_={'votes': PollOptionCount.votes + 1}
+            ).returning(PollOptionCount.votes)
+        ).scalar_one()
+
+        # Counts only grow, so clients keep the highest count seen per option
+        live_updates.publish(db.session, [live_updates.org_channel(poll.organization_id)], 'poll.tally', {
+            'poll_id': poll.id,
+            'option_index': option_index,
+            'option': options[option_index],
+            'votes': votes
+        })
+        return votes
+
+    @staticmethod
+    def tallies(poll_ids) -> Dict[int, Dict[int, int]]:
+        """poll ID -> {option index: votes} for the options that have votes"""
+        result = {poll_id: {} for poll_id in poll_ids}
+        if not poll_ids:
+            return result
+        counts = db.session.execute(
+            select(PollOptionCount.poll_id, PollOptionCount.option_index, PollOptionCount.votes)
+            .where(PollOptionCount.poll_id.in_(poll_ids))
+        )
+        for poll_id, option_index, votes in counts:
+            result[poll_id][option_index] = votes
+        return result
+
+    @staticmethod
+    def own_votes(polls, user_id) -> Dict[int, int]:
+        """poll ID -> option index the member voted for, for the polls they voted in"""
+        keys = {(poll.id, QuickPollService.voter_key(poll, user_id)) for poll in polls}
+        if not keys:
+            return {}
+        rows = db.session.execute(
+            select(PollResponse.poll_id, PollResponse.voter_key, PollResponse.response_data).where(
+                PollResponse.poll_id.in_([poll_id for poll_id, _ in keys]),
+                PollResponse.voter_key.in_([key for _, key in keys])
+            )
+        )
+        return {poll_id: json.loads(data)['option_index']
+                for poll_id, key, data in rows if (poll_id, key) in keys}
@@ -0,0 +1,372 @@
+"""
+Recurring Events for BandSync
+
+A recurring event is stored once: the series row (is_recurring=True) is its
+own first occurrence and carries the rule in its recurring_* fields. Later
+occurrences are expanded on demand for a date window and never touch the
+database until they have to - when an occurrence is edited, cancelled or
+RSVP'd, or its reminder is about to go out, it is materialized as an
+exception row pointing back at the series (parent_event_id) with the start
+it replaces (recurrence_id).
+
+Unmaterialized occurrences are addressed as "<series id>-<YYYYMMDDTHHMMSS>".
+Deleting an occurrence records its start in event_occurrence_exclusions so
+it isn't expanded again. The series row is its own first occurrence, so
+editing, cancelling or deleting the first date first detaches it from the
+series (see detach_first).
+"""
+
+import os
+import re
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from dateutil.rrule import rrule, DAILY, WEEKLY, MONTHLY, YEARLY
+from sqlalchemy import or_, update, delete
+from models import db, Event, EventOccurrenceExclusion
+from services.analytics_rollups import AnalyticsRollupService
+from utils.db_utils import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+FREQUENCIES = {'daily': DAILY, 'weekly': WEEKLY, 'monthly': MONTHLY, 'yearly': YEARLY}
+
+# Fields an occurrence shares with its series
+SERIES_FIELDS = (
+    'title', 'type', 'description', 'location_address', 'location_lat', 'location_lng',
+    'location_place_id', 'category_id', 'send_reminders', 'reminder_days_before',
+    'organization_id', 'created_by'
+)
+
+# Rule fields a series carries on top of SERIES_FIELDS
+RULE_FIELDS = ('recurring_pattern', 'recurring_interval', 'recurring_end_date')
+
+OCCURRENCE_KEY_FORMAT = '%Y%m%dT%H%M%S'
+OCCURRENCE_KEY_PATTERN = re.compile(r'^(\d+)-(\d{8}T\d{6})$')
+
+
+class Occurrence:
+    """An occurrence of a series without a row of its own; reads everything else from the series"""
+
+    is_occurrence = True
+
+    def __init__(self, series, start):
+        self.series = series
+        self.date = start
+        self.end_date = series.end_date + (start - series.date) if series.end_date else None
+        self.recurrence_id = start
+        self.parent_event_id = series.id
+        self.is_recurring = False
+        self.rsvps = []
+
+    @property
+    def id(self):
+        return f'{self.series.id}-{self.date.strftime(OCCURRENCE_KEY_FORMAT)}'
+
+    def __getattr__(self, name):
+        return getattr(self.series, name)
+
+
+class RecurrenceService:
+    """Expand and materialize occurrences of recurring events"""
+
+    # How far ahead open-ended listings expand series when no window is given
+    HORIZON_DAYS = int(os.environ.get('RECURRENCE_HORIZON_DAYS', 365))
+
+    @staticmethod
+    def build_rule(series):
+        """dateutil rrule for a series, or None if it doesn't actually recur"""
+        frequency = FREQUENCIES.get(series.recurring_pattern)
+        if not series.is_recurring or frequency is None or series.date is None:
+            return None
+        # RFC 5545 allows COUNT or UNTIL, not both; an end date alongside a
+        # count is applied while expanding
+        return rrule(
+            frequency,
+            dtstart=series.date,
+            interval=series.recurring_interval or 1,
+            count=series.recurring_count or None,
+            until=None if series.recurring_count else series.recurring_end_date
+        )
+
+    @staticmethod
+    def ical_rule(series):
+        """
+        RRULE value for an iCal feed, or None if the series doesn't recur.
+        A series with both a count and an end date stops at whichever comes
+        first, so the rule carries COUNT or UNTIL accordingly.
+        """
+        expansion = RecurrenceService.build_rule(series)
+        if expansion is None:
+            return None
+        rule = {'freq': series.recurring_pattern.upper(), 'interval': series.recurring_interval or 1}
+        if series.recurring_count and series.recurring_end_date:
+            # The count bounds the expansion, so listing it is cheap
+            if list(expansion)[-1] <= series.recurring_end_date:
+                rule['count'] = series.recurring_count
+            else:
+                rule['until'] = series.recurring_end_date
+        elif series.recurring_count:
+            rule['count'] = series.recurring_count
+        elif series.recurring_end_date:
+            rule['until'] = series.recurring_end_date
+        return rule
+
+    @staticmethod
+    def expand(series, start, end, materialized=()):
+        """
+        Unmaterialized occurrences of a series starting in [start, end).
+
+        The series' own date is its first occurrence and is never returned;
+        neither are starts in `materialized`, which have exception rows.
+        """
+        rule = RecurrenceService.build_rule(series)
+        if rule is None:
+            return []
+        start = max(start or series.date, series.date)
+        if series.recurring_end_date:
+            end = min(end, series.recurring_end_date + timedelta(microseconds=1))
+        if start >= end:
+            return []
+        return [
+            Occurrence(series, when) for when in rule.between(start, end, inc=True)
+            if when < end and when != series.date and when not in materialized
+        ]
+
+    @staticmethod
+    def occurrences_between(query, start, end):
+        """
+        Unmaterialized occurrences of every series matched by `query` (an
+        Event query carrying the caller's filters) starting in [start, end),
+        in date order. Two queries regardless of how many series there are.
+        """
+        series_query = query.filter(
+            Event.is_recurring == True,
+            Event.parent_event_id.is_(None),
+            Event.date.isnot(None),
+            Event.date < end
+        )
+        if start:
+            series_query = series_query.filter(or_(
+                Event.recurring_end_date.is_(None), Event.recurring_end_date >= start
+            ))
+        series_list = series_query.all()
+        if not series_list:
+            return []
+
+        materialized = defaultdict(set)
+        exceptions = db.session.query(Event.parent_event_id, Event.recurrence_id).filter(
+            Event.parent_event_id.in_([series.id for series in series_list]),
+            Event.recurrence_id.isnot(None),
+            Event.recurrence_id < end
+        )
+        if start:
+            exceptions = exceptions.filter(Event.recurrence_id >= start)
+        for series_id, recurrence_id in exceptions:
+            materialized[series_id].add(recurrence_id)
+        # Deleted occurrences are skipped like materialized ones
+        exclusions = db.session.query(EventOccurrenceExclusion.series_id, EventOccurrenceExclusion.recurrence_id).filter(
+            EventOccurrenceExclusion.series_id.in_([series.id for series in series_list]),
+            EventOccurrenceExclusion.recurrence_id < end
+        )
+        if start:
+            exclusions = exclusions.filter(EventOccurrenceExclusion.recurrence_id >= start)
+        for series_id, recurrence_id in exclusions:
+            materialized[series_id].add(recurrence_id)
+
+        occurrences = [
+            occurrence for series in series_list
+            for occurrence in RecurrenceService.expand(series, start, end, materialized[series.id])
+        ]
+        return sorted(occurrences, key=lambda occurrence: (occurrence.date, occurrence.series.id))
+
+    @staticmethod
+    def sort_id(event):
+        """
+        Tie-breaker after date for listings: the row ID, or the series ID for
+        an occurrence (a series' own row never shares an occurrence's date)
+        """
+        return event.series.id if isinstance(event, Occurrence) else event.id
+
+    @staticmethod
+    def merge(events, occurrences):
+        """Merge Event rows ordered by (date, id) with expanded occurrences"""
+        if not occurrences:
+            return events
+        return sorted(events + occurrences, key=lambda e: (
+            e.date is not None, e.date or datetime.min, RecurrenceService.sort_id(e)
+        ))
+
+    @staticmethod
+    def materialize(occurrences):
+        """
+        Give occurrences rows of their own, copying their series' fields.
+        Concurrent callers are safe: an occurrence that already has a row
+        keeps it.
+
+        Returns:
+            dict: {(series_id, recurrence_id): Event}
+        """
+        if not occurrences:
+            return {}
+        now = datetime.utcnow()
+        rows = [{
+            **{field: getattr(occurrence.series, field) for field in SERIES_FIELDS},
+            'date': occurrence.date,
+            'end_date': occurrence.end_date,
+            'is_recurring': False,
+            'parent_event_id': occurrence.series.id,
+            'recurrence_id': occurrence.recurrence_id,
+            'created_at': now
+        } for occurrence in occurrences]
+
+        inserted = [row[0] for row in db.session.execute(
+            dialect_insert(Event).values(rows)
+            .on_conflict_do_nothing(index_elements=['parent_event_id', 'recurrence_id'])
+            .returning(Event.id)
+        )]
+        # Core inserts skip the ORM flush hooks that keep analytics current
+        if inserted:
+            AnalyticsRollupService.mark_dirty(db.session, event_ids=inserted)
+
+        return {
+            (event.parent_event_id, event.recurrence_id): event for event in Event.query.filter(
+                Event.parent_event_id.in_({occurrence.series.id for occurrence in occurrences}),
+                Event.recurrence_id.in_({occurrence.recurrence_id for occurrence in occurrences})
+            )
+        }
+
+    @staticmethod
+    def materialize_between(query, start, end):
+        """Materialize every occurrence of the series matched by `query` in [start, end)"""
+        occurrences = RecurrenceService.occurrences_between(query, start, end)
+        if occurrences:
+            RecurrenceService.materialize(occurrences)
+        return len(occurrences)
+
+    @staticmethod
+    def is_occurrence_key(key):
+        """Whether `key` is an occurrence key rather than an event ID"""
+        return isinstance(key, str) and OCCURRENCE_KEY_PATTERN.match(key) is not None
+
+    @staticmethod
+    def resolve(organization_id, key, materialize=False):
+        """
+        Look up an occurrence by key within an organization.
+
+        Returns:
+            Event, Occurrence or None: The occurrence's row if it has one (or
+            was just given one with materialize=True), else the Occurrence
+        """
+        match = OCCURRENCE_KEY_PATTERN.match(key)
+        if not match:
+            return None
+        series_id, start = int(match.group(1)), datetime.strptime(match.group(2), OCCURRENCE_KEY_FORMAT)
+
+        series = Event.query.filter_by(id=series_id, organization_id=organization_id, is_recurring=True).first()
+        if not series:
+            return None
+        if start == series.date:
+            return series
+
+        existing = Event.query.filter_by(parent_event_id=series.id, recurrence_id=start).first()
+        if existing:
+            return existing
+        if db.session.get(EventOccurrenceExclusion, (series.id, start)):
+            return None
+
+        occurrences = RecurrenceService.expand(series, start, start + timedelta(seconds=1))
+        if not occurrences:
+            return None
+        if not materialize:
+            return occurrences[0]
+        return RecurrenceService.materialize(occurrences)[(series.id, start)]
+
+    @staticmethod
+    def exclude(occurrence):
+        """
+        Record a deleted occurrence (its row, or an unmaterialized Occurrence)
+        so the series never expands it again. Does not commit.
+        """
+        db.session.execute(
+            dialect_insert(EventOccurrenceExclusion).values(
+                series_id=occurrence.parent_event_id,
+                recurrence_id=occurrence.recurrence_id,
+                created_at=datetime.utcnow()
+            ).on_conflict_do_nothing(index_elements=['series_id', 'recurrence_id'])
+        )
+
+    @staticmethod
+    def exclusions(series_ids):
+        """series ID -> starts of its deleted occurrences, for iCal EXDATEs"""
+        result = defaultdict(list)
+        if series_ids:
+            for series_id, recurrence_id in db.session.query(
+                EventOccurrenceExclusion.series_id, EventOccurrenceExclusion.recurrence_id
+            ).filter(EventOccurrenceExclusion.series_id.in_(series_ids)).order_by(EventOccurrenceExclusion.recurrence_id):
+                result[series_id].append(recurrence_id)
+        return result
+
+    @staticmethod
+    def detach_first(series):
+        """
+        Make a series' first date an event of its own, so editing, cancelling
+        or deleting it leaves the later dates alone. The row keeps the first
+        date (and its RSVPs); the rule moves to a new series row starting at
+        the next date without a row of its own. Materialized and deleted
+        occurrences after that date move with the rule, earlier ones become
+        plain events. Does not commit.
+
+        Returns:
+            Event or None: The new series, or None if no dates are left to expand
+        """
+        rule = RecurrenceService.build_rule(series)
+        if rule is None:
+            return None
+        exceptions = Event.query.filter_by(parent_event_id=series.id).all()
+        taken = {event.recurrence_id for event in exceptions} | set(db.session.scalars(
+            db.select(EventOccurrenceExclusion.recurrence_id).where(EventOccurrenceExclusion.series_id == series.id)
+        ))
+
+        next_start = next_index = None
+        for index, when in enumerate(rule):
+            if series.recurring_end_date and when > series.recurring_end_date:
+                break
+            if index and when not in taken:
+                next_start, next_index = when, index
+                break
+
+        new_series = None
+        if next_start is not None:
+            new_series = Event(
+                **{field: getattr(series, field) for field in SERIES_FIELDS + RULE_FIELDS},
+                date=next_start,
+                end_date=series.end_date + (next_start - series.date) if series.end_date else None,
+                is_recurring=True,
+                recurring_count=series.recurring_count - next_index if series.recurring_count else None
+            )
+            db.session.add(new_series)
+            db.session.flush()
+
+        for event in exceptions:
+            if new_series and event.recurrence_id > next_start:
+                event.parent_event_id = new_series.id
+            else:
+                event.parent_event_id = None
+                event.recurrence_id = None
+        if new_series:
+            db.session.execute(
+                update(EventOccurrenceExclusion).where(
+                    EventOccurrenceExclusion.series_id == series.id,
+                    EventOccurrenceExclusion.recurrence_id > next_start
+                ).values(series_id=new_series.id)
+            )
+        db.session.execute(delete(EventOccurrenceExclusion).where(EventOccurrenceExclusion.series_id == series.id))
+
+        series.is_recurring = False
+        series.recurring_pattern = None
+        series.recurring_end_date = None
+        series.recurring_count = None
+        db.session.flush()
+        return new_series
+
@@ -0,0 +1,70 @@
+"""
+RSVP Writes for BandSync
+
+An RSVP is recorded with a single INSERT ... ON CONFLICT DO UPDATE against
+the (event_id, user_id) unique index. The statement copies the status it
+replaces into rsvp.previous_status and hands it back with RETURNING, so the
+request never reads the row first and concurrent submissions from the same
+member can't both see the old status.
+"""
+
+from datetime import datetime
+from sqlalchemy import select, literal
+from models import db, Event, RSVP
+from services.analytics_rollups import AnalyticsRollupService
+from services.calendar_service import note_calendar_change
+from services import live_updates
+from utils.db_utils import dialect_insert
+
+VALID_STATUSES = ('Yes', 'No', 'Maybe')
+
+
+class RSVPService:
+    """Record member RSVPs"""
+
+    @staticmethod
+    def normalize_status(status):
+        """'yes'/'Yes' -> 'Yes'; None if it isn't a valid RSVP status"""
+        if isinstance(status, str) and status.capitalize() in VALID_STATUSES:
+            return status.capitalize()
+        return None
+
+    @staticmethod
+    def upsert(event_id, organization_id, user_id, status):
+        """
+        Set a member's RSVP to an organization's event in one statement.
+        Does not commit.
+
+        Returns:
+            tuple: (recorded, previous_status) - recorded is False if the
+            event isn't in the organization; previous_status is None for a
+            first RSVP
+        """
+        user_id = int(user_id)
+        # Selecting the row's values from the event enforces tenancy in the
+        # same statement: no event, nothing inserted
+        source = select(
+            Event.id,
+            literal(user_id, RSVP.user_id.type),
+            literal(status, RSVP.status.type),
+            literal(datetime.utcnow(), RSVP.created_at.type)
+        ).where(Event.id == event_id, Event.organization_id == organization_id)
+
+        stmt = dialect_insert(RSVP).from_select(['event_id', 'user_id', 'status', 'created_at'], source)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['event_id', 'user_id'],
+            set_={'previous_status': RSVP.status, 'status': stmt.excluded.status}
+        ).returning(RSVP.previous_status)
+
+        row = db.session.execute(stmt).first()
+        if row is None:
+            return False, None
+
+        # Core statements skip the ORM flush hooks that keep rollups and feeds current
+        AnalyticsRollupService.mark_dirty(db.session, event_ids=[event_id])
+        note_calendar_change(db.session, user_ids=[user_id])
+        if row.previous_status != status:
+            live_updates.publish(db.session, [live_updates.org_channel(organization_id)], 'rsvp.updated', {
+                'event_id': event_id, 'user_id': user_id, 'status': status, 'previous_status': row.previous_status
+            })
+        return True, row.previous_status
@@ -3,23 +3,47 @@ Scheduled Task Service for BandSync
 Handles background tasks like sending email reminders using APScheduler.
 """
 
+import os
+import time
 import logging
+from collections import defaultdict
 from datetime import datetime, timedelta
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from flask import current_app
-from models import db, Event, User, UserOrganization, EmailLog
+from sqlalchemy import and_, or_, func, update, bindparam
+from sqlalchemy.orm import joinedload
+from models import db, Event, User, UserOrganization, EmailLog, EventReminderLedger
 from services.email_service import EmailService
+from services.notification_queue import NotificationQueue
+from services.analytics_rollups import AnalyticsRollupService
+from services.recurrence import RecurrenceService
+from services.log_partitions import maintain_partitions
+from services.substitute_escalation import substitute_escalation
+from services.member_import import MemberImportService
+from utils.db_utils import dialect_insert
 
 logger = logging.getLogger(__name__)
 
 class ScheduledTaskService:
     """Service for managing scheduled background tasks"""
     
+    # How far ahead reminder runs look for due events
+    REMINDER_LOOKAHEAD = timedelta(hours=72)
+    # Ledger claims that never got a reminder_sent_at belong to a run that died
+    REMINDER_CLAIM_TIMEOUT = timedelta(hours=1)
+    # Due events handled per claim/render/send round
+    REMINDER_BATCH_SIZE = int(os.environ.get('REMINDER_BATCH_SIZE', 200))
+    # Notification jobs claimed per batch, and batches per run, when draining the queue
+    NOTIFICATION_BATCH_SIZE = int(os.environ.get('NOTIFICATION_BATCH_SIZE', 100))
+    NOTIFICATION_MAX_BATCHES = int(os.environ.get('NOTIFICATION_MAX_BATCHES', 20))
+    
     def __init__(self, app=None):
         self.scheduler = BackgroundScheduler()
         self.email_service = EmailService()
         self.app = app
+        # Timing and counts from the most recent run of each job, by job ID
+        self.last_runs = {}
         
         if app:
             self.init_app(app)
@@ -51,6 +75,26 @@ class ScheduledTaskService:
             replace_existing=True
         )
         
+        # Deliver queued notifications. Every web worker runs this; claims use
+        # SKIP LOCKED so workers (and jobs/notification_worker.py, if it is
+        # deployed) never deliver the same job twice
+        self.scheduler.add_job(
+            func=self.process_notification_jobs,
+            trigger=CronTrigger(minute='*'),
+            id='process_notification_jobs',
+            name='Process Notification Jobs',
+            replace_existing=True
+        )
+        
+        # Fail member imports lost with a restarted worker (app.py also runs this at startup)
+        self.scheduler.add_job(
+            func=self.fail_stale_member_imports,
+            trigger=CronTrigger(minute='*/5'),
+            id='fail_stale_member_imports',
+            name='Fail Stale Member Imports',
+            replace_existing=True
+        )
+        
         # Send daily summaries at 8 AM
         self.scheduler.add_job(
             func=self.send_daily_summaries,
@@ -69,6 +113,33 @@ class ScheduledTaskService:
             replace_existing=True
         )
         
+        # Keep analytics rollups current
+        self.scheduler.add_job(
+            func=self.compact_analytics_rollups,
+            trigger=CronTrigger(minute='*/15'),
+            id='compact_analytics_rollups',
+            name='Compact Analytics Rollups',
+            replace_existing=True
+        )
+        
+        # Contact the next call-list wave of substitute requests nobody has taken
+        self.scheduler.add_job(
+            func=self.escalate_substitute_requests,
+            trigger=CronTrigger(minute='*'),
+            id='escalate_substitute_requests',
+            name='Escalate Substitute Requests',
+            replace_existing=True
+        )
+        
+        # Keep next months' log table partitions created ahead of time
+        self.scheduler.add_job(
+            func=self.maintain_log_partitions,
+            trigger=CronTrigger(hour=3, minute=30),
+            id='maintain_log_partitions',
+            name='Maintain Log Partitions',
+            replace_existing=True
+        )
+        
         # Send RSVP deadline reminders daily at 10 AM
         self.scheduler.add_job(
             func=self.send_rsvp_deadline_reminders,
@@ -82,100 +153,323 @@ class ScheduledTaskService:
         """Send event reminders based on event settings"""
         with self.app.app_context():
             try:
-                # Get all events that need reminders
-                cutoff_time = datetime.utcnow() + timedelta(hours=72)  # Look 3 days ahead
-                events = Event.query.filter(
+                if not self.email_service.client:
+                    logger.warning("Email service not configured - skipping event reminders")
+                    return
+                
+                now = datetime.utcnow()
+                
+                # Occurrences of recurring events get a row (and so a ledger
+                # entry, email links and RSVPs) just before their reminder
+                RecurrenceService.materialize_between(Event.query.filter(
                     Event.send_reminders == True,
-                    Event.date.isnot(None),
-                    Event.date <= cutoff_time,
-                    Event.date >= datetime.utcnow(),
                     Event.is_template == False,
-                    Event.is_cancelled == False  # Don't send reminders for cancelled events
-                ).all()
+                    Event.is_cancelled == False
+                ), now, now + self.REMINDER_LOOKAHEAD)
+                db.session.commit()
                 
-                for event in events:
-                    # Check if it's time to send reminder
-                    reminder_time = event.date - timedelta(days=event.reminder_days_before)
-                    
-                    if datetime.utcnow() >= reminder_time:
-                        # Check if we've already sent this reminder
-                        existing_reminder = EmailLog.query.filter_by(
-                            event_id=event.id,
-                            email_type='event_reminder'
-                        ).first()
-                        
-                        if not existing_reminder:
-                            self.email_service.send_event_reminder(event)
-                            logger.info(f"Sent reminder for event {event.id}: {event.title}")
+                due_events = self._get_due_reminder_events(now)
+                total_sent = 0
                 
-                logger.info(f"Processed {len(events)} events for reminders")
+                # Each batch mixes events from many organizations; the email
+                # pipeline delivers its provider batches in parallel
+                for i in range(0, len(due_events), self.REMINDER_BATCH_SIZE):
+                    total_sent += self._send_reminder_batch(due_events[i:i + self.REMINDER_BATCH_SIZE], now)
+                
+                logger.info(f"Processed {len(due_events)} due events for reminders, sent {total_sent} emails")
                 
             except Exception as e:
+                db.session.rollback()
                 logger.error(f"Error sending event reminders: {e}")
     
+    def _get_due_reminder_events(self, now):
+        """
+        Events whose reminder is due and not yet sent, in one anti-join query
+        against the reminder ledger.
+        """
+        cutoff_time = now + self.REMINDER_LOOKAHEAD
+        days_before = func.coalesce(Event.reminder_days_before, 1)
+        
+        # A reminder is due once date - reminder_days_before <= now. Inside the
+        # 72 hour window only 0-2 days need checking, which keeps the predicate
+        # free of database-specific date arithmetic.
+        reminder_due = or_(
+            days_before >= 3,
+            *[and_(days_before == days, Event.date <= now + timedelta(days=days)) for days in range(3)]
+        )
+        
+        return Event.query.options(
+            joinedload(Event.organization)
+        ).outerjoin(
+            EventReminderLedger, EventReminderLedger.event_id == Event.id
+        ).filter(
+            Event.send_reminders == True,
+            Event.date.isnot(None),
+            Event.date <= cutoff_time,
+            Event.date >= now,
+            Event.is_template == False,
+            Event.is_cancelled == False,  # Don't send reminders for cancelled events
+            reminder_due,
+            or_(
+                EventReminderLedger.id.is_(None),
+                and_(
+                    EventReminderLedger.reminder_sent_at.is_(None),
+                    EventReminderLedger.claimed_at < now - self.REMINDER_CLAIM_TIMEOUT
+                )
+            )
+        ).order_by(Event.date).all()
+    
+    def _claim_reminders(self, events, now):
+        """
+        Claim events in the ledger so overlapping runs (or other workers'
+        schedulers) never send the same reminder twice.
+        
+        Returns:
+            set: IDs of the events this run now owns
+        """
+        rows = [{'event_id': e.id, 'organization_id': e.organization_id, 'claimed_at': now} for e in events]
+        claimed = {
+            row[0] for row in db.session.execute(
+                dialect_insert(EventReminderLedger).values(rows)
+                .on_conflict_do_nothing(index_elements=['event_id'])
+                .returning(EventReminderLedger.event_id)
+            )
+        }
+        
+        # Take over claims left behind by a run that died before sending
+        stale_ids = [e.id for e in events if e.id not in claimed]
+        if stale_ids:
+            claimed |= {
+                row[0] for row in db.session.execute(
+                    update(EventReminderLedger).where(
+                        EventReminderLedger.event_id.in_(stale_ids),
+                        EventReminderLedger.reminder_sent_at.is_(None),
+                        EventReminderLedger.claimed_at < now - self.REMINDER_CLAIM_TIMEOUT
+                    ).values(claimed_at=now).returning(EventReminderLedger.event_id)
+                )
+            }
+        
+        db.session.commit()
+        return claimed
+    
+    def _get_reminder_recipients(self, organization_ids):
+        """Members who want event reminders, grouped by organization, in one query"""
+        rows = db.session.query(UserOrganization.organization_id, User).join(
+            User, User.id == UserOrganization.user_id
+        ).filter(
+            UserOrganization.organization_id.in_(organization_ids),
+            UserOrganization.is_active == True,
+            User.email.isnot(None),
+            User.email_notifications == True,
+            User.email_event_reminders == True
+        ).all()
+        
+        recipients = defaultdict(list)
+        for organization_id, user in rows:
+            recipients[organization_id].append(user)
+        return recipients
+    
+    def _send_reminder_batch(self, events, now):
+        """Claim, render and deliver reminders for a batch of due events"""
+        claimed = self._claim_reminders(events, now)
+        events = [e for e in events if e.id in claimed]
+        if not events:
+            return 0
+        
+        recipients = self._get_reminder_recipients({e.organization_id for e in events})
+        
+        emails = []
+        recipient_counts = {}
+        for event in events:
+            users = recipients.get(event.organization_id, [])
+            recipient_counts[event.id] = len(users)
+            emails.extend(
+                self.email_service.render_event_reminder(event, user, event.reminder_days_before or 1)
+                for user in users
+            )
+        
+        # Blocks until delivered; EmailLog rows are written in bulk
+        results = self.email_service.send_bulk(emails, background=False)
+        
+        ledger = EventReminderLedger.__table__
+        db.session.execute(
+            ledger.update().where(ledger.c.event_id == bindparam('b_event_id')).values(
+                reminder_sent_at=bindparam('b_sent_at'),
+                recipient_count=bindparam('b_count')
+            ),
+            [{'b_event_id': event_id, 'b_sent_at': datetime.utcnow(), 'b_count': count}
+             for event_id, count in recipient_counts.items()]
+        )
+        db.session.commit()
+        
+        sent = sum(1 for r in results if r.status == 'sent')
+        logger.info(f"Sent reminders for {len(events)} events ({sent}/{len(emails)} emails delivered)")
+        return sent
+    
     def send_daily_summaries(self):
         """Send daily summaries to users who have opted in"""
+        self._send_event_summaries('daily', User.email_daily_summary, days_ahead=1)
+    
+    def send_weekly_summaries(self):
+        """Send weekly summaries to users who have opted in"""
+        self._send_event_summaries('weekly', User.email_weekly_summary, days_ahead=7)
+    
+    def _send_event_summaries(self, period, preference, days_ahead):
+        """
+        Build each organization's summary once and fan it out to every
+        opted-in member of that organization.
+        
+        Args:
+            period: 'daily' or 'weekly'
+            preference: User column that opts a member in
+            days_ahead: Days after today the summary window covers
+        """
         with self.app.app_context():
+            started = time.perf_counter()
+            stats = {'organizations': 0, 'events': 0, 'emails': 0, 'sent': 0}
             try:
-                # Get users who want daily summaries
-                users = User.query.filter_by(email_daily_summary=True).all()
+                if not self.email_service.client:
+                    logger.warning(f"Email service not configured - skipping {period} summaries")
+                    return
                 
-                for user in users:
-                    # Get user's organizations
-                    orgs = user.get_organizations()
-                    
-                    for org in orgs:
-                        # Get events for today and tomorrow
-                        today = datetime.utcnow().date()
-                        tomorrow = today + timedelta(days=1)
-                        
-                        events = Event.query.filter(
-                            Event.organization_id == org.id,
-                            Event.date.isnot(None),
-                            Event.date >= datetime.combine(today, datetime.min.time()),
-                            Event.date <= datetime.combine(tomorrow, datetime.max.time()),
-                            Event.is_template == False
-                        ).all()
-                        
-                        if events:
-                            self.email_service.send_daily_summary(user, org, events)
+                today = datetime.utcnow().date()
+                window_start = datetime.combine(today, datetime.min.time())
+                window_end = datetime.combine(today + timedelta(days=days_ahead), datetime.max.time())
+                
+                # Every organization's events in one query
+                events_by_org = defaultdict(list)
+                for event in Event.query.options(joinedload(Event.organization)).filter(
+                    Event.date.isnot(None),
+                    Event.date >= window_start,
+                    Event.date <= window_end,
+                    Event.is_template == False
+                ).order_by(Event.date.asc()).all():
+                    events_by_org[event.organization_id].append(event)
                 
-                logger.info(f"Sent daily summaries to {len(users)} users")
+                # Occurrences of recurring events in the window that have no row yet
+                for occurrence in RecurrenceService.occurrences_between(
+                    Event.query.filter(Event.is_template == False), window_start, window_end
+                ):
+                    events_by_org[occurrence.organization_id].append(occurrence)
+                for organization_id, events in events_by_org.items():
+                    events.sort(key=lambda event: event.date)
+                
+                # Every opted-in member of those organizations in one query
+                members_by_org = defaultdict(list)
+                if events_by_org:
+                    for organization_id, user in db.session.query(UserOrganization.organization_id, User).join(
+                        User, User.id == UserOrganization.user_id
+                    ).filter(
+                        UserOrganization.organization_id.in_(events_by_org.keys()),
+                        UserOrganization.is_active == True,
+                        User.email.isnot(None),
+                        preference == True
+                    ).all():
+                        members_by_org[organization_id].append(user)
+                
+                emails = []
+                for organization_id, members in members_by_org.items():
+                    events = events_by_org[organization_id]
+                    context = self.email_service.build_event_summary_context(events[0].organization, events, period)
+                    emails.extend(self.email_service.render_event_summary(user, context) for user in members)
+                    stats['organizations'] += 1
+                    stats['events'] += len(events)
+                
+                results = self.email_service.send_bulk(emails, background=False)
+                stats['emails'] = len(emails)
+                stats['sent'] = sum(1 for r in results if r.status == 'sent')
                 
             except Exception as e:
-                logger.error(f"Error sending daily summaries: {e}")
+                db.session.rollback()
+                stats['error'] = str(e)
+                logger.error(f"Error sending {period} summaries: {e}")
+            finally:
+                stats['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+                stats['finished_at'] = datetime.utcnow().isoformat()
+                self.last_runs[f'send_{period}_summaries'] = stats
+            
+            logger.info(
+                f"Sent {period} summaries: {stats['sent']}/{stats['emails']} emails for "
+                f"{stats['organizations']} organizations ({stats['events']} events) in {stats['duration_ms']} ms"
+            )
     
-    def send_weekly_summaries(self):
-        """Send weekly summaries to users who have opted in"""
+    def compact_analytics_rollups(self):
+        """Recompute dirty analytics rollup days and roll activity forward"""
         with self.app.app_context():
+            started = time.perf_counter()
             try:
-                # Get users who want weekly summaries
-                users = User.query.filter_by(email_weekly_summary=True).all()
-                
-                for user in users:
-                    # Get user's organizations
-                    orgs = user.get_organizations()
-                    
-                    for org in orgs:
-                        # Get events for the next week
-                        today = datetime.utcnow().date()
-                        next_week = today + timedelta(days=7)
-                        
-                        events = Event.query.filter(
-                            Event.organization_id == org.id,
-                            Event.date.isnot(None),
-                            Event.date >= datetime.combine(today, datetime.min.time()),
-                            Event.date <= datetime.combine(next_week, datetime.max.time()),
-                            Event.is_template == False
-                        ).order_by(Event.date.asc()).all()
-                        
-                        if events:
-                            self.email_service.send_weekly_summary(user, org, events)
-                
-                logger.info(f"Sent weekly summaries to {len(users)} users")
-                
+                stats = AnalyticsRollupService.compact()
+            except Exception as e:
+                db.session.rollback()
+                stats = {'error': str(e)}
+                logger.error(f"Error compacting analytics rollups: {e}")
+            stats['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            stats['finished_at'] = datetime.utcnow().isoformat()
+            self.last_runs['compact_analytics_rollups'] = stats
+            logger.info(f"Compacted analytics rollups: {stats}")
+    
+    def process_notification_jobs(self):
+        """Drain due notification jobs (new event, cancellation, RSVP change, substitute offer)"""
+        with self.app.app_context():
+            started = time.perf_counter()
+            stats = {'jobs': 0, 'batches': 0}
+            try:
+                for _ in range(self.NOTIFICATION_MAX_BATCHES):
+                    processed = NotificationQueue.process_batch(
+                        self.NOTIFICATION_BATCH_SIZE, email_service=self.email_service
+                    )
+                    if not processed:
+                        break
+                    stats['jobs'] += processed
+                    stats['batches'] += 1
+            except Exception as e:
+                db.session.rollback()
+                stats['error'] = str(e)
+                logger.error(f"Error processing notification jobs: {e}")
+            stats['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            stats['finished_at'] = datetime.utcnow().isoformat()
+            self.last_runs['process_notification_jobs'] = stats
+            if stats['jobs'] or 'error' in stats:
+                logger.info(f"Processed notification jobs: {stats}")
+    
+    def fail_stale_member_imports(self):
+        """Mark member imports that stopped making progress as failed"""
+        with self.app.app_context():
+            try:
+                failed = MemberImportService.fail_stale_jobs()
+                if failed:
+                    logger.info(f"Marked {failed} stale member imports failed")
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error failing stale member imports: {e}")
+    
+    def escalate_substitute_requests(self):
+        """Contact the next wave for every substitute request whose wave timed out"""
+        with self.app.app_context():
+            started = time.perf_counter()
+            try:
+                stats = substitute_escalation.run_due()
+            except Exception as e:
+                db.session.rollback()
+                stats = {'error': str(e)}
+                logger.error(f"Error escalating substitute requests: {e}")
+            stats['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            stats['finished_at'] = datetime.utcnow().isoformat()
+            self.last_runs['escalate_substitute_requests'] = stats
+            if stats.get('requests') or 'error' in stats:
+                logger.info(f"Escalated substitute requests: {stats}")
+    
+    def maintain_log_partitions(self):
+        """Create upcoming monthly partitions for the partitioned log tables"""
+        with self.app.app_context():
+            try:
+                with db.engine.connect() as connection:
+                    created = maintain_partitions(connection)
+                if created:
+                    logger.info(f"Created log partitions: {', '.join(created)}")
             except Exception as e:
-                logger.error(f"Error sending weekly summaries: {e}")
+                # Another worker's scheduler may have created them first
+                logger.error(f"Error maintaining log partitions: {e}")
     
     def send_rsvp_deadline_reminders(self):
         """Send RSVP deadline reminders for events happening soon to non-responders"""
@@ -261,7 +555,8 @@ class ScheduledTaskService:
                 'id': job.id,
                 'name': job.name,
                 'next_run': job.next_run_time.isoformat() if job.next_run_time else None,
-                'trigger': str(job.trigger)
+                'trigger': str(job.trigger),
+                'last_run': self.last_runs.get(job.id)
             }
             for job in self.scheduler.get_jobs()
         ]
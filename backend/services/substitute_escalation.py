@@ -0,0 +1,288 @@
+"""
+Substitute Escalation for BandSync
+Works through a substitute request's call list in waves. The first few
+eligible members (by order_position) are contacted at once; if nobody has
+taken the spot when the wave times out, the next wave is contacted, and so
+on. Escalation stops the moment the request is filled. When the call list
+runs out the request stays open for anyone to take until the event starts,
+then expires.
+
+Open requests wait in a priority queue keyed by next_contact_at, the next
+time escalation has to act on them. The queue is the (status,
+next_contact_at) index on substitute_requests rather than a heap in process
+memory, because every worker runs the scheduler and a restart must not lose
+it. Each run pops only the due requests, so its cost follows the number of
+waves due, not the number of open requests. A request is claimed with a
+conditional UPDATE that leases it for CLAIM_TIMEOUT, so two workers never
+contact the same wave and a run that dies is retried once the lease lapses.
+
+Wave size and timeout depend on the request's urgency level, and requests
+for events starting within SUBSTITUTE_URGENT_HOURS escalate as urgent. Pass
+a `clock` to drive the engine from a fake clock in tests.
+"""
+
+import os
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import joinedload
+from models import db, User, RSVP, SubstituteRequest, SubstituteResponse, CallList, CallListMember
+from services import live_updates
+from services.notification_queue import NotificationQueue
+from utils.db_utils import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+# Urgency level -> (members contacted per wave, minutes before the next wave)
+DEFAULT_WAVES = {
+    'low': (2, 120),
+    'normal': (3, 30),
+    'high': (5, 15),
+    'urgent': (10, 5),
+}
+# e.g. SUBSTITUTE_WAVES='{"normal": [4, 20]}' overrides individual levels
+WAVES = {**DEFAULT_WAVES, **{level: tuple(setting) for level, setting
+                             in json.loads(os.environ.get('SUBSTITUTE_WAVES', '{}')).items()}}
+URGENT_WINDOW = timedelta(hours=int(os.environ.get('SUBSTITUTE_URGENT_HOURS', 24)))
+# How long a run owns the requests it claimed before another may retry them
+CLAIM_TIMEOUT = timedelta(minutes=5)
+BATCH_SIZE = int(os.environ.get('SUBSTITUTE_ESCALATION_BATCH_SIZE', 100))
+
+
+class SubstituteEscalation:
+    """Contacts call-list members in waves until a substitute request is filled"""
+
+    def __init__(self, clock: Callable[[], datetime] = datetime.utcnow,
+                 waves: Optional[Dict[str, Tuple[int, int]]] = None, batch_size: int = BATCH_SIZE):
+        self.clock = clock
+        self.waves = waves or WAVES
+        self.batch_size = batch_size
+
+    def wave_settings(self, substitute_request, event, now) -> Tuple[int, timedelta]:
+        """(members per wave, wave timeout) for the request right now"""
+        urgency = substitute_request.urgency_level or 'normal'
+        if event.date and event.date - now <= URGENT_WINDOW:
+            urgency = 'urgent'
+        size, minutes = self.waves.get(urgency, self.waves['normal'])
+        return size, timedelta(minutes=minutes)
+
+    @staticmethod
+    def choose_call_list(substitute_request, organization_id):
+        """The section's call list, else the organization's default, else any of its lists"""
+        lists = CallList.query.filter_by(organization_id=organization_id)
+        if substitute_request.section_id:
+            call_list = lists.filter_by(section_id=substitute_request.section_id).first()
+            if call_list:
+                return call_list
+        return lists.filter_by(is_default=True).first() or lists.order_by(CallList.id).first()
+
+    def start(self, substitute_request) -> Dict:
+        """Contact the request's first wave straight away instead of on the next run. Commits."""
+        now = self.clock()
+        substitute_request.next_contact_at = now
+        db.session.commit()
+        return self._escalate(self._claim([substitute_request.id], now), now)
+
+    def run_due(self) -> Dict:
+        """Act on every request whose next contact time has come. Commits per batch."""
+        now = self.clock()
+        stats = {'requests': 0, 'contacted': 0, 'exhausted': 0, 'expired': 0}
+        while True:
+            due = db.session.scalars(
+                select(SubstituteRequest.id).where(
+                    SubstituteRequest.status == 'open',
+                    SubstituteRequest.next_contact_at <= now
+                ).order_by(SubstituteRequest.next_contact_at).limit(self.batch_size)
+            ).all()
+            if not due:
+                return stats
+            # Claimed requests move out of the due range, so this loop always ends
+            for key, value in self._escalate(self._claim(due, now), now).items():
+                stats[key] += value
+
+    def decline(self, substitute_request, user_id) -> bool:
+        """
+        Record a member's decline. Once everyone contacted so far has
+        declined there's no point waiting out the wave, so the next one is
+        contacted now. Commits.
+
+        Returns:
+            bool: True if the next wave was contacted early
+        """
+        now = self.clock()
+        self._record_response(substitute_request.id, user_id, 'unavailable', now)
+        waiting = db.session.scalar(
+            select(func.count()).select_from(SubstituteResponse).where(
+                SubstituteResponse.request_id == substitute_request.id,
+                SubstituteResponse.response == 'pending'
+            )
+        )
+        escalated = bool(
+            not waiting and substitute_request.status == 'open'
+            and substitute_request.next_contact_at and substitute_request.next_contact_at > now
+            and db.session.execute(
+                update(SubstituteRequest).where(
+                    SubstituteRequest.id == substitute_request.id,
+                    SubstituteRequest.next_contact_at == substitute_request.next_contact_at
+                ).values(next_contact_at=now).execution_options(synchronize_session=False)
+            ).rowcount
+        )
+        db.session.commit()
+        if escalated:
+            self._escalate(self._claim([substitute_request.id], now), now)
+        return escalated
+
+    def fill(self, substitute_request_id, user_id) -> bool:
+        """
+        Give the spot to `user_id` if the request is still open, which also
+        takes it out of the escalation queue. Does not commit.
+
+        Returns:
+            bool: False if it was filled (or closed) first
+        """
+        now = self.clock()
+        filled = db.session.execute(
+            update(SubstituteRequest).where(
+                SubstituteRequest.id == substitute_request_id,
+                SubstituteRequest.status == 'open'
+            ).values(
+                status='filled', filled_by=user_id, filled_at=now, next_contact_at=None
+            ).execution_options(synchronize_session=False)
+        ).rowcount
+        if not filled:
+            return False
+        self._record_response(substitute_request_id, user_id, 'available', now)
+        return True
+
+    def _claim(self, request_ids: List[int], now) -> List[int]:
+        """Lease the due requests among request_ids to this run"""
+        claimed = db.session.scalars(
+            update(SubstituteRequest).where(
+                SubstituteRequest.id.in_(request_ids),
+                SubstituteRequest.status == 'open',
+                SubstituteRequest.next_contact_at <= now
+            ).values(next_contact_at=now + CLAIM_TIMEOUT)
+            .returning(SubstituteRequest.id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.session.commit()
+        return claimed
+
+    def _escalate(self, request_ids: List[int], now) -> Dict:
+        """Contact the next wave (or expire/park) each claimed request. Commits."""
+        stats = {'requests': len(request_ids), 'contacted': 0, 'exhausted': 0, 'expired': 0}
+        if not request_ids:
+            return stats
+
+        requests = SubstituteRequest.query.options(
+            joinedload(SubstituteRequest.event), joinedload(SubstituteRequest.requester)
+        ).filter(SubstituteRequest.id.in_(request_ids)).populate_existing().all()
+
+        for substitute_request in requests:
+            event = substitute_request.event
+            if (event is None or event.is_cancelled or (event.date and event.date <= now)
+                    or (substitute_request.expires_at and substitute_request.expires_at <= now)):
+                substitute_request.status = 'expired'
+                substitute_request.next_contact_at = None
+                stats['expired'] += 1
+                continue
+
+            if substitute_request.call_list_id is None:
+                call_list = self.choose_call_list(substitute_request, event.organization_id)
+                substitute_request.call_list_id = call_list.id if call_list else None
+
+            size, timeout = self.wave_settings(substitute_request, event, now)
+            wave = self._next_wave(substitute_request, size)
+            if not wave:
+                # Everyone has been asked: stay open for takers, look again only to expire it
+                substitute_request.next_contact_at = event.date
+                stats['exhausted'] += 1
+                live_updates.publish(db.session, [live_updates.user_channel(substitute_request.requested_by)],
+                                     'substitute.exhausted', {
+                                         'request_id': substitute_request.id,
+                                         'event_id': event.id,
+                                         'waves': substitute_request.escalation_wave or 0
+                                     })
+                continue
+
+            self._contact(substitute_request, event, wave, now)
+            substitute_request.escalation_wave = (substitute_request.escalation_wave or 0) + 1
+            next_contact = now + timeout
+            substitute_request.next_contact_at = min(next_contact, event.date) if event.date else next_contact
+            stats['contacted'] += len(wave)
+
+        db.session.commit()
+        return stats
+
+    @staticmethod
+    def _next_wave(substitute_request, size) -> List[Tuple[int, int]]:
+        """(member id, user id) of the next `size` call-list members not yet asked"""
+        if not substitute_request.call_list_id:
+            return []
+        asked = select(SubstituteResponse.user_id).where(SubstituteResponse.request_id == substitute_request.id)
+        playing = select(RSVP.user_id).where(RSVP.event_id == substitute_request.event_id, RSVP.status == 'Yes')
+        return db.session.execute(
+            select(CallListMember.id, CallListMember.user_id)
+            .join(User, User.id == CallListMember.user_id)
+            .where(
+                CallListMember.call_list_id == substitute_request.call_list_id,
+                CallListMember.is_active == True,
+                CallListMember.user_id != substitute_request.requested_by,
+                CallListMember.user_id.not_in(asked),
+                CallListMember.user_id.not_in(playing)
+            )
+            .order_by(CallListMember.order_position, CallListMember.id)
+            .limit(size)
+        ).all()
+
+    @staticmethod
+    def _contact(substitute_request, event, wave, now):
+        """Record the wave as contacted, then email and push the offer to each member"""
+        member_ids = [member_id for member_id, _ in wave]
+        user_ids = [user_id for _, user_id in wave]
+        db.session.execute(
+            dialect_insert(SubstituteResponse).values([{
+                'request_id': substitute_request.id,
+                'user_id': user_id,
+                'response': 'pending',
+                'responded_at': None,
+                'contacted_at': now,
+                'contact_method': 'email'
+            } for user_id in user_ids]).on_conflict_do_nothing(index_elements=['request_id', 'user_id'])
+        )
+        db.session.execute(
+            update(CallListMember).where(CallListMember.id.in_(member_ids))
+            .values(last_contacted=now).execution_options(synchronize_session=False)
+        )
+        NotificationQueue.enqueue_substitute_offers(substitute_request, event.organization_id, user_ids)
+
+        requester = substitute_request.requester
+        live_updates.publish(db.session, [live_updates.user_channel(user_id) for user_id in user_ids],
+                             'substitute.offer', {
+                                 'request_id': substitute_request.id,
+                                 'event_id': event.id,
+                                 'event_title': event.title,
+                                 'event_date': event.date.isoformat() if event.date else None,
+                                 'requested_by': substitute_request.requested_by,
+                                 'requester_name': requester.name if requester else None,
+                                 'request_message': substitute_request.request_message
+                             })
+        logger.info(f"Substitute request {substitute_request.id}: contacted wave "
+                    f"{(substitute_request.escalation_wave or 0) + 1} ({len(user_ids)} members)")
+
+    @staticmethod
+    def _record_response(request_id, user_id, response, now):
+        stmt = dialect_insert(SubstituteResponse).values(
+            request_id=request_id, user_id=user_id, response=response, responded_at=now
+        )
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['request_id', 'user_id'],
+            set_={'response': stmt.excluded.response, 'responded_at': stmt.excluded.responded_at}
+        ))
+
+
+# Global instance
+substitute_escalation = SubstituteEscalation()
@@ -0,0 +1,230 @@
+"""
+Survey Results for BandSync
+
+Keeps survey results pre-aggregated so the results page reads a row per
+question instead of re-tallying every response:
+
+- survey_question_stats:          responses, and the count and sum of numeric
+                                  ratings, per question
+- survey_answer_counts:           how often each option was chosen (multiple
+                                  choice and checkbox) or each whole rating
+                                  1-5 given, per question
+- event_survey.respondent_count:  members who have answered the survey
+
+Anonymous responses carry a respondent_key, an HMAC of the member's ID keyed
+with the app's secret, so resubmitting replaces a member's answers (and
+counts them once) without the response naming them.
+
+A submission moves the totals by the difference between the member's
+previous and new answers, as increments in the transaction that stores the
+responses, so concurrent submissions can't lose each other's counts.
+Surveys answered before these tables existed have a NULL respondent_count
+and are rebuilt from their responses on first read.
+"""
+
+import hmac
+import json
+import math
+import hashlib
+import logging
+from collections import Counter, defaultdict
+from flask import current_app
+from sqlalchemy import select, update, delete, func
+from models import db, EventSurvey, SurveyQuestion, SurveyResponse, SurveyQuestionStats, SurveyAnswerCount
+from utils.db_utils import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+RATING_BUCKETS = range(1, 6)
+
+
+def _rating(value):
+    try:
+        rating = float(value)
+    except (ValueError, TypeError):
+        return None
+    return rating if math.isfinite(rating) else None
+
+
+def answer_values(question_type, value):
+    """The survey_answer_counts values a response counts towards"""
+    if not value:
+        return []
+    if question_type == 'multiple_choice':
+        return [value]
+    if question_type == 'checkbox':
+        # Multiple selections are stored as a JSON list
+        if value.startswith('['):
+            try:
+                return [str(selection) for selection in json.loads(value)]
+            except ValueError:
+                pass
+        return [value]
+    if question_type == 'rating':
+        rating = _rating(value)
+        if rating is not None and rating.is_integer() and int(rating) in RATING_BUCKETS:
+            return [str(int(rating))]
+    return []
+
+
+class SurveyResultsService:
+    """Maintain and read the survey result aggregates"""
+
+    @staticmethod
+    def respondent_key(survey, user_id):
+        """The respondent_key for a member's answers to an anonymous survey, else None"""
+        if not survey.is_anonymous:
+            return None
+        secret = (current_app.config.get('SECRET_KEY') or '').encode()
+        return hmac.new(secret, f'survey:{survey.id}:{user_id}'.encode(), hashlib.sha256).hexdigest()
+
+    @staticmethod
+    def record_submission(survey_id, questions, previous, submitted, new_respondent):
+        """
+        Apply one submission to the aggregates. Call it after the responses
+        are flushed, in the same transaction. Does not commit.
+
+        Args:
+            questions: question ID -> SurveyQuestion for the survey
+            previous: question ID -> the member's earlier answer, for the
+                questions they had already answered
+            submitted: question ID -> the answer just stored
+            new_respondent: Whether this is the member's first submission
+        """
+        # Taking the survey row here also waits out a concurrent rebuild, after
+        # which the totals include everything but this submission
+        aggregated = db.session.execute(
+            update(EventSurvey).where(
+                EventSurvey.id == survey_id,
+                EventSurvey.respondent_count.isnot(None)
+            ).values(respondent_count=EventSurvey.respondent_count + (1 if new_respondent else 0))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not aggregated:
+            return
+
+        stats = defaultdict(lambda: {'response_count': 0, 'rating_count': 0, 'rating_sum': 0.0})
+        answers = Counter()
+        for question_id, value in submitted.items():
+            question = questions[question_id]
+            changes = [(value, 1)]
+            if question_id in previous:
+                changes.append((previous[question_id], -1))
+            else:
+                stats[question_id]['response_count'] += 1
+            for answer, sign in changes:
+                for answer_value in answer_values(question.question_type, answer):
+                    answers[(question_id, answer_value)] += sign
+                rating = _rating(answer) if question.question_type == 'rating' else None
+                if rating is not None:
+                    stats[question_id]['rating_count'] += sign
+                    stats[question_id]['rating_sum'] += sign * rating
+
+        SurveyResultsService._add(SurveyQuestionStats, ['question_id'], [
+            {'question_id': question_id, 'survey_id': survey_id, **totals}
+            for question_id, totals in stats.items() if any(totals.values())
+        ])
+        SurveyResultsService._add(SurveyAnswerCount, ['question_id', 'value'], [
+            {'question_id': question_id, 'survey_id': survey_id, 'value': answer_value, 'count': change}
+            for (question_id, answer_value), change in answers.items() if change
+        ])
+
+    @staticmethod
+    def ensure_aggregated(surveys):
+        """Rebuild the aggregates of any of `surveys` answered before they were kept. Commits if it did."""
+        stale = [survey for survey in surveys if survey.respondent_count is None]
+        for survey in stale:
+            SurveyResultsService.rebuild(survey.id)
+        if stale:
+            db.session.commit()
+            for survey in stale:
+                db.session.refresh(survey)
+
+    @staticmethod
+    def rebuild(survey_id):
+        """Recompute a survey's aggregates from its responses. Does not commit."""
+        # Lock the survey row so submissions wait for the rebuild (see record_submission)
+        db.session.execute(
+            select(EventSurvey.id).where(EventSurvey.id == survey_id).with_for_update()
+        )
+        db.session.execute(delete(SurveyQuestionStats).where(SurveyQuestionStats.survey_id == survey_id))
+        db.session.execute(delete(SurveyAnswerCount).where(SurveyAnswerCount.survey_id == survey_id))
+
+        stats = defaultdict(lambda: {'response_count': 0, 'rating_count': 0, 'rating_sum': 0.0})
+        answers = Counter()
+        respondents = set()
+        rows = db.session.execute(
+            select(SurveyResponse.question_id, SurveyQuestion.question_type, SurveyResponse.user_id,
+                   SurveyResponse.respondent_key, SurveyResponse.response_value)
+            .join(SurveyQuestion, SurveyQuestion.id == SurveyResponse.question_id)
+            .where(SurveyResponse.survey_id == survey_id)
+            .execution_options(yield_per=1000)
+        )
+        for question_id, question_type, user_id, respondent_key, value in rows:
+            stats[question_id]['response_count'] += 1
+            if user_id or respondent_key:
+                respondents.add(user_id or respondent_key)
+            for answer_value in answer_values(question_type, value):
+                answers[(question_id, answer_value)] += 1
+            rating = _rating(value) if question_type == 'rating' else None
+            if rating is not None:
+                stats[question_id]['rating_count'] += 1
+                stats[question_id]['rating_sum'] += rating
+
+        if stats:
+            db.session.execute(SurveyQuestionStats.__table__.insert(), [
+                {'question_id': question_id, 'survey_id': survey_id, **totals} for question_id, totals in stats.items()
+            ])
+        if answers:
+            db.session.execute(SurveyAnswerCount.__table__.insert(), [
+                {'question_id': question_id, 'survey_id': survey_id, 'value': answer_value, 'count': count}
+                for (question_id, answer_value), count in answers.items()
+            ])
+        # Anonymous responses can't be told apart: the busiest question stands in for them
+        respondent_count = len(respondents) or max((s['response_count'] for s in stats.values()), default=0)
+        db.session.execute(
+            update(EventSurvey).where(EventSurvey.id == survey_id).values(respondent_count=respondent_count)
+            .execution_options(synchronize_session=False)
+        )
+        logger.info(f"Rebuilt results for survey {survey_id}: {respondent_count} respondents")
+
+    @staticmethod
+    def question_results(survey_id):
+        """
+        Returns:
+            dict: question ID -> {'stats': SurveyQuestionStats or None,
+                'answers': {value: count}} for every answered question
+        """
+        results = defaultdict(lambda: {'stats': None, 'answers': {}})
+        for stats in SurveyQuestionStats.query.filter_by(survey_id=survey_id):
+            results[stats.question_id]['stats'] = stats
+        answer_counts = SurveyAnswerCount.query.filter(
+            SurveyAnswerCount.survey_id == survey_id,
+            SurveyAnswerCount.count > 0
+        ).order_by(SurveyAnswerCount.id)
+        for answer_count in answer_counts:
+            results[answer_count.question_id]['answers'][answer_count.value] = answer_count.count
+        return results
+
+    @staticmethod
+    def question_counts(survey_ids):
+        """survey ID -> number of questions"""
+        if not survey_ids:
+            return {}
+        return dict(db.session.execute(
+            select(SurveyQuestion.survey_id, func.count(SurveyQuestion.id))
+            .where(SurveyQuestion.survey_id.in_(survey_ids))
+            .group_by(SurveyQuestion.survey_id)
+        ).all())
+
+    @staticmethod
+    def _add(model, index_elements, rows):
+        """Insert rows, or add their counts to the rows already there"""
+        if not rows:
+            return
+        stmt = dialect_insert(model).values(rows)
+        counters = [column for column in rows[0] if column not in index_elements and column != 'survey_id']
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={column: getattr(model, column) + getattr(stmt.excluded, column) for column in counters}
+        ))
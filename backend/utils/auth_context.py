@@ -0,0 +1,176 @@
+"""
+Request-scoped auth context
+Resolves the signed-in user, their current organization and their role in it
+once per request, so blueprints stop re-querying them in every helper call.
+
+The access token carries the organization and role as claims. The role is
+verified against the membership tables through a short-TTL cache shared by
+the worker: a cache hit costs no query, and a claim that disagrees with the
+cache (a member promoted since it was filled) forces a fresh lookup.
+Membership changes committed in this process drop their cache entries.
+"""
+
+import os
+import time
+import threading
+from flask import request
+from flask_jwt_extended import get_jwt
+from sqlalchemy import event as sa_event, select, and_
+from sqlalchemy.orm import Session
+from models import db, User, Organization, UserOrganization
+
+ROLE_CACHE_SECONDS = int(os.environ.get('ROLE_CACHE_SECONDS', 60))
+
+
+class RoleCache:
+    """(user_id, organization_id) -> verified role, for ROLE_CACHE_SECONDS"""
+
+    def __init__(self, ttl=ROLE_CACHE_SECONDS, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id, organization_id, claimed_role=None):
+        """The member's role in the organization, or None if they don't belong to it"""
+        key = (int(user_id), int(organization_id))
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry[1] > self.clock() and (claimed_role is None or claimed_role == entry[0]):
+            return entry[0]
+
+        role = self.load(*key)
+        with self._lock:
+            self._entries[key] = (role, self.clock() + self.ttl)
+        return role
+
+    @staticmethod
+    def load(user_id, organization_id):
+        """
+        Role from the active membership row, falling back to the legacy
+        single-organization fields for users without one
+        """
+        row = db.session.execute(
+            select(UserOrganization.role, User.role, User.organization_id)
+            .select_from(User)
+            .outerjoin(UserOrganization, and_(
+                UserOrganization.user_id == User.id,
+                UserOrganization.organization_id == organization_id,
+                UserOrganization.is_active == True
+            ))
+            .where(User.id == user_id)
+        ).first()
+        if row is None:
+            return None
+        membership_role, legacy_role, legacy_organization_id = row
+        if membership_role:
+            return membership_role
+        return legacy_role if legacy_organization_id == organization_id else None
+
+    def invalidate(self, user_ids):
+        user_ids = set(user_ids)
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] in user_ids:
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+role_cache = RoleCache()
+
+
+class AuthContext:
+    """The current request's user, organization and role, each loaded at most once"""
+
+    _unset = object()
+
+    def __init__(self, claims):
+        self.claims = claims
+        self.user_id = int(claims['sub'])
+        self.organization_id = claims.get('organization_id')
+        self._user = self._unset
+        self._organization = self._unset
+        self._role = self._unset
+
+    @property
+    def user(self):
+        if self._user is self._unset:
+            self._user = db.session.get(User, self.user_id)
+        return self._user
+
+    @property
+    def organization(self):
+        if self._organization is self._unset:
+            self._organization = db.session.get(Organization, self.organization_id) if self.organization_id else None
+        return self._organization
+
+    @property
+    def role(self):
+        if self._role is self._unset:
+            self._role = role_cache.get(self.user_id, self.organization_id, self.claims.get('role')) \
+                if self.organization_id else None
+        return self._role
+
+    @property
+    def is_admin(self):
+        return self.role == 'Admin'
+
+
+def get_auth_context():
+    """The AuthContext for the current request's access token (call inside @jwt_required)"""
+    # Kept in the WSGI environ rather than on g, which outlives the request
+    # when a test or script runs several requests inside one app context
+    context = request.environ.get('bandsync.auth_context')
+    if context is None:
+        context = request.environ['bandsync.auth_context'] = AuthContext(get_jwt())
+    return context
+
+
+def current_user():
+    """The signed-in User"""
+    return get_auth_context().user
+
+
+def get_current_user_and_org():
+    """Current user and organization from JWT"""
+    context = get_auth_context()
+    return context.user, context.organization
+
+
+def is_admin(user=None, organization_id=None):
+    """
+    Check if a user is admin in an organization - by default the current
+    user in the current organization
+    """
+    context = get_auth_context()
+    if user is None and organization_id is None:
+        return context.is_admin
+    if not user or not organization_id:
+        return False
+    if user.id == context.user_id and organization_id == context.organization_id:
+        return context.is_admin
+    return role_cache.get(user.id, organization_id) == 'Admin'
+
+
+@sa_event.listens_for(Session, 'after_flush')
+def _collect_membership_changes(session, flush_context):
+    """Remember whose roles changed in this transaction"""
+    changes = session.info.setdefault('membership_changes', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (UserOrganization, User)) and obj.id:
+            changes.add(obj.user_id if isinstance(obj, UserOrganization) else obj.id)
+
+
+@sa_event.listens_for(Session, 'after_commit')
+def _invalidate_roles(session):
+    changes = session.info.pop('membership_changes', None)
+    if changes:
+        role_cache.invalidate(user_ids=changes)
+
+
+@sa_event.listens_for(Session, 'after_rollback')
+def _discard_membership_changes(session):
+    session.info.pop('membership_changes', None)
@@ -0,0 +1,16 @@
+from models import db
+
+def dialect_insert(model):
+    """INSERT construct with on_conflict_do_nothing/do_update for the active database.
+    
+    Both production (PostgreSQL) and local development (SQLite) support
+    INSERT ... ON CONFLICT, but SQLAlchemy exposes it per dialect.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"ON CONFLICT inserts are not supported on {dialect}")
+    return insert(model)
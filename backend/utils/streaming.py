@@ -0,0 +1,50 @@
+import csv
+import io
+import json
+from datetime import datetime, date
+from flask import Response, stream_with_context
+
+# Rows fetched per round trip when streaming from a server-side cursor
+STREAM_BATCH_SIZE = 1000
+
+STREAM_FORMATS = ('csv', 'ndjson')
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+def _csv_lines(rows, fieldnames):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        # Hand each line to the client as soon as it's written
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def _ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, default=_json_default) + '\n'
+
+def stream_rows(rows, format_type, fieldnames, filename):
+    """Stream an iterable of dicts as a CSV or NDJSON download.
+
+    `rows` is consumed lazily inside the request context, so pass a generator
+    backed by a `yield_per` query to keep memory flat however many rows there are.
+    """
+    if format_type == 'csv':
+        body, mimetype = _csv_lines(rows, fieldnames), 'text/csv'
+    elif format_type == 'ndjson':
+        body, mimetype = _ndjson_lines(rows), 'application/x-ndjson'
+    else:
+        raise ValueError(f"Unsupported stream format: {format_type}")
+
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}.{format_type}"'
+    response.headers['X-Accel-Buffering'] = 'no'  # Don't let a proxy buffer the whole export
+    return response
@@ -1,4 +1,4 @@
-import React, { useState, useRef } from 'react';
+import React, { useState, useRef, useEffect } from 'react';
 import { 
   Card, 
   CardBody, 
@@ -38,14 +38,23 @@ import {
 } from 'react-icons/fa';
 import Toast from './Toast';
 
+// How often a running member import's progress is polled
+const IMPORT_POLL_MILLISECONDS = 2000;
+
 const BulkOperations = () => {
   const [activeTab, setActiveTab] = useState('import');
+  const [importFile, setImportFile] = useState(null);
   const [importPreview, setImportPreview] = useState(null);
   const [importLoading, setImportLoading] = useState(false);
+  const [importJob, setImportJob] = useState(null);
   const [showPreviewModal, setShowPreviewModal] = useState(false);
   const [showRecurringModal, setShowRecurringModal] = useState(false);
   const [toast, setToast] = useState(null);
   const fileInputRef = useRef(null);
+  const pollTimerRef = useRef(null);
+
+  // Stop polling when the page goes away
+  useEffect(() => () => clearTimeout(pollTimerRef.current), []);
 
   const [recurringEventForm, setRecurringEventForm] = useState({
     name: '',
@@ -70,12 +79,13 @@ const BulkOperations = () => {
     if (!file) return;
 
     setImportLoading(true);
+    setImportFile(file);
     const formData = new FormData();
     formData.append('file', file);
 
     try {
       const token = localStorage.getItem('token');
-      const response = await fetch('/api/bulk/import/members/preview', {
+      const response = await fetch('/api/bulk-ops/import/members/preview', {
         method: 'POST',
         headers: {
           'Authorization': `Bearer ${token}`
@@ -98,29 +108,63 @@ const BulkOperations = () => {
     }
   };
 
+  // The import runs in the background; follow its job until it finishes
+  const pollImportJob = async (statusUrl) => {
+    try {
+      const token = localStorage.getItem('token');
+      const response = await fetch(statusUrl, {
+        headers: { 'Authorization': `Bearer ${token}` }
+      });
+      if (!response.ok) throw new Error(`Import status request failed (${response.status})`);
+      const job = await response.json();
+      setImportJob(job);
+
+      if (job.status === 'completed') {
+        setToast({
+          type: job.error_count ? 'warning' : 'success',
+          message: `Import finished: ${job.created_count} created, ${job.added_count} added, ` +
+            `${job.skipped_count} skipped, ${job.error_count} errors`
+        });
+      } else if (job.status === 'failed') {
+        setToast({ type: 'error', message: 'Member import failed' });
+      } else {
+        pollTimerRef.current = setTimeout(() => pollImportJob(statusUrl), IMPORT_POLL_MILLISECONDS);
+      }
+    } catch (error) {
+      setToast({ type: 'error', message: 'Lost track of the member import; check the member list shortly' });
+    }
+  };
+
   const handleImportMembers = async () => {
-    if (!importPreview || importPreview.valid_rows.length === 0) {
+    if (!importFile || !importPreview || importPreview.valid_rows === 0) {
       setToast({ type: 'error', message: 'No valid rows to import' });
       return;
     }
 
+    // The whole file goes up; the preview only holds its first rows
+    const formData = new FormData();
+    formData.append('file', importFile);
+
     try {
       const token = localStorage.getItem('token');
-      const response = await fetch('/api/bulk/import/members', {
+      const response = await fetch('/api/bulk-ops/import/members', {
         method: 'POST',
         headers: {
-          'Authorization': `Bearer ${token}`,
-          'Content-Type': 'application/json'
+          'Authorization': `Bearer ${token}`
         },
-        body: JSON.stringify({ members: importPreview.valid_data })
+        body: formData
       });
 
       if (response.ok) {
         const data = await response.json();
-        setToast({ type: 'success', message: data.message });
+        setToast({ type: 'info', message: data.message });
         setShowPreviewModal(false);
         setImportPreview(null);
+        setImportFile(null);
         if (fileInputRef.current) fileInputRef.current.value = '';
+        setImportJob({ job_id: data.job_id, status: 'pending', progress: 0 });
+        clearTimeout(pollTimerRef.current);
+        pollImportJob(data.status_url);
       } else {
         const error = await response.json();
         setToast({ type: 'error', message: error.error || 'Failed to import members' });
@@ -133,20 +177,21 @@ const BulkOperations = () => {
   const handleExportData = async () => {
     try {
       const token = localStorage.getItem('token');
+      // The server streams the CSV, so large exports never sit in memory as JSON
       const endpoint = exportOptions.type === 'members' ? 
-        '/api/bulk/export/members' : 
-        `/api/bulk/export/events?start_date=${exportOptions.start_date}&end_date=${exportOptions.end_date}`;
+        '/api/bulk-ops/export/members?format=csv' : 
+        `/api/bulk-ops/export/events?format=csv&start_date=${exportOptions.start_date}&end_date=${exportOptions.end_date}`;
 
       const response = await fetch(endpoint, {
         headers: {
-          'Authorization': `Bearer ${token}`,
-          'Content-Type': 'application/json'
+          'Authorization': `Bearer ${token}`
         }
       });
 
       if (response.ok) {
-        const data = await response.json();
-        downloadCSV(data.data, data.filename);
+        const disposition = response.headers.get('Content-Disposition') || '';
+        const match = disposition.match(/filename="([^"]+)"/);
+        downloadBlob(await response.blob(), match ? match[1] : `${exportOptions.type}_export.csv`);
         setToast({ type: 'success', message: 'Data exported successfully' });
       } else {
         const error = await response.json();
@@ -162,7 +207,7 @@ const BulkOperations = () => {
     
     try {
       const token = localStorage.getItem('token');
-      const response = await fetch('/api/bulk/events/recurring', {
+      const response = await fetch('/api/bulk-ops/events/recurring', {
         method: 'POST',
         headers: {
           'Authorization': `Bearer ${token}`,
@@ -194,16 +239,7 @@ const BulkOperations = () => {
     }
   };
 
-  const downloadCSV = (data, filename) => {
-    if (data.length === 0) return;
-    
-    const headers = Object.keys(data[0]);
-    const csvContent = [
-      headers.join(','),
-      ...data.map(row => headers.map(header => `"${row[header] || ''}"`).join(','))
-    ].join('\n');
-
-    const blob = new Blob([csvContent], { type: 'text/csv;charset=utf-8;' });
+  const downloadBlob = (blob, filename) => {
     const link = document.createElement('a');
     const url = URL.createObjectURL(blob);
     link.setAttribute('href', url);
@@ -212,6 +248,7 @@ const BulkOperations = () => {
     document.body.appendChild(link);
     link.click();
     document.body.removeChild(link);
+    URL.revokeObjectURL(url);
   };
 
   const downloadTemplate = () => {
@@ -304,7 +341,7 @@ const BulkOperations = () => {
                             accept=".csv"
                             onChange={handleFileUpload}
                             ref={fileInputRef}
-                            disabled={importLoading}
+                            disabled={importLoading || importJob?.status === 'pending' || importJob?.status === 'running'}
                           />
                           <small className="text-muted">
                             Required columns: email, first_name, last_name<br />
@@ -318,6 +355,27 @@ const BulkOperations = () => {
                             <p className="mt-2">Processing file...</p>
                           </div>
                         )}
+
+                        {importJob && (
+                          <div className="mt-3">
+                            <div className="d-flex justify-content-between">
+                              <small>Import {importJob.status}</small>
+                              <small>{importJob.processed_rows || 0} / {importJob.total_rows || '?'} rows</small>
+                            </div>
+                            <Progress
+                              value={importJob.progress || 0}
+                              color={importJob.status === 'failed' ? 'danger' : 'success'}
+                              animated={importJob.status === 'pending' || importJob.status === 'running'}
+                            />
+                            {importJob.errors?.length > 0 && (
+                              <small className="text-danger">
+                                {importJob.errors.slice(0, 5).map(error =>
+                                  error.row_number ? `Row ${error.row_number}: ${error.error}` : error.error
+                                ).join('; ')}
+                              </small>
+                            )}
+                          </div>
+                        )}
                       </CardBody>
                     </Card>
                   </Col>
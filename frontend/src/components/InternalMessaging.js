@@ -26,6 +26,7 @@ import {
   FaUsers
 } from 'react-icons/fa';
 import Toast from './Toast';
+import { useLiveUpdates, currentUserId } from '../utils/liveUpdates';
 
 const InternalMessaging = () => {
   const [threads, setThreads] = useState([]);
@@ -76,6 +77,29 @@ const InternalMessaging = () => {
     scrollToBottom();
   }, [messages]);
 
+  // New messages arrive as deltas: move the thread to the top with its new
+  // last message instead of refetching the inbox
+  useLiveUpdates('message.created', ({ thread, last_message, sender_id }) => {
+    const fromMe = sender_id === currentUserId();
+    const isOpen = selectedThread && selectedThread.id === thread.id;
+    setThreads(prev => {
+      const existing = prev.find(t => t.id === thread.id);
+      const updated = {
+        participants: [],
+        participant_count: 0,
+        unread_count: 0,
+        ...existing,
+        ...thread,
+        last_message
+      };
+      if (!fromMe && !isOpen) updated.unread_count = (updated.unread_count || 0) + 1;
+      return [updated, ...prev.filter(t => t.id !== thread.id)];
+    });
+    if (isOpen) fetchMessages(thread.id);
+  });
+
+  useLiveUpdates('resync', () => fetchThreads());
+
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
@@ -166,7 +190,8 @@ const InternalMessaging = () => {
       if (response.ok) {
         setNewMessage('');
         fetchMessages(selectedThread.id);
-        fetchThreads(); // Refresh threads to update last message
+        // Our own message.created delta may be published on another worker
+        fetchThreads();
       } else {
         setToast({ type: 'error', message: 'Failed to send message' });
       }
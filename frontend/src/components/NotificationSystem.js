@@ -1,4 +1,5 @@
 import React, { useState, useEffect } from 'react';
+import { useLiveUpdates, currentUserId } from '../utils/liveUpdates';
 
 const NotificationSystem = () => {
   const [notifications, setNotifications] = useState([]);
@@ -53,6 +54,23 @@ const NotificationSystem = () => {
     };
   }, []);
 
+  // Pushed from the server as they happen
+  useLiveUpdates('substitute.requested', ({ requested_by, requester_name, event_title }) => {
+    if (requested_by !== currentUserId()) {
+      addNotification(`${requester_name || 'A member'} needs a substitute for ${event_title}`, 'info', 8000);
+    }
+  });
+
+  useLiveUpdates('substitute.filled', ({ requested_by, substitute_name, event_title }) => {
+    if (requested_by === currentUserId()) {
+      addNotification(`${substitute_name || 'A member'} will cover ${event_title} for you`, 'success', 8000);
+    }
+  });
+
+  useLiveUpdates('poll.created', ({ question }) => {
+    addNotification(`New poll: ${question}`, 'info');
+  });
+
   const getIcon = (type) => {
     switch (type) {
       case 'success':
@@ -33,6 +33,20 @@ import {
   FaDownload
 } from 'react-icons/fa';
 import Toast from './Toast';
+import { useLiveUpdates } from '../utils/liveUpdates';
+
+// Vote counts only grow, so a 'poll.tally' delta is applied only when it is
+// higher than the count already shown (deltas can arrive out of order)
+const applyTally = (poll, { poll_id, option, votes }) => {
+  if (!poll || poll.id !== poll_id) return poll;
+  const current = poll.option_counts[option] || 0;
+  if (votes <= current) return poll;
+  return {
+    ...poll,
+    option_counts: { ...poll.option_counts, [option]: votes },
+    total_responses: poll.total_responses + (votes - current)
+  };
+};
 
 const QuickPolls = () => {
   const [polls, setPolls] = useState([]);
@@ -63,10 +77,29 @@ const QuickPolls = () => {
     setIsAdmin(true);
   }, []);
 
+  // Live tallies from /api/stream, instead of polling while members vote
+  useLiveUpdates('poll.tally', (tally) => {
+    setPolls(prev => prev.map(poll => applyTally(poll, tally)));
+    setSelectedPoll(prev => applyTally(prev, tally));
+  });
+
+  useLiveUpdates('poll.created', (poll) => {
+    setPolls(prev => prev.some(p => p.id === poll.id) ? prev : [poll, ...prev]);
+  });
+
+  useLiveUpdates('poll.closed', ({ poll_id }) => {
+    setPolls(prev => prev.map(poll => poll.id === poll_id ? { ...poll, is_active: false } : poll));
+    setSelectedPoll(prev => prev && prev.id === poll_id ? { ...prev, is_active: false } : prev);
+  });
+
+  useLiveUpdates('resync', () => {
+    fetchPolls();
+  });
+
   const fetchPolls = async () => {
     try {
       const token = localStorage.getItem('token');
-      const response = await fetch('/api/polls', {
+      const response = await fetch('/api/quick-polls/', {
         headers: {
           'Authorization': `Bearer ${token}`,
           'Content-Type': 'application/json'
@@ -89,7 +122,7 @@ const QuickPolls = () => {
   const fetchTemplates = async () => {
     try {
       const token = localStorage.getItem('token');
-      const response = await fetch('/api/polls/templates', {
+      const response = await fetch('/api/quick-polls/templates', {
         headers: {
           'Authorization': `Bearer ${token}`,
           'Content-Type': 'application/json'
@@ -108,7 +141,7 @@ const QuickPolls = () => {
   const fetchPollDetails = async (pollId) => {
     try {
       const token = localStorage.getItem('token');
-      const response = await fetch(`/api/polls/${pollId}`, {
+      const response = await fetch(`/api/quick-polls/${pollId}`, {
         headers: {
           'Authorization': `Bearer ${token}`,
           'Content-Type': 'application/json'
@@ -140,7 +173,7 @@ const QuickPolls = () => {
 
     try {
       const token = localStorage.getItem('token');
-      const response = await fetch('/api/polls', {
+      const response = await fetch('/api/quick-polls/', {
         method: 'POST',
         headers: {
           'Authorization': `Bearer ${token}`,
@@ -176,7 +209,7 @@ const QuickPolls = () => {
   const handleVote = async (pollId, response) => {
     try {
       const token = localStorage.getItem('token');
-      const result = await fetch(`/api/polls/${pollId}/respond`, {
+      const result = await fetch(`/api/quick-polls/${pollId}/respond`, {
         method: 'POST',
         headers: {
           'Authorization': `Bearer ${token}`,
@@ -200,7 +233,7 @@ const QuickPolls = () => {
   const handleClosePoll = async (pollId) => {
     try {
       const token = localStorage.getItem('token');
-      const response = await fetch(`/api/polls/${pollId}/close`, {
+      const response = await fetch(`/api/quick-polls/${pollId}/close`, {
         method: 'POST',
         headers: {
           'Authorization': `Bearer ${token}`,
@@ -226,7 +259,7 @@ const QuickPolls = () => {
 
     try {
       const token = localStorage.getItem('token');
-      const response = await fetch(`/api/polls/${pollId}`, {
+      const response = await fetch(`/api/quick-polls/${pollId}`, {
         method: 'DELETE',
         headers: {
           'Authorization': `Bearer ${token}`,
@@ -248,7 +281,7 @@ const QuickPolls = () => {
   const handleExportResults = async (pollId) => {
     try {
       const token = localStorage.getItem('token');
-      const response = await fetch(`/api/polls/${pollId}/export`, {
+      const response = await fetch(`/api/quick-polls/${pollId}/export`, {
         headers: {
           'Authorization': `Bearer ${token}`,
           'Content-Type': 'application/json'
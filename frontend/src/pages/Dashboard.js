@@ -18,8 +18,15 @@ import UserAvatar from '../components/UserAvatar';
 import { useTheme } from '../contexts/ThemeContext';
 import { getGoogleMapsApiKey } from '../config/constants';
 import { getApiUrl } from '../utils/apiUrl';
+import { useLiveUpdates } from '../utils/liveUpdates';
 import axios from 'axios';
 
+const DAY_MS = 24 * 60 * 60 * 1000;
+// Window of events the dashboard loads (and fetches RSVPs for)
+const DASHBOARD_PAST_DAYS = 30;
+const DASHBOARD_AHEAD_DAYS = 180;
+const DASHBOARD_EVENT_LIMIT = 200;
+
 function Dashboard() {
   const [events, setEvents] = useState([]);
   const [rsvps, setRsvps] = useState({});
@@ -46,6 +53,32 @@ function Dashboard() {
     if (window.showInfo) window.showInfo(message);
   };
 
+  // Every roster in one request; also sets the current user's own answers
+  const loadRosters = async (eventIds) => {
+    if (!eventIds.length) return;
+    const res = await axios.get(`${getApiUrl()}/events/rsvps`, {
+      params: { ids: eventIds.join(',') },
+      headers: { Authorization: `Bearer ${localStorage.getItem('token')}` }
+    });
+    const username = localStorage.getItem('username');
+    const rsvpMap = {};
+    const allRsvpMap = {};
+    for (const eventId of eventIds) {
+      const roster = res.data[eventId] || { Yes: [], No: [], Maybe: [] };
+      allRsvpMap[eventId] = roster;
+      rsvpMap[eventId] = null;
+      for (const [rsvpStatus, users] of Object.entries(roster)) {
+        // Check if users array contains objects with username property
+        const hasUserRsvp = users.some(user =>
+          typeof user === 'object' ? user.username === username : user === username
+        );
+        if (hasUserRsvp) rsvpMap[eventId] = rsvpStatus;
+      }
+    }
+    setRsvps(prev => ({ ...prev, ...rsvpMap }));
+    setAllRsvps(prev => ({ ...prev, ...allRsvpMap }));
+  };
+
   useEffect(() => {
     const fetchData = async () => {
       setLoading(true);
@@ -66,45 +99,24 @@ function Dashboard() {
         });
         setAllUsers(resUsers.data);
         
-        // Get all events
-        const resEvents = await axios.get(`${apiUrl}/events/`, {
+        // Get the last month's and the next six months' events
+        const now = Date.now();
+        const params = new URLSearchParams({
+          from: new Date(now - DASHBOARD_PAST_DAYS * DAY_MS).toISOString().slice(0, 19),
+          to: new Date(now + DASHBOARD_AHEAD_DAYS * DAY_MS).toISOString().slice(0, 19),
+          limit: DASHBOARD_EVENT_LIMIT
+        });
+        const resEvents = await axios.get(`${apiUrl}/events/?${params.toString()}`, {
           headers: { Authorization: `Bearer ${token}` }
         });
         
         // Sort events by date
-        const sortedEvents = resEvents.data.sort((a, b) => new Date(a.date) - new Date(b.date));
+        const sortedEvents = resEvents.data.events.sort((a, b) => new Date(a.date) - new Date(b.date));
         setEvents(sortedEvents);
         
-        // Get user's RSVPs for all events and all member responses
-        const rsvpMap = {};
-        const allRsvpMap = {};
-        for (const event of sortedEvents) {
-          try {
-            const res = await axios.get(`${apiUrl}/events/${event.id}/rsvps`, {
-              headers: { Authorization: `Bearer ${token}` }
-            });
-            
-            // Store all responses for this event
-            allRsvpMap[event.id] = res.data;
-            
-            // Find the RSVP for the current user
-            const username = localStorage.getItem('username');
-            let status = null;
-            for (const [rsvpStatus, users] of Object.entries(res.data)) {
-              // Check if users array contains objects with username property
-              const hasUserRsvp = users.some(user => 
-                typeof user === 'object' ? user.username === username : user === username
-              );
-              if (hasUserRsvp) status = rsvpStatus;
-            }
-            rsvpMap[event.id] = status;
-          } catch {
-            rsvpMap[event.id] = null;
-            allRsvpMap[event.id] = { Yes: [], No: [], Maybe: [] };
-          }
-        }
-        setRsvps(rsvpMap);
-        setAllRsvps(allRsvpMap);
+        // Get user's RSVPs for all events and all member responses; the
+        // events still show if the rosters fail to load
+        await loadRosters(sortedEvents.map(event => event.id)).catch(() => {});
       } catch (err) {
         setError('Failed to load events.');
       }
@@ -113,6 +125,45 @@ function Dashboard() {
     fetchData();
   }, []);
 
+  // Other members' RSVP changes arrive as deltas; only unknown members need a refetch
+  const refreshEventRsvps = async (eventId) => {
+    const res = await axios.get(`${getApiUrl()}/events/${eventId}/rsvps`, {
+      headers: { Authorization: `Bearer ${localStorage.getItem('token')}` }
+    });
+    setAllRsvps(prev => ({ ...prev, [eventId]: res.data }));
+  };
+
+  useLiveUpdates('rsvp.updated', ({ event_id, user_id, status }) => {
+    if (!(event_id in allRsvps)) return;
+    const member = allUsers.find(u => u.id === user_id);
+    if (!member) {
+      refreshEventRsvps(event_id).catch(() => {});
+      return;
+    }
+    setAllRsvps(prev => {
+      const current = prev[event_id] || { Yes: [], No: [], Maybe: [] };
+      const updated = {};
+      for (const [key, users] of Object.entries(current)) {
+        updated[key] = users.filter(u => (typeof u === 'object' ? u.username : u) !== member.username);
+      }
+      updated[status] = [...(updated[status] || []), {
+        username: member.username,
+        name: member.name,
+        display_name: member.name,
+        section_id: member.section_id,
+        section_name: member.section_name
+      }];
+      return { ...prev, [event_id]: updated };
+    });
+    if (member.username === localStorage.getItem('username')) {
+      setRsvps(prev => ({ ...prev, [event_id]: status }));
+    }
+  });
+
+  useLiveUpdates('resync', () => {
+    loadRosters(events.map(event => event.id)).catch(() => {});
+  });
+
   const handleRSVP = async (eventId, rsvpStatus) => {
     try {
       const token = localStorage.getItem('token');
@@ -127,11 +178,9 @@ function Dashboard() {
       setRsvps({ ...rsvps, [eventId]: capitalizedStatus });
       showSuccessMessage(`RSVP updated to "${capitalizedStatus}"`);
       
-      // Refresh the RSVP data to get updated member responses
-      const res = await axios.get(`${apiUrl}/events/${eventId}/rsvps`, {
-        headers: { Authorization: `Bearer ${token}` }
-      });
-      setAllRsvps(prev => ({ ...prev, [eventId]: res.data }));
+      // Refetch our own change: its rsvp.updated delta only reaches this
+      // client if the stream happens to be served by the same worker
+      await refreshEventRsvps(eventId);
     } catch (error) {
       showErrorMessage('Failed to update RSVP');
     }
@@ -0,0 +1,143 @@
+import { useEffect, useRef } from 'react';
+import { getApiUrl } from './apiUrl';
+
+// One shared EventSource on /api/stream for the whole page. Components
+// subscribe to delta types ('message.created', 'rsvp.updated', ...) and apply
+// them to state they already hold instead of refetching lists. 'resync' is
+// delivered when deltas were missed (the connection dropped or fell behind):
+// refetch then.
+//
+// EventSource can't send headers, so each connection opens with a
+// short-lived stream token from POST /api/stream/token rather than putting
+// the access token in the URL. The server recycles streams every few minutes,
+// long after that token expired, so it sends 'reconnect' first and we open a
+// new stream with a new token straight away. When the server refuses the
+// connection (a network blip outlived the token, or the worker is at its
+// stream cap) we fetch a new token and try again after a pause.
+
+const RETRY_MILLISECONDS = 30000;
+
+const listeners = {};
+let source = null;
+let sourceToken = null;
+let connecting = false;
+let connectedOnce = false;
+let retryTimer = null;
+let attached = new Set();
+
+const dispatch = (type, data) => {
+  (listeners[type] || []).forEach(listener => listener(data));
+};
+
+const hasListeners = () => Object.values(listeners).some(list => list.length);
+
+const closeSource = () => {
+  if (source) source.close();
+  source = null;
+  sourceToken = null;
+  attached = new Set();
+};
+
+const scheduleReconnect = () => {
+  if (retryTimer) return;
+  retryTimer = setTimeout(() => {
+    retryTimer = null;
+    connect();
+  }, RETRY_MILLISECONDS);
+};
+
+const connect = async () => {
+  const token = localStorage.getItem('token');
+  if (!token || typeof window.EventSource === 'undefined') return;
+  if ((source && sourceToken === token) || connecting) return;
+  closeSource();
+
+  connecting = true;
+  let streamToken;
+  try {
+    const response = await fetch(`${getApiUrl()}/stream/token`, {
+      method: 'POST',
+      headers: { Authorization: `Bearer ${token}` }
+    });
+    if (!response.ok) throw new Error(`Stream token request failed (${response.status})`);
+    streamToken = (await response.json()).token;
+  } catch (error) {
+    scheduleReconnect();
+    return;
+  } finally {
+    connecting = false;
+  }
+  if (!hasListeners() || source) return;
+
+  sourceToken = token;
+  source = new window.EventSource(`${getApiUrl()}/stream?token=${encodeURIComponent(streamToken)}`);
+
+  // Reconnects (after the server recycles the stream or a network blip) may have missed deltas
+  source.addEventListener('ready', () => {
+    if (connectedOnce) dispatch('resync', {});
+    connectedOnce = true;
+  });
+  // The server is about to close this stream; replace it before EventSource retries with a stale token
+  source.addEventListener('reconnect', () => {
+    closeSource();
+    connect();
+  });
+  source.addEventListener('error', () => {
+    if (localStorage.getItem('token') !== sourceToken) {
+      // A new access token (after refresh) needs a new connection
+      connect();
+    } else if (source && source.readyState === window.EventSource.CLOSED) {
+      // Refused outright - EventSource won't retry on its own
+      closeSource();
+      scheduleReconnect();
+    }
+  });
+  Object.keys(listeners).forEach(attach);
+};
+
+const attach = (type) => {
+  if (!source || attached.has(type) || type === 'resync') return;
+  attached.add(type);
+  source.addEventListener(type, (event) => {
+    try {
+      dispatch(type, JSON.parse(event.data));
+    } catch (error) {
+      console.error('Malformed live update', error);
+    }
+  });
+};
+
+// The signed-in user's ID, from the access token's subject
+export const currentUserId = () => {
+  try {
+    const payload = localStorage.getItem('token').split('.')[1].replace(/-/g, '+').replace(/_/g, '/');
+    return Number(JSON.parse(window.atob(payload)).sub);
+  } catch {
+    return null;
+  }
+};
+
+export const subscribe = (type, listener) => {
+  listeners[type] = [...(listeners[type] || []), listener];
+  connect();
+  attach(type);
+  return () => {
+    listeners[type] = (listeners[type] || []).filter(l => l !== listener);
+    if (!hasListeners()) {
+      closeSource();
+      clearTimeout(retryTimer);
+      retryTimer = null;
+      connectedOnce = false;
+    }
+  };
+};
+
+// Subscribe a component to one delta type; the latest handler is always used
+export const useLiveUpdates = (type, handler) => {
+  const handlerRef = useRef(handler);
+  handlerRef.current = handler;
+
+  useEffect(() => subscribe(type, (data) => handlerRef.current(data)), [type]);
+};
+
+export default useLiveUpdates;
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Test the analytics rollup tables behind AnalyticsService
+Checks that rollups follow RSVP/Event writes once compacted, that dashboard
+reads never write, and that they cost the same number of queries regardless
+of how much history an org has.
+"""
+
+import os
+import sys
+import time
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from datetime import datetime, timedelta
+from sqlalchemy import event as sa_event
+from app import app, db
+from models import User, Organization, Section, Event, RSVP, EmailLog, AnalyticsDirtyDay
+from services.analytics_service import AnalyticsService
+from services.analytics_rollups import AnalyticsRollupService
+
+HISTORY_SIZES = [10, 100]  # Past events per organization
+
+
+def seed_organization(name, events, members=20):
+    """An organization with `events` past events, each answered by every member"""
+    org = Organization(name=name)
+    db.session.add(org)
+    db.session.flush()
+    sections = [Section(name=n, organization_id=org.id) for n in ('Cornet', 'Horn')]
+    db.session.add_all(sections)
+    db.session.flush()
+
+    users = [
+        User(username=f'{name}_{i}', email=f'{name}_{i}@example.com', password_hash='x',
+             organization_id=org.id, section_id=sections[i % 2].id)
+        for i in range(members)
+    ]
+    db.session.add_all(users)
+    db.session.flush()
+
+    now = datetime.utcnow()
+    for e in range(events):
+        event = Event(title=f'Rehearsal {e}', date=now - timedelta(days=e * 3 + 1),
+                      type='Rehearsal' if e % 3 else 'Concert', organization_id=org.id)
+        db.session.add(event)
+        db.session.flush()
+        db.session.add_all([
+            RSVP(user_id=u.id, event_id=event.id, status='Yes' if i % 4 else 'No', created_at=event.date - timedelta(days=1))
+            for i, u in enumerate(users)
+        ])
+    db.session.add(EmailLog(organization_id=org.id, email_type='new_event', status='sent'))
+    db.session.commit()
+    return org, users
+
+
+def count_queries(fn, statements=None):
+    statements = [] if statements is None else statements
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sa_event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        start = time.perf_counter()
+        fn()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+    finally:
+        sa_event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return len(statements), elapsed_ms
+
+
+def dashboard(org_id):
+    AnalyticsService.get_organization_overview(org_id, 30)
+    AnalyticsService.get_member_analytics(org_id, 30)
+    AnalyticsService.get_event_analytics(org_id, 90)
+    AnalyticsService.get_communication_analytics(org_id, 30)
+
+
+def test_rollups_follow_writes():
+    """RSVP changes and event moves show up in the next read"""
+    print("🧪 Testing rollup maintenance")
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        org, users = seed_organization('Rollup Band', 5)
+
+        # Reads never backfill or compact; that is the scheduler's job
+        statements = []
+        count_queries(lambda: dashboard(org.id), statements)
+        writes = [st for st in statements if st.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        assert not writes, writes
+        assert AnalyticsService.get_event_analytics(org.id, 90)['event_stats'] == []
+        AnalyticsRollupService.compact()
+
+        events = AnalyticsService.get_event_analytics(org.id, 90)['event_stats']
+        assert len(events) == 5, len(events)
+        assert all(e['total_responses'] == 20 and e['yes_count'] == 15 for e in events), events
+
+        # Flip one RSVP and move one event out of the window
+        newest = Event.query.filter_by(organization_id=org.id).order_by(Event.date.desc()).first()
+        rsvp = RSVP.query.filter_by(event_id=newest.id, status='No').first()
+        rsvp.status = 'Yes'
+        oldest = Event.query.filter_by(organization_id=org.id).order_by(Event.date).first()
+        oldest.date = datetime.utcnow() - timedelta(days=200)
+        db.session.commit()
+        # Every member changing their mind appends a marker rather than updating a shared row
+        for other in RSVP.query.filter_by(event_id=newest.id, status='Yes').limit(5):
+            other.status = 'Maybe'
+            db.session.commit()
+        dirty = {(d.organization_id, d.day) for d in AnalyticsDirtyDay.query}
+        assert len(dirty) == 3, "Expected the RSVP's day and both of the moved event's days"
+        assert AnalyticsDirtyDay.query.count() > 3
+        stats = AnalyticsRollupService.compact()
+        assert stats['dirty_days'] == 3 and AnalyticsDirtyDay.query.count() == 0, stats
+
+        events = {e['id']: e for e in AnalyticsService.get_event_analytics(org.id, 90)['event_stats']}
+        assert len(events) == 4 and oldest.id not in events, events.keys()
+        assert events[newest.id]['yes_count'] == 11 and events[newest.id]['maybe_count'] == 5, events[newest.id]
+
+        members = AnalyticsService.get_member_analytics(org.id, 30)
+        assert sum(m['total_rsvps'] for m in members['member_stats']) == 4 * 20
+        assert [s['member_count'] for s in members['section_stats']] == [10, 10]
+
+        overview = AnalyticsService.get_organization_overview(org.id, 30)
+        assert overview['recent_events'] == 4, overview
+        comm = AnalyticsService.get_communication_analytics(org.id, 30)
+        assert comm['email']['sent_emails'] == 1, comm
+        print("✅ Rollups track RSVP and event changes")
+
+
+def test_dashboard_query_count():
+    """Dashboard cost must not depend on the amount of history"""
+    print("🧪 Benchmarking analytics dashboard")
+    results = []
+    with app.app_context():
+        db.create_all()
+        for size in HISTORY_SIZES:
+            org, _ = seed_organization(f'History {size}', size)
+            AnalyticsRollupService.compact()
+            queries, elapsed_ms = count_queries(lambda: dashboard(org.id))
+            print(f"📊 {size:>4} past events: {queries} queries, {elapsed_ms:.1f} ms")
+            results.append(queries)
+
+    assert len(set(results)) == 1, f"Query count grows with history: {dict(zip(HISTORY_SIZES, results))}"
+    print("✅ Dashboard query count is constant")
+
+
+if __name__ == '__main__':
+    try:
+        test_rollups_follow_writes()
+        test_dashboard_query_count()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test the batched audit sink
+Checks audit and security events are buffered instead of written on the
+caller's session, land in batches on flush, and that loss is bounded when
+the buffer is full or the database keeps failing.
+"""
+
+import os
+import sys
+import time
+import threading
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from sqlalchemy import event as sa_event, create_engine
+from app import app, db
+from models import AuditLog, SecurityEvent, Organization
+from routes.security import log_audit_event, log_security_event, audit_required
+from services import audit_sink
+from services.audit_sink import AuditSink
+
+
+def test_audit_sink():
+    """Audited calls queue records; the sink writes them in batches on its own connection"""
+    print("🧪 Testing batched audit sink")
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        sink = audit_sink._default_sink = AuditSink(db.engine, batch_size=50, flush_seconds=3600)
+
+        statements = []
+        request_thread = threading.get_ident()
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            # The sink's own writes happen on its thread
+            if threading.get_ident() == request_thread:
+                statements.append(statement)
+
+        sa_event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            with app.test_request_context('/api/things/7', headers={'User-Agent': 'pytest', 'X-Forwarded-For': '10.0.0.9'}):
+                # Logging must not commit the caller's half-finished work
+                db.session.add(Organization(name='Uncommitted Band'))
+
+                @audit_required('view', 'thing')
+                def view_thing(id):
+                    return 'ok'
+
+                for i in range(120):
+                    assert view_thing(id=i + 1) == 'ok'
+                assert log_security_event('failed_login', 'medium', details={'username': 'bob'}, user_id=3)
+                db.session.rollback()
+        finally:
+            sa_event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+        assert statements == [], f"Audited calls hit the database: {statements[:2]}"
+        assert Organization.query.filter_by(name='Uncommitted Band').count() == 0, "Caller's work was committed"
+
+        sink.shutdown()
+        audit_sink._default_sink = None
+        assert sink.pending() == 0 and sink.written == 121 and sink.dropped == 0
+        assert AuditLog.query.count() == 120
+        entry = AuditLog.query.order_by(AuditLog.id).first()
+        assert entry.ip_address == '10.0.0.9' and entry.resource_id == 1 and entry.timestamp is not None
+        assert entry.details['method'] == 'GET', entry.details
+        security_event = SecurityEvent.query.one()
+        assert security_event.severity == 'medium' and security_event.resolved is False
+        assert security_event.details == {'username': 'bob'}
+
+        # The background thread writes a full batch without being asked
+        background = AuditSink(db.engine, batch_size=5, flush_seconds=3600)
+        for i in range(5):
+            background.record('audit', {'action_type': 'login', 'resource_type': 'user', 'resource_id': i})
+        for _ in range(50):
+            if background.written == 5:
+                break
+            time.sleep(0.05)
+        assert background.written == 5, "Full batch was not written in the background"
+        background.shutdown()
+
+        # A full buffer drops new records rather than growing without bound
+        bounded = AuditSink(db.engine, batch_size=100, flush_seconds=3600, max_buffer=3)
+        accepted = [bounded.record('audit', {'action_type': 'view', 'resource_type': 'user'}) for _ in range(5)]
+        assert accepted == [True, True, True, False, False] and bounded.dropped == 2
+        bounded.shutdown()
+        assert bounded.written == 3
+
+        # A batch that keeps failing is dropped and counted, not retried forever
+        broken = AuditSink(create_engine('sqlite:///:memory:'), batch_size=10, flush_seconds=3600, max_retries=1)
+        broken.record('audit', {'action_type': 'view', 'resource_type': 'user'})
+        broken.shutdown()
+        assert broken.dropped == 1 and broken.written == 0 and broken.pending() == 0
+
+        print("✅ 121 audited calls issued no queries and were written in batches by the sink")
+
+
+if __name__ == '__main__':
+    try:
+        test_audit_sink()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
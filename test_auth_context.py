@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test the request-scoped auth context
+Checks the user, organization and role are resolved once per request, that
+verified roles are served from the TTL cache, and that a demotion or a
+disagreeing role claim is picked up without waiting for the cache to expire.
+"""
+
+import os
+import sys
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event as sa_event
+from app import app, db
+from models import User, Organization, UserOrganization
+from utils.auth_context import RoleCache, role_cache
+
+
+def count_queries(client, method, url, headers, **kwargs):
+    """Return (response, queries issued to authorize the request, i.e. not counting the poll it creates)"""
+    # Each request starts from a fresh view of the database, as it would in production
+    db.session.expire_all()
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if 'quick_polls' not in statement:
+            statements.append(statement)
+
+    sa_event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = getattr(client, method)(url, headers=headers, **kwargs)
+    finally:
+        sa_event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return response, len(statements)
+
+
+def test_auth_context():
+    """Roles are verified once per TTL, and demotions apply immediately"""
+    print("🧪 Testing request-scoped auth context")
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        org = Organization(name='Context Band')
+        db.session.add(org)
+        db.session.flush()
+        admin = User(username='context_admin', email='context_admin@example.com', password_hash='x')
+        legacy = User(username='context_legacy', email='context_legacy@example.com', password_hash='x',
+                      organization_id=org.id, role='Admin')
+        db.session.add_all([admin, legacy])
+        db.session.flush()
+        membership = UserOrganization(user_id=admin.id, organization_id=org.id, role='Admin')
+        db.session.add(membership)
+        db.session.commit()
+        role_cache.clear()
+
+        token = create_access_token(identity=str(admin.id),
+                                    additional_claims={'organization_id': org.id, 'role': 'Admin'})
+        headers = {'Authorization': f'Bearer {token}'}
+        client = app.test_client()
+
+        # Admin-only route: first call verifies the role, the next one is served from the cache
+        response, first = count_queries(client, 'post', '/api/quick-polls/', headers,
+                                        json={'question': 'Pizza?', 'options': ['Yes', 'No']})
+        assert response.status_code == 201, response.get_json()
+        response, cached = count_queries(client, 'post', '/api/quick-polls/', headers,
+                                         json={'question': 'Pizza?', 'options': ['Yes', 'No']})
+        assert response.status_code == 201
+        assert cached == first - 1, f"Role was not served from the cache ({first} then {cached} queries)"
+        # User and organization are loaded once however often handlers ask
+        assert cached <= 2, f"{cached} queries to authorize one request"
+
+        # Demoting the member drops their cached role on commit
+        membership.role = 'Member'
+        db.session.commit()
+        assert client.post('/api/quick-polls/', headers=headers,
+                           json={'question': 'Pizza?', 'options': ['Yes', 'No']}).status_code == 403
+
+        # Claims are only trusted as far as the membership table agrees
+        assert client.get('/api/admin/scheduled-jobs', headers=headers).status_code == 403
+
+        # A role claim that disagrees with the cache forces a fresh lookup
+        cache = RoleCache(ttl=3600)
+        assert cache.get(admin.id, org.id) == 'Member'
+        UserOrganization.query.filter_by(id=membership.id).update({'role': 'Admin'})
+        db.session.commit()
+        assert cache.get(admin.id, org.id) == 'Member', "Cache entry was not used"
+        assert cache.get(admin.id, org.id, claimed_role='Admin') == 'Admin'
+
+        # Users without a membership row fall back to the legacy fields
+        assert cache.get(legacy.id, org.id) == 'Admin'
+        assert cache.get(legacy.id, org.id + 1) is None
+
+        print(f"✅ Verified role cached: {first} queries on the first admin request, {cached} after")
+
+
+if __name__ == '__main__':
+    try:
+        test_auth_context()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
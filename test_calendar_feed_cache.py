@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test the cached iCal feeds
+Polls organization and personal feeds with If-None-Match: unchanged feeds
+answer 304 from the cache without touching the database, and committing an
+Event (or a member's RSVP) drops the affected feeds so the next poll gets
+the new content under a new ETag. Rolled back writes leave the cache alone,
+and the cache never holds more than its size limit.
+"""
+
+import os
+import sys
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from datetime import datetime, timedelta
+from sqlalchemy import event as sa_event
+from app import app, db
+from models import User, Organization, UserOrganization, Event, RSVP
+from services.calendar_service import calendar_service
+
+
+def poll(client, url, etag=None):
+    """Return (status, ETag, body, query_count) for a feed GET"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db.session.remove()
+    sa_event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url, headers={'If-None-Match': f'"{etag}"'} if etag else {})
+    finally:
+        sa_event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return response.status_code, response.headers.get('ETag', '').strip('"'), response.get_data(as_text=True), len(statements)
+
+
+def test_calendar_feed_cache():
+    """Unchanged feeds are 304s from the cache; Event and RSVP commits invalidate them"""
+    print("🧪 Testing cached calendar feeds")
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        calendar_service.feed_cache.clear()
+        org = Organization(name='Feed Band')
+        other = Organization(name='Other Feed Band')
+        db.session.add_all([org, other])
+        db.session.flush()
+        member = User(username='feed_member', name='Feed Member', email='feed_member@example.com',
+                      password_hash='x', organization_id=org.id)
+        db.session.add(member)
+        db.session.flush()
+        db.session.add(UserOrganization(user_id=member.id, organization_id=org.id))
+        first = Event(title='Spring Concert', date=datetime.utcnow() + timedelta(days=7), organization_id=org.id)
+        db.session.add(first)
+        db.session.commit()
+        org_id, other_id, member_id, first_id = org.id, other.id, member.id, first.id
+
+        client = app.test_client()
+        org_url = f'/api/calendar/org/{org_id}/events.ics'
+        user_url = f'/api/calendar/user/{member_id}/org/{org_id}/events.ics'
+
+        status, etag, body, _ = poll(client, org_url)
+        assert status == 200 and etag and 'Spring Concert' in body, (status, etag)
+        status, same_etag, _, queries = poll(client, org_url, etag)
+        assert status == 304 and same_etag == etag, (status, same_etag)
+        assert queries == 0, f"Cached feed ran {queries} queries"
+        print("✅ Matching If-None-Match answered 304 from the cache with no queries")
+
+        # Another organization's events leave this feed cached
+        db.session.add(Event(title='Elsewhere', date=datetime.utcnow() + timedelta(days=3), organization_id=other_id))
+        db.session.commit()
+        assert calendar_service.feed_cache.get(('org', org_id, False)) is not None
+
+        # A rolled back event leaves it cached too
+        db.session.add(Event(title='Never Happened', date=datetime.utcnow() + timedelta(days=4), organization_id=org_id))
+        db.session.flush()
+        db.session.rollback()
+        assert poll(client, org_url, etag)[0] == 304
+
+        # A committed event drops it, and the next poll gets the new feed
+        db.session.add(Event(title='Summer Gala', date=datetime.utcnow() + timedelta(days=30), organization_id=org_id))
+        db.session.commit()
+        assert calendar_service.feed_cache.get(('org', org_id, False)) is None, "Event commit didn't drop the feed"
+        status, new_etag, body, _ = poll(client, org_url, etag)
+        assert status == 200 and new_etag != etag and 'Summer Gala' in body, (status, new_etag)
+        assert poll(client, org_url, new_etag)[0] == 304
+        print("✅ Event commit invalidated the organization feed; other orgs and rollbacks didn't")
+
+        # A member's RSVP drops their personal feed
+        status, user_etag, _, _ = poll(client, user_url)
+        assert status == 200 and poll(client, user_url, user_etag)[0] == 304
+        db.session.add(RSVP(event_id=first_id, user_id=member_id, status='Yes'))
+        db.session.commit()
+        assert calendar_service.feed_cache.get(('user', member_id, org_id)) is None, "RSVP commit didn't drop the feed"
+        status, new_user_etag, _, _ = poll(client, user_url, user_etag)
+        assert status == 200 and new_user_etag != user_etag, (status, new_user_etag)
+        print("✅ RSVP commit invalidated the member's personal feed")
+
+        # A rebuild after the TTL with nothing changed keeps the ETag
+        feed = calendar_service.feed_cache.get(('org', org_id, False))
+        feed.expires_at = datetime.utcnow() - timedelta(seconds=1)
+        status, rebuilt_etag, _, queries = poll(client, org_url, new_etag)
+        assert status == 304 and rebuilt_etag == new_etag and queries > 0, (status, queries)
+        print("✅ Expired feed rebuilt with an unchanged ETag still answers 304")
+
+        # Past its size limit the cache drops the least recently used feed
+        cache = calendar_service.feed_cache
+        max_entries = cache.max_entries
+        cache.max_entries = 2
+        try:
+            cache.clear()
+            poll(client, org_url)
+            poll(client, user_url)
+            poll(client, org_url, new_etag)
+            poll(client, f'/api/calendar/public/{org_id}/events.ics')
+            assert len(cache) == 2, len(cache)
+            assert cache.get(('user', member_id, org_id)) is None, "Least recently used feed kept"
+            assert cache.get(('org', org_id, False)) is not None and cache.get(('public', org_id)) is not None
+        finally:
+            cache.max_entries = max_entries
+        print("✅ Cache bounded, least recently used feed evicted")
+
+
+if __name__ == '__main__':
+    try:
+        test_calendar_feed_cache()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Test the batched email delivery pipeline against the in-memory FakeTransport
+Covers batching, per-recipient retry, rate-limit handling, background
+dispatch and bulk EmailLog writes - no Resend account needed.
+"""
+
+import os
+import sys
+import time
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from app import app, db
+from models import Organization, EmailLog
+from services.email_delivery import EmailDispatcher, FakeTransport, OutboundEmail
+from services.email_service import EmailService
+
+
+def make_emails(org_id, count):
+    return [
+        OutboundEmail(
+            to=f'member{i}@example.com',
+            subject='Event Cancelled: Concert',
+            html='<p>Cancelled</p>',
+            user_id=i + 1,
+            organization_id=org_id,
+            email_type='event_cancellation',
+            event_id=1
+        )
+        for i in range(count)
+    ]
+
+
+def test_batching_retry_and_rate_limits():
+    """Every deliverable email is sent once, bad addresses fail alone"""
+    print("🧪 Testing batching, retries and rate limits")
+    transport = FakeTransport(
+        max_batch_size=25,
+        transient_failures={'member3@example.com': 2, 'member40@example.com': 1},
+        permanent_failures=['member77@example.com'],
+        rate_limit_every=4
+    )
+    dispatcher = EmailDispatcher(transport, 'BandSync <noreply@example.com>', max_workers=4,
+                                 batch_size=50, max_retries=3, rate_per_second=0,
+                                 sleep=lambda seconds: None)
+
+    results = dispatcher.send(make_emails(1, 200))
+    sent = [r for r in results if r.status == 'sent']
+    failed = [r for r in results if r.status == 'failed']
+
+    assert len(results) == 200, len(results)
+    assert [r.email.to for r in failed] == ['member77@example.com'], [r.email.to for r in failed]
+    assert len(sent) == 199
+    delivered = [p['to'] for p in transport.sent]
+    assert len(delivered) == len(set(delivered)) == 199, "Some recipients were emailed twice"
+    assert transport.calls < 200, f"Expected batched calls, got {transport.calls}"
+    print(f"✅ 199/200 delivered in {transport.calls} provider calls, 1 permanent failure isolated")
+
+
+def test_background_dispatch_and_bulk_logs():
+    """send_bulk returns immediately and writes EmailLog rows when done"""
+    print("🧪 Testing background dispatch")
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        org = Organization(name='Pipeline Band')
+        db.session.add(org)
+        db.session.commit()
+
+        transport = FakeTransport()
+        service = EmailService(transport=transport)
+        service.dispatcher.rate_limiter.rate = 0
+
+        start = time.perf_counter()
+        future = service.send_bulk(make_emails(org.id, 200))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        assert elapsed_ms < 100, f"send_bulk blocked for {elapsed_ms:.0f} ms"
+
+        future.result(timeout=30)
+        logs = EmailLog.query.filter_by(organization_id=org.id, email_type='event_cancellation').count()
+        assert logs == 200, f"Expected 200 EmailLog rows, got {logs}"
+        print(f"✅ Queued 200 emails in {elapsed_ms:.1f} ms, {logs} EmailLog rows written")
+
+
+if __name__ == '__main__':
+    try:
+        test_batching_retry_and_rate_limits()
+        test_background_dispatch_and_bulk_logs()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
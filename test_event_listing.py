@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Test the windowed, keyset-paginated event listing
+Seeds a long-running band (one-off events plus a weekly series) and pages
+through GET /api/events/, checking every event appears exactly once and that
+each page costs the same number of queries however deep it is. Window bounds
+with UTC offsets are accepted. Without a window or paging, only recent and
+upcoming events are listed.
+"""
+
+import os
+import sys
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event as sa_event
+from app import app, db
+from models import User, Organization, Event, EventCategory
+
+EVENT_COUNT = 1000
+PAGE_SIZE = 50
+
+
+def get(client, url, headers):
+    """Return (query_count, JSON body) for a GET"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sa_event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.get_json()
+    finally:
+        sa_event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return len(statements), response.get_json()
+
+
+def test_event_listing():
+    """Pages cover the window exactly once in (date, id) order in constant queries"""
+    print("🧪 Testing paginated event listing")
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        org = Organization(name='Listing Band')
+        db.session.add(org)
+        db.session.flush()
+        category = EventCategory(name='Concert', organization_id=org.id)
+        admin = User(username='listing_admin', name='Listing Admin', email='listing_admin@example.com',
+                     password_hash='x', organization_id=org.id)
+        db.session.add_all([category, admin])
+        db.session.flush()
+
+        start = datetime(2024, 1, 1, 19, 0)
+        db.session.add_all([Event(
+            title=f'Gig {i}', date=start + timedelta(hours=12 * i), organization_id=org.id,
+            category_id=category.id, created_by=admin.id
+        ) for i in range(EVENT_COUNT)])
+        # Two events at the same time exercise the id tie-breaker
+        db.session.add(Event(title='Same time', date=start + timedelta(hours=12), organization_id=org.id))
+        db.session.add(Event(title='Rehearsal', date=start + timedelta(hours=1), organization_id=org.id,
+                             is_recurring=True, recurring_pattern='weekly', recurring_count=60))
+        db.session.commit()
+
+        token = create_access_token(identity=str(admin.id), additional_claims={'organization_id': org.id})
+        headers = {'Authorization': f'Bearer {token}'}
+        client = app.test_client()
+
+        window_end = start + timedelta(days=600)
+        everything = client.get(f'/api/events/?from={start.isoformat()}&to={window_end.isoformat()}',
+                                headers=headers).get_json()
+        assert len(everything) == EVENT_COUNT + 1 + 60, len(everything)
+
+        seen = []
+        query_counts = []
+        url = f'/api/events/?from={start.isoformat()}&to={window_end.isoformat()}&limit={PAGE_SIZE}'
+        cursor = None
+        while True:
+            queries, page = get(client, url + (f'&cursor={cursor}' if cursor else ''), headers)
+            assert len(page['events']) <= PAGE_SIZE
+            seen.extend(e['id'] for e in page['events'])
+            query_counts.append(queries)
+            if not page['pagination']['has_next']:
+                break
+            cursor = page['pagination']['next_cursor']
+
+        assert seen == [e['id'] for e in everything], "Pages skipped, repeated or reordered events"
+        assert len(set(query_counts)) == 1, f"Query count varies across pages: {query_counts}"
+
+        # Projection returns just the requested fields
+        _, page = get(client, "/api/events/?limit=5&fields=id,date,category", headers)
+        assert set(page['events'][0]) == {'id', 'date', 'category'}, page['events'][0]
+        assert page['events'][0]['category'] == 'Concert', page['events'][0]
+
+        assert client.get('/api/events/?fields=id,secret', headers=headers).status_code == 400
+        assert client.get('/api/events/?cursor=bogus', headers=headers).status_code == 400
+
+        # Bounds with offsets are compared in UTC: Z matches the naive window,
+        # and +02:00 on the same wall time starts two hours earlier
+        response = client.get(f"/api/events/?from={start.isoformat()}Z&to={window_end.isoformat()}Z", headers=headers)
+        assert response.status_code == 200, response.get_json()
+        assert [e['id'] for e in response.get_json()] == [e['id'] for e in everything]
+        shifted = (start + timedelta(hours=2)).isoformat()
+        response = client.get(f"/api/events/?from={shifted}%2B02:00&to={window_end.isoformat()}", headers=headers)
+        assert response.status_code == 200 and len(response.get_json()) == len(everything), response.status_code
+
+        print(f"✅ {len(seen)} events in {len(query_counts)} pages of {PAGE_SIZE}, "
+              f"{query_counts[0]} queries per page")
+
+
+def test_default_window():
+    """The unparameterized listing skips old history and starts series in the window"""
+    print("🧪 Testing default event listing window")
+    with app.app_context():
+        org = Organization(name='Window Band')
+        db.session.add(org)
+        db.session.flush()
+        admin = User(username='window_admin', name='Window Admin', email='window_admin@example.com',
+                     password_hash='x', organization_id=org.id)
+        db.session.add(admin)
+        now = datetime.utcnow()
+        db.session.add_all([
+            Event(title='Ancient', date=now - timedelta(days=400), organization_id=org.id),
+            Event(title='Recent', date=now - timedelta(days=10), organization_id=org.id),
+            Event(title='Upcoming', date=now + timedelta(days=30), organization_id=org.id),
+            Event(title='Far future', date=now + timedelta(days=800), organization_id=org.id),
+            Event(title='Undated', organization_id=org.id),
+            # A long-running weekly series that started three years ago
+            Event(title='Rehearsal', date=now - timedelta(days=3 * 365), organization_id=org.id,
+                  is_recurring=True, recurring_pattern='weekly')
+        ])
+        db.session.commit()
+
+        token = create_access_token(identity=str(admin.id), additional_claims={'organization_id': org.id})
+        _, events = get(app.test_client(), '/api/events/', {'Authorization': f'Bearer {token}'})
+        titles = {e['title'] for e in events}
+        assert {'Recent', 'Upcoming', 'Undated', 'Rehearsal'} <= titles, titles
+        assert not titles & {'Ancient', 'Far future'}, titles
+        dated = [datetime.fromisoformat(e['date']) for e in events if e['date']]
+        assert min(dated) >= now - timedelta(days=91) and max(dated) <= now + timedelta(days=366), (min(dated), max(dated))
+        rehearsals = sum(1 for e in events if e['title'] == 'Rehearsal')
+        assert rehearsals <= (90 + 365) // 7 + 1, rehearsals
+        print(f"✅ Default window lists {len(events)} events, {rehearsals} of them series occurrences")
+
+
+if __name__ == '__main__':
+    try:
+        test_event_listing()
+        test_default_window()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
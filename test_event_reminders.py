@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Test event reminder claiming and batched sending
+Runs the hourly reminder job against the FakeTransport: due events are
+claimed in the ledger and reminded once per member, a claim left behind by
+a run that died is taken over while a live one is left alone, and due
+events are sent in batches of REMINDER_BATCH_SIZE.
+"""
+
+import os
+import sys
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from datetime import datetime, timedelta
+from app import app, db
+from models import User, Organization, UserOrganization, Event, EventReminderLedger
+from services.email_delivery import FakeTransport
+from services.email_service import EmailService
+from services.scheduled_tasks import task_service
+
+
+class RecordingEmailService(EmailService):
+    """EmailService on the FakeTransport that remembers each send_bulk call"""
+
+    def __init__(self):
+        super().__init__(transport=FakeTransport())
+        self.dispatcher.rate_limiter.rate = 0
+        self.bulk_calls = []
+
+    def send_bulk(self, emails, background=True):
+        self.bulk_calls.append(len(emails))
+        return super().send_bulk(emails, background=background)
+
+    def recipients(self, event_id):
+        return sorted(p['to'] for p in self.dispatcher.transport.sent if p['subject'].startswith(f'Reminder: {event_id} '))
+
+
+def setup(name, members):
+    org = Organization(name=f'{name} Band')
+    db.session.add(org)
+    db.session.flush()
+    users = [User(username=f'{name}_{i}', name=f'{name} {i}', email=f'{name}_{i}@example.com', password_hash='x',
+                  organization_id=org.id) for i in range(members)]
+    # Opted out of reminders
+    users[0].email_event_reminders = False
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.add_all([UserOrganization(user_id=u.id, organization_id=org.id) for u in users])
+    db.session.commit()
+    return org.id, sorted(u.email for u in users[1:])
+
+
+def add_event(org_id, starts_in, days_before=1, **fields):
+    event = Event(title='pending', date=datetime.utcnow() + starts_in, organization_id=org_id,
+                  send_reminders=True, reminder_days_before=days_before, **fields)
+    db.session.add(event)
+    db.session.flush()
+    # Titles carry the ID so sent reminders can be traced back to their event
+    event.title = str(event.id)
+    db.session.commit()
+    return event.id
+
+
+def run_reminders(service, batch_size=None):
+    email_service, default_batch_size = task_service.email_service, task_service.REMINDER_BATCH_SIZE
+    task_service.email_service = service
+    task_service.REMINDER_BATCH_SIZE = batch_size or default_batch_size
+    try:
+        task_service.send_event_reminders()
+    finally:
+        task_service.email_service, task_service.REMINDER_BATCH_SIZE = email_service, default_batch_size
+    db.session.expire_all()
+
+
+def test_claim_and_takeover():
+    """Due events are reminded once; stale claims are taken over, live ones left alone"""
+    print("🧪 Testing reminder claims and takeover")
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        org_id, members = setup('claim', 6)
+        due = add_event(org_id, timedelta(hours=20))
+        not_yet = add_event(org_id, timedelta(hours=60), days_before=1)
+        early = add_event(org_id, timedelta(hours=60), days_before=3)
+        cancelled = add_event(org_id, timedelta(hours=5), is_cancelled=True)
+
+        # One claim left by a run that died two hours ago, one by a run still sending
+        abandoned = add_event(org_id, timedelta(hours=10))
+        in_flight = add_event(org_id, timedelta(hours=12))
+        now = datetime.utcnow()
+        db.session.add_all([
+            EventReminderLedger(event_id=abandoned, organization_id=org_id, claimed_at=now - timedelta(hours=2)),
+            EventReminderLedger(event_id=in_flight, organization_id=org_id, claimed_at=now - timedelta(minutes=5))
+        ])
+        db.session.commit()
+
+        service = RecordingEmailService()
+        run_reminders(service)
+        for event_id in (due, early, abandoned):
+            assert service.recipients(event_id) == members, (event_id, service.recipients(event_id))
+            ledger = EventReminderLedger.query.filter_by(event_id=event_id).one()
+            assert ledger.reminder_sent_at is not None and ledger.recipient_count == len(members)
+        for event_id in (not_yet, cancelled, in_flight):
+            assert service.recipients(event_id) == [], event_id
+        assert EventReminderLedger.query.filter_by(event_id=in_flight).one().reminder_sent_at is None
+        print("✅ Due events reminded, stale claim taken over, live claim and not-yet-due events skipped")
+
+        # The next run finds nothing left to send
+        again = RecordingEmailService()
+        run_reminders(again)
+        assert again.dispatcher.transport.sent == [], "Reminders sent twice"
+        print("✅ Second run sends nothing")
+
+
+def test_batched_sending():
+    """Due events from several organizations go out REMINDER_BATCH_SIZE events at a time"""
+    print("🧪 Testing batched reminder sending")
+    with app.app_context():
+        orgs = [setup(f'batch{i}', 4) for i in range(3)]
+        events = {add_event(org_id, timedelta(hours=6 + i)): members
+                  for i, (org_id, members) in enumerate(orgs * 4)}
+
+        service = RecordingEmailService()
+        run_reminders(service, batch_size=5)
+        assert len(service.bulk_calls) == 3, service.bulk_calls
+        for event_id, members in events.items():
+            assert service.recipients(event_id) == members, event_id
+        assert EventReminderLedger.query.filter(EventReminderLedger.event_id.in_(events),
+                                                EventReminderLedger.reminder_sent_at.is_(None)).count() == 0
+        print(f"✅ {len(events)} events reminded in {len(service.bulk_calls)} batches of up to 5")
+
+
+if __name__ == '__main__':
+    try:
+        test_claim_and_takeover()
+        test_batched_sending()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test the daily/weekly event summary job
+Runs the weekly summary against the FakeTransport for a few organizations,
+then for many more members: each organization's summary is built once
+however many members opted in, the run costs the same number of queries,
+and its counts and timing are recorded in last_runs.
+"""
+
+import os
+import sys
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import event as sa_event
+from app import app, db
+from models import User, Organization, UserOrganization, Event
+from services.email_delivery import FakeTransport
+from services.email_service import EmailService
+from services.scheduled_tasks import task_service
+
+
+class RecordingEmailService(EmailService):
+    """EmailService on the FakeTransport that counts summary contexts built per organization"""
+
+    def __init__(self):
+        super().__init__(transport=FakeTransport())
+        self.dispatcher.rate_limiter.rate = 0
+        self.contexts = Counter()
+
+    def build_event_summary_context(self, organization, events, period):
+        self.contexts[organization.id] += 1
+        return super().build_event_summary_context(organization, events, period)
+
+
+def setup(name, members):
+    """An organization with two events this week, a weekly series and `members` opted-in members"""
+    org = Organization(name=f'{name} Band')
+    db.session.add(org)
+    db.session.flush()
+    users = [User(username=f'{name}_{i}', name=f'{name} {i}', email=f'{name}_{i}@example.com', password_hash='x',
+                  organization_id=org.id, email_weekly_summary=True) for i in range(members + 1)]
+    # Opted out of summaries
+    users[0].email_weekly_summary = False
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.add_all([UserOrganization(user_id=u.id, organization_id=org.id) for u in users])
+    now = datetime.utcnow()
+    db.session.add_all([
+        Event(title=f'{name} Concert', date=now + timedelta(days=2), organization_id=org.id),
+        Event(title=f'{name} Gala', date=now + timedelta(days=5), organization_id=org.id),
+        Event(title=f'{name} Rehearsal', date=now + timedelta(days=1), organization_id=org.id,
+              is_recurring=True, recurring_pattern='daily', recurring_count=3)
+    ])
+    db.session.commit()
+    return org.id
+
+
+def run_weekly_summaries():
+    """Return (query_count, stats, email service) for one weekly summary run"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    service = RecordingEmailService()
+    email_service = task_service.email_service
+    task_service.email_service = service
+    db.session.remove()
+    sa_event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        task_service.send_weekly_summaries()
+    finally:
+        sa_event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+        task_service.email_service = email_service
+    return len(statements), task_service.last_runs['send_weekly_summaries'], service
+
+
+def test_event_summaries():
+    """One summary per organization, constant queries, stats recorded"""
+    print("🧪 Testing weekly event summaries")
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        org_ids = [setup('summary_small0', 3), setup('summary_small1', 4)]
+        query_counts = []
+
+        for round_members in (None, 60):
+            if round_members:
+                org_ids += [setup(f'summary_large{i}', round_members) for i in range(3)]
+            queries, stats, service = run_weekly_summaries()
+            query_counts.append(queries)
+
+            assert 'error' not in stats, stats
+            assert all(service.contexts[org_id] == 1 for org_id in org_ids), service.contexts
+            assert max(service.contexts.values()) == 1, service.contexts
+            assert stats['organizations'] == len(service.contexts)
+            sent = service.dispatcher.transport.sent
+            assert stats['emails'] == stats['sent'] == len(sent), (stats, len(sent))
+            recipients = {p['to'] for p in sent}
+            assert 'summary_small0_0@example.com' not in recipients, "Opted-out member got a summary"
+            assert 'summary_small0_1@example.com' in recipients
+            # Two one-off events and the series' occurrences in the week, per organization
+            assert stats['events'] >= 5 * len(org_ids), stats
+            assert stats['duration_ms'] >= 0 and stats['finished_at'], stats
+            print(f"📊 {len(org_ids)} organizations, {stats['emails']} emails: {queries} queries")
+
+        assert len(set(query_counts)) == 1, f"Query count grows with members and organizations: {query_counts}"
+        print(f"✅ Each organization summarized once, {query_counts[0]} queries per run")
+
+
+if __name__ == '__main__':
+    try:
+        test_event_summaries()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Test custom field response summaries
+Members answer a tour-logistics event's custom fields through the API; each
+submission must be a single upsert, the summary must match a tally of the
+stored responses in a fixed number of queries, and a cached summary must be
+dropped when a response is written.
+"""
+
+import os
+import sys
+import random
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event as sa_event
+from app import app, db
+from models import User, Organization, UserOrganization, Event, EventCustomField, EventFieldResponse
+from services.field_summaries import field_summary_service
+
+MEALS = ['Vegetarian', 'Vegan', 'Anything']
+GEAR = ['Stand', 'Mute', 'Tuner']
+
+
+def setup(name, members, extra_fields):
+    """An event with meal, gear, luggage and `extra_fields` text fields"""
+    org = Organization(name=name)
+    db.session.add(org)
+    db.session.flush()
+    users = [User(username=f'{name}_{i}', name=f'{name} {i}', email=f'{name}_{i}@example.com', password_hash='x',
+                  organization_id=org.id, role='Admin' if i == 0 else 'Member') for i in range(members + 1)]
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.add_all([UserOrganization(user_id=u.id, organization_id=org.id, role=u.role) for u in users])
+    event = Event(title=f'{name} tour', organization_id=org.id)
+    db.session.add(event)
+    db.session.flush()
+    fields = [EventCustomField(event_id=event.id, field_name='Meal', field_type='select', display_order=0),
+              EventCustomField(event_id=event.id, field_name='Gear', field_type='checkbox', display_order=1),
+              EventCustomField(event_id=event.id, field_name='Bags', field_type='number', display_order=2)]
+    fields += [EventCustomField(event_id=event.id, field_name=f'Note {i}', field_type='text', display_order=3 + i)
+               for i in range(extra_fields)]
+    db.session.add_all(fields)
+    db.session.commit()
+    tokens = [{'Authorization': 'Bearer ' + create_access_token(
+        identity=str(u.id), additional_claims={'organization_id': org.id, 'role': u.role})} for u in users]
+    return event.id, [f.id for f in fields], tokens
+
+
+def answers(rng, field_ids):
+    meal, gear, bags = field_ids[:3]
+    submitted = {str(meal): rng.choice(MEALS), str(gear): ','.join(rng.sample(GEAR, rng.randint(0, 3))),
+                 str(bags): str(rng.randint(0, 3))}
+    for field_id in field_ids[3:]:
+        submitted[str(field_id)] = rng.choice(['', 'Window seat', 'Arriving late'])
+    return submitted
+
+
+def record_queries(action):
+    db.session.remove()
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sa_event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        result = action()
+    finally:
+        sa_event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return statements, result
+
+
+def test_field_summaries():
+    """Bulk upserts, one GROUP BY per summary and invalidation on write"""
+    print("🧪 Testing custom field summaries")
+    rng = random.Random(3)
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        client = app.test_client()
+        event_id, field_ids, tokens = setup('tour', 120, 20)
+        meal, gear, bags = field_ids[:3]
+        submit_url = f'/api/events/{event_id}/field-responses'
+
+        for headers in tokens[1:]:
+            statements, response = record_queries(lambda: client.post(
+                submit_url, headers=headers, json={'responses': answers(rng, field_ids)}))
+            assert response.status_code == 200, response.get_json()
+            writes = [s for s in statements if s.lstrip().upper().startswith(('INSERT', 'UPDATE'))]
+            assert len(writes) == 1, f"{len(writes)} writes for one submission"
+        # Resubmitting replaces the earlier answers; answers to other events' fields are ignored
+        client.post(submit_url, headers=tokens[1], json={'responses': {str(meal): 'Vegan', '999999': 'x'}})
+        assert EventFieldResponse.query.filter_by(event_id=event_id).count() == 120 * len(field_ids)
+
+        stored = EventFieldResponse.query.filter_by(event_id=event_id).all()
+        meals = {}
+        for response in stored:
+            if response.field_id == meal:
+                meals[response.response_value] = meals.get(response.response_value, 0) + 1
+        ticked = sum(len([o for o in r.response_value.split(',') if o]) for r in stored if r.field_id == gear)
+        luggage = [int(r.response_value) for r in stored if r.field_id == bags]
+
+        summary_url = f'/api/events/{event_id}/field-responses/summary'
+        statements, response = record_queries(lambda: client.get(summary_url, headers=tokens[0]))
+        assert response.status_code == 200, response.get_json()
+        summary = response.get_json()
+        assert len(summary) == len(field_ids) and summary[str(meal)]['total_responses'] == 120
+        assert summary[str(meal)]['distribution'] == meals
+        assert sum(summary[str(gear)]['distribution'].values()) == ticked
+        assert set(summary[str(gear)]['distribution']) <= set(GEAR)
+        assert summary[str(bags)]['average'] == sum(luggage) / len(luggage)
+        assert len(summary[str(field_ids[3])]['responses']) == 120
+        print(f"✅ Summary of {len(field_ids)} fields x 120 members in {len(statements)} queries")
+
+        # Served from the cache until a response for the event is written
+        statements, _ = record_queries(lambda: client.get(summary_url, headers=tokens[0]))
+        assert not [s for s in statements if 'event_field_response' in s], "Cached summary re-queried"
+        client.post(submit_url, headers=tokens[2], json={'responses': {str(meal): 'Gluten free'}})
+        refreshed = client.get(summary_url, headers=tokens[0]).get_json()
+        assert refreshed[str(meal)]['distribution'].get('Gluten free') == 1, refreshed[str(meal)]['distribution']
+        assert field_summary_service.cache.get((event_id, True)) is not None
+        print("✅ Cached summary dropped when a response was written")
+
+
+def test_summary_query_count():
+    """The summary costs the same number of queries for 3 fields x 5 members as for 25 x 200"""
+    print("🧪 Testing custom field summary query count")
+    rng = random.Random(5)
+    with app.app_context():
+        client = app.test_client()
+        counts = []
+        for name, members, extra in (('quartet', 5, 0), ('federation', 200, 22)):
+            event_id, field_ids, tokens = setup(name, members, extra)
+            for headers in tokens[1:]:
+                client.post(f'/api/events/{event_id}/field-responses', headers=headers,
+                            json={'responses': answers(rng, field_ids)})
+            statements, response = record_queries(lambda: client.get(
+                f'/api/events/{event_id}/field-responses/summary?include_responses=false', headers=tokens[0]))
+            assert response.status_code == 200 and 'responses' not in response.get_json()[str(field_ids[0])]
+            counts.append(len(statements))
+        assert counts[0] == counts[1], f"{counts[0]} queries for the small event, {counts[1]} for the large one"
+        print(f"✅ Summaries served in {counts[1]} queries regardless of fields and members")
+
+
+if __name__ == '__main__':
+    try:
+        test_field_summaries()
+        test_summary_query_count()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Test live updates
+Checks the broker routes deltas by channel, that deltas queued in a
+transaction go out only on commit, and that GET /api/stream delivers the
+RSVP and message deltas other requests publish as Server-Sent Events. The
+stream only takes short-lived stream tokens in its URL, asks clients to
+reconnect with a new one before it is recycled, and turns clients away once
+a worker holds its cap of open streams.
+"""
+
+import os
+import sys
+import json
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from app import app, db
+from models import User, Organization, UserOrganization, Event
+from services import live_updates
+from routes import live_updates as live_updates_routes
+from services.live_updates import LiveUpdateBroker, Subscription, get_broker, org_channel, user_channel
+
+
+def read_events(chunks, count):
+    """Parse the next `count` SSE events (skipping comments) into (type, data)"""
+    events = []
+    while len(events) < count:
+        chunk = next(chunks)
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n') if line and not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def test_broker():
+    """Subscribers get their channels' deltas and are flagged when they fall behind"""
+    broker = LiveUpdateBroker()
+    band, other = broker.subscribe([org_channel(1), user_channel(7)]), broker.subscribe([org_channel(2)])
+    broker.publish(org_channel(1), {'type': 'a', 'data': {}})
+    broker.publish(user_channel(7), {'type': 'b', 'data': {}})
+    assert [band.get(0)['type'], band.get(0)['type'], band.get(0)] == ['a', 'b', None]
+    assert other.get(0) is None
+
+    slow = Subscription(broker, [org_channel(3)], maxsize=2)
+    for i in range(3):
+        slow.put({'type': 'x', 'data': {'i': i}})
+    assert slow.overflowed
+
+    band.close()
+    other.close()
+    assert broker.subscriber_count() == 0
+
+
+def test_stream():
+    """Deltas are sent after commit and streamed to the organization's clients"""
+    print("🧪 Testing live updates")
+    test_broker()
+
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        org = Organization(name='Live Band')
+        db.session.add(org)
+        db.session.flush()
+        member = User(username='live_member', name='Live Member', email='live_member@example.com',
+                      password_hash='x', organization_id=org.id)
+        event = Event(title='Gig', date=datetime.utcnow() + timedelta(days=2), organization_id=org.id)
+        db.session.add_all([member, event])
+        db.session.flush()
+        db.session.add(UserOrganization(user_id=member.id, organization_id=org.id))
+        db.session.commit()
+
+        # Only committed work is published
+        subscription = get_broker().subscribe([org_channel(org.id)])
+        live_updates.publish(db.session, [org_channel(org.id)], 'test.rolled_back', {})
+        db.session.rollback()
+        live_updates.publish(db.session, [org_channel(org.id)], 'test.committed', {})
+        assert subscription.get(0) is None, "Delta sent before commit"
+        db.session.commit()
+        assert subscription.get(0)['type'] == 'test.committed'
+        assert subscription.get(0) is None, "Rolled back delta was sent"
+        subscription.close()
+
+        token = create_access_token(identity=str(member.id), additional_claims={'organization_id': org.id})
+        headers = {'Authorization': f'Bearer {token}'}
+        client = app.test_client()
+
+        assert client.get('/api/stream').status_code == 401
+        assert client.get('/api/stream?token=nonsense').status_code == 401
+        # Access tokens stay out of URLs (and so out of access logs)
+        assert client.get(f'/api/stream?token={token}').status_code == 401
+        assert client.post('/api/stream/token').status_code == 401
+        issued = client.post('/api/stream/token', headers=headers).get_json()
+        assert issued['expires_in'] == live_updates_routes.STREAM_TOKEN_SECONDS
+        stream_token = issued['token']
+
+        response = client.get(f'/api/stream?token={stream_token}')
+        assert response.status_code == 200 and response.mimetype == 'text/event-stream'
+        chunks = iter(response.response)
+        assert read_events(chunks, 1) == [('ready', {'channels': [org_channel(org.id), user_channel(member.id)]})]
+
+        assert client.post(f'/api/events/{event.id}/rsvp', headers=headers, json={'status': 'Yes'}).status_code == 200
+        # Repeating an answer changes nothing, so publishes nothing
+        assert client.post(f'/api/events/{event.id}/rsvp', headers=headers, json={'status': 'Yes'}).status_code == 200
+        response_send = client.post('/api/messages/send', headers=headers,
+                                    json={'subject': 'Set list', 'content': 'Opening with the march'})
+        assert response_send.status_code == 201, response_send.get_json()
+
+        (rsvp_type, rsvp), (message_type, message) = read_events(chunks, 2)
+        assert rsvp_type == 'rsvp.updated' and rsvp == {
+            'event_id': event.id, 'user_id': member.id, 'status': 'Yes', 'previous_status': None
+        }, rsvp
+        assert message_type == 'message.created', message_type
+        assert message['thread']['id'] == response_send.get_json()['thread_id']
+        assert message['last_message']['content'] == 'Opening with the march'
+        assert message['sender_id'] == member.id
+
+        response.close()
+        assert get_broker().subscriber_count() == 0, "Closed stream left its subscription behind"
+        assert live_updates_routes.open_stream_count() == 0
+        print("✅ Committed deltas streamed to the organization")
+
+        # A recycled stream's last event tells the client to reconnect with a new token
+        max_stream_seconds = live_updates_routes.MAX_STREAM_SECONDS
+        live_updates_routes.MAX_STREAM_SECONDS = 0.2
+        try:
+            response = client.get(f"/api/stream?token={client.post('/api/stream/token', headers=headers).get_json()['token']}")
+            chunks = iter(response.response)
+            assert [event_type for event_type, _ in read_events(chunks, 2)] == ['ready', 'reconnect']
+            assert next(chunks, None) is None, "Stream kept going after asking the client to reconnect"
+            response.close()
+        finally:
+            live_updates_routes.MAX_STREAM_SECONDS = max_stream_seconds
+        assert live_updates_routes.open_stream_count() == 0
+        print("✅ Recycled stream asked the client to reconnect before closing")
+
+        # A worker serves at most MAX_STREAMS streams so API requests keep their threads
+        max_streams = live_updates_routes.MAX_STREAMS
+        live_updates_routes.MAX_STREAMS = 2
+        try:
+            streams = [client.get('/api/stream', headers=headers) for _ in range(2)]
+            assert all(r.status_code == 200 for r in streams)
+            turned_away = client.get('/api/stream', headers=headers)
+            assert turned_away.status_code == 503 and turned_away.headers['Retry-After'], turned_away.status_code
+            # API requests still go through while the streams are open
+            assert client.get('/api/events/', headers=headers).status_code == 200
+            # Closed newest first: the test client runs every stream on this one thread
+            streams[1].close()
+            reopened = client.get('/api/stream', headers=headers)
+            assert reopened.status_code == 200
+            reopened.close()
+            streams[0].close()
+        finally:
+            live_updates_routes.MAX_STREAMS = max_streams
+        assert live_updates_routes.open_stream_count() == 0 and get_broker().subscriber_count() == 0
+        print("✅ Streams capped per worker and released on close")
+
+
+if __name__ == '__main__':
+    try:
+        test_stream()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
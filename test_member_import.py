@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test the chunked background member import
+Uploads a roster with good rows, bad rows, duplicates and existing members,
+then polls the job until it finishes. Running jobs that stopped making
+progress are marked failed.
+"""
+
+import os
+import sys
+import io
+import time
+import atexit
+import shutil
+import tempfile
+
+# Use a throwaway database file - the import runs on a background thread,
+# which gets its own connection
+DB_DIR = tempfile.mkdtemp(prefix='test_member_import_')
+atexit.register(shutil.rmtree, DB_DIR, ignore_errors=True)
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(DB_DIR, 'test_member_import.db')}"
+os.environ['MEMBER_IMPORT_CHUNK_SIZE'] = '50'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from app import app, db
+from models import User, Organization, Section, UserOrganization, MemberImportJob
+from services.scheduled_tasks import task_service
+
+ROSTER_SIZE = 150
+
+
+def build_roster(existing_email, member_email):
+    lines = ['email,first_name,last_name,phone,section,role']
+    for i in range(ROSTER_SIZE):
+        lines.append(f'roster{i}@example.com,First{i},Last{i},555-{i:04d},horn,Member')
+    lines.append('not-an-email,Bad,Row,,,Member')               # invalid
+    lines.append('roster0@example.com,Dup,Row,,,Member')        # duplicate in file
+    lines.append(f'{existing_email},Existing,User,,,Admin')     # account exists, not a member
+    lines.append(f'{member_email},Already,Member,,,Member')     # already a member
+    return '\n'.join(lines).encode()
+
+
+def test_member_import():
+    """Roster imports in the background with partial success and progress"""
+    print("🧪 Testing chunked member import")
+    with app.app_context():
+        db.drop_all()
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        org = Organization(name='Import Federation')
+        db.session.add(org)
+        db.session.flush()
+        db.session.add(Section(name='Horn', organization_id=org.id))
+        admin = User(username='import_admin', email='import_admin@example.com', password_hash='x')
+        outsider = User(username='outsider', email='outsider@example.com', password_hash='x')
+        db.session.add_all([admin, outsider])
+        db.session.flush()
+        db.session.add(UserOrganization(user_id=admin.id, organization_id=org.id, role='Admin'))
+        db.session.commit()
+
+        token = create_access_token(identity=str(admin.id), additional_claims={'organization_id': org.id})
+        headers = {'Authorization': f'Bearer {token}'}
+        client = app.test_client()
+        roster = build_roster('Outsider@example.com', admin.email)
+
+        response = client.post('/api/bulk-ops/import/members/preview', headers=headers,
+                               data={'file': (io.BytesIO(roster), 'roster.csv')})
+        preview = response.get_json()
+        assert response.status_code == 200, preview
+        assert preview['valid_rows'] == ROSTER_SIZE + 1 and preview['invalid_rows'] == 3, preview['invalid_data']
+
+        start = time.perf_counter()
+        response = client.post('/api/bulk-ops/import/members', headers=headers,
+                               data={'file': (io.BytesIO(roster), 'roster.csv')})
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        assert response.status_code == 202, response.get_json()
+        job_id = response.get_json()['job_id']
+
+        for _ in range(600):
+            job = client.get(f'/api/bulk-ops/import/jobs/{job_id}', headers=headers).get_json()
+            if job['status'] in ('completed', 'failed'):
+                break
+            time.sleep(0.1)
+
+        assert job['status'] == 'completed', job
+        assert job['created_count'] == ROSTER_SIZE, job
+        assert job['added_count'] == 1 and job['skipped_count'] == 1 and job['error_count'] == 2, job
+        members = UserOrganization.query.filter_by(organization_id=org.id).count()
+        assert members == ROSTER_SIZE + 2, members
+        horn = UserOrganization.query.filter(UserOrganization.section_id.isnot(None)).count()
+        assert horn == ROSTER_SIZE, horn
+        assert User.query.filter_by(email='roster5@example.com').first().check_password('TempPassword123!')
+        print(f"✅ Request returned in {elapsed_ms:.0f} ms; imported {job['created_count']} members, "
+              f"{job['error_count']} row errors reported")
+
+
+def test_stale_jobs_failed():
+    """Running jobs left behind by a restarted worker are failed; live ones are left alone"""
+    print("🧪 Testing stale member import cleanup")
+    with app.app_context():
+        org = Organization(name='Restart Federation')
+        db.session.add(org)
+        db.session.flush()
+        now = datetime.utcnow()
+        lost = MemberImportJob(id='lost-job', organization_id=org.id, status='running', total_rows=1000,
+                               processed_rows=500, errors=[], started_at=now - timedelta(hours=1),
+                               updated_at=now - timedelta(minutes=30))
+        live = MemberImportJob(id='live-job', organization_id=org.id, status='running', total_rows=1000,
+                               processed_rows=500, errors=[], started_at=now - timedelta(hours=1), updated_at=now)
+        db.session.add_all([lost, live])
+        db.session.commit()
+
+        task_service.fail_stale_member_imports()
+        db.session.expire_all()
+        lost, live = db.session.get(MemberImportJob, 'lost-job'), db.session.get(MemberImportJob, 'live-job')
+        assert lost.status == 'failed' and lost.finished_at and '500 of 1000' in lost.errors[-1]['error'], lost.errors
+        assert live.status == 'running', live.status
+        print("✅ Stalled import marked failed, running import left alone")
+
+
+if __name__ == '__main__':
+    try:
+        test_member_import()
+        test_stale_jobs_failed()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
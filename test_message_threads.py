@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Test the message thread inbox
+Seeds threads with messages and read receipts and checks GET
+/api/messages/threads returns each thread's latest message and the member's
+real unread count in the same number of queries however many threads there
+are, and that keyset pages cover every thread once. Then sends, replies,
+broadcasts and reads through the endpoints and checks the unread counts
+follow.
+"""
+
+import os
+import sys
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event as sa_event
+from app import app, db
+from models import User, Organization, UserOrganization, MessageThread, Message, MessageRecipient
+
+PAGE_SIZE = 7
+
+
+def get(client, url, headers):
+    """Return (query_count, JSON body) for a GET"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sa_event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.get_json()
+    finally:
+        sa_event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return len(statements), response.get_json()
+
+
+def add_threads(org, sender, reader, count, start):
+    """`count` threads, thread i holding i % 4 + 1 messages of which i % 3 are unread by `reader`"""
+    expected = {}
+    for i in range(count):
+        thread = MessageThread(organization_id=org.id, subject=f'Thread {i}', created_by=sender.id,
+                               last_message_at=start + timedelta(hours=i))
+        db.session.add(thread)
+        db.session.flush()
+        messages = [Message(thread_id=thread.id, sender_id=sender.id, content=f'Message {m} ' + 'x' * (m * 60),
+                            sent_at=start + timedelta(hours=i, minutes=m)) for m in range(i % 4 + 1)]
+        db.session.add_all(messages)
+        db.session.flush()
+        unread = min(i % 3, len(messages))
+        db.session.add_all([MessageRecipient(message_id=message.id, user_id=reader.id,
+                                             read_at=None if n < unread else start)
+                            for n, message in enumerate(messages)])
+        expected[thread.id] = (messages[-1].content, unread)
+    db.session.commit()
+    return expected
+
+
+def test_message_threads():
+    """Latest message and unread count per thread, in constant queries"""
+    print("🧪 Testing message thread inbox")
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        org = Organization(name='Inbox Band')
+        db.session.add(org)
+        db.session.flush()
+        sender = User(username='inbox_sender', name='Inbox Sender', email='inbox_sender@example.com',
+                      password_hash='x', organization_id=org.id)
+        reader = User(username='inbox_reader', email='inbox_reader@example.com', password_hash='x',
+                      organization_id=org.id)
+        db.session.add_all([sender, reader])
+        db.session.flush()
+        db.session.add_all([UserOrganization(user_id=u.id, organization_id=org.id) for u in (sender, reader)])
+        db.session.commit()
+
+        token = create_access_token(identity=str(reader.id), additional_claims={'organization_id': org.id})
+        headers = {'Authorization': f'Bearer {token}'}
+        client = app.test_client()
+        start = datetime(2025, 3, 1, 9, 0)
+
+        expected = add_threads(org, sender, reader, 5, start)
+        few_queries, threads = get(client, '/api/messages/threads', headers)
+        expected.update(add_threads(org, sender, reader, 40, start + timedelta(days=10)))
+        many_queries, threads = get(client, '/api/messages/threads', headers)
+        assert few_queries == many_queries, f"Query count grows with threads: {few_queries} vs {many_queries}"
+
+        assert len(threads) == 45
+        assert [t['last_message_at'] for t in threads] == sorted((t['last_message_at'] for t in threads), reverse=True)
+        for thread in threads:
+            content, unread = expected[thread['id']]
+            preview = content[:100] + '...' if len(content) > 100 else content
+            assert thread['last_message']['content'] == preview, thread
+            assert thread['last_message']['sender_name'] == 'Inbox Sender', thread
+            assert thread['unread_count'] == unread, thread
+
+        # The sender has no receipts, so nothing is unread for them
+        sender_token = create_access_token(identity=str(sender.id), additional_claims={'organization_id': org.id})
+        _, sender_threads = get(client, '/api/messages/threads', {'Authorization': f'Bearer {sender_token}'})
+        assert all(t['unread_count'] == 0 for t in sender_threads)
+
+        # Pages cover the inbox exactly once, newest first, in constant queries
+        seen, query_counts, cursor = [], [], None
+        while True:
+            url = f'/api/messages/threads?limit={PAGE_SIZE}' + (f'&cursor={cursor}' if cursor else '')
+            queries, page = get(client, url, headers)
+            assert len(page['threads']) <= PAGE_SIZE
+            seen.extend(t['id'] for t in page['threads'])
+            query_counts.append(queries)
+            if not page['pagination']['has_next']:
+                break
+            cursor = page['pagination']['next_cursor']
+        assert seen == [t['id'] for t in threads], "Pages skipped, repeated or reordered threads"
+        assert len(set(query_counts)) == 1, f"Query count varies across pages: {query_counts}"
+
+        assert client.get('/api/messages/threads?cursor=bogus', headers=headers).status_code == 400
+
+        print(f"✅ {len(threads)} threads in {many_queries} queries, "
+              f"{len(query_counts)} pages of {PAGE_SIZE}")
+
+
+def test_unread_counts_through_endpoints():
+    """Sending creates receipts for the people a message reaches; reading a thread clears them"""
+    print("🧪 Testing unread counts through the messaging endpoints")
+    with app.app_context():
+        db.create_all()
+        org = Organization(name='Receipts Band')
+        other = Organization(name='Other Receipts Band')
+        db.session.add_all([org, other])
+        db.session.flush()
+        users = {name: User(username=f'receipts_{name}', name=name.title(), email=f'receipts_{name}@example.com',
+                            password_hash='x', organization_id=org.id)
+                 for name in ('alice', 'bob', 'carol', 'dave', 'outsider')}
+        db.session.add_all(users.values())
+        db.session.flush()
+        db.session.add_all([
+            UserOrganization(user_id=users['alice'].id, organization_id=org.id, role='Admin'),
+            UserOrganization(user_id=users['bob'].id, organization_id=org.id),
+            UserOrganization(user_id=users['carol'].id, organization_id=org.id),
+            # Left the band
+            UserOrganization(user_id=users['dave'].id, organization_id=org.id, is_active=False),
+            UserOrganization(user_id=users['outsider'].id, organization_id=other.id)
+        ])
+        db.session.commit()
+        ids = {name: user.id for name, user in users.items()}
+        headers = {name: {'Authorization': 'Bearer ' + create_access_token(
+            identity=str(user_id), additional_claims={'organization_id': org.id})} for name, user_id in ids.items()}
+        client = app.test_client()
+
+        def unread(name):
+            _, threads = get(client, '/api/messages/threads', headers[name])
+            return {t['id']: t['unread_count'] for t in threads if t['unread_count']}
+
+        # A message to the organization reaches every active member but its sender
+        response = client.post('/api/messages/send', headers=headers['alice'],
+                               json={'subject': 'Tour', 'content': 'Coach leaves at 8'})
+        assert response.status_code == 201, response.get_json()
+        tour = response.get_json()['thread_id']
+        assert unread('bob') == unread('carol') == {tour: 1}
+        assert unread('alice') == {} and unread('dave') == {}
+        assert MessageRecipient.query.filter_by(user_id=ids['dave']).count() == 0
+
+        # Reading the thread clears the reader's receipts only
+        response = client.get(f'/api/messages/threads/{tour}/messages', headers=headers['bob'])
+        assert response.status_code == 200, response.get_json()
+        assert [m['is_read'] for m in response.get_json()['messages']] == [False]
+        assert unread('bob') == {} and unread('carol') == {tour: 1}
+        messages = client.get(f'/api/messages/threads/{tour}/messages', headers=headers['bob']).get_json()['messages']
+        assert [m['is_read'] for m in messages] == [True] and messages[0]['sender']['name'] == 'Alice'
+
+        # A reply in an organization thread reaches everyone else
+        response = client.post(f'/api/messages/threads/{tour}/messages', headers=headers['bob'],
+                               json={'content': 'Can we make it 9?'})
+        assert response.status_code == 201, response.get_json()
+        assert unread('alice') == {tour: 1} and unread('carol') == {tour: 2} and unread('bob') == {}
+        print("✅ Organization messages and replies counted unread until read")
+
+        # A direct thread and its replies only reach its participants
+        assert client.post('/api/messages/threads', headers=headers['alice'], json={
+            'subject': 'Solo', 'participants': [ids['outsider']], 'initial_message': 'Hi'
+        }).status_code == 400
+        response = client.post('/api/messages/threads', headers=headers['alice'], json={
+            'subject': 'Solo', 'participants': [ids['bob']], 'initial_message': 'Can you play the solo?'
+        })
+        assert response.status_code == 201, response.get_json()
+        solo = response.get_json()['thread_id']
+        assert unread('bob') == {solo: 1} and solo not in unread('carol')
+        client.get(f'/api/messages/threads/{solo}/messages', headers=headers['bob'])
+        client.post(f'/api/messages/threads/{solo}/messages', headers=headers['bob'], json={'content': 'Yes'})
+        assert unread('alice') == {tour: 1, solo: 1} and solo not in unread('carol') and unread('bob') == {}
+
+        # A broadcast gives each active member their own unread thread
+        response = client.post('/api/messages/broadcast', headers=headers['alice'], json={
+            'subject': 'Uniforms', 'content': 'Bring your jackets', 'recipients': {'all_members': True}
+        })
+        assert response.status_code == 201 and response.get_json()['recipients_count'] == 2, response.get_json()
+        assert len(unread('carol')) == 2 and sum(unread('carol').values()) == 3
+        assert unread('dave') == {}
+        print("✅ Direct threads and broadcasts only counted for their recipients")
+
+        # Deleting a thread takes its receipts with it
+        assert client.delete(f'/api/messages/threads/{tour}', headers=headers['alice']).status_code == 200
+        assert tour not in unread('carol')
+        assert MessageRecipient.query.join(Message).filter(Message.thread_id == tour).count() == 0
+        print("✅ Deleted thread's receipts removed")
+
+
+if __name__ == '__main__':
+    try:
+        test_message_threads()
+        test_unread_counts_through_endpoints()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Test the DB-backed notification queue
+Fans an event out to its organization's members, claims and delivers the
+jobs through the FakeTransport, backs failures off until they give up, hands
+out jobs a dead worker left 'processing', and drains the queue from the
+scheduler job that runs in the web workers. Deleting an event takes its jobs
+with it.
+"""
+
+import os
+import sys
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from sqlalchemy import text
+from app import app, db
+from models import User, Organization, UserOrganization, Event, NotificationJob, EmailLog
+from services.email_delivery import FakeTransport
+from services.email_service import EmailService
+from services.notification_queue import NotificationQueue
+from services.scheduled_tasks import task_service
+
+
+def fake_email_service(**transport_options):
+    service = EmailService(transport=FakeTransport(**transport_options))
+    service.dispatcher.rate_limiter.rate = 0
+    service.dispatcher.sleep = lambda seconds: None
+    return service
+
+
+def setup(name, members):
+    org = Organization(name=f'{name} Band')
+    db.session.add(org)
+    db.session.flush()
+    users = [User(username=f'{name}_{i}', name=f'{name} {i}', email=f'{name}_{i}@example.com', password_hash='x',
+                  organization_id=org.id) for i in range(members)]
+    # Opted out of new event emails
+    users[0].email_new_events = False
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.add_all([UserOrganization(user_id=u.id, organization_id=org.id) for u in users])
+    event = Event(title='Summer Gala', date=datetime.utcnow() + timedelta(days=10), organization_id=org.id)
+    db.session.add(event)
+    db.session.commit()
+    return org.id, event, users
+
+
+def jobs(event_id):
+    return {job.user_id: job for job in NotificationJob.query.filter_by(event_id=event_id)}
+
+
+def test_enqueue_claim_and_retry():
+    """Jobs are queued once per member, delivered once, and retried with backoff"""
+    print("🧪 Testing notification enqueue, claim, delivery and retry")
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        org_id, event, users = setup('queue', 12)
+
+        assert NotificationQueue.enqueue_event_fanout(event, 'new_event') == 11
+        db.session.commit()
+        assert NotificationQueue.enqueue_event_fanout(event, 'new_event') == 0, "Fan-out queued duplicates"
+        db.session.commit()
+        assert users[0].id not in jobs(event.id)
+
+        bad_address = users[3].email
+        service = fake_email_service(permanent_failures=[bad_address])
+        # Two batches: claims hand out each due job once
+        assert NotificationQueue.process_batch(6, email_service=service) == 6
+        assert NotificationQueue.process_batch(6, email_service=service) == 5
+        assert NotificationQueue.process_batch(6, email_service=service) == 0
+
+        queued = jobs(event.id)
+        delivered = [p['to'] for p in service.dispatcher.transport.sent]
+        assert sorted(delivered) == sorted(u.email for u in users[1:] if u.email != bad_address)
+        assert {j.status for u, j in queued.items() if u != users[3].id} == {'sent'}
+        failed = queued[users[3].id]
+        assert failed.status == 'pending' and failed.attempts == 1 and failed.last_error
+        assert failed.run_after > datetime.utcnow(), "Failed job not backed off"
+        assert EmailLog.query.filter_by(event_id=event.id, email_type='new_event').count() >= 10
+        print("✅ 11 jobs queued once, 10 delivered in two claims, 1 failure backed off")
+
+        # Retries until MAX_ATTEMPTS, then gives up
+        max_attempts = NotificationQueue.MAX_ATTEMPTS
+        NotificationQueue.MAX_ATTEMPTS = 3
+        try:
+            for attempt in range(2, 4):
+                failed.run_after = datetime.utcnow() - timedelta(seconds=1)
+                db.session.commit()
+                assert NotificationQueue.process_batch(10, email_service=service) == 1
+                assert failed.attempts == attempt
+            assert failed.status == 'failed' and failed.completed_at is not None
+            assert NotificationQueue.process_batch(10, email_service=service) == 0
+        finally:
+            NotificationQueue.MAX_ATTEMPTS = max_attempts
+        print("✅ Failing job retried with backoff, then marked failed")
+
+        # A job a dead worker left 'processing' is handed out again once its lock times out
+        stuck = queued[users[4].id]
+        stuck.status = 'processing'
+        stuck.locked_at = datetime.utcnow() - NotificationQueue.LOCK_TIMEOUT - timedelta(minutes=1)
+        fresh = queued[users[5].id]
+        fresh.status = 'processing'
+        fresh.locked_at = datetime.utcnow()
+        db.session.commit()
+        claimed = NotificationQueue.claim(10)
+        assert [job.id for job in claimed] == [stuck.id], [job.id for job in claimed]
+        assert stuck.status == 'processing' and stuck.locked_at > datetime.utcnow() - timedelta(minutes=1)
+        print("✅ Stale 'processing' job reclaimed, live claim left alone")
+
+
+def test_scheduler_drains_queue():
+    """The scheduler job in the web workers delivers queued jobs"""
+    print("🧪 Testing scheduler-driven notification drain")
+    with app.app_context():
+        org = Organization(name='Drain Band')
+        db.session.add(org)
+        db.session.flush()
+        members = [User(username=f'drain_{i}', name=f'Drain {i}', email=f'drain_{i}@example.com',
+                        password_hash='x', organization_id=org.id) for i in range(30)]
+        db.session.add_all(members)
+        db.session.flush()
+        db.session.add_all([UserOrganization(user_id=u.id, organization_id=org.id) for u in members])
+        event = Event(title='Drain Concert', date=datetime.utcnow() + timedelta(days=3), organization_id=org.id,
+                      is_cancelled=True, cancellation_reason='Venue flooded')
+        db.session.add(event)
+        db.session.flush()
+        NotificationQueue.enqueue_event_fanout(event, 'event_cancellation', payload={'reason': 'Venue flooded'})
+        db.session.commit()
+
+        email_service, batch_size = task_service.email_service, task_service.NOTIFICATION_BATCH_SIZE
+        task_service.email_service = fake_email_service()
+        task_service.NOTIFICATION_BATCH_SIZE = 8
+        try:
+            task_service.process_notification_jobs()
+            stats = task_service.last_runs['process_notification_jobs']
+            delivered = len(task_service.email_service.dispatcher.transport.sent)
+        finally:
+            task_service.email_service, task_service.NOTIFICATION_BATCH_SIZE = email_service, batch_size
+
+        assert 'error' not in stats, stats
+        assert stats['jobs'] == 30 and stats['batches'] == 4, stats
+        assert delivered == 30
+        assert {job.status for job in jobs(event.id).values()} == {'sent'}
+        assert db.session.get(Event, event.id).cancellation_notification_sent
+        print(f"✅ Scheduler drained 30 jobs in {stats['batches']} batches")
+
+
+
+def test_delete_event_with_jobs():
+    """An event's queued jobs don't stop it from being deleted"""
+    print("🧪 Testing event delete with queued notifications")
+    with app.app_context():
+        client = app.test_client()
+        org_id, event, users = setup('delete', 5)
+        NotificationQueue.enqueue_event_fanout(event, 'new_event')
+        UserOrganization.query.filter_by(user_id=users[1].id).update({'role': 'Admin'})
+        db.session.commit()
+        event_id = event.id
+        admin = {'Authorization': 'Bearer ' + create_access_token(
+            identity=str(users[1].id), additional_claims={'organization_id': org_id, 'role': 'Admin'})}
+
+        # SQLite only enforces foreign keys when asked to, outside a transaction
+        db.session.execute(text('PRAGMA foreign_keys = ON'))
+        try:
+            response = client.delete(f'/api/events/{event_id}', headers=admin)
+        finally:
+            db.session.rollback()
+            db.session.execute(text('PRAGMA foreign_keys = OFF'))
+        assert response.status_code == 200, response.get_json()
+        assert NotificationJob.query.filter_by(event_id=event_id).count() == 0
+        print("✅ Event deleted and its queued jobs removed by the cascade")
+
+
+if __name__ == '__main__':
+    try:
+        test_enqueue_claim_and_retry()
+        test_scheduler_drains_queue()
+        test_delete_event_with_jobs()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Test the super admin organization performance report
+Seeds organizations with known members, events and RSVPs and checks the
+grouped query's metrics and engagement scores against the formula, paging
+and sorting, sort_by/order validation, and that a page costs the same
+number of queries however many organizations there are.
+"""
+
+import os
+import sys
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event as sa_event
+from app import app, db
+from models import User, Organization, UserOrganization, Event, RSVP
+
+URL = '/api/super-admin/analytics/organizations/performance'
+
+
+def get(client, url, headers):
+    """Return (query_count, response) for a GET"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db.session.remove()
+    sa_event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        sa_event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return len(statements), response
+
+
+def seed(index):
+    """Organization `index` with index + 1 members, index events (every other one recent) and RSVPs to them"""
+    org = Organization(name=f'Performance Band {index:03d}')
+    db.session.add(org)
+    db.session.flush()
+    users = [User(username=f'perf{index}_{i}', email=f'perf{index}_{i}@example.com', password_hash='x',
+                  organization_id=org.id) for i in range(index + 1)]
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.add_all([UserOrganization(user_id=u.id, organization_id=org.id) for u in users])
+    now = datetime.utcnow()
+    events = [Event(title=f'Gig {i}', organization_id=org.id,
+                    date=now - timedelta(days=5 if i % 2 == 0 else 90)) for i in range(index)]
+    db.session.add_all(events)
+    db.session.flush()
+    db.session.add_all([RSVP(event_id=event.id, user_id=user.id, status='Yes')
+                        for event in events for user in users[:2]])
+    db.session.commit()
+
+    user_count, total_events = len(users), len(events)
+    recent_events = sum(1 for i in range(index) if i % 2 == 0)
+    total_rsvps = total_events * min(2, user_count)
+    score = min(total_events / user_count * 20 + total_rsvps / user_count * 10
+                + min(recent_events / max(user_count * 0.1, 1), 1) * 50, 100)
+    return org.id, {'user_count': user_count, 'total_events': total_events, 'recent_events_30d': recent_events,
+                    'total_rsvps': total_rsvps, 'recent_rsvps_30d': recent_events * min(2, user_count),
+                    'engagement_score': round(score, 1)}
+
+
+def test_organization_performance():
+    """Grouped metrics match the formula, pages cover every organization, queries stay constant"""
+    print("🧪 Testing organization performance report")
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        admin = User(username='perf_super', email='perf_super@example.com', password_hash='x', super_admin=True)
+        member = User(username='perf_member', email='perf_member@example.com', password_hash='x')
+        db.session.add_all([admin, member])
+        db.session.commit()
+        headers = {'Authorization': 'Bearer ' + create_access_token(identity=str(admin.id))}
+        client = app.test_client()
+
+        assert client.get(URL, headers={'Authorization': 'Bearer ' + create_access_token(
+            identity=str(member.id))}).status_code == 403
+        for bad in ('sort_by=password_hash', 'sort_by=name;drop', 'order=sideways'):
+            response = client.get(f'{URL}?{bad}', headers=headers)
+            assert response.status_code == 400, (bad, response.status_code)
+        print("✅ Non-super admins refused, unknown sort_by/order rejected")
+
+        expected = dict(seed(i) for i in range(6))
+        query_counts = []
+        for total in (6, 30):
+            expected.update(seed(i) for i in range(len(expected), total))
+
+            # Page through by name; every organization appears once, in order
+            seen = []
+            page = 1
+            while True:
+                queries, response = get(client, f'{URL}?sort_by=name&order=asc&per_page=4&page={page}', headers)
+                body = response.get_json()
+                assert response.status_code == 200, body
+                query_counts.append(queries)
+                seen.extend(body['organizations'])
+                if page >= body['pagination']['pages']:
+                    break
+                page += 1
+            assert body['pagination']['total'] == body['summary']['total_organizations'] == total
+            assert [o['name'] for o in seen] == sorted(o['name'] for o in seen), "Pages out of name order"
+            assert sorted(o['id'] for o in seen) == sorted(expected), "Pages skipped or repeated organizations"
+
+            for org in seen:
+                metrics = {key: org['metrics'][key] for key in expected[org['id']]}
+                assert metrics == expected[org['id']], (org['name'], metrics, expected[org['id']])
+
+            # Sorted by score, highest first
+            _, response = get(client, f'{URL}?sort_by=engagement_score&order=desc&per_page=200', headers)
+            scores = [o['metrics']['engagement_score'] for o in response.get_json()['organizations']]
+            assert scores == sorted(scores, reverse=True) and len(scores) == total, scores
+            print(f"📊 {total} organizations: {query_counts[-1]} queries per page")
+
+        assert len(set(query_counts)) == 1, f"Query count grows with organizations: {query_counts}"
+        print(f"✅ Metrics match the engagement formula, {query_counts[0]} queries per page at any size")
+
+
+if __name__ == '__main__':
+    try:
+        test_organization_performance()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
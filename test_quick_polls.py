@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Test quick poll vote counting
+A rehearsal's worth of members vote in a live poll: each vote must be an
+insert plus a counter upsert with no reads of earlier votes, a second vote
+must be turned away by the unique index, the counts must match the stored
+votes and be pushed to the organization, and the tallies endpoint must
+answer 304 while nothing changed.
+"""
+
+import os
+import sys
+import json
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event as sa_event
+from app import app, db
+from models import User, Organization, UserOrganization, PollResponse, PollOptionCount
+from services.live_updates import get_broker, org_channel
+
+OPTIONS = ['Bar 12', 'Bar 48', 'From the top']
+
+
+def setup(members):
+    org = Organization(name='Rehearsal Band')
+    db.session.add(org)
+    db.session.flush()
+    users = [User(username=f'poll_{i}', name=f'Player {i}', email=f'poll_{i}@example.com', password_hash='x',
+                  organization_id=org.id, role='Admin' if i == 0 else 'Member') for i in range(members + 1)]
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.add_all([UserOrganization(user_id=u.id, organization_id=org.id, role=u.role) for u in users])
+    db.session.commit()
+    tokens = [{'Authorization': 'Bearer ' + create_access_token(
+        identity=str(u.id), additional_claims={'organization_id': org.id, 'role': u.role})} for u in users]
+    return org.id, [u.id for u in users], tokens
+
+
+def record_queries(action):
+    db.session.remove()
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sa_event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        result = action()
+    finally:
+        sa_event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return statements, result
+
+
+def test_quick_poll_votes():
+    """Votes are counted without reading earlier votes, once per member"""
+    print("🧪 Testing quick poll vote counting")
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        client = app.test_client()
+        org_id, user_ids, tokens = setup(40)
+
+        response = client.post('/api/quick-polls/', headers=tokens[0], json={
+            'question': 'Where do we restart?', 'options': OPTIONS, 'expires_in_hours': 1})
+        assert response.status_code == 201, response.get_json()
+        poll_id = response.get_json()['id']
+        subscription = get_broker().subscribe([org_channel(org_id)])
+
+        for i, headers in enumerate(tokens[1:]):
+            statements, response = record_queries(lambda: client.post(
+                f'/api/quick-polls/{poll_id}/respond', headers=headers, json={'response': OPTIONS[i % 3]}))
+            assert response.status_code == 200, response.get_json()
+            touched = [s for s in statements if 'poll_responses' in s or 'poll_option_counts' in s]
+            assert len(touched) == 2 and not [s for s in touched if s.lstrip().upper().startswith('SELECT')], touched
+        assert response.get_json()['votes'] == 14
+
+        # The unique index turns the second vote away and leaves the counts alone
+        response = client.post(f'/api/quick-polls/{poll_id}/respond', headers=tokens[1], json={'option_index': 2})
+        assert response.status_code == 409, response.get_json()
+        assert client.post(f'/api/quick-polls/{poll_id}/respond', headers=tokens[1],
+                           json={'response': 'Bar 99'}).status_code == 400
+
+        stored = [json.loads(r.response_data)['option'] for r in PollResponse.query.filter_by(poll_id=poll_id)]
+        counts = {row.option_index: row.votes for row in PollOptionCount.query.filter_by(poll_id=poll_id)}
+        assert {OPTIONS[i]: votes for i, votes in counts.items()} == {o: stored.count(o) for o in OPTIONS}
+
+        deltas = []
+        while True:
+            delta = subscription.get(0)
+            if delta is None:
+                break
+            deltas.append(delta)
+        subscription.close()
+        tallies = [d['data'] for d in deltas if d['type'] == 'poll.tally']
+        assert len(tallies) == 40 and tallies[-1] == {'poll_id': poll_id, 'option_index': 0,
+                                                      'option': OPTIONS[0], 'votes': 14}, tallies[-1]
+
+        polls = client.get('/api/quick-polls/', headers=tokens[2]).get_json()
+        assert polls[0]['option_counts'] == {'Bar 12': 14, 'Bar 48': 13, 'From the top': 13}
+        assert polls[0]['total_responses'] == 40 and polls[0]['user_response'] == 'Bar 48'
+        print("✅ 40 votes counted by upsert, duplicate rejected by the unique index")
+
+        # Cheap refreshes: 304 until a vote changes the counts
+        url = f'/api/quick-polls/{poll_id}/tallies'
+        first = client.get(url, headers=tokens[2])
+        assert first.status_code == 200 and first.get_json()['total_responses'] == 40
+        etag = first.headers['ETag']
+        assert client.get(url, headers={**tokens[2], 'If-None-Match': etag}).status_code == 304
+        client.post(f'/api/quick-polls/{poll_id}/close', headers=tokens[0])
+        closed = client.get(url, headers={**tokens[2], 'If-None-Match': etag})
+        assert closed.status_code == 200 and closed.get_json()['is_open'] is False
+        assert client.post(f'/api/quick-polls/{poll_id}/respond', headers=tokens[0],
+                           json={'option_index': 0}).status_code == 400
+        print("✅ Tallies endpoint answers 304 until the poll changes")
+
+
+def test_anonymous_poll():
+    """Anonymous votes don't record the member but still count once"""
+    print("🧪 Testing anonymous quick poll")
+    with app.app_context():
+        client = app.test_client()
+        admin = {'Authorization': 'Bearer ' + create_access_token(
+            identity='1', additional_claims={'organization_id': 1, 'role': 'Admin'})}
+        member = {'Authorization': 'Bearer ' + create_access_token(
+            identity='2', additional_claims={'organization_id': 1, 'role': 'Member'})}
+        response = client.post('/api/quick-polls/', headers=admin, json={
+            'question': 'Tempo?', 'options': ['Faster', 'Slower'], 'is_anonymous': True})
+        poll_id = response.get_json()['id']
+
+        assert client.post(f'/api/quick-polls/{poll_id}/respond', headers=member,
+                           json={'response': 'Slower'}).status_code == 200
+        assert client.post(f'/api/quick-polls/{poll_id}/respond', headers=member,
+                           json={'response': 'Faster'}).status_code == 409
+        vote = PollResponse.query.filter_by(poll_id=poll_id).one()
+        assert vote.user_id is None and vote.voter_key != '2' and len(vote.voter_key) == 64
+        poll = client.get(f'/api/quick-polls/{poll_id}', headers=member).get_json()
+        assert poll['user_response'] == 'Slower' and poll['option_counts'] == {'Faster': 0, 'Slower': 1}
+        print("✅ Anonymous vote stored under a keyed hash and counted once")
+
+
+if __name__ == '__main__':
+    try:
+        test_quick_poll_votes()
+        test_anonymous_poll()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
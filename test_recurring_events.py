@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Test lazy recurring-event expansion
+Creates a weekly series, checks it's stored as one row, that occurrences are
+expanded per date window, and that only RSVP'd/cancelled/reminded occurrences
+get rows of their own. Cancelling, editing or deleting one date - the first
+included - leaves the others alone, and every event action takes an
+occurrence key.
+"""
+
+import os
+import sys
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from app import app, db
+from models import User, Organization, UserOrganization, Event, RSVP, EventOccurrenceExclusion
+from services.recurrence import RecurrenceService
+
+
+def test_recurring_events():
+    """A weekly series is one row until occurrences are touched"""
+    print("🧪 Testing lazy recurring events")
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        org = Organization(name='Recurring Band')
+        db.session.add(org)
+        db.session.flush()
+        admin = User(username='recurring_admin', email='recurring_admin@example.com', password_hash='x',
+                     organization_id=org.id)
+        db.session.add(admin)
+        db.session.flush()
+        db.session.add(UserOrganization(user_id=admin.id, organization_id=org.id, role='Admin'))
+        db.session.commit()
+
+        token = create_access_token(identity=str(admin.id),
+                                    additional_claims={'organization_id': org.id, 'role': 'Admin'})
+        headers = {'Authorization': f'Bearer {token}'}
+        client = app.test_client()
+
+        first = (datetime.utcnow() + timedelta(days=1)).replace(hour=19, minute=0, second=0, microsecond=0)
+        response = client.post('/api/events/', headers=headers, json={
+            'title': 'Rehearsal', 'date': first.isoformat(), 'end_date': (first + timedelta(hours=2)).isoformat(),
+            'is_recurring': True, 'recurring_pattern': 'weekly', 'recurring_count': 52,
+            'send_notification': False
+        })
+        assert response.status_code == 200, response.get_json()
+        series_id = response.get_json()['id']
+        assert Event.query.count() == 1, "Series was expanded into rows on create"
+
+        # A ten week window holds ten occurrences: the series row plus nine expanded ones
+        window = f"from={first.isoformat()}&to={(first + timedelta(weeks=10)).isoformat()}"
+        events = client.get(f'/api/events/?{window}', headers=headers).get_json()
+        assert len(events) == 10, len(events)
+        assert events[0]['id'] == series_id and isinstance(events[1]['id'], str), events[:2]
+        assert events[1]['end_date'] == (first + timedelta(weeks=1, hours=2)).isoformat(), events[1]
+
+        # The whole series, with no window
+        assert len(client.get('/api/events/', headers=headers).get_json()) == 52
+
+        # RSVPing to an occurrence gives it (and only it) a row
+        key = events[3]['id']
+        assert client.get(f'/api/events/{key}/rsvps', headers=headers).get_json() == {'Yes': [], 'No': [], 'Maybe': []}
+        response = client.post(f'/api/events/{key}/rsvp', headers=headers, json={'status': 'Yes'})
+        assert response.status_code == 200, response.get_json()
+        occurrence = Event.query.filter(Event.parent_event_id == series_id).one()
+        assert occurrence.recurrence_id == first + timedelta(weeks=3)
+        assert RSVP.query.filter_by(event_id=occurrence.id).one().status == 'Yes'
+        assert client.get(f'/api/events/{key}/rsvps', headers=headers).get_json()['Yes'][0]['username'] == admin.username
+
+        # ...which replaces the expanded occurrence rather than duplicating it
+        events = client.get(f'/api/events/?{window}', headers=headers).get_json()
+        assert len(events) == 10 and events[3]['id'] == occurrence.id, events[3]
+
+        # Cancelling another occurrence only cancels that one
+        response = client.post(f"/api/events/{events[5]['id']}/cancel", headers=headers, json={'reason': 'Hall booked'})
+        assert response.status_code == 200, response.get_json()
+        events = client.get(f'/api/events/?{window}', headers=headers).get_json()
+        assert [e['is_cancelled'] for e in events].count(True) == 1 and events[5]['is_cancelled'], events[5]
+
+        # Unknown or off-schedule occurrences are 404s
+        off_schedule = (first + timedelta(days=2)).strftime('%Y%m%dT%H%M%S')
+        assert client.get(f'/api/events/{series_id}-{off_schedule}', headers=headers).status_code == 404
+
+        # The feed carries the rule once, with the touched occurrences as overrides
+        feed = client.get(f'/api/calendar/org/{org.id}/events.ics', headers=headers).get_data(as_text=True)
+        assert feed.count('RRULE:FREQ=WEEKLY;COUNT=52;INTERVAL=1') == 1, feed
+        assert feed.count('RECURRENCE-ID') == 2 and feed.count('STATUS:CANCELLED') == 1, feed
+
+        # Reminder runs materialize the occurrences about to be reminded about
+        before = Event.query.count()
+        RecurrenceService.materialize_between(Event.query, first + timedelta(weeks=1), first + timedelta(weeks=2))
+        db.session.commit()
+        assert Event.query.count() == before + 1
+        RecurrenceService.materialize_between(Event.query, first + timedelta(weeks=1), first + timedelta(weeks=2))
+        assert Event.query.count() == before + 1, "Materializing twice created duplicate rows"
+
+        print(f"✅ 52 week series stored in {Event.query.count()} rows")
+
+
+def test_single_dates():
+    """Cancelling, editing or deleting one date of a series, the first included, leaves the rest"""
+    print("🧪 Testing changes to single dates of a series")
+    with app.app_context():
+        db.create_all()
+        org = Organization(name='Single Date Band')
+        db.session.add(org)
+        db.session.flush()
+        admin = User(username='single_date_admin', email='single_date_admin@example.com', password_hash='x',
+                     organization_id=org.id)
+        db.session.add(admin)
+        db.session.flush()
+        db.session.add(UserOrganization(user_id=admin.id, organization_id=org.id, role='Admin'))
+        db.session.commit()
+        org_id = org.id
+
+        token = create_access_token(identity=str(admin.id),
+                                    additional_claims={'organization_id': org_id, 'role': 'Admin'})
+        headers = {'Authorization': f'Bearer {token}'}
+        client = app.test_client()
+
+        first = (datetime.utcnow() + timedelta(days=1)).replace(hour=18, minute=30, second=0, microsecond=0)
+        response = client.post('/api/events/', headers=headers, json={
+            'title': 'Sectional', 'date': first.isoformat(), 'is_recurring': True,
+            'recurring_pattern': 'weekly', 'recurring_count': 8, 'send_notification': False
+        })
+        series_id = response.get_json()['id']
+        window = f"from={first.isoformat()}&to={(first + timedelta(weeks=8)).isoformat()}"
+
+        def listing():
+            return client.get(f'/api/events/?{window}', headers=headers).get_json()
+
+        # Week 1 gets a row through an RSVP; week 3 is deleted without ever having one
+        events = listing()
+        assert client.post(f"/api/events/{events[1]['id']}/rsvp", headers=headers, json={'status': 'Yes'}).status_code == 200
+        before = Event.query.count()
+        assert client.delete(f"/api/events/{events[3]['id']}", headers=headers).status_code == 200
+        assert Event.query.count() == before, "Deleting an unmaterialized occurrence created or removed rows"
+        assert len(listing()) == 7
+
+        # Cancelling the first date cancels it alone
+        response = client.post(f'/api/events/{series_id}/cancel', headers=headers, json={'reason': 'Snow'})
+        assert response.status_code == 200, response.get_json()
+        events = listing()
+        assert len(events) == 7, [e['date'] for e in events]
+        assert [e['is_cancelled'] for e in events] == [True] + [False] * 6, events
+        assert all(e['title'] == 'Sectional' for e in events)
+        assert first + timedelta(weeks=3) not in {datetime.fromisoformat(e['date']) for e in events}
+
+        # The rule moved to a series from week 2 (week 1 has its own row), RSVPs stayed put
+        series = db.session.get(Event, series_id)
+        assert not series.is_recurring and series.is_cancelled
+        week_one = Event.query.filter_by(recurrence_id=None, date=first + timedelta(weeks=1)).one()
+        assert week_one.parent_event_id is None and RSVP.query.filter_by(event_id=week_one.id).count() == 1
+        rest = Event.query.filter_by(is_recurring=True, organization_id=org_id).one()
+        assert rest.date == first + timedelta(weeks=2) and rest.recurring_count == 6, (rest.date, rest.recurring_count)
+        assert EventOccurrenceExclusion.query.filter_by(series_id=rest.id).count() == 1
+
+        # Editing the new first date edits it alone
+        assert events[2]['id'] == rest.id, events[2]
+        response = client.put(f'/api/events/{rest.id}', headers=headers, json={'title': 'Tutti'})
+        assert response.status_code == 200, response.get_json()
+        events = listing()
+        assert [e['title'] for e in events] == ['Sectional', 'Sectional', 'Tutti'] + ['Sectional'] * 4, events
+        assert not any(e['is_cancelled'] for e in events[1:])
+        print("✅ First date cancelled and edited on its own; later dates unchanged")
+
+        # A deleted materialized occurrence doesn't come back expanded
+        key = events[4]['id']
+        assert client.post(f'/api/events/{key}/rsvp', headers=headers, json={'status': 'No'}).status_code == 200
+        row = RecurrenceService.resolve(org_id, key)
+        RSVP.query.filter_by(event_id=row.id).delete()
+        db.session.commit()
+        assert client.delete(f'/api/events/{row.id}', headers=headers).status_code == 200
+        events = listing()
+        assert len(events) == 6 and key not in [e['id'] for e in events], events
+        assert client.get(f'/api/events/{key}', headers=headers).status_code == 404
+
+        # ...and the feed lists it as an EXDATE (week 3 now falls before the rule's start)
+        feed = client.get(f'/api/calendar/org/{org_id}/events.ics', headers=headers).get_data(as_text=True)
+        exdates = [line for line in feed.splitlines() if line.startswith('EXDATE')]
+        assert exdates == [f"EXDATE:{(first + timedelta(weeks=5)).strftime('%Y%m%dT%H%M%S')}"], exdates
+        print("✅ Deleted dates stay deleted in listings and feeds")
+
+        # Exports and substitute requests take occurrence keys
+        key = events[-1]['id']
+        response = client.get(f'/api/events/{key}/export-rsvps?format=csv', headers=headers)
+        assert response.status_code == 200 and response.mimetype == 'text/csv', response.status_code
+        assert client.get(f'/api/events/{key}/rsvp-report/pdf', headers=headers).status_code == 200
+        key = events[-2]['id']
+        response = client.post('/api/substitutes/request', headers=headers, json={'event_id': key})
+        assert response.status_code == 404 and response.get_json()['error'] == 'RSVP not found for this event'
+        assert client.post(f'/api/events/{key}/rsvp', headers=headers, json={'status': 'Yes'}).status_code == 200
+        response = client.post('/api/substitutes/request', headers=headers, json={'event_id': key})
+        assert response.status_code in (200, 201), response.get_json()
+        print("✅ Export, PDF report and substitute requests accept occurrence keys")
+
+
+def test_ical_rule():
+    """A series with a count and an end date ends at whichever comes first in the feed"""
+    print("🧪 Testing iCal rules for series with a count and an end date")
+    first = datetime(2025, 1, 6, 19, 0)
+
+    def series(**fields):
+        return Event(title='Rehearsal', date=first, is_recurring=True, recurring_pattern='weekly', **fields)
+
+    assert RecurrenceService.ical_rule(series(recurring_count=4)) == {'freq': 'WEEKLY', 'interval': 1, 'count': 4}
+    # Four weeks end before the end date
+    rule = RecurrenceService.ical_rule(series(recurring_count=4, recurring_end_date=first + timedelta(weeks=10)))
+    assert rule == {'freq': 'WEEKLY', 'interval': 1, 'count': 4}, rule
+    # The end date comes first
+    end = first + timedelta(weeks=2, days=1)
+    rule = RecurrenceService.ical_rule(series(recurring_count=10, recurring_end_date=end))
+    assert rule == {'freq': 'WEEKLY', 'interval': 1, 'until': end}, rule
+    print("✅ COUNT kept when it ends first, UNTIL used when the end date does")
+
+
+if __name__ == '__main__':
+    try:
+        test_recurring_events()
+        test_single_dates()
+        test_ical_rule()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
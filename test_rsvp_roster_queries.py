@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Benchmark for GET /api/events/<id>/rsvps and the bulk GET /api/events/rsvps
+Seeds rosters of different sizes into a throwaway SQLite database and fails
+if the number of SQL statements grows with the number of members, or with
+the number of events asked for in bulk.
+"""
+
+import os
+import sys
+import time
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event as sa_event
+from app import app, db
+from models import User, Organization, UserOrganization, Section, Event, RSVP
+
+ROSTER_SIZES = [10, 100, 1000]
+
+
+def seed_roster(size):
+    """Create an organization with `size` members who have all RSVP'd to one event"""
+    org = Organization(name=f'Benchmark Band {size}')
+    db.session.add(org)
+    db.session.flush()
+
+    sections = [Section(name=name, organization_id=org.id) for name in ('Cornet', 'Horn', 'Percussion')]
+    db.session.add_all(sections)
+    event = Event(title='Concert', date=datetime.utcnow() + timedelta(days=7), organization_id=org.id)
+    db.session.add(event)
+    db.session.flush()
+
+    statuses = ['Yes', 'no', 'Maybe', 'unknown']
+    for i in range(size):
+        user = User(
+            username=f'bench{size}_{i}',
+            email=f'bench{size}_{i}@example.com',
+            name=f'Member {i}' if i % 5 else None,
+            password_hash='x',
+            section_id=sections[i % len(sections)].id,
+            # Mix legacy membership and UserOrganization membership
+            organization_id=org.id if i % 2 else None
+        )
+        db.session.add(user)
+        db.session.flush()
+        if not i % 2:
+            db.session.add(UserOrganization(user_id=user.id, organization_id=org.id, role='Member', is_active=True))
+        db.session.add(RSVP(user_id=user.id, event_id=event.id, status=statuses[i % len(statuses)]))
+
+    db.session.commit()
+    return org, event
+
+
+def count_queries(client, url, headers):
+    """Return (query_count, elapsed_ms, response) for a single GET"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.engine
+    sa_event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+    finally:
+        sa_event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return len(statements), elapsed_ms, response
+
+
+def test_rsvp_roster_query_count():
+    """Query count for the roster endpoint must not depend on roster size"""
+    print("🧪 Benchmarking RSVP roster endpoint")
+    print("=" * 60)
+
+    results = []
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        client = app.test_client()
+
+        for size in ROSTER_SIZES:
+            org, event = seed_roster(size)
+            token = create_access_token(
+                identity='1',
+                additional_claims={'role': 'Admin', 'organization_id': org.id}
+            )
+            headers = {'Authorization': f'Bearer {token}'}
+            queries, elapsed_ms, response = count_queries(client, f'/api/events/{event.id}/rsvps', headers)
+
+            assert response.status_code == 200, response.get_data(as_text=True)
+            data = response.get_json()
+            returned = sum(len(v) for v in data.values())
+            assert returned == size, f"Expected {size} RSVPs, got {returned}"
+
+            print(f"📊 {size:>5} members: {queries} queries, {elapsed_ms:.1f} ms")
+            results.append(queries)
+
+    assert len(set(results)) == 1, f"❌ Query count grows with roster size: {dict(zip(ROSTER_SIZES, results))}"
+    print("✅ Query count is constant across roster sizes")
+
+
+def test_bulk_rosters():
+    """One bulk request returns the same rosters as per-event requests, in constant queries"""
+    print("🧪 Benchmarking bulk RSVP rosters")
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+        org, first = seed_roster(12)
+        _, elsewhere = seed_roster(3)
+        users = [rsvp.user_id for rsvp in RSVP.query.filter_by(event_id=first.id)]
+        headers = {'Authorization': 'Bearer ' + create_access_token(
+            identity='1', additional_claims={'role': 'Admin', 'organization_id': org.id})}
+
+        event_ids = [first.id]
+        results = []
+        for total in (3, 30):
+            events = [Event(title=f'Gig {i}', date=datetime.utcnow() + timedelta(days=i), organization_id=org.id)
+                      for i in range(len(event_ids), total)]
+            db.session.add_all(events)
+            db.session.flush()
+            db.session.add_all([RSVP(event_id=event.id, user_id=user_id, status=('Yes', 'No')[i % 2])
+                                for i, event in enumerate(events) for user_id in users[:i % 5]])
+            db.session.commit()
+            event_ids += [event.id for event in events]
+
+            ids = ','.join(map(str, event_ids + [elsewhere.id])) + f',{first.id}-20300101T190000'
+            queries, _, response = count_queries(client, f'/api/events/rsvps?ids={ids}', headers)
+            assert response.status_code == 200, response.get_data(as_text=True)
+            rosters = response.get_json()
+            assert str(elsewhere.id) not in rosters, "Another organization's roster was returned"
+            assert rosters[f'{first.id}-20300101T190000'] == {'Yes': [], 'No': [], 'Maybe': []}
+            for event_id in (event_ids[0], event_ids[-1]):
+                assert rosters[str(event_id)] == client.get(f'/api/events/{event_id}/rsvps', headers=headers).get_json()
+            results.append(queries)
+            print(f"📊 {total:>5} events: {queries} queries")
+
+        assert client.get('/api/events/rsvps?ids=1,drop', headers=headers).status_code == 400
+    assert len(set(results)) == 1, f"❌ Query count grows with events: {results}"
+    print("✅ Bulk rosters match per-event rosters in constant queries")
+
+
+if __name__ == '__main__':
+    try:
+        test_rsvp_roster_query_count()
+        test_bulk_rosters()
+    except AssertionError as e:
+        print(e)
+        sys.exit(1)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test the single-statement RSVP upsert
+Submits, changes and repeats a member's RSVP, checking the status the upsert
+replaced drives admin change tracking, that other organizations' events are
+404s, and that the write itself is one statement.
+"""
+
+import os
+import sys
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event as sa_event
+from app import app, db
+from models import User, Organization, UserOrganization, Event, RSVP, NotificationJob
+
+
+def post_rsvp(client, event_id, status, headers):
+    """Return (response, RSVP statements issued)"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if 'rsvp' in statement.lower():
+            statements.append(statement)
+
+    sa_event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.post(f'/api/events/{event_id}/rsvp', headers=headers, json={'status': status})
+    finally:
+        sa_event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return response, statements
+
+
+def test_rsvp_upsert():
+    """Previous status comes back from the upsert; unchanged answers queue nothing"""
+    print("🧪 Testing RSVP upsert")
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        org = Organization(name='Upsert Band')
+        other_org = Organization(name='Other Band')
+        db.session.add_all([org, other_org])
+        db.session.flush()
+        member = User(username='upsert_member', email='upsert_member@example.com', password_hash='x',
+                      organization_id=org.id)
+        gig = Event(title='Gig', date=datetime.utcnow() + timedelta(days=3), organization_id=org.id)
+        other_gig = Event(title='Not ours', date=datetime.utcnow() + timedelta(days=3), organization_id=other_org.id)
+        db.session.add_all([member, gig, other_gig])
+        db.session.flush()
+        db.session.add(UserOrganization(user_id=member.id, organization_id=org.id))
+        db.session.commit()
+
+        token = create_access_token(identity=str(member.id), additional_claims={'organization_id': org.id})
+        headers = {'Authorization': f'Bearer {token}'}
+        client = app.test_client()
+
+        def change_job():
+            db.session.expire_all()
+            return NotificationJob.query.filter_by(job_type='rsvp_change', event_id=gig.id).one_or_none()
+
+        # First answer: inserted, tracked as a change from nothing
+        response, statements = post_rsvp(client, gig.id, 'yes', headers)
+        assert response.status_code == 200, response.get_json()
+        assert len(statements) == 1 and 'ON CONFLICT' in statements[0], statements
+        rsvp = RSVP.query.filter_by(event_id=gig.id, user_id=member.id).one()
+        assert rsvp.status == 'Yes' and rsvp.previous_status is None
+        job = change_job()
+        assert job.payload == {'previous_status': None, 'new_status': 'Yes'}, job.payload
+        job.status = 'sent'
+        db.session.commit()
+
+        # Changed answer: same row, previous status returned by the upsert
+        response, statements = post_rsvp(client, gig.id, 'No', headers)
+        assert response.status_code == 200 and len(statements) == 1, statements
+        db.session.expire_all()
+        rsvp = RSVP.query.filter_by(event_id=gig.id, user_id=member.id).one()
+        assert (rsvp.status, rsvp.previous_status) == ('No', 'Yes')
+        job = change_job()
+        assert job.status == 'pending' and job.payload == {'previous_status': 'Yes', 'new_status': 'No'}, job.payload
+        job.status = 'sent'
+        db.session.commit()
+
+        # Same answer again: nothing to tell the admins
+        response, _ = post_rsvp(client, gig.id, 'No', headers)
+        assert response.status_code == 200
+        assert change_job().status == 'sent', "An unchanged RSVP queued a notification"
+
+        # Other organizations' events and bad statuses write nothing
+        response, _ = post_rsvp(client, other_gig.id, 'Yes', headers)
+        assert response.status_code == 404, response.get_json()
+        assert post_rsvp(client, 999999, 'Yes', headers)[0].status_code == 404
+        assert post_rsvp(client, gig.id, 'Perhaps', headers)[0].status_code == 400
+        assert RSVP.query.count() == 1
+
+        print("✅ RSVPs upserted in one statement with change tracking queued")
+
+
+if __name__ == '__main__':
+    try:
+        test_rsvp_upsert()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
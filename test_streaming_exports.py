@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Test the streaming CSV/NDJSON export endpoints
+Seeds users into a throwaway SQLite database, then checks the exports stream
+the right rows and that the number of SQL statements doesn't grow with them.
+"""
+
+import os
+import sys
+import csv
+import io
+import json
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event as sa_event
+from app import app, db
+from models import User, Organization, Event, RSVP, Section, UserOrganization
+
+USER_COUNTS = [50, 500]
+
+
+def seed_users(org, count, prefix):
+    """`count` users who each RSVP'd to one event created by the first user"""
+    users = [User(username=f'{prefix}_{i}', email=f'{prefix}_{i}@example.com', password_hash='x',
+                  organization_id=org.id) for i in range(count)]
+    db.session.add_all(users)
+    db.session.flush()
+    event = Event(title='Concert', date=datetime.utcnow() - timedelta(days=1),
+                  organization_id=org.id, created_by=users[0].id)
+    db.session.add(event)
+    db.session.flush()
+    db.session.add_all([RSVP(user_id=u.id, event_id=event.id, status='Yes') for u in users])
+    db.session.commit()
+    return users
+
+
+def stream(client, url, headers):
+    """Return (query_count, response body) for a streamed GET"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sa_event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        assert response.is_streamed, "Export was buffered instead of streamed"
+        body = response.get_data(as_text=True)
+    finally:
+        sa_event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return len(statements), body
+
+
+def test_user_activity_export():
+    """CSV and NDJSON user activity exports stream every user in constant queries"""
+    print("🧪 Testing super-admin user activity export")
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        org = Organization(name='Export Band')
+        admin = User(username='export_admin', email='export_admin@example.com', password_hash='x', super_admin=True)
+        db.session.add_all([org, admin])
+        db.session.commit()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(admin.id))}'}
+        client = app.test_client()
+
+        query_counts = []
+        total = 1
+        for size in USER_COUNTS:
+            users = seed_users(org, size, f'activity{size}')
+            total += size
+
+            queries, body = stream(client, '/api/super-admin/analytics/export/user_activity?format=csv', headers)
+            rows = list(csv.DictReader(io.StringIO(body)))
+            assert len(rows) == total, f"Expected {total} CSV rows, got {len(rows)}"
+            creator = next(r for r in rows if r['username'] == users[0].username)
+            assert creator['events_created'] == '1' and creator['total_activity'] == '2', creator
+
+            _, body = stream(client, '/api/super-admin/analytics/export/user_activity?format=ndjson', headers)
+            records = [json.loads(line) for line in body.splitlines()]
+            assert len(records) == total and records[-1]['rsvps_made'] == 1, records[-1]
+
+            print(f"📊 {total:>4} users: {queries} queries")
+            query_counts.append(queries)
+
+    assert len(set(query_counts)) == 1, f"Query count grows with users: {query_counts}"
+    print("✅ User activity export streams in constant queries")
+
+
+def test_bulk_ops_exports():
+    """Member/event exports stream from batched queries with no per-row lazy loads"""
+    print("🧪 Testing bulk-ops member and event exports")
+    with app.app_context():
+        db.create_all()
+        org = Organization(name='Bulk Export Band')
+        db.session.add(org)
+        db.session.flush()
+        section = Section(name='Horn', organization_id=org.id)
+        admin = User(username='bulk_admin', name='Bulk Admin', email='bulk_admin@example.com', password_hash='x')
+        db.session.add_all([section, admin])
+        db.session.flush()
+        db.session.add(UserOrganization(user_id=admin.id, organization_id=org.id, role='Admin', section_id=section.id))
+        db.session.commit()
+        token = create_access_token(identity=str(admin.id), additional_claims={'organization_id': org.id})
+        headers = {'Authorization': f'Bearer {token}'}
+        client = app.test_client()
+        # The admin's role is verified on the first request and cached after that
+        stream(client, '/api/bulk-ops/export/members?format=csv', headers)
+
+        query_counts = []
+        total = 1
+        for size in USER_COUNTS:
+            users = seed_users(org, size, f'bulk{size}')
+            db.session.add_all([UserOrganization(user_id=u.id, organization_id=org.id, section_id=section.id)
+                                for u in users])
+            db.session.commit()
+            total += size
+
+            queries, body = stream(client, '/api/bulk-ops/export/members?format=csv', headers)
+            rows = list(csv.DictReader(io.StringIO(body)))
+            assert len(rows) == total, f"Expected {total} member rows, got {len(rows)}"
+            assert rows[0]['first_name'] == 'Bulk' and rows[0]['section'] == 'Horn', rows[0]
+
+            _, body = stream(client, '/api/bulk-ops/export/events?format=ndjson', headers)
+            events = [json.loads(line) for line in body.splitlines()]
+            assert events[-1]['rsvp_count'] == size and events[-1]['yes_count'] == size, events[-1]
+
+            _, body = stream(client, '/api/bulk-ops/export?format=ndjson', headers)
+            types = [json.loads(line)['type'] for line in body.splitlines()]
+            assert types.count('member') == total and types.count('event') == len(events), types[:3]
+
+            _, body = stream(client, '/api/bulk-ops/export/events?format=csv&start_date=2000-01-01', headers)
+            assert len(list(csv.DictReader(io.StringIO(body)))) == len(events)
+
+            print(f"📊 {total:>4} members: {queries} queries")
+            query_counts.append(queries)
+
+        for bad in ('start_date=yesterday', 'end_date=2024-13-40'):
+            response = client.get(f'/api/bulk-ops/export/events?format=csv&{bad}', headers=headers)
+            assert response.status_code == 400, (bad, response.status_code)
+
+    assert len(set(query_counts)) == 1, f"Query count grows with members: {query_counts}"
+    print("✅ Bulk-ops exports stream in constant queries, bad dates rejected")
+
+
+if __name__ == '__main__':
+    try:
+        test_user_activity_export()
+        test_bulk_ops_exports()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
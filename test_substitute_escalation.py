@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Test substitute call list escalation
+Drives the escalation engine from a fake clock: waves go out in call list
+order, the next wave follows a timeout or a full set of declines, accepting
+stops escalation, and an exhausted request expires when the event starts.
+Also checks a run only touches the requests that are due.
+"""
+
+import os
+import sys
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event as sa_event
+from app import app, db
+from models import (User, Organization, UserOrganization, Event, RSVP, CallList, CallListMember,
+                    SubstituteRequest, SubstituteResponse, NotificationJob)
+from services.substitute_escalation import substitute_escalation
+
+WAVES = {'normal': (3, 30), 'urgent': (10, 5)}
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, **kwargs):
+        self.now += timedelta(**kwargs)
+
+
+def contacted(request_id):
+    """User IDs contacted for a request, in call list order"""
+    return [r.user_id for r in SubstituteResponse.query.filter_by(request_id=request_id)
+            .order_by(SubstituteResponse.contacted_at, SubstituteResponse.user_id)]
+
+
+def test_substitute_escalation():
+    """Waves escalate on timeout and declines, and stop once the spot is filled"""
+    print("🧪 Testing substitute escalation")
+    clock = FakeClock(datetime.utcnow().replace(microsecond=0))
+    substitute_escalation.clock = clock
+    substitute_escalation.waves = WAVES
+
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        org = Organization(name='Escalation Band')
+        db.session.add(org)
+        db.session.flush()
+        requester = User(username='sub_requester', name='Requester', email='sub_requester@example.com',
+                         password_hash='x', organization_id=org.id)
+        members = [User(username=f'sub_{i}', name=f'Sub {i}', email=f'sub_{i}@example.com', password_hash='x',
+                        organization_id=org.id) for i in range(8)]
+        db.session.add_all([requester] + members)
+        db.session.flush()
+        db.session.add_all([UserOrganization(user_id=u.id, organization_id=org.id) for u in [requester] + members])
+        event = Event(title='Spring Concert', date=clock.now + timedelta(days=5), organization_id=org.id)
+        db.session.add(event)
+        db.session.flush()
+        call_list = CallList(organization_id=org.id, name='Trumpets', is_default=True)
+        db.session.add(call_list)
+        db.session.flush()
+        # Listed in reverse so order_position, not insertion order, decides
+        for position, member in reversed(list(enumerate(members))):
+            db.session.add(CallListMember(call_list_id=call_list.id, user_id=member.id, order_position=position,
+                                          is_active=member is not members[5]))
+        db.session.add(RSVP(event_id=event.id, user_id=requester.id, status='Yes'))
+        # Already playing, so never asked
+        db.session.add(RSVP(event_id=event.id, user_id=members[1].id, status='Yes'))
+        db.session.commit()
+        ids = [m.id for m in members]
+        tokens = {u.id: {'Authorization': 'Bearer ' + create_access_token(
+            identity=str(u.id), additional_claims={'organization_id': org.id})} for u in [requester] + members}
+        client = app.test_client()
+
+        # Creating the request contacts the first wave at once
+        response = client.post('/api/substitutes/request', headers=tokens[requester.id],
+                               json={'event_id': event.id, 'reason': 'Sick'})
+        assert response.status_code == 201, response.get_json()
+        request_id = response.get_json()['request_id']
+        substitute_request = db.session.get(SubstituteRequest, request_id)
+        assert substitute_request.call_list_id == call_list.id
+        assert contacted(request_id) == [ids[0], ids[2], ids[3]], contacted(request_id)
+        assert substitute_request.next_contact_at == clock.now + timedelta(minutes=30)
+        assert db.session.get(CallListMember, CallListMember.query.filter_by(user_id=ids[0]).one().id).last_contacted == clock.now
+        assert NotificationJob.query.filter_by(job_type='substitute_offer').count() == 3
+
+        # Nothing happens before the wave times out
+        clock.advance(minutes=29)
+        assert substitute_escalation.run_due()['requests'] == 0
+        clock.advance(minutes=2)
+        stats = substitute_escalation.run_due()
+        assert stats['requests'] == 1 and stats['contacted'] == 3, stats
+        assert contacted(request_id)[3:] == [ids[4], ids[6], ids[7]], contacted(request_id)
+
+        # Once the whole wave has declined the next one goes out without waiting
+        for user_id in ids[:1] + ids[2:4] + ids[4:5] + ids[6:7]:
+            assert client.post('/api/substitutes/decline', headers=tokens[user_id],
+                               json={'request_id': request_id}).status_code == 200
+        db.session.expire_all()
+        assert db.session.get(SubstituteRequest, request_id).escalation_wave == 2, "Escalated before everyone declined"
+        assert client.post('/api/substitutes/decline', headers=tokens[ids[7]],
+                           json={'request_id': request_id}).status_code == 200
+        db.session.expire_all()
+        substitute_request = db.session.get(SubstituteRequest, request_id)
+        # Everyone eligible has been asked: it stays open and is only looked at again to expire it
+        assert substitute_request.status == 'open' and substitute_request.next_contact_at == event.date
+
+        # A member who declined can still take the spot, which stops escalation
+        response = client.post('/api/substitutes/accept', headers=tokens[ids[3]], json={'request_id': request_id})
+        assert response.status_code == 200, response.get_json()
+        assert client.post('/api/substitutes/accept', headers=tokens[ids[4]],
+                           json={'request_id': request_id}).status_code == 404
+        db.session.expire_all()
+        substitute_request = db.session.get(SubstituteRequest, request_id)
+        assert substitute_request.status == 'filled' and substitute_request.filled_by == ids[3]
+        assert substitute_request.next_contact_at is None
+        statuses = {r.user_id: r.status for r in RSVP.query.filter_by(event_id=event.id)}
+        assert statuses[ids[3]] == 'Yes' and statuses[requester.id] == 'No', statuses
+        clock.advance(days=10)
+        assert substitute_escalation.run_due()['requests'] == 0
+
+        # Filled before the timeout: the next wave never goes out
+        clock.now = event.date - timedelta(days=3)
+        second = SubstituteRequest(event_id=event.id, requested_by=ids[0], status='open')
+        db.session.add(second)
+        db.session.commit()
+        substitute_escalation.start(second)
+        first_wave = contacted(second.id)
+        assert first_wave == [ids[2], ids[4], ids[6]], first_wave
+        assert substitute_escalation.fill(second.id, ids[2])
+        db.session.commit()
+        clock.advance(hours=1)
+        assert substitute_escalation.run_due()['requests'] == 0 and contacted(second.id) == first_wave
+
+        # Within a day of the event waves are urgent: bigger and faster
+        clock.now = event.date - timedelta(hours=6)
+        third = SubstituteRequest(event_id=event.id, requested_by=ids[2], status='open')
+        db.session.add(third)
+        db.session.commit()
+        substitute_escalation.start(third)
+        # Every eligible member at once: the substitute from the first request now plays too
+        assert contacted(third.id) == [ids[0], ids[4], ids[6], ids[7]], contacted(third.id)
+        assert db.session.get(SubstituteRequest, third.id).next_contact_at == clock.now + timedelta(minutes=5)
+        clock.advance(minutes=5)
+        assert substitute_escalation.run_due()['exhausted'] == 1
+        clock.now = event.date
+        assert substitute_escalation.run_due()['expired'] == 1
+        db.session.expire_all()
+        assert db.session.get(SubstituteRequest, third.id).status == 'expired'
+
+        print("✅ Waves escalate on timeout and declines and stop once filled")
+
+
+def test_due_requests_only():
+    """A run's cost depends on the requests due, not on every open request"""
+    print("🧪 Testing escalation only touches due requests")
+    clock = substitute_escalation.clock
+    with app.app_context():
+        event = Event.query.filter_by(title='Spring Concert').one()
+        requester = User.query.filter_by(username='sub_requester').one()
+        event.date = clock.now + timedelta(days=30)
+        later = clock.now + timedelta(days=1)
+        db.session.add_all([SubstituteRequest(event_id=event.id, requested_by=requester.id, status='open',
+                                              next_contact_at=later) for _ in range(2000)])
+        due = SubstituteRequest(event_id=event.id, requested_by=requester.id, status='open',
+                                next_contact_at=clock.now)
+        db.session.add(due)
+        db.session.commit()
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        sa_event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            stats = substitute_escalation.run_due()
+        finally:
+            sa_event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+        assert stats['requests'] == 1, stats
+        assert len(statements) <= 15, f"{len(statements)} queries for one due request"
+        assert SubstituteRequest.query.filter(SubstituteRequest.next_contact_at == later).count() == 2000
+
+        plan = ' '.join(row[-1] for row in db.session.execute(db.text(
+            "EXPLAIN QUERY PLAN SELECT id FROM substitute_requests WHERE status = 'open' "
+            "AND next_contact_at <= :now ORDER BY next_contact_at LIMIT 100"), {'now': clock.now}))
+        assert 'ix_substitute_requests_status_next_contact' in plan, plan
+        print(f"✅ One due request among 2001 open took {len(statements)} queries")
+
+
+if __name__ == '__main__':
+    try:
+        test_substitute_escalation()
+        test_due_requests_only()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
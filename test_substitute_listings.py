@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Test substitute listing query counts
+The request, available-request and call list listings load their events,
+requesters, substitutes and RSVPs in the same query, so the number of
+queries must be the same for 1 request as for 1,000. Also pages the
+listings by cursor and filters them by section.
+"""
+
+import os
+import sys
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event as sa_event
+from app import app, db
+from models import (User, Organization, UserOrganization, Event, RSVP, Section, CallList, CallListMember,
+                    SubstituteRequest)
+
+ENDPOINTS = ['/api/substitutes/requests', '/api/substitutes/available', '/api/substitutes/call-list']
+
+
+def seed(name, count):
+    """An organization with `count` requests made by, filled by, and open to its viewer"""
+    org = Organization(name=name)
+    db.session.add(org)
+    db.session.flush()
+    section = Section(name='Brass', organization_id=org.id)
+    viewer = User(username=f'{name}_viewer', name='Viewer', email=f'{name}_viewer@example.com',
+                  password_hash='x', organization_id=org.id)
+    db.session.add_all([section, viewer])
+    db.session.flush()
+    others = [User(username=f'{name}_{i}', name=f'Member {i}', email=f'{name}_{i}@example.com', password_hash='x',
+                   organization_id=org.id) for i in range(count)]
+    db.session.add_all(others)
+    db.session.flush()
+    db.session.add_all([UserOrganization(user_id=u.id, organization_id=org.id) for u in [viewer] + others])
+    events = [Event(title=f'Gig {i}', date=datetime.utcnow() + timedelta(days=i + 1), organization_id=org.id)
+              for i in range(count)]
+    db.session.add_all(events)
+    db.session.flush()
+    call_list = CallList(organization_id=org.id, name='Everyone', is_default=True)
+    db.session.add(call_list)
+    db.session.flush()
+    created = datetime.utcnow() - timedelta(days=1)
+    for i, (event, other) in enumerate(zip(events, others)):
+        db.session.add(CallListMember(call_list_id=call_list.id, user_id=other.id, order_position=i))
+        # Alternately made by the viewer and filled by them, plus one open to them
+        mine = SubstituteRequest(event_id=event.id, section_id=section.id if i % 2 else None,
+                                 created_at=created + timedelta(minutes=i), requested_by=viewer.id if i % 2 else other.id,
+                                 filled_by=other.id if i % 2 else viewer.id, status='filled',
+                                 filled_at=created + timedelta(minutes=i))
+        open_request = SubstituteRequest(event_id=event.id, section_id=section.id if i % 2 else None,
+                                         created_at=created + timedelta(minutes=i), requested_by=other.id, status='open')
+        db.session.add_all([mine, open_request])
+        db.session.add(RSVP(event_id=event.id, user_id=viewer.id, status='Maybe' if i % 3 else 'Yes'))
+    db.session.commit()
+    token = create_access_token(identity=str(viewer.id), additional_claims={'organization_id': org.id})
+    return {'Authorization': f'Bearer {token}'}, section.id
+
+
+def count_queries(client, url, headers):
+    # Each request starts from an empty session, as it would in production
+    db.session.remove()
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sa_event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        sa_event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    assert response.status_code == 200, response.get_json()
+    return len(statements), response.get_json()
+
+
+def test_listing_query_counts():
+    """The same number of queries for 1 request as for 1,000"""
+    print("🧪 Testing substitute listing query counts")
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        small, _ = seed('small', 1)
+        large, _ = seed('large', 1000)
+        client = app.test_client()
+        # Warm up the per-process caches (role lookups, compiled statements)
+        for url in ENDPOINTS:
+            count_queries(client, url, small)
+
+        for url in ENDPOINTS:
+            small_count, small_body = count_queries(client, url, small)
+            large_count, large_body = count_queries(client, url, large)
+            assert small_count == large_count, f"{url}: {small_count} queries for 1 request, {large_count} for 1000"
+            print(f"✅ {url}: {large_count} queries for {len(large_body)} rows")
+
+        _, requests = count_queries(client, ENDPOINTS[0], large)
+        assert len(requests) == 1000 and requests[0]['created_at'] > requests[-1]['created_at']
+        assert {r['is_requester'] for r in requests} == {True, False}
+        _, available = count_queries(client, ENDPOINTS[1], large)
+        # Open requests for events the viewer already plays (every third) are left out
+        assert len(available) == 666 and all(r['rsvp_status'] == 'Maybe' for r in available), len(available)
+        _, call_list = count_queries(client, ENDPOINTS[2], large)
+        assert [entry['priority_order'] for entry in call_list] == list(range(1000))
+        # Members filled the odd-numbered requests, the viewer the even ones
+        assert [bool(entry['last_substitute_date']) for entry in call_list[:4]] == [False, True, False, True]
+
+
+def test_paging_and_sections():
+    """Cursor pages cover the listing exactly once and section filters apply in SQL"""
+    print("🧪 Testing substitute listing paging")
+    with app.app_context():
+        headers, section_id = seed('paged', 25)
+        client = app.test_client()
+        _, everything = count_queries(client, ENDPOINTS[0], headers)
+
+        seen, cursor = [], None
+        while True:
+            url = f'{ENDPOINTS[0]}?limit=10' + (f'&cursor={cursor}' if cursor else '')
+            _, body = count_queries(client, url, headers)
+            seen.extend(r['id'] for r in body['requests'])
+            cursor = body['pagination']['next_cursor']
+            if not body['pagination']['has_next']:
+                break
+        assert seen == [r['id'] for r in everything], "Pages skipped or repeated requests"
+
+        _, sectioned = count_queries(client, f'{ENDPOINTS[1]}?section_id={section_id}', headers)
+        assert sectioned and all(r['section_id'] == section_id for r in sectioned)
+        assert client.get(f'{ENDPOINTS[0]}?cursor=nonsense', headers=headers).status_code == 400
+        print(f"✅ Paged {len(seen)} requests by cursor")
+
+
+if __name__ == '__main__':
+    try:
+        test_listing_query_counts()
+        test_paging_and_sections()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Test aggregated survey results
+Members submit (and resubmit) a survey through the API; the results served
+from the aggregate tables must match a tally of the stored responses, a
+rebuild from the responses must reproduce them, and the number of queries
+behind the results must not grow with the number of respondents.
+"""
+
+import os
+import sys
+import json
+import random
+
+# Use a throwaway in-memory database - must be set before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event as sa_event
+from app import app, db
+from models import (User, Organization, UserOrganization, Event, EventSurvey, SurveyResponse,
+                    SurveyQuestionStats, SurveyAnswerCount)
+
+OPTIONS = ['Too short', 'Just right', 'Too long']
+PIECES = ['Overture', 'Suite', 'March', 'Encore']
+
+
+def setup(name, members):
+    """An organization with an admin, `members` members and a four-question post-concert survey"""
+    org = Organization(name=name)
+    db.session.add(org)
+    db.session.flush()
+    users = [User(username=f'{name}_{i}', name=f'{name} {i}', email=f'{name}_{i}@example.com', password_hash='x',
+                  organization_id=org.id, role='Admin' if i == 0 else 'Member') for i in range(members + 1)]
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.add_all([UserOrganization(user_id=u.id, organization_id=org.id, role=u.role) for u in users])
+    event = Event(title=f'{name} concert', organization_id=org.id)
+    db.session.add(event)
+    db.session.commit()
+    tokens = [{'Authorization': 'Bearer ' + create_access_token(
+        identity=str(u.id), additional_claims={'organization_id': org.id, 'role': u.role})} for u in users]
+    return event.id, tokens
+
+
+def create_survey(client, event_id, admin, anonymous=False):
+    response = client.post(f'/api/events/{event_id}/surveys', headers=admin, json={
+        'title': 'How did it go?',
+        'is_anonymous': anonymous,
+        'questions': [
+            {'question_text': 'Rate the concert', 'question_type': 'rating'},
+            {'question_text': 'Length', 'question_type': 'multiple_choice', 'question_options': OPTIONS},
+            {'question_text': 'Favourite pieces', 'question_type': 'checkbox', 'question_options': PIECES},
+            {'question_text': 'Anything else?', 'question_type': 'text'}
+        ]
+    })
+    assert response.status_code == 201, response.get_json()
+    survey_id = response.get_json()['id']
+    details = client.get(f'/api/events/{event_id}/surveys/{survey_id}', headers=admin).get_json()
+    return survey_id, [q['id'] for q in details['questions']]
+
+
+def answers(rng, question_ids):
+    rating, length, pieces, comment = question_ids
+    submitted = {str(rating): str(rng.choice([1, 2, 3, 4, 5, 4.5, 'n/a'])), str(length): rng.choice(OPTIONS),
+                 str(pieces): rng.sample(PIECES, rng.randint(1, 3))}
+    if rng.random() < 0.5:
+        submitted[str(comment)] = 'Great gig'
+    if rng.random() < 0.2:
+        del submitted[str(length)]
+    return submitted
+
+
+def expected_results(survey_id, question_ids):
+    """Tally the stored responses the way the results page used to"""
+    rating, length, pieces, _ = question_ids
+    responses = SurveyResponse.query.filter_by(survey_id=survey_id).all()
+    by_question = {q: [r.response_value for r in responses if r.question_id == q] for q in question_ids}
+    ratings = []
+    for value in by_question[rating]:
+        try:
+            ratings.append(float(value))
+        except ValueError:
+            pass
+    selections = {}
+    for value in by_question[pieces]:
+        for selection in json.loads(value):
+            selections[selection] = selections.get(selection, 0) + 1
+    lengths = {}
+    for value in by_question[length]:
+        lengths[value] = lengths.get(value, 0) + 1
+    return {
+        'respondents': len({r.user_id for r in responses if r.user_id}),
+        'totals': {q: len(values) for q, values in by_question.items()},
+        'average': sum(ratings) / len(ratings),
+        'distribution': {str(i): ratings.count(i) for i in range(1, 6)},
+        'lengths': lengths,
+        'pieces': selections
+    }
+
+
+def check_results(body, expected, question_ids):
+    rating, length, pieces, _ = question_ids
+    questions = {q['id']: q for q in body['questions']}
+    assert body['survey']['total_responses'] == expected['respondents'], body['survey']
+    assert {q: questions[q]['total_responses'] for q in question_ids} == expected['totals']
+    assert abs(questions[rating]['average_rating'] - expected['average']) < 1e-9
+    assert questions[rating]['rating_distribution'] == expected['distribution']
+    assert questions[length]['response_counts'] == expected['lengths'], questions[length]['response_counts']
+    assert questions[pieces]['response_counts'] == expected['pieces'], questions[pieces]['response_counts']
+
+
+def count_queries(client, url, headers):
+    db.session.remove()
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sa_event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        sa_event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    assert response.status_code == 200, response.get_json()
+    return len(statements), response.get_json()
+
+
+def test_survey_results():
+    """Aggregates follow submissions and resubmissions, and survive a rebuild"""
+    print("🧪 Testing aggregated survey results")
+    rng = random.Random(7)
+    with app.app_context():
+        # Start from empty tables - other test files may share this database in one pytest run
+        db.drop_all()
+        db.create_all()
+        client = app.test_client()
+        event_id, tokens = setup('federation', 60)
+        survey_id, question_ids = create_survey(client, event_id, tokens[0])
+
+        for headers in tokens[1:]:
+            response = client.post(f'/api/events/{event_id}/surveys/{survey_id}/responses', headers=headers,
+                                   json={'responses': answers(rng, question_ids)})
+            assert response.status_code == 200, response.get_json()
+        # A third of the members change their minds
+        for headers in tokens[1::3]:
+            client.post(f'/api/events/{event_id}/surveys/{survey_id}/responses', headers=headers,
+                        json={'responses': answers(rng, question_ids)})
+
+        url = f'/api/events/{event_id}/surveys/{survey_id}/results'
+        expected = expected_results(survey_id, question_ids)
+        _, body = count_queries(client, url, tokens[0])
+        check_results(body, expected, question_ids)
+        assert len(body['questions'][0]['individual_responses']) == expected['totals'][question_ids[0]]
+
+        listing = client.get(f'/api/events/{event_id}/surveys', headers=tokens[0]).get_json()
+        assert listing[0]['response_count'] == 60 and listing[0]['question_count'] == 4, listing
+
+        # Surveys answered before the aggregates existed are rebuilt on first read
+        SurveyQuestionStats.query.filter_by(survey_id=survey_id).delete()
+        SurveyAnswerCount.query.filter_by(survey_id=survey_id).delete()
+        db.session.get(EventSurvey, survey_id).respondent_count = None
+        db.session.commit()
+        _, rebuilt = count_queries(client, url, tokens[0])
+        check_results(rebuilt, expected, question_ids)
+        assert db.session.get(EventSurvey, survey_id).respondent_count == 60
+        print("✅ Aggregated results match the stored responses, before and after a rebuild")
+
+
+def test_results_query_count():
+    """The results cost the same number of queries for 5 respondents as for 200"""
+    print("🧪 Testing survey results query count")
+    rng = random.Random(11)
+    with app.app_context():
+        client = app.test_client()
+        counts = []
+        for name, members in (('small', 5), ('large', 200)):
+            event_id, tokens = setup(name, members)
+            survey_id, question_ids = create_survey(client, event_id, tokens[0])
+            for headers in tokens[1:]:
+                client.post(f'/api/events/{event_id}/surveys/{survey_id}/responses', headers=headers,
+                            json={'responses': answers(rng, question_ids)})
+            url = f'/api/events/{event_id}/surveys/{survey_id}/results?include_responses=false'
+            count_queries(client, url, tokens[0])
+            queries, body = count_queries(client, url, tokens[0])
+            check_results(body, expected_results(survey_id, question_ids), question_ids)
+            assert 'individual_responses' not in body['questions'][0]
+            counts.append(queries)
+        assert counts[0] == counts[1], f"{counts[0]} queries for 5 respondents, {counts[1]} for 200"
+
+        # A member resubmitting an anonymous survey replaces their answers
+        survey_id, question_ids = create_survey(client, event_id, tokens[0], anonymous=True)
+        for rating in ('5', '3'):
+            response = client.post(f'/api/events/{event_id}/surveys/{survey_id}/responses', headers=tokens[1],
+                                   json={'responses': {str(question_ids[0]): rating}})
+            assert response.status_code == 200, response.get_json()
+        client.post(f'/api/events/{event_id}/surveys/{survey_id}/responses', headers=tokens[2],
+                    json={'responses': {str(question_ids[0]): '5'}})
+        _, body = count_queries(client, f'/api/events/{event_id}/surveys/{survey_id}/results', tokens[0])
+        distribution = body['questions'][0]['rating_distribution']
+        assert body['survey']['total_responses'] == 2, body['survey']
+        assert distribution['5'] == 1 and distribution['3'] == 1, distribution
+        assert SurveyResponse.query.filter_by(survey_id=survey_id, user_id=None).count() == 2
+        print(f"✅ Results served in {counts[1]} queries regardless of respondents")
+
+
+if __name__ == '__main__':
+    try:
+        test_survey_results()
+        test_results_query_count()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)